@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Benchmarks of the Caffe and Keras weight converters '''
+
+import collections
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class _Namespace(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Dense(_Namespace):
+    ''' Stand-in of a Keras Dense layer '''
+
+
+class TimeCaffeWeights(object):
+    ''' write_caffe_hdf5 on a synthetic ResNet-like network '''
+
+    n_blocks = 50
+
+    def setup(self):
+        try:
+            from dlpy.model_conversion.write_caffe_model_parm import write_caffe_hdf5
+        except ImportError:
+            raise NotImplementedError('h5py is not installed')
+        self.write_caffe_hdf5 = write_caffe_hdf5
+
+        rng = np.random.RandomState(0)
+        params = collections.OrderedDict()
+        layer_list = []
+        for i in range(self.n_blocks):
+            conv, bn, scale = 'conv{}'.format(i), 'bn{}'.format(i), 'scale{}'.format(i)
+            params[conv] = [_Namespace(data=rng.rand(64, 64, 3, 3).astype('float32'))]
+            params[bn] = [_Namespace(data=rng.rand(64).astype('float32'))
+                          for _ in range(3)]
+            params[scale] = [_Namespace(data=rng.rand(64).astype('float32'))
+                             for _ in range(2)]
+            layer_list.append(_Namespace(layer_parm=_Namespace(name=conv),
+                                         related_layers=[]))
+            layer_list.append(_Namespace(
+                layer_parm=_Namespace(name=bn),
+                related_layers=[_Namespace(type='Scale', name=scale)]))
+        self.net = _Namespace(params=params)
+        self.layer_list = layer_list
+        self.tmpdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def time_write_caffe_hdf5(self):
+        self.write_caffe_hdf5(self.net, self.layer_list,
+                              os.path.join(self.tmpdir, 'bench.caffemodel.h5'))
+
+    def time_write_caffe_hdf5_gzip(self):
+        self.write_caffe_hdf5(self.net, self.layer_list,
+                              os.path.join(self.tmpdir, 'bench.caffemodel.h5'),
+                              compression='gzip')
+
+
+def _resnet_prototxt_layers(n_blocks):
+    ''' LayerParameter stand-ins of a ResNet-like network '''
+    def layer(name, type, top, bottom):
+        return _Namespace(name=name, type=type, top=[top], bottom=bottom, include=[])
+
+    layers = [layer('data', 'Data', 'data', [])]
+    prev = 'data'
+    for i in range(n_blocks):
+        shortcut = prev
+        for j in range(3):
+            conv = 'res{}_conv{}'.format(i, j)
+            layers.append(layer(conv, 'Convolution', conv, [prev]))
+            layers.append(layer('bn' + conv, 'BatchNorm', conv, [conv]))
+            layers.append(layer('scale' + conv, 'Scale', conv, [conv]))
+            layers.append(layer(conv + '_relu', 'ReLU', conv, [conv]))
+            prev = conv
+        res = 'res{}'.format(i)
+        layers.append(layer(res, 'Eltwise', res, [shortcut, prev]))
+        layers.append(layer(res + '_relu', 'ReLU', res, [res]))
+        prev = res
+    layers.append(layer('fc', 'InnerProduct', 'fc', [prev]))
+    layers.append(layer('prob', 'Softmax', 'prob', ['fc']))
+    return layers
+
+
+class TimeCaffeTopology(object):
+    ''' Composite layer assembly of a ResNet-152 sized Caffe network '''
+
+    n_blocks = 50
+
+    def setup(self):
+        try:
+            from dlpy.model_conversion.sas_caffe_parse import make_composite_layers
+        except ImportError:
+            raise NotImplementedError('h5py is not installed')
+        self.make_composite_layers = make_composite_layers
+        self.net_layers = _resnet_prototxt_layers(self.n_blocks)
+
+    def time_make_composite_layers(self):
+        self.make_composite_layers(self.net_layers)
+
+
+def _resnet_keras_model(n_blocks):
+    ''' Stand-in of a ResNet-like functional Keras model '''
+    from dlpy.model_conversion.keras_h5 import KerasH5Model, KerasNode, make_layer
+
+    class KerasModel(KerasH5Model):
+        def get_layer(self, name=None):
+            # Keras looks layers up by scanning the layer list
+            for layer in self.layers:
+                if layer.name == name:
+                    return layer
+
+    layers = []
+
+    def layer(class_name, name, inbound):
+        new_layer = make_layer(class_name, dict(name=name))
+        new_layer._inbound_nodes.append(KerasNode(inbound_layers=inbound))
+        for src in layers:
+            if src.name in inbound:
+                src._outbound_nodes.append(KerasNode(outbound_layer=name))
+        layers.append(new_layer)
+        return name
+
+    prev = layer('InputLayer', 'input_1', [])
+    for i in range(n_blocks):
+        shortcut = prev
+        for j in range(3):
+            conv = layer('Conv2D', 'res{}_conv{}'.format(i, j), [prev])
+            bn = layer('BatchNormalization', 'res{}_bn{}'.format(i, j), [conv])
+            prev = layer('Activation', 'res{}_relu{}'.format(i, j), [bn])
+        res = layer('Add', 'res{}'.format(i), [shortcut, prev])
+        prev = layer('Activation', 'res{}_relu'.format(i), [res])
+    prev = layer('Flatten', 'flatten', [prev])
+    layer('Dense', 'fc', [prev])
+    return KerasModel('resnet', layers)
+
+
+class TimeKerasTopology(object):
+    ''' Source layer resolution of a ResNet-152 sized Keras model '''
+
+    n_blocks = 50
+
+    def setup(self):
+        try:
+            from dlpy.model_conversion.sas_keras_parse import (
+                KerasLayerGraph, find_previous_computation_layer,
+                computation_layer_classes)
+        except ImportError:
+            raise NotImplementedError('h5py is not installed')
+        self.graph_class = KerasLayerGraph
+        self.find_previous = find_previous_computation_layer
+        self.classes = computation_layer_classes
+        self.model = _resnet_keras_model(self.n_blocks)
+
+    def time_find_previous_computation_layers(self):
+        graph = self.graph_class(self.model)
+        for layer in self.model.layers:
+            self.find_previous(self.model, layer.name, self.classes, graph)
+
+
+class TimeKerasWeights(object):
+    ''' write_keras_hdf5 on a small convolutional Keras model '''
+
+    def setup(self):
+        try:
+            from keras.models import Sequential
+            from keras.layers import Conv2D, Dense, Flatten
+            from dlpy.model_conversion.write_keras_model_parm import write_keras_hdf5
+        except ImportError:
+            raise NotImplementedError('keras is not installed')
+        self.write_keras_hdf5 = write_keras_hdf5
+
+        model = Sequential()
+        model.add(Conv2D(32, (3, 3), input_shape=(32, 32, 3)))
+        model.add(Conv2D(64, (3, 3)))
+        model.add(Flatten())
+        model.add(Dense(256))
+        model.add(Dense(10))
+        self.model = model
+        self.tmpdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def time_write_keras_hdf5(self):
+        self.write_keras_hdf5(self.model, os.path.join(self.tmpdir, 'bench.kerasmodel.h5'))
+
+
+class TimeKerasPermutation(object):
+    ''' Flatten permutation and axis conversion of VGG16-sized Keras weights '''
+
+    def setup(self):
+        try:
+            from dlpy.model_conversion.write_keras_model_parm import (
+                flatten_permutation, convert_keras_tensor)
+        except ImportError:
+            raise NotImplementedError('h5py is not installed')
+        self.flatten_permutation = flatten_permutation
+        self.convert_keras_tensor = convert_keras_tensor
+        rng = np.random.RandomState(0)
+        self.fc1 = Dense(name='fc1')
+        self.kernel = rng.rand(7 * 7 * 512, 512).astype('float32')
+
+    def time_flatten_permutation(self):
+        self.flatten_permutation(7, 7, 512)
+
+    def time_convert_fc1(self):
+        perm_index = self.flatten_permutation(7, 7, 512)
+        self.convert_keras_tensor(self.fc1, self.kernel, 'channels_last', 'fc1', perm_index)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Benchmarks of the start-up time of a fresh interpreter importing DLPy '''
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    subprocess.check_call([sys.executable, '-c', code], env=env)
+
+
+class TimeImport(object):
+    ''' Interpreter start-up and import, as paid by every scoring worker '''
+
+    def time_python(self):
+        run_python('pass')
+
+    def time_import_dlpy(self):
+        run_python('import dlpy')
+
+    def time_import_applications(self):
+        run_python('import dlpy.applications')
+
+    def time_import_caffe_model(self):
+        run_python('from dlpy.caffe_models import VGG16_Model')
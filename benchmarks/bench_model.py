@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Benchmarks of the client-side model building and parsing '''
+
+from dlpy import applications
+from dlpy.model import extract_layers, heat_map_tensors
+
+from common import NullCAS, quiet, model_table_frame, heat_map_scores
+
+
+class TimeCompile(object):
+    ''' Layer option generation of the model builders (Sequential.compile) '''
+
+    def setup(self):
+        self.conn = NullCAS()
+
+    def time_resnet50(self):
+        with quiet():
+            applications.ResNet50_SAS(self.conn)
+
+    def time_resnet152(self):
+        with quiet():
+            applications.ResNet152_SAS(self.conn)
+
+    def time_densenet(self):
+        with quiet():
+            applications.DenseNet_Cifar(self.conn, n_classes=10)
+
+
+class TimeFromTable(object):
+    ''' Parsing of a model table into layers (Model.from_table) '''
+
+    def setup(self):
+        with quiet():
+            model = applications.ResNet152_SAS(NullCAS())
+        self.frame = model_table_frame(model.layers)
+
+    def time_extract_layers_resnet152(self):
+        extract_layers(self.frame)
+
+
+class TimeSummary(object):
+    ''' Layer.summary_str and Model.print_summary '''
+
+    def setup(self):
+        with quiet():
+            self.model = applications.ResNet152_SAS(NullCAS())
+
+    def time_summary_str(self):
+        for layer in self.model.layers:
+            layer.summary_str
+
+    def time_print_summary(self):
+        with quiet():
+            self.model.print_summary()
+
+
+class TimeHeatMap(object):
+    ''' Post-processing of the masked image scores of heat_map_analysis '''
+
+    def setup(self):
+        self.scores = heat_map_scores()
+
+    def time_heat_map_tensors(self):
+        heat_map_tensors(self.scores, 224, 224)
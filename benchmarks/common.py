@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Synthetic inputs shared by the benchmarks '''
+
+import contextlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import six
+import swat
+from swat.cas.results import CASResults
+
+
+class NullCAS(object):
+    '''
+    Connection stand-in that accepts every action and returns empty results
+
+    Only the client-side work of DLPy is measured with it.
+
+    '''
+
+    def __init__(self):
+        self.n_calls = 0
+
+    def retrieve(self, _name_, **kwargs):
+        self.n_calls += 1
+        return CASResults()
+
+    def queryactionset(self, actionset, **kwargs):
+        return {actionset: True}
+
+    def loadactionset(self, *args, **kwargs):
+        return CASResults()
+
+    def CASTable(self, name, **kwargs):
+        return swat.CASTable(name, **kwargs)
+
+
+@contextlib.contextmanager
+def quiet():
+    ''' Silence the notes printed by DLPy '''
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+_LAYER_TYPES = {'input': (1, 'inputopts'),
+                'convo': (2, 'convopts'),
+                'pool': (3, 'poolingopts'),
+                'fc': (4, 'fcopts'),
+                'output': (5, 'outputopts'),
+                'batchnorm': (8, 'bnopts'),
+                'residual': (9, 'residualopts')}
+
+
+def model_table_frame(layers, model_name='BENCH'):
+    '''
+    Build the content of a model table, as dlExportModel would, from layers
+
+    Parameters
+    ----------
+    layers : list of Layer
+        Specifies the compiled layers of a model (without concatenation layers).
+    model_name : string, optional
+        Specifies the name of the model.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+
+    '''
+    rows = [(model_name, 'modeltype', -1, 1., '')]
+    ids = dict((id(layer), layer_id) for layer_id, layer in enumerate(layers))
+    for layer_id, layer in enumerate(layers):
+        code, prefix = _LAYER_TYPES[layer.config['type'].lower()]
+        rows.append((layer.name, 'layertype', layer_id, float(code), ''))
+        for key, value in layer.config.items():
+            if key == 'type' or isinstance(value, (list, tuple)) or value is None:
+                continue
+            if code == 3 and key == 'pool':
+                key, value = 'poolingtype', '{} pooling'.format(value.title())
+            opt = '{}.{}'.format(prefix, key.lower())
+            if isinstance(value, six.string_types):
+                rows.append((layer.name, opt, layer_id, np.nan, value))
+            else:
+                rows.append((layer.name, opt, layer_id, float(value), ''))
+        if code == 1:
+            rows.append((layer.name, 'inputopts.crop', layer_id, np.nan, 'No cropping'))
+            rows.append((layer.name, 'inputopts.flip', layer_id, np.nan, 'No flipping'))
+        for i, src in enumerate(layer.src_layers or []):
+            rows.append((layer.name, 'srclayers.{}'.format(i), layer_id,
+                         float(ids[id(src)]), src.name))
+    return pd.DataFrame(rows, columns=['_DLKey0_', '_DLKey1_', '_DLLayerID_',
+                                       '_DLNumVal_', '_DLChrVal_'])
+
+
+def heat_map_scores(n_images=5, width=224, height=224, mask=56, step=14,
+                    n_classes=10, seed=12345):
+    '''
+    Build the scores of masked images, as heat_map_analysis fetches them
+
+    Parameters
+    ----------
+    n_images : int, optional
+        Specifies the number of images.
+    width, height : int, optional
+        Specifies the size of the images.
+    mask : int, optional
+        Specifies the size of the masks.
+    step : int, optional
+        Specifies the step between the masks.
+    n_classes : int, optional
+        Specifies the number of classes.
+    seed : int, optional
+        Specifies the random seed.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+
+    '''
+    rng = np.random.RandomState(seed)
+    xs, ys = np.meshgrid(np.arange(0, width - mask + 1, step),
+                         np.arange(0, height - mask + 1, step))
+    n_masks = xs.size
+    n = n_images * n_masks
+    labels = ['class {}'.format(i) for i in range(n_classes)]
+    out = pd.DataFrame({'_parentId_': np.repeat(np.arange(1, n_images + 1), n_masks),
+                        '_id_': np.arange(n) + 1,
+                        '_label_': np.repeat(rng.choice(labels, n_images), n_masks),
+                        'x': np.tile(xs.ravel(), n_images),
+                        'y': np.tile(ys.ravel(), n_images),
+                        'width': mask,
+                        'height': mask})
+    probs = rng.dirichlet(np.ones(n_classes), size=n)
+    for i, label in enumerate(labels):
+        out['P__label_' + label.replace(' ', '_')] = probs[:, i]
+    return out
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Run the DLPy client-side benchmarks
+
+The benchmarks follow the asv conventions: the modules are named
+``bench_*.py`` and the ``time_*`` methods of their classes are timed,
+after calling the optional ``setup`` method.  A ``setup`` raising
+NotImplementedError skips the class (e.g. an optional dependency is
+missing).  No CAS server is needed.
+
+Usage::
+
+    python benchmarks/run.py --save          # record the baseline
+    python benchmarks/run.py                 # compare against the baseline
+    python benchmarks/run.py -k heat_map     # only the matching benchmarks
+
+The run fails (exit status 1) when a benchmark is slower than the baseline
+by more than the threshold factor.
+
+'''
+
+from __future__ import print_function
+
+import argparse
+import glob
+import importlib
+import inspect
+import json
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, '.baseline.json')
+
+
+def discover(pattern=None):
+    ''' Yield (name, class, method name) of the benchmarks '''
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    for path in sorted(glob.glob(os.path.join(HERE, 'bench_*.py'))):
+        module = importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+        for cls_name, cls in sorted(inspect.getmembers(module, inspect.isclass)):
+            if cls.__module__ != module.__name__:
+                continue
+            for method in sorted(dir(cls)):
+                if not method.startswith('time_'):
+                    continue
+                name = '{}.{}.{}'.format(module.__name__, cls_name, method)
+                if pattern is None or pattern in name:
+                    yield name, cls, method
+
+
+def measure(cls, method, repeat=5, min_time=0.2):
+    ''' Best time per call, in seconds, or None if the benchmark is skipped '''
+    bench = cls()
+    try:
+        if hasattr(bench, 'setup'):
+            bench.setup()
+    except NotImplementedError:
+        return None
+    try:
+        func = getattr(bench, method)
+        # Calibrate the number of calls per repeat
+        number = 1
+        while True:
+            elapsed = timeit.timeit(func, number=number)
+            if elapsed >= min_time / repeat or number >= 1000000:
+                break
+            number *= 10
+        times = timeit.repeat(func, number=number, repeat=repeat)
+        return min(times) / number
+    finally:
+        if hasattr(bench, 'teardown'):
+            bench.teardown()
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1.), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '{:8.3f} {}'.format(seconds * scale, unit)
+    return '{:8.3f} ns'.format(seconds * 1e9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the DLPy benchmarks.')
+    parser.add_argument('-k', dest='pattern', default=None,
+                        help='only run the benchmarks whose name contains PATTERN')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='slowdown factor reported as a regression '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timing repeats (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for name, cls, method in discover(args.pattern):
+        seconds = measure(cls, method, repeat=args.repeat)
+        if seconds is None:
+            print('{:<60} {:>11}'.format(name, 'skipped'))
+            continue
+        results[name] = seconds
+        line = '{:<60} {}'.format(name, format_time(seconds))
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += '  {:6.2f}x'.format(ratio)
+            if ratio > args.threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+
+    if regressions:
+        print('{} benchmark(s) slower than {}x the baseline.'
+              .format(len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
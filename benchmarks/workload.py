@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Round-trip regression report of a typical DLPy workload
+
+The workload loads images, splits them, trains and scores a small CNN and
+runs a heat map analysis.  By default it runs against the in-process
+:class:`dlpy.fake_cas.FakeCAS` and compares the number of action calls
+and the bytes returned, by action, against ``round_trips.json``.
+
+Usage::
+
+    python benchmarks/workload.py                     # check against the baseline
+    python benchmarks/workload.py --save              # update the baseline
+    python benchmarks/workload.py --record run.log.gz --host h --port 5570
+    python benchmarks/workload.py --replay run.log.gz
+
+The check fails (exit status 1) when the workload issues more action calls
+than the baseline, or returns more bytes than the threshold factor allows.
+
+'''
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from common import quiet
+from dlpy.fake_cas import FakeCAS
+from dlpy.images import ImageTable
+from dlpy.layers import InputLayer, Conv2d, Pooling, Dense, OutputLayer
+from dlpy.replay import RecordingCAS, ReplayCAS, log_summary, compare_summaries
+from dlpy.Sequential import Sequential
+from dlpy.splitting import two_way_split
+
+DEFAULT_BASELINE = os.path.join(HERE, 'round_trips.json')
+
+
+def image_frame(n_images=24, size=16, seed=12345):
+    ''' Synthetic image data, as loaded by ImageTable.load_files '''
+    from PIL import Image
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(n_images):
+        buf = io.BytesIO()
+        Image.fromarray(rng.randint(0, 255, (size, size, 3)).astype('uint8')).save(buf, 'PNG')
+        images.append(buf.getvalue())
+    return pd.DataFrame(dict(_image_=images,
+                             _label_=['cat', 'dog'] * (n_images // 2),
+                             _filename_0=['{}.png'.format(i) for i in range(n_images)],
+                             _id_=np.arange(1, n_images + 1)))
+
+
+def run_workload(conn, data='workload_images'):
+    '''
+    Run the workload
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the connection.
+    data : string, optional
+        Specifies the name of the table of images.  It is uploaded if it
+        does not exist.
+
+    '''
+    if not conn.retrieve('table.tableexists', name=data).get('exists'):
+        conn.upload_frame(image_frame(), casout=dict(name=data, replace=True))
+    images = ImageTable.from_table(conn.CASTable(data))
+    train, test = two_way_split(images, test_rate=25)
+
+    model = Sequential(conn, model_table='workload_cnn')
+    model.add(InputLayer(3, 16, 16))
+    model.add(Conv2d(4, 3))
+    model.add(Pooling(2))
+    model.add(Dense(8))
+    model.add(OutputLayer(n=2))
+
+    model.fit(data=train, inputs='_image_', target='_label_', max_epochs=2)
+    model.predict(data=test)
+    model.heat_map_analysis(data=test, mask_width=8, mask_height=8, step_size=4,
+                            display=False, max_display=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the round trips of a DLPy workload.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='increase factor of the bytes reported as a regression '
+                             '(default: %(default)s)')
+    parser.add_argument('--record', metavar='LOG', default=None,
+                        help='write the action log of the run to LOG')
+    parser.add_argument('--replay', metavar='LOG', default=None,
+                        help='replay LOG instead of running against a connection')
+    parser.add_argument('--host', default=None,
+                        help='CAS host to run against (default: in-process FakeCAS)')
+    parser.add_argument('--port', type=int, default=None, help='CAS port')
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        conn = ReplayCAS(args.replay)
+        with quiet():
+            run_workload(conn)
+        conn.assert_complete()
+        print('Replayed the {} actions of {}.'.format(len(conn.records), args.replay))
+        return 0
+
+    if args.host:
+        import swat
+        conn = swat.CAS(args.host, args.port)
+    else:
+        conn = FakeCAS()
+
+    path = args.record
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.log.gz')
+        os.close(fd)
+    try:
+        with RecordingCAS(conn, path) as recorder:
+            with quiet():
+                run_workload(recorder)
+        summary = log_summary(path)
+    finally:
+        if args.record is None:
+            os.remove(path)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(summary[['calls', 'bytes']].to_dict(orient='index'), f,
+                      indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(summary.to_string())
+        return 0
+    with open(args.baseline) as f:
+        baseline = pd.DataFrame.from_dict(json.load(f), orient='index')
+
+    report = compare_summaries(baseline, summary)
+    print(report.to_string())
+    total = report.loc['Total']
+    if total['calls_diff'] > 0 or \
+            total['bytes'] > args.threshold * max(total['bytes_baseline'], 1):
+        print('The workload issues more round trips or transfers more data than the baseline.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
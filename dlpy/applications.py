@@ -18,18 +18,54 @@
 
 ''' Pre-built deep learning models '''
 
+import hashlib
 import os
 import warnings
 
 from .Sequential import Sequential
 from .blocks import ResBlockBN, ResBlock_Caffe, DenseNetBlock
-from .caffe_models import (model_vgg16, model_vgg19, model_resnet50,
-                           model_resnet101, model_resnet152)
 from .layers import (InputLayer, Conv2d, Pooling, Dense, BN, OutputLayer)
 from .model import Model
 from .utils import random_name
 
 
+def backbone_weights(model, pre_train_weight_file, n_layers):
+    '''
+    Return the session table of the pre-trained weights of the first layers
+
+    The weights of the layers with IDs below n_layers are loaded once per
+    session and weights file, and shared by the models built on the same
+    backbone (see :meth:`dlpy.model.Model.share_weights`).
+
+    Parameters
+    ----------
+    model : Model
+        Specifies the model with the full pre-trained architecture.
+    pre_train_weight_file : string
+        Specifies the server-side path of the pre-trained weights file.
+    n_layers : int
+        Specifies the number of layers of the backbone.
+
+    Returns
+    -------
+    string
+        The name of the shared weights table
+
+    '''
+    key = '{}:{}'.format(pre_train_weight_file, n_layers)
+    name = 'Backbone_' + hashlib.sha1(key.encode('utf8')).hexdigest()[:10]
+    if model._retrieve_('table.tableexists', name=name)['exists']:
+        return name
+
+    model.load_weights(path=pre_train_weight_file)
+    weight_table_options = model.model_weights.to_table_params()
+    weight_table_options.update(dict(where='_LayerID_<{}'.format(n_layers)))
+    model._retrieve_('table.partition', table=weight_table_options,
+                     casout=dict(replace=True, name=name))
+    model._retrieve_('table.droptable', **model.model_weights.to_table_params())
+    return name
+
+
 def LeNet5(conn, model_table='LENET5',
            n_classes=10, n_channels=1, width=28, height=28, scale=1.0 / 255,
            random_flip='none', random_crop='none', offsets=0):
@@ -679,6 +715,7 @@ def VGG16(conn, model_table='VGG16',
                              '2. upload the *.h5 file to '
                              'a server side directory which the CAS session has access to.\n'
                              '3. specify the pre_train_weight_file using the fully qualified server side path.')
+        from .caffe_models import model_vgg16
         model_cas = model_vgg16.VGG16_Model(
             s=conn, model_table=model_table, n_channels=n_channels,
             width=width, height=height, random_crop=random_crop,
@@ -703,17 +740,13 @@ def VGG16(conn, model_table='VGG16',
 
         else:
             model = Model.from_table(model_cas, display_note=False)
-            model.load_weights(path=pre_train_weight_file)
-
-            weight_table_options = model.model_weights.to_table_params()
-            weight_table_options.update(dict(where='_LayerID_<19'))
-            model._retrieve_('table.partition', table=weight_table_options,
-                             casout=dict(replace=True, **model.model_weights.to_table_params()))
+            backbone = backbone_weights(model, pre_train_weight_file, 19)
             model._retrieve_('deeplearn.removelayer', model=model_table, name='fc8')
             model._retrieve_('deeplearn.addlayer', model=model_table, name='fc8',
                              layer=dict(type='output', n=n_classes, act='softmax'),
                              srcLayers=['fc7'])
             model = Model.from_table(conn.CASTable(model_table))
+            model.share_weights(backbone)
 
             return model
 
@@ -946,6 +979,7 @@ def VGG19(conn, model_table='VGG19',
                              '2. upload the *.h5 file to '
                              'a server side directory which the CAS session has access to.\n'
                              '3. specify the pre_train_weight_file using the fully qualified server side path.')
+        from .caffe_models import model_vgg19
         model_cas = model_vgg19.VGG19_Model(
             s=conn, model_table=model_table, n_channels=n_channels,
             width=width, height=height, random_crop=random_crop,
@@ -972,17 +1006,13 @@ def VGG19(conn, model_table='VGG19',
         else:
 
             model = Model.from_table(model_cas, display_note=False)
-            model.load_weights(path=pre_train_weight_file)
-
-            weight_table_options = model.model_weights.to_table_params()
-            weight_table_options.update(dict(where='_LayerID_<22'))
-            model._retrieve_('table.partition', table=weight_table_options,
-                             casout=dict(replace=True, **model.model_weights.to_table_params()))
+            backbone = backbone_weights(model, pre_train_weight_file, 22)
             model._retrieve_('deeplearn.removelayer', model=model_table, name='fc8')
             model._retrieve_('deeplearn.addlayer', model=model_table, name='fc8',
                              layer=dict(type='output', n=n_classes, act='softmax'),
                              srcLayers=['fc7'])
             model = Model.from_table(conn.CASTable(model_table))
+            model.share_weights(backbone)
 
             return model
 
@@ -1745,6 +1775,7 @@ def ResNet50_Caffe(conn, model_table='RESNET50_CAFFE', batch_norm_first=False,
                              '2. upload the *.h5 file to '
                              'a server side directory which the CAS session has access to.\n'
                              '3. specify the pre_train_weight_file using the fully qualified server side path.')
+        from .caffe_models import model_resnet50
         model_cas = model_resnet50.ResNet50_Model(
             s=conn, model_table=model_table, n_channels=n_channels,
             width=width, height=height, random_crop=random_crop,
@@ -1770,17 +1801,13 @@ def ResNet50_Caffe(conn, model_table='RESNET50_CAFFE', batch_norm_first=False,
 
         else:
             model = Model.from_table(model_cas, display_note=False)
-            model.load_weights(path=pre_train_weight_file)
+            backbone = backbone_weights(model, pre_train_weight_file, 125)
             model._retrieve_('deeplearn.removelayer', model=model_table, name='fc1000')
             model._retrieve_('deeplearn.addlayer', model=model_table, name='output',
                              layer=dict(type='output', n=n_classes, act='softmax'),
                              srcLayers=['pool5'])
-
-            weight_table_options = model.model_weights.to_table_params()
-            weight_table_options.update(dict(where='_LayerID_<125'))
-            model._retrieve_('table.partition', table=weight_table_options,
-                             casout=dict(replace=True, **model.model_weights.to_table_params()))
             model = Model.from_table(conn.CASTable(model_table))
+            model.share_weights(backbone)
             return model
 
 
@@ -2009,6 +2036,7 @@ def ResNet101_Caffe(conn, model_table='RESNET101_CAFFE', batch_norm_first=False,
                              '2. upload the *.h5 file to '
                              'a server side directory which the CAS session has access to.\n'
                              '3. specify the pre_train_weight_file using the fully qualified server side path.')
+        from .caffe_models import model_resnet101
         model_cas = model_resnet101.ResNet101_Model(
             s=conn, model_table=model_table, n_channels=n_channels,
             width=width, height=height, random_crop=random_crop,
@@ -2034,17 +2062,13 @@ def ResNet101_Caffe(conn, model_table='RESNET101_CAFFE', batch_norm_first=False,
 
         else:
             model = Model.from_table(conn.CASTable(model_table), display_note=False)
-            model.load_weights(path=pre_train_weight_file)
+            backbone = backbone_weights(model, pre_train_weight_file, 244)
             model._retrieve_('deeplearn.removelayer', model=model_table, name='fc1000')
             model._retrieve_('deeplearn.addlayer', model=model_table, name='output',
                              layer=dict(type='output', n=n_classes, act='softmax'),
                              srcLayers=['pool5'])
-
-            weight_table_options = model.model_weights.to_table_params()
-            weight_table_options.update(dict(where='_LayerID_<244'))
-            model._retrieve_('table.partition', table=weight_table_options,
-                             casout=dict(replace=True, **model.model_weights.to_table_params()))
             model = Model.from_table(conn.CASTable(model_table))
+            model.share_weights(backbone)
             return model
 
 
@@ -2274,6 +2298,7 @@ def ResNet152_Caffe(conn, model_table='RESNET152_CAFFE', batch_norm_first=False,
                              '2. upload the *.h5 file to '
                              'a server side directory which the CAS session has access to.\n'
                              '3. specify the pre_train_weight_file using the fully qualified server side path.')
+        from .caffe_models import model_resnet152
         model_cas = model_resnet152.ResNet152_Model(
             s=conn, model_table=model_table, n_channels=n_channels,
             width=width, height=height, random_crop=random_crop,
@@ -2299,17 +2324,13 @@ def ResNet152_Caffe(conn, model_table='RESNET152_CAFFE', batch_norm_first=False,
 
         else:
             model = Model.from_table(conn.CASTable(model_table), display_note=False)
-            model.load_weights(path=pre_train_weight_file)
+            backbone = backbone_weights(model, pre_train_weight_file, 363)
             model._retrieve_('deeplearn.removelayer', model=model_table, name='fc1000')
             model._retrieve_('deeplearn.addlayer', model=model_table, name='output',
                              layer=dict(type='output', n=n_classes, act='softmax'),
                              srcLayers=['pool5'])
-
-            weight_table_options = model.model_weights.to_table_params()
-            weight_table_options.update(dict(where='_LayerID_<363'))
-            model._retrieve_('table.partition', table=weight_table_options,
-                             casout=dict(replace=True, **model.model_weights.to_table_params()))
             model = Model.from_table(conn.CASTable(model_table))
+            model.share_weights(backbone)
             return model
 
 
@@ -16,9 +16,40 @@
 #  limitations under the License.
 #
 
-from .model_lenet import LeNet_Model
-from .model_resnet101 import ResNet101_Model
-from .model_resnet152 import ResNet152_Model
-from .model_resnet50 import ResNet50_Model
-from .model_vgg16 import VGG16_Model
-from .model_vgg19 import VGG19_Model
+'''
+Deep learning models converted from Caffe
+
+The modules are large, they are imported on first use.
+
+'''
+
+import importlib
+import sys
+
+_MODELS = {'LeNet_Model': 'model_lenet',
+           'ResNet101_Model': 'model_resnet101',
+           'ResNet152_Model': 'model_resnet152',
+           'ResNet50_Model': 'model_resnet50',
+           'VGG16_Model': 'model_vgg16',
+           'VGG19_Model': 'model_vgg19'}
+
+__all__ = sorted(_MODELS)
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _MODELS:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+        module = importlib.import_module('.' + _MODELS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_MODELS))
+else:
+    from .model_lenet import LeNet_Model
+    from .model_resnet101 import ResNet101_Model
+    from .model_resnet152 import ResNet152_Model
+    from .model_resnet50 import ResNet50_Model
+    from .model_vgg16 import VGG16_Model
+    from .model_vgg19 import VGG19_Model
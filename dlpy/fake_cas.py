@@ -0,0 +1,1193 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' In-process stand-in of a CAS connection for offline testing and profiling '''
+
+import collections
+import itertools
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import six
+from swat.cas.results import CASResults
+from swat.cas.table import CASTable
+
+
+LAYER_TYPES = collections.OrderedDict([
+    ('input', (1, 'inputopts')),
+    ('convo', (2, 'convopts')),
+    ('pool', (3, 'poolingopts')),
+    ('fc', (4, 'fcopts')),
+    ('output', (5, 'outputopts')),
+    ('batchnorm', (8, 'bnopts')),
+    ('residual', (9, 'residualopts')),
+    ('concat', (10, 'concatopts'))])
+
+_LAYER_ALIASES = {'convolution': 'convo', 'pooling': 'pool', 'fullconnect': 'fc'}
+
+_MODEL_COLUMNS = ['_DLKey0_', '_DLKey1_', '_DLLayerID_', '_DLNumVal_', '_DLChrVal_']
+
+# Name of the table parameter of the actions not using "table"
+_TABLE_PARAMS = {'fetchimages': 'imagetable'}
+
+# Actions referencing their table by name and caslib
+_NAME_PARAMS = set(['droptable', 'tableinfo', 'tabledetails', 'tableexists', 'altertable',
+                    'promote', 'attribute'])
+
+
+def _short_name(name):
+    return name.lower().split('.')[-1]
+
+
+class _ActionSet(object):
+    ''' Actions of an action set, called as attributes '''
+
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        action_name = '{}.{}'.format(self._name, name)
+        return lambda **kwargs: self._conn.retrieve(action_name, **kwargs)
+
+
+class _Performance(object):
+
+    def __init__(self, elapsed_time):
+        self.elapsed_time = elapsed_time
+        self.cpu_user_time = elapsed_time
+        self.cpu_system_time = 0.
+        self.memory = 0
+
+
+class FakeCASError(Exception):
+    ''' Raised, as the severity of the results, by the actions of :class:`FakeCAS` '''
+
+
+class _StubConnection(object):
+    '''
+    Connection interface of the in-process stand-ins of CAS
+
+    It provides what DLPy and :class:`swat.CASTable` use of a connection,
+    and counts the action calls.  The subclasses run the actions in
+    :meth:`_invoke`.
+
+    '''
+
+    def __init__(self, latency=0.):
+        self.latency = latency
+        self.history = []
+        self.action_counts = collections.Counter()
+        self._lock = threading.RLock()
+        self._id_generator = itertools.count()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self.has_actionset(name) and not self.has_action(name):
+            # action set attributes, e.g. conn.deepLearn.addLayer(...)
+            return _ActionSet(self, name)
+        if not self.has_action(name):
+            raise AttributeError(name)
+        return lambda **kwargs: self.retrieve(name, **kwargs)
+
+    @property
+    def round_trips(self):
+        ''' Total number of action calls '''
+        return sum(self.action_counts.values())
+
+    def reset_stats(self):
+        ''' Forget the recorded action calls '''
+        with self._lock:
+            self.history = []
+            self.action_counts = collections.Counter()
+
+    def queryactionset(self, actionset, **kwargs):
+        return self.retrieve('builtins.queryactionset', actionset=actionset, **kwargs)
+
+    def loadactionset(self, actionset, **kwargs):
+        return self.retrieve('builtins.loadactionset', actionset=actionset, **kwargs)
+
+    def _gen_id(self):
+        return np.base_repr(next(self._id_generator), 36)
+
+    def has_action(self, name):
+        raise NotImplementedError
+
+    def has_actionset(self, name):
+        return name.lower() in ('table', 'simple', 'sampling', 'image', 'deeplearn',
+                                'astore', 'builtins')
+
+    def get_action_class(self, name):
+        conn = self
+        action_name = name
+
+        class StubAction(object):
+            default_params = {}
+
+            def __call__(self, **kwargs):
+                return self.retrieve(**kwargs)
+
+            def retrieve(self, **kwargs):
+                params = dict(type(self).default_params)
+                params.update(kwargs)
+                return conn.retrieve(action_name, **params)
+
+        return StubAction
+
+    def get_actionset(self, name):
+        raise AttributeError(name)
+
+    def CASTable(self, name, **kwargs):
+        table = CASTable(name, **kwargs)
+        table.set_connection(self)
+        return table
+
+    def upload_frame(self, data, casout=None, **kwargs):
+        '''
+        Upload a DataFrame as a table
+
+        Parameters
+        ----------
+        data : pandas.DataFrame
+            Specifies the data.
+        casout : string or dict, optional
+            Specifies the output table.
+
+        Returns
+        -------
+        :class:`CASTable`
+
+        '''
+        return self.retrieve('table.upload', data=data, casout=casout, **kwargs)['casTable']
+
+    def retrieve(self, _name_, **kwargs):
+        '''
+        Run an action
+
+        Parameters
+        ----------
+        _name_ : string
+            Specifies the name of the action, with or without the action set.
+        **kwargs : keyword arguments
+            Specifies the parameters of the action.
+
+        Returns
+        -------
+        :class:`CASResults`
+
+        '''
+        params = dict((key.lower(), value) for key, value in kwargs.items()
+                      if not key.startswith('_'))
+        start = time.time()
+        with self._lock:
+            self.history.append((_name_, params))
+            self.action_counts[_short_name(_name_)] += 1
+            out = self._invoke(_name_, kwargs)
+        delay = self._delay(out)
+        if delay:
+            time.sleep(delay)
+        if getattr(out, 'performance', None) is None:
+            out.performance = _Performance(time.time() - start)
+        return out
+
+    def _invoke(self, name, kwargs):
+        raise NotImplementedError
+
+    def _delay(self, out):
+        return self.latency
+
+    def endsession(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCAS(_StubConnection):
+    '''
+    In-process stand-in of a CAS connection
+
+    The tables live in memory as pandas DataFrames.  The table, simple,
+    sampling and image actions used by DLPy are implemented on them, model
+    tables are built by buildModel and addLayer with the same layout as on
+    the server, and dlTrain and dlScore produce synthetic weights, training
+    histories and predictions.  Every action call is counted, and can be
+    delayed, so that the number of round trips and the client overhead of
+    the DLPy API can be measured without a server.
+
+    Parameters
+    ----------
+    latency : double, optional
+        Specifies the time, in seconds, added to every action call.
+        Default : 0
+    bandwidth : double, optional
+        Specifies the transfer rate, in bytes per second, of the tables
+        returned to the client.  The transfer time is added to the latency.
+        Default : None, meaning instantaneous transfers
+    seed : int, optional
+        Specifies the seed of the synthetic results.
+
+    Attributes
+    ----------
+    tables : dict
+        The tables of the session, by upper-case name
+    history : list
+        The (action name, parameters) of every action call
+    action_counts : collections.Counter
+        The number of calls of each action
+    score_function : callable
+        Specifies the function returning the predicted probabilities of
+        dlScore and astore.score, called with the scored rows (a DataFrame)
+        and the target levels.  The probabilities are random when None.
+
+    Examples
+    --------
+    >>> conn = FakeCAS(latency=0.005)
+    >>> model = Sequential(conn, model_table='simple')
+    >>> model.add(InputLayer(3, 32, 32))
+    >>> model.add(OutputLayer(n=2))
+    >>> conn.round_trips
+    3
+
+    Returns
+    -------
+    :class:`FakeCAS`
+
+    '''
+
+    def __init__(self, latency=0., bandwidth=None, seed=12345):
+        _StubConnection.__init__(self, latency=latency)
+        self.bandwidth = bandwidth
+        self.tables = {}
+        self.saved_tables = {}
+        self.caslibs = collections.OrderedDict([('CASUSER', '/fake/casuser/')])
+        self.actionsets = set(['builtins', 'table', 'simple'])
+        self.score_function = None
+        self._rng = np.random.RandomState(seed)
+
+    def has_action(self, name):
+        return self._handler(name) is not None
+
+    def get_action_names(self):
+        return sorted(name[8:] for name in dir(type(self)) if name.startswith('_action_'))
+
+    def endsession(self):
+        with self._lock:
+            self.tables = {}
+
+    def _invoke(self, name, kwargs):
+        # Apply the table the action is called on, as swat does
+        kwargs = dict(kwargs)
+        table = kwargs.pop('__table__', None)
+        short_name = _short_name(name)
+        if table is not None:
+            inputs = table.get_inputs_param()
+            params = table.to_table_params()
+            if short_name in _NAME_PARAMS:
+                for key in ('name', 'caslib'):
+                    if key in params:
+                        kwargs.setdefault(key, params[key])
+            else:
+                if inputs and short_name in ('columninfo', 'update', 'partition', 'save'):
+                    params.setdefault('vars', inputs)
+                kwargs.setdefault(_TABLE_PARAMS.get(short_name, 'table'), params)
+            if inputs and short_name == 'fetch':
+                kwargs.setdefault('fetchvars', inputs)
+            elif inputs and short_name in ('summary', 'freq'):
+                kwargs.setdefault('inputs', inputs)
+            if short_name == 'fetch':
+                for key, value in table.get_fetch_params().items():
+                    kwargs.setdefault(key, value)
+        params = dict((key.lower(), value) for key, value in kwargs.items()
+                      if not key.startswith('_'))
+
+        handler = self._handler(name)
+        out = CASResults()
+        out.severity = 0
+        out.status = None
+        out.messages = []
+        try:
+            if handler is None:
+                raise FakeCASError('Action "{}" is not supported.'.format(name))
+            res = handler(**params)
+            for key, value in (res or {}).items():
+                out[key] = value
+        except FakeCASError as err:
+            out.severity = 2
+            out.status = str(err)
+            out.messages = ['ERROR: {}'.format(err)]
+        return out
+
+    def _delay(self, out):
+        delay = self.latency
+        if self.bandwidth:
+            nbytes = sum(int(value.memory_usage(deep=True).sum()) for value in out.values()
+                         if isinstance(value, pd.DataFrame))
+            delay += float(nbytes) / self.bandwidth
+        return delay
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _handler(self, name):
+        return getattr(self, '_action_' + _short_name(name), None)
+
+    @staticmethod
+    def _table_opts(table):
+        if table is None:
+            return {}
+        if isinstance(table, CASTable):
+            table = table.to_table_params()
+        if isinstance(table, six.string_types):
+            return dict(name=table)
+        return dict((key.lower(), value) for key, value in dict(table).items())
+
+    def _get(self, table):
+        opts = self._table_opts(table)
+        name = opts.get('name')
+        if name is None:
+            raise FakeCASError('The table name is missing.')
+        entry = self.tables.get(str(name).upper())
+        if entry is None:
+            raise FakeCASError('Table "{}" does not exist.'.format(name))
+        return entry
+
+    def _frame(self, table):
+        ''' The rows of a table, after computed variables, where and vars '''
+        opts = self._table_opts(table)
+        entry = self._get(opts)
+        frame = entry['frame']
+        if opts.get('computedvars'):
+            frame = frame.copy()
+            _compute(frame, opts['computedvars'], opts.get('computedvarsprogram', ''))
+        if opts.get('where'):
+            frame = frame[_where(frame, opts['where'])]
+        columns = opts.get('vars') or opts.get('varlist')
+        if columns:
+            columns = [item['name'] if isinstance(item, dict) else item for item in columns]
+            frame = frame[[_column(frame, item) for item in columns]]
+        return frame.reset_index(drop=True)
+
+    def _store(self, casout, frame, **meta):
+        opts = self._table_opts(casout)
+        name = opts.get('name')
+        if name is None:
+            name = 'FAKE_{}'.format(len(self.tables) + 1)
+        key = str(name).upper()
+        if key in self.tables and opts.get('replace') is False:
+            raise FakeCASError('Table "{}" already exists.'.format(name))
+        entry = dict(name=name, frame=frame.reset_index(drop=True),
+                     promoted=bool(opts.get('promote')), attributes=None,
+                     binary_types={}, created=time.time())
+        entry.update(meta)
+        self.tables[key] = entry
+        return self.CASTable(name)
+
+    def _out(self, table, casout, frame, **meta):
+        ''' Store an output table and return the casTable results '''
+        out = self._store(casout, frame, **meta)
+        return dict(casTable=out, OutputCasTables=pd.DataFrame(
+            dict(casLib=['CASUSER'], Name=[out.params['name']],
+                 Rows=[frame.shape[0]], Columns=[frame.shape[1]])))
+
+    def _columninfo(self, frame):
+        rows = []
+        for i, col in enumerate(frame.columns):
+            values = frame[col]
+            if values.dtype.kind in 'iufb':
+                ctype, length = 'double', 8
+            elif len(values) and isinstance(values.iloc[0], six.binary_type):
+                ctype, length = 'varbinary', int(values.map(len).max())
+            else:
+                ctype = 'varchar'
+                length = int(values.astype(str).map(len).max()) if len(values) else 1
+            rows.append(dict(Column=col, ID=i + 1, Type=ctype, RawLength=length,
+                             FormattedLength=length, NFL=0, NFD=0))
+        return pd.DataFrame(rows, columns=['Column', 'ID', 'Type', 'RawLength',
+                                           'FormattedLength', 'NFL', 'NFD'])
+
+    # ------------------------------------------------------------------
+    # builtins and table actions
+    # ------------------------------------------------------------------
+
+    def _action_loadactionset(self, actionset=None, **kwargs):
+        self.actionsets.add(str(actionset).lower())
+        return dict(actionset=actionset)
+
+    def _action_queryactionset(self, actionset=None, **kwargs):
+        return {actionset: True}
+
+    def _action_tableinfo(self, name=None, caslib=None, table=None, **kwargs):
+        if table is not None:
+            name = self._table_opts(table).get('name')
+        if name is not None:
+            entries = [self._get(dict(name=name))]
+        else:
+            entries = sorted(self.tables.values(), key=lambda item: item['created'])
+        if not entries:
+            return {}
+        return dict(TableInfo=pd.DataFrame(dict(
+            Name=[item['name'].upper() for item in entries],
+            Rows=[item['frame'].shape[0] for item in entries],
+            Columns=[item['frame'].shape[1] for item in entries],
+            Global=[int(item['promoted']) for item in entries],
+            CreateTime=[item['created'] for item in entries],
+            ModTime=[item['created'] for item in entries],
+            AccessTime=[item['created'] for item in entries])))
+
+    def _action_tableexists(self, name=None, table=None, **kwargs):
+        opts = self._table_opts(table if table is not None else name)
+        return dict(exists=int(str(opts.get('name')).upper() in self.tables))
+
+    def _action_tabledetails(self, name=None, table=None, **kwargs):
+        frame = self._get(table if table is not None else name)['frame']
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        return dict(TableDetails=pd.DataFrame(dict(
+            Node=['ALL'], Blocks=[1], Rows=[frame.shape[0]], DataSize=[nbytes],
+            VardataSize=[0], CompressedSize=[0])))
+
+    def _action_columninfo(self, table=None, inputs=None, **kwargs):
+        info = self._columninfo(self._frame(table))
+        return dict(ColumnInfo=info)
+
+    def _action_numrows(self, table=None, **kwargs):
+        return dict(numrows=self._frame(table).shape[0])
+
+    def _action_fetch(self, table=None, to=20, maxrows=None, sortby=None, index=False,
+                      fetchvars=None, **kwargs):
+        frame = self._frame(table)
+        if sortby:
+            sortby = [item if isinstance(item, dict) else dict(name=item) for item in sortby]
+            frame = frame.sort_values(
+                [_column(frame, item['name']) for item in sortby],
+                ascending=[item.get('order', 'ASCENDING').upper() == 'ASCENDING'
+                           for item in sortby])
+        start = int(kwargs.get('from', 1) or 1)
+        stop = int(to)
+        if maxrows is not None:
+            stop = min(stop, start + int(maxrows) - 1)
+        if fetchvars:
+            fetchvars = [item['name'] if isinstance(item, dict) else item
+                         for item in fetchvars]
+            frame = frame[[_column(frame, item) for item in fetchvars]]
+        frame = frame.iloc[start - 1:stop].reset_index(drop=True)
+        if index:
+            frame.insert(0, '_Index_', np.arange(start, start + frame.shape[0]))
+        return dict(Fetch=frame)
+
+    def _action_partition(self, table=None, casout=None, **kwargs):
+        return self._out(table, casout, self._frame(table).copy())
+
+    def _action_shuffle(self, table=None, casout=None, **kwargs):
+        frame = self._frame(table)
+        frame = frame.iloc[self._rng.permutation(frame.shape[0])]
+        return self._out(table, casout, frame)
+
+    def _action_droptable(self, name=None, table=None, caslib=None, quiet=False, **kwargs):
+        opts = self._table_opts(table if table is not None else name)
+        key = str(opts.get('name')).upper()
+        if key not in self.tables:
+            if quiet:
+                return {}
+            raise FakeCASError('Table "{}" does not exist.'.format(opts.get('name')))
+        del self.tables[key]
+        return {}
+
+    def _action_promote(self, name=None, table=None, **kwargs):
+        self._get(table if table is not None else name)['promoted'] = True
+        return {}
+
+    def _action_upload(self, data=None, casout=None, **kwargs):
+        if not isinstance(data, pd.DataFrame):
+            raise FakeCASError('Only DataFrames can be uploaded.')
+        return self._out(None, casout, data.copy())
+
+    def _action_addtable(self, table=None, datamsghandler=None, vars=None, **kwargs):
+        if datamsghandler is None:
+            raise FakeCASError('A data message handler is required.')
+        names = [item['name'] for item in vars or datamsghandler.vars]
+        rows = []
+        while True:
+            row = datamsghandler.getrow(len(rows))
+            if row is None:
+                break
+            rows.append(list(row))
+        frame = pd.DataFrame(rows, columns=names)
+        if kwargs.get('append') and str(table).upper() in self.tables:
+            frame = pd.concat([self._get(table)['frame'], frame], ignore_index=True)
+        casout = dict(name=table, replace=kwargs.get('replace', True) or
+                      bool(kwargs.get('append')), promote=kwargs.get('promote', False))
+        return self._out(None, casout, frame)
+
+    def _action_altertable(self, name=None, caslib=None, columns=None, **kwargs):
+        entry = self._get(name)
+        for column in columns or []:
+            column = dict((key.lower(), value) for key, value in column.items())
+            if column.get('binarytype'):
+                entry['binary_types'][column['name']] = column['binarytype']
+            if column.get('rename'):
+                entry['frame'] = entry['frame'].rename(
+                    columns={column['name']: column['rename']})
+            if column.get('drop'):
+                entry['frame'] = entry['frame'].drop(columns=[column['name']])
+        return {}
+
+    def _action_update(self, table=None, set=None, **kwargs):
+        opts = self._table_opts(table)
+        entry = self._get(opts)
+        frame = entry['frame']
+        mask = _where(frame, opts['where']) if opts.get('where') else \
+            np.ones(frame.shape[0], dtype=bool)
+        for item in set or []:
+            item = dict((key.lower(), value) for key, value in item.items())
+            column = _column(frame, item['var'])
+            value = frame.loc[mask].eval(_sas_to_query(frame, str(item['value'])),
+                                         engine='python', local_dict=_LOCALS)
+            frame.loc[mask, column] = value
+        return dict(rowsUpdated=int(np.sum(mask)))
+
+    def _action_attribute(self, task=None, attrtable=None, name=None, table=None, **kwargs):
+        task = str(task).lower()
+        entry = self._get(table if table is not None else name)
+        if task == 'convert':
+            attributes = entry['attributes']
+            if attributes is None:
+                attributes = pd.DataFrame(dict(Key=[], Attribute=[], Type=[], Value=[]))
+            self._store(dict(name=self._table_opts(attrtable)['name'], replace=True),
+                        attributes.copy())
+        elif task == 'add':
+            entry['attributes'] = self._get(attrtable)['frame'].copy()
+        elif task in ('drop', 'remove'):
+            entry['attributes'] = None
+        return {}
+
+    def _action_save(self, table=None, name=None, caslib=None, replace=False, **kwargs):
+        frame = self._frame(table)
+        key = (str(caslib).upper(), str(name))
+        if key in self.saved_tables and not replace:
+            raise FakeCASError('File "{}" already exists.'.format(name))
+        self.saved_tables[key] = frame.copy()
+        return dict(caslib=caslib, name=name)
+
+    def _action_loadtable(self, path=None, caslib=None, casout=None, **kwargs):
+        key = (str(caslib).upper(), str(path))
+        if key not in self.saved_tables:
+            raise FakeCASError('File "{}" does not exist.'.format(path))
+        if casout is None:
+            casout = dict(name=str(path).split('.')[0])
+        return dict(self._out(None, casout, self.saved_tables[key].copy()),
+                    tableName=self._table_opts(casout)['name'])
+
+    def _action_fileinfo(self, caslib=None, **kwargs):
+        names = [name for lib, name in self.saved_tables if lib == str(caslib).upper()]
+        return dict(FileInfo=pd.DataFrame(dict(Name=names)))
+
+    def _action_caslibinfo(self, caslib=None, **kwargs):
+        return dict(CASLibInfo=pd.DataFrame(dict(Name=list(self.caslibs.keys()),
+                                                 Path=list(self.caslibs.values()))))
+
+    def _action_addcaslib(self, name=None, path=None, **kwargs):
+        self.caslibs[str(name).upper()] = path
+        return {}
+
+    def _action_dropcaslib(self, caslib=None, **kwargs):
+        self.caslibs.pop(str(caslib).upper(), None)
+        return {}
+
+    # ------------------------------------------------------------------
+    # simple and sampling actions
+    # ------------------------------------------------------------------
+
+    def _action_summary(self, table=None, inputs=None, **kwargs):
+        frame = self._frame(table)
+        if inputs:
+            frame = frame[[_column(frame, item) for item in inputs]]
+        frame = frame.select_dtypes(include=[np.number])
+        return dict(Summary=pd.DataFrame(dict(
+            Column=list(frame.columns),
+            Min=frame.min().values, Max=frame.max().values,
+            N=frame.count().values, Mean=frame.mean().values,
+            Std=frame.std().values)))
+
+    def _action_freq(self, table=None, inputs=None, **kwargs):
+        frame = self._frame(table)
+        rows = []
+        for item in inputs or frame.columns:
+            column = _column(frame, item['name'] if isinstance(item, dict) else item)
+            counts = frame[column].value_counts().sort_index()
+            for level, (value, count) in enumerate(counts.items()):
+                rows.append(dict(Column=column, CharVar=str(value), FmtVar=str(value),
+                                 Level=level + 1, Frequency=count))
+        return dict(Frequency=pd.DataFrame(rows))
+
+    def _action_crosstab(self, table=None, row=None, col=None, **kwargs):
+        frame = self._frame(table)
+        out = pd.crosstab(frame[_column(frame, row)], frame[_column(frame, col)])
+        out.columns = ['Col{}'.format(i + 1) for i in range(out.shape[1])]
+        out = out.reset_index()
+        return dict(Crosstab=out)
+
+    def _sample(self, table, output, fractions, partind):
+        opts = self._table_opts(table)
+        frame = self._frame(opts)
+        groupby = opts.get('groupby')
+        if isinstance(groupby, six.string_types):
+            groupby = [groupby]
+        output = dict((key.lower(), value) for key, value in (output or {}).items())
+        indicator = np.zeros(frame.shape[0], dtype=int)
+        groups = frame.groupby([_column(frame, item) for item in groupby]).indices \
+            if groupby else {None: np.arange(frame.shape[0])}
+        for index in groups.values():
+            index = self._rng.permutation(index)
+            start = 0
+            for part, fraction in enumerate(fractions):
+                count = int(round(len(index) * fraction / 100.))
+                indicator[index[start:start + count]] = part + 1
+                start += count
+        if partind:
+            frame = frame.copy()
+            frame[output.get('partindname', '_PartInd_')] = indicator
+        else:
+            frame = frame[indicator == 1]
+        return self._out(None, output.get('casout'), frame)
+
+    def _action_stratified(self, table=None, output=None, samppct=None, samppct2=None,
+                           partind=False, **kwargs):
+        fractions = [samppct] + ([samppct2] if samppct2 is not None else [])
+        return self._sample(table, output, fractions, partind)
+
+    def _action_srs(self, table=None, output=None, samppct=None, partind=False, **kwargs):
+        return self._sample(table, output, [samppct], partind)
+
+    # ------------------------------------------------------------------
+    # image actions
+    # ------------------------------------------------------------------
+
+    def _action_fetchimages(self, imagetable=None, table=None, fetchimagesvars=None,
+                            fetchvars=None, to=None, image='_image_', **kwargs):
+        frame = self._frame(imagetable if imagetable is not None else table)
+        if to is not None:
+            frame = frame.iloc[:int(to)]
+        columns = fetchimagesvars or fetchvars or []
+        out = pd.DataFrame(dict(Image=[_decode_image(item) for item in
+                                       frame.get(image, pd.Series([None] * frame.shape[0]))]))
+        if '_label_' in frame.columns:
+            out['Label'] = frame['_label_'].values
+        for column in columns:
+            if column in frame.columns and column != image:
+                out[column] = frame[column].values
+        return dict(Images=out)
+
+    def _action_summarizeimages(self, table=None, image='_image_', **kwargs):
+        frame = self._frame(table)
+        sizes = np.array([_image_size(item) for item in frame[image]]) \
+            if frame.shape[0] else np.zeros((0, 2))
+        widths = sizes[:, 0] if sizes.size else np.array([0])
+        heights = sizes[:, 1] if sizes.size else np.array([0])
+        summary = dict(Column=image, jpg=frame.shape[0],
+                       minWidth=widths.min(), maxWidth=widths.max(),
+                       minHeight=heights.min(), maxHeight=heights.max(),
+                       meanWidth=widths.mean(), meanHeight=heights.mean())
+        for name in ('1st', '2nd', '3rd'):
+            summary.update({'mean{}Channel'.format(name): 127.5,
+                            'min{}Channel'.format(name): 0,
+                            'max{}Channel'.format(name): 255})
+        return dict(Summary=pd.DataFrame([summary]))
+
+    def _action_processimages(self, table=None, casout=None, copyvars=None, **kwargs):
+        return self._out(table, casout, self._frame(table).copy())
+
+    def _action_augmentimages(self, table=None, casout=None, copyvars=None, croplist=None,
+                              image='_image_', **kwargs):
+        frame = self._frame(table)
+        columns = [_column(frame, item) for item in copyvars or [] if item != image]
+        rows = []
+        for crop in croplist or []:
+            crop = dict((key.lower(), value) for key, value in crop.items())
+            if not crop.get('sweepimage'):
+                continue
+            width, height = int(crop['width']), int(crop['height'])
+            step = int(crop.get('stepsize', 1))
+            xs = range(int(crop.get('x', 0)), int(crop['outputwidth']) - width + 1, step)
+            ys = range(int(crop.get('y', 0)), int(crop['outputheight']) - height + 1, step)
+            for i in range(frame.shape[0]):
+                parent = frame.iloc[i]
+                for y in ys:
+                    for x in xs:
+                        row = dict((column, parent[column]) for column in columns)
+                        row.update({image: parent.get(image),
+                                    '_parentId_': parent.get('_id_', i + 1),
+                                    '_id_': len(rows) + 1,
+                                    'x': x, 'y': y, 'width': width, 'height': height})
+                        rows.append(row)
+        if not rows:
+            return self._out(table, casout, frame.copy())
+        return self._out(table, casout, pd.DataFrame(rows))
+
+    # ------------------------------------------------------------------
+    # deeplearn actions
+    # ------------------------------------------------------------------
+
+    def _model_entry(self, model):
+        entry = self._get(model)
+        if 'model_name' not in entry:
+            raise FakeCASError('Table "{}" is not a model table.'.format(entry['name']))
+        return entry
+
+    def _action_buildmodel(self, model=None, type='CNN', **kwargs):
+        opts = self._table_opts(model)
+        name = opts['name']
+        frame = pd.DataFrame([(name, 'modeltype', -1, 1., type)], columns=_MODEL_COLUMNS)
+        self._store(dict(name=name, replace=opts.get('replace', True)), frame,
+                    model_name=name, model_type=type, layers=collections.OrderedDict())
+        return dict(ModelInfo=self._modelinfo(name))
+
+    def _action_addlayer(self, model=None, name=None, layer=None, srclayers=None, **kwargs):
+        entry = self._model_entry(model)
+        layers = entry['layers']
+        if name in layers and kwargs.get('replace') is not True:
+            raise FakeCASError('Layer "{}" already exists.'.format(name))
+        config = dict((key.lower(), value) for key, value in dict(layer).items())
+        layer_type = str(config.get('type', '')).lower()
+        layer_type = _LAYER_ALIASES.get(layer_type, layer_type)
+        if layer_type not in LAYER_TYPES:
+            raise FakeCASError('Layer type "{}" is not supported.'.format(layer_type))
+        config['type'] = layer_type
+        if isinstance(srclayers, six.string_types):
+            srclayers = [srclayers]
+        for src in srclayers or []:
+            if src not in layers:
+                raise FakeCASError('Source layer "{}" does not exist.'.format(src))
+        layers[name] = dict(config=config, srclayers=list(srclayers or []))
+        entry['frame'] = _model_frame(entry['model_name'], entry['model_type'], layers)
+        return {}
+
+    def _action_removelayer(self, model=None, name=None, **kwargs):
+        entry = self._model_entry(model)
+        entry['layers'].pop(name, None)
+        for layer in entry['layers'].values():
+            layer['srclayers'] = [item for item in layer['srclayers'] if item != name]
+        entry['frame'] = _model_frame(entry['model_name'], entry['model_type'],
+                                      entry['layers'])
+        return {}
+
+    def _modelinfo(self, model_name):
+        entry = self.tables[str(model_name).upper()]
+        types = [layer['config']['type'] for layer in entry['layers'].values()]
+        count = lambda layer_type: str(types.count(layer_type))
+        model_type = dict(CNN='Convolutional Neural Network',
+                          RNN='Recurrent Neural Network',
+                          DNN='Deep Neural Network').get(entry['model_type'],
+                                                         entry['model_type'])
+        rows = [('Model Name', entry['model_name']),
+                ('Model Type', model_type),
+                ('Number of Layers', str(len(types))),
+                ('Number of Input Layers', count('input')),
+                ('Number of Output Layers', count('output')),
+                ('Number of Convolutional Layers', count('convo')),
+                ('Number of Pooling Layers', count('pool')),
+                ('Number of Fully Connected Layers', count('fc')),
+                ('Number of Batch Normalization Layers', count('batchnorm')),
+                ('Number of Residual Layers', count('residual'))]
+        return pd.DataFrame(rows, columns=['Descr', 'Value'])
+
+    def _action_modelinfo(self, modeltable=None, model=None, **kwargs):
+        entry = self._model_entry(modeltable if modeltable is not None else model)
+        return dict(ModelInfo=self._modelinfo(entry['model_name']))
+
+    def _synthetic_weights(self, entry):
+        rows = []
+        for layer_id, layer in enumerate(entry['layers'].values()):
+            config = layer['config']
+            n_weights = int(config.get('nfilters', config.get('n', 0)) or 0)
+            for weight_id in range(n_weights):
+                rows.append((layer_id, weight_id, self._rng.normal(scale=0.1)))
+        return pd.DataFrame(rows, columns=['_LayerID_', '_WeightID_', '_Weight_'])
+
+    def _levels(self, frame, target):
+        if target is not None and _has_column(frame, target):
+            return sorted(frame[_column(frame, target)].astype(str).unique().tolist())
+        return None
+
+    def _action_dltrain(self, model=None, table=None, inputs=None, target=None,
+                        modelweights=None, initweights=None, optimizer=None, **kwargs):
+        entry = self._model_entry(model)
+        frame = self._frame(table)
+        optimizer = dict((key.lower(), value) for key, value in (optimizer or {}).items())
+        max_epochs = int(optimizer.get('maxepochs', 10))
+        algorithm = dict((key.lower(), value)
+                         for key, value in (optimizer.get('algorithm') or {}).items())
+        learning_rate = algorithm.get('learningrate', 0.001)
+
+        if initweights is not None:
+            weights = self._get(initweights)['frame'].copy()
+        else:
+            weights = self._synthetic_weights(entry)
+        levels = self._levels(frame, target)
+        if modelweights is None:
+            modelweights = dict(name='{}_weights'.format(entry['model_name']))
+        self._store(dict(self._table_opts(modelweights), replace=True), weights,
+                    target=target, levels=levels)
+
+        epochs = np.arange(max_epochs)
+        loss = 2. * np.exp(-0.3 * epochs) + self._rng.uniform(0, 0.05, max_epochs)
+        fit_error = 0.8 * np.exp(-0.3 * epochs)
+        history = pd.DataFrame(dict(Epoch=epochs.astype(float),
+                                    LearningRate=float(learning_rate),
+                                    Loss=loss, FitError=fit_error))
+        return dict(ModelInfo=self._modelinfo(entry['model_name']),
+                    OptIterHistory=history[['Epoch', 'LearningRate', 'Loss', 'FitError']])
+
+    @staticmethod
+    def _n_classes(entry):
+        n = [int(layer['config'].get('n', 2) or 2) for layer in entry['layers'].values()
+             if layer['config']['type'] == 'output']
+        return n[0] if n else 2
+
+    def _target_levels(self, weights, frame, n_classes):
+        ''' The target and its levels, from the trained weights or the data '''
+        target = weights.get('target') or '_label_'
+        levels = weights.get('levels') or self._levels(frame, target)
+        if not levels:
+            levels = ['{}'.format(i) for i in range(n_classes)]
+        return target, levels
+
+    def _predict(self, frame, target, levels, copyvars):
+        ''' The scored rows, with the copied columns, probabilities and predictions '''
+        n_rows = frame.shape[0]
+        if self.score_function is not None:
+            probs = np.asarray(self.score_function(frame, levels), dtype=float)
+        else:
+            probs = self._rng.dirichlet(np.ones(len(levels)), size=n_rows)
+        out = pd.DataFrame(index=range(n_rows))
+        for column in copyvars or []:
+            out[column] = frame[_column(frame, column)].values
+        for i, level in enumerate(levels):
+            out['P_{}{}'.format(target, level.replace(' ', '_'))] = probs[:, i]
+        predicted = [levels[i] for i in probs.argmax(axis=1)] if n_rows else []
+        out['I_{}'.format(target)] = predicted
+        return out, probs, predicted
+
+    def _action_dlscore(self, model=None, table=None, initweights=None, copyvars=None,
+                        casout=None, layerout=None, layerlist=None, **kwargs):
+        entry = self._model_entry(model)
+        frame = self._frame(table)
+        weights = self._get(initweights) if initweights is not None else {}
+        target, levels = self._target_levels(weights, frame, self._n_classes(entry))
+        out, probs, predicted = self._predict(frame, target, levels, copyvars)
+        n_rows = frame.shape[0]
+
+        res = {}
+        if casout is not None:
+            res.update(self._out(table, casout, out))
+        if layerout is not None:
+            names = list(entry['layers'])
+            layer_id = len(names) - 1
+            if isinstance(layerlist, six.string_types) and layerlist in names:
+                layer_id = names.index(layerlist)
+            n_features = int(entry['layers'][names[layer_id]]['config'].get('n') or 4)
+            features = pd.DataFrame(
+                self._rng.normal(size=(n_rows, n_features)),
+                columns=['_LayerAct_{}_0_0_{}'.format(layer_id, i)
+                         for i in range(n_features)])
+            for column in reversed(copyvars or []):
+                features.insert(0, column, frame[_column(frame, column)].values)
+            self._store(layerout, features)
+
+        n_errors = 0
+        if _has_column(frame, target):
+            truth = frame[_column(frame, target)].astype(str).values
+            n_errors = int(np.sum(truth != np.array(predicted, dtype=object)))
+        res['ScoreInfo'] = pd.DataFrame(dict(
+            Descr=['Number of Observations Read', 'Number of Observations Used',
+                   'Misclassification Error (%)', 'Loss Error'],
+            Value=[str(n_rows), str(n_rows),
+                   '{:.4f}'.format(100. * n_errors / n_rows if n_rows else 0.),
+                   '{:.4f}'.format(float(-np.mean(np.log(probs.max(axis=1))))
+                                   if n_rows else 0.)]))
+        return res
+
+    def _action_dlexportmodel(self, modeltable=None, initweights=None, casout=None,
+                              **kwargs):
+        entry = self._model_entry(modeltable)
+        weights = self._get(initweights) if initweights is not None else {}
+        astore = pd.DataFrame(dict(_state_=[b'FAKE-ASTORE:' +
+                                            entry['model_name'].encode('utf-8')]))
+        return self._out(None, casout, astore, astore_model=entry['model_name'],
+                         target=weights.get('target'), levels=weights.get('levels'),
+                         n_classes=self._n_classes(entry))
+
+    def _astore_entry(self, rstore):
+        entry = self._get(rstore)
+        if 'astore_model' not in entry:
+            raise FakeCASError('Table "{}" is not an analytic store.'.format(entry['name']))
+        return entry
+
+    def _action_describe(self, rstore=None, **kwargs):
+        store = self._astore_entry(rstore)
+        return dict(Description=pd.DataFrame(dict(
+            Attribute=['Analytic Engine', 'Model'],
+            Value=['deeplearn', store['astore_model']])))
+
+    def _action_score(self, table=None, rstore=None, out=None, copyvars=None, **kwargs):
+        store = self._astore_entry(rstore)
+        frame = self._frame(table)
+        target, levels = self._target_levels(store, frame, store['n_classes'])
+        scored, _, _ = self._predict(frame, target, levels, copyvars)
+        return self._out(table, out, scored)
+
+    def _action_dlimportmodelweights(self, model=None, modelweights=None, **kwargs):
+        entry = self._model_entry(model)
+        self._store(dict(self._table_opts(modelweights), replace=True),
+                    self._synthetic_weights(entry))
+        return {}
+
+    def _action_dltune(self, **kwargs):
+        return dict(TunerResults=pd.DataFrame())
+
+
+def _model_frame(model_name, model_type, layers):
+    ''' The rows of a model table, in the layout of the server '''
+    rows = [(model_name, 'modeltype', -1, 1., model_type)]
+    ids = dict((name, layer_id) for layer_id, name in enumerate(layers))
+    for layer_id, (name, layer) in enumerate(layers.items()):
+        config = layer['config']
+        code, prefix = LAYER_TYPES[config['type']]
+        rows.append((name, 'layertype', layer_id, float(code), ''))
+        for key, value in config.items():
+            if key == 'type' or value is None:
+                continue
+            if code == 1 and key == 'offsets':
+                values = list(value) if isinstance(value, (list, tuple)) else [value]
+                for i, item in enumerate(values):
+                    opt = 'inputopts.offsets' if i == 0 else 'inputopts.offsets.{}'.format(i)
+                    rows.append((name, opt, layer_id, float(item), ''))
+                continue
+            if code == 1 and key == 'randomcrop':
+                value = 'No cropping' if str(value).lower() == 'none' else 'Unique cropping'
+                rows.append((name, 'inputopts.crop', layer_id, np.nan, value))
+                continue
+            if code == 1 and key == 'randomflip':
+                value = 'No flipping' if str(value).lower() == 'none' else 'Flipping'
+                rows.append((name, 'inputopts.flip', layer_id, np.nan, value))
+                continue
+            if code == 3 and key == 'pool':
+                rows.append((name, 'poolingopts.poolingtype', layer_id, np.nan,
+                             '{} pooling'.format(str(value).title())))
+                continue
+            if key == 'includebias':
+                if not value:
+                    rows.append((name, '{}.no_bias'.format(prefix), layer_id, 1., ''))
+                continue
+            opt = '{}.{}'.format(prefix, key.replace('_', ''))
+            if isinstance(value, bool):
+                rows.append((name, opt, layer_id, float(value), ''))
+            elif isinstance(value, (int, float, np.number)):
+                rows.append((name, opt, layer_id, float(value), ''))
+            elif isinstance(value, six.string_types):
+                rows.append((name, opt, layer_id, np.nan, value))
+        if code == 1:
+            if 'randomcrop' not in config:
+                rows.append((name, 'inputopts.crop', layer_id, np.nan, 'No cropping'))
+            if 'randomflip' not in config:
+                rows.append((name, 'inputopts.flip', layer_id, np.nan, 'No flipping'))
+        for i, src in enumerate(layer['srclayers']):
+            key = 'srclayers' if i == 0 else 'srclayers.{}'.format(i)
+            rows.append((name, key, layer_id, float(ids[src]), src))
+    return pd.DataFrame(rows, columns=_MODEL_COLUMNS)
+
+
+def _has_column(frame, name):
+    return str(name).lower() in [str(col).lower() for col in frame.columns]
+
+
+def _column(frame, name):
+    ''' The column of frame matching name, ignoring the case '''
+    for col in frame.columns:
+        if str(col).lower() == str(name).lower():
+            return col
+    raise FakeCASError('Column "{}" does not exist.'.format(name))
+
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<string>"(?:[^"]|"")*"|'(?:[^']|'')*')(?P<nliteral>n\b)?|
+    (?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)|
+    (?P<op><=|>=|\^=|~=|!=|=|<|>|\(|\)|,|\+|-|\*|/)|
+    (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )''', re.VERBOSE)
+
+_WORD_OPS = {'AND': 'and', 'OR': 'or', 'NOT': 'not', 'IN': 'in',
+             'EQ': '==', 'NE': '!=', 'LT': '<', 'GT': '>', 'LE': '<=', 'GE': '>='}
+_SYMBOL_OPS = {'=': '==', '^=': '!=', '~=': '!='}
+
+
+def _sas_strip(values):
+    return pd.Series(values).astype(str).str.strip()
+
+
+def _sas_put(values, fmt):
+    values = pd.Series(values)
+    if values.dtype.kind in 'iuf':
+        return values.map('{:.12g}'.format)
+    return values.astype(str)
+
+
+def _sas_input(values, fmt):
+    return pd.to_numeric(pd.Series(values), errors='coerce')
+
+
+# The SAS functions of the expressions, called as local functions by pandas
+_FUNCTIONS = {'STRIP': _sas_strip, 'PUT': _sas_put, 'INPUT': _sas_input}
+_LOCALS = dict(('_sas_' + name.lower(), func) for name, func in _FUNCTIONS.items())
+
+
+def _sas_to_query(frame, where):
+    ''' Translate a SAS where clause to a pandas query expression '''
+    out = []
+    in_list = 0
+    pos = 0
+    where = where.strip()
+    while pos < len(where):
+        match = _TOKEN.match(where, pos)
+        if match is None:
+            raise FakeCASError('Cannot parse the where clause "{}".'.format(where))
+        pos = match.end()
+        if match.group('string') is not None:
+            text = match.group('string')
+            value = text[1:-1].replace(text[0] * 2, text[0])
+            if match.group('nliteral'):
+                out.append('`{}`'.format(_column(frame, value)))
+            elif len(out) > 1 and out[-1] in ('==', '!=') and out[-2].startswith('`') and \
+                    frame[out[-2][1:-1]].dtype.kind in 'iuf' and _is_number(value):
+                # Character values compared to numeric columns are converted, as in SAS
+                out.append(value)
+            else:
+                out.append(repr(value))
+        elif match.group('number') is not None:
+            out.append(match.group('number'))
+        elif match.group('op') is not None:
+            op = match.group('op')
+            if op == '(' and out and out[-1] == 'in':
+                in_list += 1
+                out.append('[')
+            elif op == ')' and in_list:
+                in_list -= 1
+                out.append(']')
+            else:
+                out.append(_SYMBOL_OPS.get(op, op))
+        else:
+            word = match.group('word')
+            if word.upper() in _WORD_OPS:
+                out.append(_WORD_OPS[word.upper()])
+            elif word.upper() in _FUNCTIONS and where[pos:].lstrip().startswith('('):
+                out.append('@_sas_' + word.lower())
+            elif word.endswith('.'):
+                # the format argument of put and input, e.g. best32.
+                out.append(repr(word))
+            else:
+                out.append('`{}`'.format(_column(frame, word)))
+    return ' '.join(out)
+
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _where(frame, where):
+    ''' Boolean mask of the rows of frame satisfying a SAS where clause '''
+    if frame.shape[0] == 0:
+        return np.zeros(0, dtype=bool)
+    mask = frame.eval(_sas_to_query(frame, where), engine='python', local_dict=_LOCALS)
+    return np.asarray(mask, dtype=bool)
+
+
+_ASSIGNMENT = re.compile(r'^\s*(\'[^\']+\'n|"[^"]+"n|\w+)\s*=\s*(.+?)\s*$', re.DOTALL)
+
+
+def _flatten(items):
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            for sub in _flatten(item):
+                yield sub
+        else:
+            yield item
+
+
+def _compute(frame, computedvars, program):
+    ''' Evaluate the computed variables, from the assignments of the program '''
+    if isinstance(program, (list, tuple)):
+        program = ';'.join(_flatten(program))
+    if isinstance(computedvars, six.string_types):
+        computedvars = [computedvars]
+    names = [var['name'] if isinstance(var, dict) else var for var in _flatten(computedvars)]
+    for name in names:
+        frame[name] = np.nan
+    for statement in program.split(';'):
+        match = _ASSIGNMENT.match(statement)
+        if match is None:
+            continue
+        target = match.group(1)
+        if target.endswith('n') and target[0] in '\'"':
+            target = target[1:-2]
+        if target.lower() not in [name.lower() for name in names]:
+            continue
+        target = _column(frame, target)
+        try:
+            value = frame.eval(_sas_to_query(frame, match.group(2)), engine='python',
+                               local_dict=_LOCALS)
+        except Exception:
+            # Only the expressions pandas can evaluate are supported
+            continue
+        frame[target] = value.values if hasattr(value, 'values') else value
+    for name in names:
+        if name.lower().startswith('_filename_') and frame[name].isnull().all():
+            frame[name] = ['image_{}.jpg'.format(i) for i in range(frame.shape[0])]
+
+
+def _image_size(data):
+    ''' Width and height of an encoded image '''
+    if not isinstance(data, six.binary_type):
+        return 0, 0
+    try:
+        from PIL import Image
+        import io
+        return Image.open(io.BytesIO(data)).size
+    except Exception:
+        return 0, 0
+
+
+def _decode_image(data):
+    if not isinstance(data, six.binary_type):
+        return data
+    try:
+        from PIL import Image
+        import io
+        return Image.open(io.BytesIO(data))
+    except Exception:
+        return data
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Cached activations of a frozen backbone, for training classifier heads
+
+Training a head on top of a frozen pre-trained network runs the whole
+network on every image, every epoch, although the activations of the
+frozen layers never change.  Here the backbone is scored once, with the
+layer output of a cut layer written to a feature table, and the heads are
+trained on the feature table instead of the images.
+
+The name of the feature table is derived from the architecture of the
+backbone up to the cut layer, a fingerprint of its weights, the data table
+with its creation and modification times, and the version of the table
+layout, so that the table is reused by every head trained on the same
+features, and never reused once the weights of the backbone or the data
+change.  Each row holds the activations of one image, with
+its ID and label.
+
+'''
+
+import hashlib
+
+from .utils import input_table_check
+
+FEATURE_CACHE_VERSION = 1
+
+# Prefix of the activation columns of the layerOut table of dlscore
+FEATURE_PREFIX = '_LayerAct_'
+
+
+def _layer_index(model, layer):
+    names = [item.name for item in model.layers]
+    if layer not in names:
+        raise ValueError('Layer "{}" not found in model "{}".'
+                         .format(layer, model.model_name))
+    return names.index(layer)
+
+
+def weights_fingerprint(model, n_layers):
+    '''
+    Return a fingerprint of the first layers of a model and their weights
+
+    The fingerprint is computed from the configuration of the layers and
+    summary statistics of their weights, computed on the server, so that
+    the weights table is never transferred.
+
+    Parameters
+    ----------
+    model : Model
+        Specifies the model with attached weights.
+    n_layers : int
+        Specifies the number of layers fingerprinted.
+
+    Returns
+    -------
+    string
+
+    '''
+    weights = model.model_weights.to_table_params()
+    if not model._retrieve_('table.tableexists', name=weights['name'])['exists']:
+        raise ValueError('Model "{}" has no weights attached.'.format(model.model_name))
+
+    key = hashlib.sha1()
+    for layer in model.layers[:n_layers]:
+        key.update(repr(sorted(layer.config.items())).encode('utf8'))
+
+    # The position-weighted sum tells apart weights permuted within a layer
+    table = dict(weights, where='_LayerID_<{}'.format(n_layers),
+                 computedVars=['_Key_'],
+                 computedVarsProgram='_Key_=_Weight_*(_WeightID_+1)*(_LayerID_+1)')
+    summary = model._retrieve_('simple.summary', table=table,
+                               inputs=['_Weight_', '_Key_'])['Summary']
+    for _, row in summary.iterrows():
+        # Rounded: the order of the sums may differ between runs
+        key.update('{}:{}:{:.10g}:{:.10g}:{:.10g}:{:.10g}'.format(
+            row['Column'], int(row['N']), row['Min'], row['Max'], row['Mean'],
+            row['Std']).encode('utf8'))
+    return key.hexdigest()
+
+
+def feature_table_name(model, data, layer):
+    '''
+    Return the name of the feature table of a data table at a cut layer
+
+    Parameters
+    ----------
+    model : Model
+        Specifies the backbone model, with attached weights.
+    data : CASTable or string or dict
+        Specifies the table containing the image data.
+    layer : string
+        Specifies the name of the cut layer.
+
+    Returns
+    -------
+    string
+
+    '''
+    layer_id = _layer_index(model, layer)
+    input_tbl_opts = input_table_check(data)
+    table = dict((key, value) for key, value in input_tbl_opts.items()
+                 if key in ['name', 'caslib'])
+    info = model._retrieve_('table.tableinfo', **table)['TableInfo'].iloc[0]
+    # A table replaced or modified with the same number of rows has other times
+    key = '{}:{}:{}:{}:{}:{}:{}:{!r}:{!r}'.format(
+        FEATURE_CACHE_VERSION, weights_fingerprint(model, layer_id + 1), layer,
+        input_tbl_opts['name'].upper(), str(input_tbl_opts.get('caslib', '')).upper(),
+        input_tbl_opts.get('where', ''), int(info['Rows']), float(info['CreateTime']),
+        float(info['ModTime']))
+    return 'Features_v{}_{}'.format(FEATURE_CACHE_VERSION,
+                                    hashlib.sha1(key.encode('utf8')).hexdigest()[:12])
+
+
+def cache_features(model, data, layer, id_column='_id_', target='_label_',
+                   refresh=False, **kwargs):
+    '''
+    Return the feature table of a data table, scoring the backbone if needed
+
+    Parameters
+    ----------
+    model : Model
+        Specifies the backbone model, with attached weights.
+    data : CASTable or string or dict
+        Specifies the table containing the image data.
+    layer : string
+        Specifies the name of the cut layer, whose activations are the
+        features.
+    id_column : string, optional
+        Specifies the column identifying the images.
+        Default : '_id_'
+    target : string, optional
+        Specifies the name of the column including the response variable.
+        Default : '_label_'
+    refresh : bool, optional
+        Specifies whether to score the backbone even if the feature table
+        exists.
+        Default : False
+    **kwargs : keyword arguments, optional
+        Specifies the optional arguments for the dlScore action.
+
+    Returns
+    -------
+    :class:`CASTable`
+
+    '''
+    input_tbl_opts = input_table_check(data)
+    columns = model.conn.CASTable(**input_tbl_opts).columninfo().ColumnInfo.Column.tolist()
+    for column in [id_column, target]:
+        if column not in columns:
+            raise ValueError('Column name "{}" not found in the data table.'.format(column))
+
+    name = feature_table_name(model, input_tbl_opts, layer)
+    if refresh or not model._retrieve_('table.tableexists', name=name)['exists']:
+        score_options = dict(model=model.model_table, initWeights=model.model_weights,
+                             table=input_tbl_opts,
+                             copyVars=[id_column, target],
+                             layerOut=dict(name=name, replace=True),
+                             layerList=layer,
+                             layerImageType='wide',
+                             randomflip='none',
+                             randomcrop='none',
+                             encodeName=True,
+                             **kwargs)
+        model._retrieve_('deeplearn.dlscore', **score_options)
+    else:
+        print('NOTE: Using the cached features in table "{}".'.format(name))
+    return model.conn.CASTable(name)
+
+
+def feature_columns(features):
+    '''
+    Return the names of the activation columns of a feature table
+
+    Parameters
+    ----------
+    features : CASTable
+        Specifies the feature table.
+
+    Returns
+    -------
+    list of strings
+
+    '''
+    return [column for column in features.columninfo().ColumnInfo.Column
+            if column.startswith(FEATURE_PREFIX)]
+
+
+def fit_head(head, features, target='_label_', **kwargs):
+    '''
+    Train a head model on a feature table
+
+    Parameters
+    ----------
+    head : Model
+        Specifies the head model.  Its input layer takes the activations
+        of the cut layer, e.g. InputLayer(n_features, 1, 1).
+    features : CASTable
+        Specifies the feature table.
+    target : string, optional
+        Specifies the name of the column including the response variable.
+        Default : '_label_'
+    **kwargs : keyword arguments, optional
+        Specifies the optional arguments for :meth:`Model.fit`.
+
+    Returns
+    -------
+    :class:`CASResults`
+
+    '''
+    inputs = feature_columns(features)
+    config = head.layers[0].config
+    n_inputs = int(config['nchannels']) * int(config['width']) * int(config['height'])
+    if n_inputs != len(inputs):
+        raise ValueError('The input layer of model "{}" takes {} values, the feature '
+                         'table has {} features.'.format(head.model_name, n_inputs,
+                                                         len(inputs)))
+    return head.fit(data=features, inputs=inputs, target=target, **kwargs)
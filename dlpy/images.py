@@ -18,11 +18,143 @@
 
 ''' Special functionality for CAS tables containing image data '''
 
-import matplotlib.pyplot as plt
+import io
+import struct
+
 import numpy as np
+import six
+from swat.cas.datamsghandlers import CASDataMsgHandler
 from swat.cas.table import CASTable
 
-from .utils import random_name, image_blocksize
+from .tracing import traced_call
+from .utils import random_name, image_blocksize, checked_call
+
+
+def _array_to_bmp(array):
+    ''' Encode an RGB (or grayscale) array of shape (height, width[, channels]) as BMP '''
+    array = np.asarray(array)
+    if array.ndim == 2:
+        array = np.stack([array] * 3, axis=-1)
+    if array.ndim != 3 or array.shape[2] not in (1, 3, 4):
+        raise ValueError('Image arrays must have the shape (height, width), '
+                         '(height, width, 3) or (height, width, 4).')
+    if array.shape[2] == 1:
+        array = np.concatenate([array] * 3, axis=-1)
+    if array.dtype != np.uint8:
+        array = np.clip(np.rint(array), 0, 255).astype(np.uint8)
+
+    height, width = array.shape[:2]
+    # BMP stores the rows bottom-up, in BGR order, each row padded to 4 bytes
+    pixels = array[::-1, :, 2::-1]
+    padding = (-3 * width) % 4
+    if padding:
+        pixels = np.concatenate(
+            [pixels.reshape(height, 3 * width),
+             np.zeros((height, padding), dtype=np.uint8)], axis=1)
+    pixels = np.ascontiguousarray(pixels).tobytes()
+
+    header = struct.pack('<2sIHHI', b'BM', 54 + len(pixels), 0, 0, 54)
+    info = struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0,
+                       len(pixels), 2835, 2835, 0, 0)
+    return header + info + pixels
+
+
+def encode_image(image):
+    '''
+    Encode an in-memory image to bytes that can be loaded by the server
+
+    Parameters
+    ----------
+    image : bytes or numpy.ndarray or PIL.Image.Image
+        Specifies the image.  Bytes are taken as the content of an image
+        file (e.g. JPEG or PNG) and are not modified.  Arrays are RGB
+        (or grayscale) images of shape (height, width[, channels]).
+
+    Returns
+    -------
+    bytes
+
+    '''
+    if isinstance(image, six.binary_type):
+        return image
+    if isinstance(image, np.ndarray):
+        return _array_to_bmp(image)
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None and isinstance(image, Image.Image):
+        buf = io.BytesIO()
+        image.save(buf, format='PNG')
+        return buf.getvalue()
+    raise TypeError('Images must be one of the following:\n'
+                    '1. The bytes of an encoded image file;\n'
+                    '2. A numpy array of shape (height, width[, channels]);\n'
+                    '3. A PIL image.')
+
+
+# Leading bytes of the image files the server can decode
+_IMAGE_MAGIC = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a',
+                b'II*\x00', b'MM\x00*')
+
+
+def _is_image_bytes(data):
+    ''' Whether bytes are the content of an image file, rather than e.g. a table name '''
+    if data.startswith(_IMAGE_MAGIC):
+        return True
+    # the reserved fields of a BMP file header are zeros
+    return data[:2] == b'BM' and data[6:10] == b'\x00' * 4
+
+
+def is_in_memory_image(data):
+    '''
+    Check whether data is an image, or a list of images, held by the client
+
+    Bytes are only taken as an image when they start with the signature
+    of a JPEG, PNG, BMP, GIF or TIFF file.
+
+    Parameters
+    ----------
+    data : any
+        The object to check
+
+    Returns
+    -------
+    bool
+
+    '''
+    if isinstance(data, (list, tuple)):
+        return len(data) > 0 and all(is_in_memory_image(item) for item in data)
+    if isinstance(data, six.binary_type):
+        # on Python 2, table names are binary strings too
+        return _is_image_bytes(data)
+    if isinstance(data, np.ndarray):
+        return True
+    return type(data).__module__.startswith('PIL.')
+
+
+class _ImageDataMsgHandler(CASDataMsgHandler):
+    ''' Data message handler encoding the images lazily, one buffer of rows at a time '''
+
+    def __init__(self, images, labels=None, nrecs=64):
+        self.images = images
+        self.labels = labels
+        variables = [dict(name='_image_', type='varbinary', rtype='char', length=16),
+                     dict(name='_filename_0', type='varchar', rtype='char', length=16),
+                     dict(name='_id_', type='sas', rtype='numeric', length=8)]
+        if labels is not None:
+            variables.append(dict(name='_label_', type='varchar', rtype='char',
+                                  length=16))
+        super(_ImageDataMsgHandler, self).__init__(
+            variables, nrecs=max(1, min(nrecs, len(images))))
+
+    def getrow(self, row):
+        if row >= len(self.images):
+            return
+        out = [encode_image(self.images[row]), 'image_{}'.format(row), row + 1]
+        if self.labels is not None:
+            out.append(str(self.labels[row]))
+        return out
 
 
 class ImageTable(CASTable):
@@ -92,7 +224,7 @@ class ImageTable(CASTable):
         out = cls(**tbl.params)
 
         conn = tbl.get_connection()
-        conn.loadactionset('image', _messagelevel='error')
+        checked_call(conn, 'builtins.loadactionset', actionset='image')
 
         if casout is None:
             casout = {}
@@ -102,7 +234,8 @@ class ImageTable(CASTable):
         if 'name' not in casout:
             casout['name'] = random_name()
 
-        if '_filename_0' in tbl.columninfo().ColumnInfo.Column.tolist():
+        existing = tbl.columninfo().ColumnInfo.Column.tolist()
+        if '_filename_0' in existing:
             computedvars = []
             code = []
         else:
@@ -135,20 +268,22 @@ class ImageTable(CASTable):
             table_opts = dict(**tbl.params)
 
         # This will generate the '_image_' and '_label_' columns.
-        conn.retrieve('table.shuffle', _messagelevel='error',
-                      table=table_opts,
-                      casout=dict(replace=True, blocksize=32, **casout))
+        checked_call(conn, 'table.shuffle',
+                     table=table_opts,
+                     casout=dict(replace=True, blocksize=32, **casout))
 
         column_names = ['_image_', '_label_', '_filename_0', '_id_']
         if columns is not None:
             if not isinstance(columns, list):
                 columns = list(columns)
             column_names += columns
+        available = [name.upper() for name in existing + computedvars]
+        column_names = [name for name in column_names if name.upper() in available]
 
         # Remove the unwanted columns.
-        conn.retrieve('table.partition', _messagelevel='error',
-                      table=dict(Vars=column_names, **casout),
-                      casout=dict(replace=True, blocksize=32, **casout))
+        checked_call(conn, 'table.partition',
+                     table=dict(Vars=column_names, **casout),
+                     casout=dict(replace=True, blocksize=32, **casout))
 
         out = cls(**casout)
         out.set_connection(conn)
@@ -178,7 +313,7 @@ class ImageTable(CASTable):
         :class:`ImageTable`
 
         '''
-        conn.loadactionset('image', _messagelevel='error')
+        checked_call(conn, 'builtins.loadactionset', actionset='image')
 
         if casout is None:
             casout = dict(name=random_name())
@@ -188,11 +323,11 @@ class ImageTable(CASTable):
         if 'name' not in casout:
             casout['name'] = random_name()
 
-        conn.retrieve('image.loadimages', _messagelevel='error',
-                      casout=casout,
-                      distribution=dict(type='random'),
-                      recurse=True, labellevels=-1,
-                      path=path, **kwargs)
+        checked_call(conn, 'image.loadimages',
+                     casout=casout,
+                     distribution=dict(type='random'),
+                     recurse=True, labellevels=-1,
+                     path=path, **kwargs)
 
         code = []
         code.append('length _filename_0 varchar(*);')
@@ -202,17 +337,81 @@ class ImageTable(CASTable):
         column_names = ['_image_', '_label_', '_filename_0', '_id_']
         if columns is not None:
             column_names += columns
-        conn.retrieve('table.partition', _messagelevel='error',
-                      table=dict(Vars=column_names,
-                                 computedvars=['_filename_0'],
-                                 computedvarsprogram=code,
-                                 **casout),
-                      casout=dict(replace=True, blocksize=32, **casout))
+        checked_call(conn, 'table.partition',
+                     table=dict(Vars=column_names,
+                                computedvars=['_filename_0'],
+                                computedvarsprogram=code,
+                                **casout),
+                     casout=dict(replace=True, blocksize=32, **casout))
 
         out = cls(**casout)
         out.set_connection(conn)
         return out
 
+    @classmethod
+    def from_images(cls, conn, images, labels=None, casout=None, nrecs=64):
+        '''
+        Create ImageTable from images held in memory by the client
+
+        The images are encoded and uploaded in buffers of `nrecs` rows,
+        without writing any file on the client or on the server.
+
+        Parameters
+        ----------
+        conn : CAS
+            The CAS connection object
+        images : bytes, numpy.ndarray, PIL.Image.Image, or a list of them
+            Specifies the images.  Bytes are taken as the content of an
+            image file (e.g. JPEG or PNG).  Arrays are RGB (or grayscale)
+            images of shape (height, width[, channels]).
+        labels : list of str, optional
+            Specifies the labels of the images, stored in the '_label_' column.
+        casout : dict, optional
+            The output table specifications
+        nrecs : int, optional
+            Specifies the number of images sent to the server in each
+            data message.
+            Default : 64
+
+        Returns
+        -------
+        :class:`ImageTable`
+
+        '''
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        if labels is not None and len(labels) != len(images):
+            raise ValueError('The number of labels does not match the number of images.')
+
+        if casout is None:
+            casout = dict(name=random_name())
+        elif isinstance(casout, CASTable):
+            casout = casout.to_outtable_params()
+        else:
+            casout = dict(casout)
+
+        if 'name' not in casout:
+            casout['name'] = random_name()
+        name = casout.pop('name')
+        casout.setdefault('replace', True)
+
+        handler = _ImageDataMsgHandler(images, labels=labels, nrecs=nrecs)
+        checked_call(conn, 'table.addtable',
+                     table=name, **dict(casout, **handler.args.addtable))
+        caslib = casout.get('caslib')
+        table_opts = dict(name=name) if caslib is None else dict(name=name, caslib=caslib)
+        checked_call(conn, 'table.altertable',
+                     columns=[dict(name='_image_', binaryType='image')],
+                     **table_opts)
+
+        out = cls(**table_opts)
+        out.set_connection(conn)
+        return out
+
+    def _retrieve(self, _name_, **kwargs):
+        return traced_call(_name_, kwargs,
+                           lambda: CASTable._retrieve(self, _name_, **kwargs))
+
     def __copy__(self):
         out = CASTable.__copy__(self)
         out.patch_level = self.patch_level
@@ -282,8 +481,8 @@ class ImageTable(CASTable):
             casout['name'] = random_name()
 
         res = self._retrieve('table.partition', casout=casout, table=self)['casTable']
-        out = ImageTable.from_table(tbl=res)
-        out.params.update(res.params)
+        out = ImageTable(**res.params)
+        out.set_connection(self.get_connection())
 
         return out
 
@@ -327,6 +526,7 @@ class ImageTable(CASTable):
             ncol = nimages
         if figsize is None:
             figsize = (16, 16 // ncol * nrow)
+        import matplotlib.pyplot as plt
         fig = plt.figure(figsize=figsize)
 
         for i in range(nimages):
@@ -549,7 +549,7 @@ def _unpack_config(config):
     out = {}
     out.update(config)
     out.update(kwargs)
-    for key in out:
+    for key in list(out):
         if '_' in key:
             new_key = key.replace('_', '')
             out[new_key] = out[key]
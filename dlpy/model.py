@@ -20,14 +20,17 @@
 
 import os
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import numpy as np
 import pandas as pd
+import six
 import warnings
 
 from .layers import InputLayer, Conv2d, Pooling, BN, Res, Concat, Dense, OutputLayer
-from .utils import image_blocksize, unify_keys, input_table_check, random_name, check_caslib
+from .images import ImageTable, is_in_memory_image
+from .temp_tables import temp_table_name, forget_temp_table
+from .tracing import traced_call
+from .utils import (image_blocksize, unify_keys, input_table_check, random_name, check_caslib,
+                    upload_dataframe, checked_call)
 
 
 class Model(object):
@@ -77,6 +80,18 @@ class Model(object):
         After running model.fit shows epoch, LearningRate, Loss, and Fiterror
     model_explain_table : pandas DataFrame
         Used for plotting results
+    read_only : bool
+        Whether the weights are shared with other sessions (see
+        :class:`dlpy.registry.ModelRegistry`) and cannot be trained
+    shared_version : tuple or None
+        Name and version of the published model the object is attached to
+    weights_precision_report : pandas DataFrame
+        Largest error per layer of the last weights stored with less than
+        double precision (see :meth:`to_packed_weights`)
+    copy_on_write : bool
+        Whether the model references weights shared with other models of
+        the session (see :meth:`share_weights`), which are copied to a table
+        of its own the first time the model is trained
     Returns
     -------
     :class:`Model`
@@ -85,7 +100,7 @@ class Model(object):
 
     def __init__(self, conn, model_table=None, model_weights=None):
         if not conn.queryactionset('deepLearn')['deepLearn']:
-            conn.loadactionset(actionSet='deeplearn', _messagelevel='error')
+            checked_call(conn, 'builtins.loadactionset', actionSet='deeplearn')
 
         self.conn = conn
 
@@ -114,6 +129,10 @@ class Model(object):
         self.n_epochs = 0
         self.training_history = None
         self.model_explain_table = None
+        self.read_only = False
+        self.shared_version = None
+        self.weights_precision_report = None
+        self.copy_on_write = False
 
     @classmethod
     def from_table(cls, input_model_table, display_note=True, output_model_table=None):
@@ -148,37 +167,7 @@ class Model(object):
         model.model_table.update(**input_model_table.to_table_params())
         model.model_weights = model.conn.CASTable('{}_weights'.format(model_name))
 
-        model_table = input_model_table.to_frame()
-        for layer_id in range(int(model_table['_DLLayerID_'].max()) + 1):
-            layer_table = model_table[model_table['_DLLayerID_'] == layer_id]
-            layertype = layer_table['_DLNumVal_'][layer_table['_DLKey1_'] ==
-                                                  'layertype'].tolist()[0]
-            if layertype == 1:
-                model.layers.append(extract_input_layer(layer_table=layer_table))
-            elif layertype == 2:
-                model.layers.append(extract_conv_layer(layer_table=layer_table))
-            elif layertype == 3:
-                model.layers.append(extract_pooling_layer(layer_table=layer_table))
-            elif layertype == 4:
-                model.layers.append(extract_fc_layer(layer_table=layer_table))
-            elif layertype == 5:
-                model.layers.append(extract_output_layer(layer_table=layer_table))
-            elif layertype == 8:
-                model.layers.append(extract_batchnorm_layer(layer_table=layer_table))
-            elif layertype == 9:
-                model.layers.append(extract_residual_layer(layer_table=layer_table))
-        conn_mat = model_table[['_DLNumVal_', '_DLLayerID_']][
-            model_table['_DLKey1_'].str.contains('srclayers')].sort_values('_DLLayerID_')
-        layer_id_list = conn_mat['_DLLayerID_'].tolist()
-        src_layer_id_list = conn_mat['_DLNumVal_'].tolist()
-
-        for row_id in range(conn_mat.shape[0]):
-            layer_id = int(layer_id_list[row_id])
-            src_layer_id = int(src_layer_id_list[row_id])
-            if model.layers[layer_id].src_layers is None:
-                model.layers[layer_id].src_layers = [model.layers[src_layer_id]]
-            else:
-                model.layers[layer_id].src_layers.append(model.layers[src_layer_id])
+        model.layers = extract_layers(input_model_table.to_frame())
 
         return model
 
@@ -209,7 +198,7 @@ class Model(object):
 
     @classmethod
     def from_caffe_model(cls, conn, input_network_file, output_model_table=None,
-                         model_weights_file=None, **kwargs):
+                         model_weights_file=None, cache=None, **kwargs):
         '''
         Generate a model object from a Caffe model proto file (e.g. *.prototxt), and
         convert the weights (e.g. *.caffemodel) to a SAS capable file (e.g. *.caffemodel.h5).
@@ -226,12 +215,23 @@ class Model(object):
         output_model_table : string, dict or CAS table, optional
             Specifies the CAS table to store the deep learning model.
             Default : None
+        cache : bool or :class:`dlpy.model_conversion.conversion_cache.ConversionCache`, optional
+            Specifies the cache of converted models.  When the network and
+            weights files were converted before, the cached layers and
+            weights are used instead of converting the files again.  The
+            weights are written to the cache instead of the current
+            directory, and the cached file is printed.  True selects the
+            cache in the default directory.
+            Default : None
+
         Returns
         -------
         :class:`Model`
 
         '''
-        from .model_conversion.sas_caffe_parse import caffe_to_sas
+        from .model_conversion.conversion_cache import as_conversion_cache
+        from .model_conversion.model_spec import build_model_table
+        from .model_conversion.sas_caffe_parse import caffe_to_layers
 
         if output_model_table is None:
             output_model_table = dict(name=random_name('caffe_model', 6))
@@ -243,17 +243,28 @@ class Model(object):
 
         model_name = model_table_opts['name']
 
-        output_code = caffe_to_sas(input_network_file, model_name, network_param=model_weights_file, **kwargs)
-        exec(output_code)
-        temp_name = conn
-        exec('sas_model_gen(temp_name)')
-        input_model_table = conn.CASTable(**model_table_opts)
+        def convert(weights_file=None):
+            return caffe_to_layers(input_network_file, model_name,
+                                   network_param=model_weights_file,
+                                   weights_file=weights_file, **kwargs)
+
+        cache = as_conversion_cache(cache)
+        if cache is None:
+            layers = convert()
+        else:
+            layers, weights_file = cache.convert('caffe', [input_network_file,
+                                                           model_weights_file], convert,
+                                                 model_weights_file is not None, **kwargs)
+            if weights_file is not None:
+                print('NOTE: the model weights are stored in the following file:\n'
+                      '{}'.format(weights_file))
+        input_model_table = build_model_table(conn, model_table_opts, layers)
         model = cls.from_table(input_model_table=input_model_table)
         return model
 
     @classmethod
     def from_keras_model(cls, conn, keras_model, output_model_table=None,
-                         include_weights=False, input_weights_file=None):
+                         include_weights=False, input_weights_file=None, cache=None):
         '''
         Generate a model object from a Keras model object
 
@@ -261,8 +272,10 @@ class Model(object):
         ----------
         conn : CAS
             The CAS connection object.
-        keras_model : keras_model object.
-            Specifies the keras model to be converted.
+        keras_model : keras_model object or string
+            Specifies the keras model to be converted, or the fully specified
+            client side path to a Keras HDF5 model file (saved by the keras
+            Model.save method).  Keras is not required to convert a model file.
         output_model_table : string, dict or CAS table, optional
             Specifies the CAS table to store the deep learning model.
             Default : None
@@ -272,7 +285,15 @@ class Model(object):
         input_weights_file : string, optional
             A fully specified client side path to the HDF5 file that stores the keras model weights.
             Only effective when include_weights=True.
-            If None is given, the current weights in the keras model will be used.
+            If None is given, the current weights in the keras model (or the
+            weights stored in the keras model file) will be used.
+            Default : None
+        cache : bool or :class:`dlpy.model_conversion.conversion_cache.ConversionCache`, optional
+            Specifies the cache of converted models, keyed by the keras model
+            configuration and weights files.  The current weights of a keras
+            model object are not cached.  The weights are written to the
+            cache instead of the current directory.  True selects the cache
+            in the default directory.
             Default : None
 
         Returns
@@ -281,7 +302,9 @@ class Model(object):
 
         '''
 
-        from .model_conversion.sas_keras_parse import keras_to_sas
+        from .model_conversion.conversion_cache import as_conversion_cache
+        from .model_conversion.model_spec import build_model_table
+        from .model_conversion.sas_keras_parse import keras_to_layers
         if output_model_table is None:
             output_model_table = dict(name=random_name('caffe_model', 6))
 
@@ -292,26 +315,53 @@ class Model(object):
 
         model_name = model_table_opts['name']
 
-        output_code = keras_to_sas(model=keras_model, model_name=model_name)
-        exec(output_code)
-        temp_name = conn
-        exec('sas_model_gen(temp_name)')
-        input_model_table = conn.CASTable(**model_table_opts)
+        keras_file = None
+        if isinstance(keras_model, six.string_types):
+            keras_file = keras_model
+        temp_HDF5 = os.path.join(os.getcwd(), '{}_weights.kerasmodel.h5'.format(model_name))
+
+        def convert(weights_file=temp_HDF5):
+            source = keras_model
+            if keras_file is not None:
+                from .model_conversion.keras_h5 import read_keras_h5
+                source = read_keras_h5(keras_file)
+            layers = keras_to_layers(source)
+            if include_weights:
+                from .model_conversion.write_keras_model_parm import (
+                    write_keras_hdf5, write_keras_hdf5_from_file, write_keras_hdf5_from_h5)
+                if keras_file is not None:
+                    write_keras_hdf5_from_h5(source, input_weights_file or keras_file,
+                                             weights_file)
+                elif input_weights_file is None:
+                    write_keras_hdf5(source, weights_file)
+                else:
+                    write_keras_hdf5_from_file(source, input_weights_file, weights_file)
+            return layers
+
+        cache = as_conversion_cache(cache)
+        if keras_file is None and include_weights and input_weights_file is None:
+            # the current weights of a keras model are not addressable by content
+            cache = None
+        if cache is None:
+            layers = convert()
+        else:
+            options = dict(include_weights=include_weights)
+            if keras_file is None:
+                options['config'] = keras_model.to_json()
+            layers, temp_HDF5 = cache.convert('keras', [keras_file, input_weights_file],
+                                              convert, include_weights, **options)
+        input_model_table = build_model_table(conn, model_table_opts, layers)
         model = cls.from_table(input_model_table=input_model_table)
 
         if include_weights:
-            from .model_conversion.write_keras_model_parm import write_keras_hdf5, write_keras_hdf5_from_file
-            temp_HDF5 = os.path.join(os.getcwd(), '{}_weights.kerasmodel.h5'.format(model_name))
-            if input_weights_file is None:
-                write_keras_hdf5(keras_model, temp_HDF5)
-            else:
-                write_keras_hdf5_from_file(keras_model, input_weights_file, temp_HDF5)
             print('NOTE: the model weights has been stored in the following file:\n'
                   '{}'.format(temp_HDF5))
         return model
 
     def _retrieve_(self, _name_, message_level='error', **kwargs):
-        return self.conn.retrieve(_name_, _messagelevel=message_level, **kwargs)
+        return traced_call(_name_, kwargs,
+                           lambda: self.conn.retrieve(_name_, _messagelevel=message_level,
+                                                      **kwargs))
 
     def load(self, path, display_note=True):
         '''
@@ -399,16 +449,29 @@ class Model(object):
                                                 caslib=cas_lib_name,
                                                 includeDirectories=False).FileInfo.Name)
 
+        weights_file = None
         if (_file_name_ + '_weights' + _extension_) in _file_name_list_:
-            print('NOTE: ' + _file_name_ + '_weights' + _extension_ +
-                  ' is used as model weigths.')
+            weights_file = _file_name_ + '_weights' + _extension_
+            print('NOTE: ' + weights_file + ' is used as model weigths.')
 
             self._retrieve_('table.loadtable',
                             caslib=cas_lib_name,
-                            path=_file_name_ + '_weights' + _extension_,
+                            path=weights_file,
                             casout=dict(replace=True, name=self.model_name + '_weights'))
             self.set_weights(self.model_name + '_weights')
+        elif (_file_name_ + '_weights_packed' + _extension_) in _file_name_list_:
+            weights_file = _file_name_ + '_weights_packed' + _extension_
+            print('NOTE: ' + weights_file + ' is used as model weigths.')
 
+            self._retrieve_('table.loadtable',
+                            caslib=cas_lib_name,
+                            path=weights_file,
+                            casout=dict(replace=True,
+                                        name=self.model_name + '_weights_packed'))
+            self.set_weights_from_packed(self.model_name + '_weights_packed')
+            self._retrieve_('table.droptable', name=self.model_name + '_weights_packed')
+
+        if weights_file is not None:
             if (_file_name_ + '_weights_attr' + _extension_) in _file_name_list_:
                 print('NOTE: ' + _file_name_ + '_weights_attr' + _extension_ +
                       ' is used as weigths attribute.')
@@ -440,9 +503,136 @@ class Model(object):
                             table=weight_tbl)
 
         self.model_weights = self.conn.CASTable(name=self.model_name + '_weights')
+        self.read_only = False
+        self.copy_on_write = False
         print('NOTE: Model weights attached successfully!')
 
-    def load_weights(self, path, **kwargs):
+    def share_weights(self, weight_tbl):
+        '''
+        Reference a weights table shared with other models, copy on write
+
+        The model scores with the shared table, which it never modifies:
+        the first training writes the trained weights to a table of its own
+        (<model name>_weights), starting from the shared weights.  The
+        shared table may hold the weights of some layers only, e.g. the
+        backbone of a model whose head is trained for a new task.
+
+        Parameters
+        ----------
+        weight_tbl : CASTable or string or dict
+            Specifies the shared weights table.
+
+        '''
+        self.model_weights = self.conn.CASTable(**input_table_check(weight_tbl))
+        self.read_only = True
+        self.copy_on_write = True
+
+    def get_weights(self, chunk_size=1 << 20):
+        '''
+        Return the weights of the model as NumPy arrays
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Specifies the number of weights fetched by each action.
+            Default : 1048576
+
+        Returns
+        -------
+        OrderedDict
+            Layer names --> list of numpy arrays, see
+            :mod:`dlpy.weights_arrays` for the arrays of each layer type
+
+        '''
+        from .weights_arrays import fetch_weights
+        if self.model_weights is None:
+            raise ValueError('The model has no weights.')
+        return fetch_weights(self.conn, self.model_weights, self.layers,
+                             chunk_size=chunk_size)
+
+    def set_weights_from_arrays(self, weights):
+        '''
+        Assign weights held in NumPy arrays to the Model object
+
+        Parameters
+        ----------
+        weights : dict
+            Specifies the arrays of each layer with weights, keyed by layer
+            name, in the structure returned by :meth:`get_weights`.
+
+        '''
+        from .weights_arrays import weights_frame
+        frame = weights_frame(self.layers, weights)
+        upload_dataframe(self.conn, frame, self.model_name + '_weights', nrecs=10000)
+        self.set_weights(self.model_name + '_weights')
+
+    def to_packed_weights(self, casout=None, chunk_size=None, dtype='float64'):
+        '''
+        Copy the weights of the model to a table in the packed format
+
+        The packed table holds one varbinary blob per chunk of the weights
+        of a layer, instead of one row per weight, see
+        :mod:`dlpy.weights_arrays`.  The rows of the weights table are
+        fetched and packed by the client, and the packed table is uploaded.
+
+        Parameters
+        ----------
+        casout : string or dict, optional
+            Specifies the packed table.
+            Default : <model name>_weights_packed
+        chunk_size : int, optional
+            Specifies the number of weights in each blob.
+            Default : 65536
+        dtype : string, optional
+            Specifies the precision of the stored weights, 'float16',
+            'float32' or 'float64'.  With less than double precision, the
+            largest error of each layer is kept in the
+            weights_precision_report attribute.
+            Default : 'float64'
+
+        Returns
+        -------
+        :class:`CASTable`
+
+        '''
+        from .weights_arrays import (fetch_rows, pack_weights, precision_report,
+                                     PACKED_CHUNK_SIZE)
+        if casout is None:
+            casout = dict(name=self.model_name + '_weights_packed')
+        frame = fetch_rows(self.conn, self.model_weights)
+        packed = pack_weights(frame, chunk_size or PACKED_CHUNK_SIZE, dtype=dtype)
+        if np.dtype(dtype) != np.float64:
+            report = precision_report(frame, dtype)
+            report.insert(1, 'layer', [self.layers[int(layer_id)].name
+                                       for layer_id in report['_LayerID_']])
+            self.weights_precision_report = report
+            worst = report.loc[report['max_abs_error'].idxmax()]
+            print('NOTE: Weights stored as {}, the largest error is {:.3g} (layer {}).'
+                  .format(np.dtype(dtype).name, worst['max_abs_error'], worst['layer']))
+        return upload_dataframe(self.conn, packed, casout, binary_columns=['_Blob_'],
+                                nrecs=16)
+
+    def set_weights_from_packed(self, packed_tbl):
+        '''
+        Assign weights stored in the packed format to the Model object
+
+        The packed table is fetched and unpacked by the client, and the
+        weights are uploaded, as doubles, in the row format read by the deep
+        learning actions.
+
+        Parameters
+        ----------
+        packed_tbl : CASTable or string or dict
+            Specifies the packed weights table, see :meth:`to_packed_weights`.
+
+        '''
+        from .weights_arrays import unpack_weights
+        packed = self.conn.CASTable(**input_table_check(packed_tbl)).to_frame()
+        upload_dataframe(self.conn, unpack_weights(packed), self.model_name + '_weights',
+                         nrecs=10000)
+        self.set_weights(self.model_name + '_weights')
+
+    def load_weights(self, path, upload=False, **kwargs):
         '''
         Load the weights form a data file specified by ‘path’
 
@@ -451,6 +641,13 @@ class Model(object):
         path : string
             Specifies the server-side directory of the file that
             contains the weight table.
+        upload : bool, optional
+            Specifies that `path` is a client-side HDF5 file, which is read
+            by the client and streamed into the weights table, instead of
+            being copied to the server first.  Additional keyword arguments
+            (chunk_size, resume and progress) are passed to
+            :func:`dlpy.weights_upload.load_uploaded_weights`.
+            Default : False
 
         Notes
         -----
@@ -459,7 +656,13 @@ class Model(object):
         '''
 
         dir_name, file_name = os.path.split(path)
-        if file_name.lower().endswith('.sashdat'):
+        if upload:
+            from .weights_upload import load_uploaded_weights
+            if not file_name.lower().endswith('.h5'):
+                raise ValueError('Only HDF5 weights files (caffemodel.h5 or '
+                                 'kerasmodel.h5) can be uploaded.')
+            load_uploaded_weights(self, path, **kwargs)
+        elif file_name.lower().endswith('.sashdat'):
             self.load_weights_from_table(path)
         elif file_name.lower().endswith('caffemodel.h5'):
             self.load_weights_from_caffe(path, **kwargs)
@@ -628,9 +831,10 @@ class Model(object):
         ----------
         data : CASTable or string or dict
             Specifies the CAS table containing the training data for the model
-        inputs : string, optional
+        inputs : string or list of strings, optional
             Specifies the variable name of in the input_tbl, that is the
-            input of the deep learning model.
+            input of the deep learning model, or the numeric variables
+            making up the input.
             Default : '_image_'
         target : string, optional
             Specifies the variable name of in the input_tbl, that is the
@@ -667,8 +871,10 @@ class Model(object):
         if target not in input_table.columninfo().ColumnInfo.Column.tolist():
             raise ValueError('Column name "{}" not found in the data table.'.format(target))
 
-        if inputs not in input_table.columninfo().ColumnInfo.Column.tolist():
-            raise ValueError('Column name "{}" not found in the data table.'.format(inputs))
+        for column in inputs if isinstance(inputs, list) else [inputs]:
+            if column not in input_table.columninfo().ColumnInfo.Column.tolist():
+                raise ValueError('Column name "{}" not found in the data table.'
+                                 .format(column))
 
         if optimizer is None:
             optimizer = dict(algorithm=dict(learningrate=lr),
@@ -696,14 +902,23 @@ class Model(object):
         else:
             raise TypeError('optimizer should be a dictionary of optimization options.')
 
+        if self.read_only and not self.copy_on_write:
+            raise ValueError('The model is attached to shared weights and is read-only. '
+                             'Use set_weights to make a session copy of the weights '
+                             'before training.')
+
         max_epochs = optimizer['maxepochs']
 
+        model_weights = self.model_weights
+        if self.copy_on_write:
+            model_weights = self.conn.CASTable(self.model_name + '_weights')
+
         train_options = dict(model=self.model_table,
                              table=input_tbl_opts,
                              inputs=inputs,
                              target=target,
                              modelWeights=dict(replace=True,
-                                               **self.model_weights.to_table_params()),
+                                               **model_weights.to_table_params()),
                              optimizer=optimizer)
         train_options = unify_keys(train_options)
         try:
@@ -721,6 +936,12 @@ class Model(object):
 
         r = self._retrieve_('deeplearn.dltrain', message_level='note', **train_options)
 
+        # a failed training keeps the shared weights
+        if self.copy_on_write and r.severity <= 1:
+            self.model_weights = model_weights
+            self.read_only = False
+            self.copy_on_write = False
+
         try:
             temp = r.OptIterHistory
             temp.Epoch += 1  # Epochs should start from 1
@@ -797,9 +1018,11 @@ class Model(object):
 
         Parameters
         ----------
-        data : ImageTable or string or dict
+        data : ImageTable or string or dict, or in-memory images
             Specifies the ImageTable containing the validating data
-            for the prediction
+            for the prediction.  Images held by the client (bytes of image
+            files, numpy arrays, PIL images, or a list of them) are uploaded
+            with :meth:`ImageTable.from_images` and scored without labels.
         inputs : string, optional
             Specifies the variable name of in the data, that is the input
             of the deep learning model.
@@ -817,9 +1040,15 @@ class Model(object):
         :class:`CASResults`
 
         '''
+        temp_input = None
+        if is_in_memory_image(data):
+            temp_input = ImageTable.from_images(self.conn, data)
+            data = temp_input
+
         input_tbl_opts = input_table_check(data)
         input_table = self.conn.CASTable(**input_tbl_opts)
-        if target not in input_table.columninfo().ColumnInfo.Column.tolist():
+        has_target = target in input_table.columninfo().ColumnInfo.Column.tolist()
+        if not has_target and temp_input is None:
             raise ValueError('Column name "{}" not found in the data table.'.format(target))
 
         if inputs not in input_table.columninfo().ColumnInfo.Column.tolist():
@@ -828,7 +1057,7 @@ class Model(object):
         input_table = self.conn.CASTable(**input_tbl_opts)
         copy_vars = input_table.columns.tolist()
 
-        valid_res_tbl = random_name('Valid_Res')
+        valid_res_tbl = temp_table_name(self.conn, 'Valid_Res')
         dlscore_options = dict(model=self.model_table, initweights=self.model_weights,
                                table=input_table,
                                copyvars=copy_vars,
@@ -845,9 +1074,15 @@ class Model(object):
 
         res = self._retrieve_('deeplearn.dlscore', **dlscore_options)
 
+        if temp_input is not None:
+            self._retrieve_('table.droptable', **temp_input.to_table_params())
+
         self.valid_score = res.ScoreInfo
-        self.valid_conf_mat = self.conn.crosstab(
-            table=valid_res_tbl, row=target, col='I_' + target)
+        if has_target:
+            self.valid_conf_mat = self._retrieve_('simple.crosstab', table=valid_res_tbl,
+                                                  row=target, col='I_' + target)
+        else:
+            self.valid_conf_mat = None
 
         temp_tbl = self.conn.CASTable(valid_res_tbl)
         self.valid_res_tbl = temp_tbl
@@ -950,7 +1185,7 @@ class Model(object):
 
         input_tbl = input_table_check(data)
 
-        feature_maps_tbl = random_name('Feature_Maps') + '_{}'.format(image_id)
+        feature_maps_tbl = temp_table_name(self.conn, 'Feature_Maps_{}'.format(image_id))
         score_options = dict(model=self.model_table, initWeights=self.model_weights,
                              table=dict(where='{}="{}"'.format(uid_name,
                                                                uid_value), **input_tbl),
@@ -1001,7 +1236,7 @@ class Model(object):
         if target not in input_table.columninfo().ColumnInfo.Column.tolist():
             raise ValueError('Column name "{}" not found in the data table.'.format(target))
 
-        feature_tbl = random_name('Features')
+        feature_tbl = temp_table_name(self.conn, 'Features')
         score_options = dict(model=self.model_table, initWeights=self.model_weights,
                              table=dict(**input_tbl_opts),
                              layerOut=dict(name=feature_tbl),
@@ -1014,8 +1249,54 @@ class Model(object):
         self._retrieve_('deeplearn.dlscore', **score_options)
         x = self.conn.CASTable(feature_tbl).as_matrix()
         y = self.conn.CASTable(**input_tbl_opts)[target].as_matrix().ravel()
+        self._retrieve_('table.droptable', name=feature_tbl)
+        forget_temp_table(self.conn, feature_tbl)
         return x, y
 
+    def fit_head(self, head, data, layer, id_column='_id_', target='_label_',
+                 refresh=False, **kwargs):
+        '''
+        Train a head model on the cached features of a frozen backbone
+
+        The model is scored once per data table and weights, with the
+        activations of layer written to a feature table (see
+        :mod:`dlpy.feature_cache`), and the head model is trained on the
+        feature table.  Heads trained on the same data and layer share
+        the feature table.
+
+        Parameters
+        ----------
+        head : Model
+            Specifies the head model.  Its input layer takes the
+            activations of layer, e.g. InputLayer(n_features, 1, 1).
+        data : CASTable or string or dict
+            Specifies the table containing the image data.
+        layer : string
+            Specifies the name of the cut layer.
+        id_column : string, optional
+            Specifies the column identifying the images.
+            Default : '_id_'
+        target : string, optional
+            Specifies the name of the column including the response variable.
+            Default : '_label_'
+        refresh : bool, optional
+            Specifies whether to score the backbone even if the feature
+            table exists.
+            Default : False
+        **kwargs : keyword arguments, optional
+            Specifies the optional arguments for :meth:`Model.fit` of the
+            head model.
+
+        Returns
+        -------
+        :class:`CASResults`
+
+        '''
+        from .feature_cache import cache_features, fit_head
+        features = cache_features(self, data, layer, id_column=id_column, target=target,
+                                  refresh=refresh)
+        return fit_head(head, features, target=target, **kwargs)
+
 
     def heat_map_analysis(self, data=None, mask_width=None, mask_height=None, step_size=None,
                            display=True, img_type='A', image_id=None, filename=None, inputs="_image_",
@@ -1081,7 +1362,7 @@ class Model(object):
             input_table = self.conn.CASTable(**input_tbl_opts)
             copy_vars = input_table.columns.tolist()
 
-            valid_res_tbl_com = random_name('Valid_Res_Complete')
+            valid_res_tbl_com = temp_table_name(self.conn, 'Valid_Res_Complete')
             dlscore_options_com = dict(model=self.model_table, initweights=self.model_weights,
                                        table=input_table,
                                        copyvars=copy_vars,
@@ -1111,7 +1392,7 @@ class Model(object):
             raise ValueError('Input table is empty.')
 
 
-        im_summary = data._retrieve('image.summarizeimages')['Summary']
+        im_summary = data._retrieve('image.summarizeimages')['Summary'].iloc[0]
         output_width = int(im_summary.minWidth)
         output_height = int(im_summary.minHeight)
 
@@ -1133,7 +1414,7 @@ class Model(object):
         # Used on calculating probs for masked images only need imageTable columns
         copy_vars = ImageTable.from_table(data).columns.tolist()
 
-        masked_image_table = random_name('MASKED_IMG')
+        masked_image_table = temp_table_name(self.conn, 'MASKED_IMG')
         blocksize = image_blocksize(output_width, output_height)
 
         #   if image_id does not exist but filename does, create image_id from filename
@@ -1160,9 +1441,11 @@ class Model(object):
                 raise ValueError('image_id not found in the table')
 
         # if data was passed in, run predict, otherwise predict has been run using model.predict()
+        scored_tbl = None
         if run_predict:
             print("Running prediction ...")
             data = get_predictions(data)
+            scored_tbl = data.to_table_params()['name']
             print("... finished running prediction")
 
             # filter on M / C on scored data
@@ -1183,6 +1466,7 @@ class Model(object):
 
         # get max_display number of random images
         # do not want to use two_way_split because converts to imagetable and lose columns
+        sample_tbl = None
         if data.numrows().numrows > max_display:
             print('NOTE: The number of images in the table is too large,'
                   ' only {} randomly selected images are used in analysis.'.format(max_display))
@@ -1190,9 +1474,9 @@ class Model(object):
             te_rate = max_display / data.numrows().numrows * 100
 
             if not self.conn.queryactionset('sampling')['sampling']:
-                self.conn.loadactionset('sampling', _messagelevel='error')
+                self._retrieve_('builtins.loadactionset', actionSet='sampling')
 
-            sample_tbl = random_name('SAMPLE_TBL')
+            sample_tbl = temp_table_name(self.conn, 'SAMPLE_TBL')
             self._retrieve_('sampling.srs',
                             table=data.to_table_params(),
                             output=dict(casout=dict(replace=True, name=sample_tbl,
@@ -1222,7 +1506,7 @@ class Model(object):
         #     print("head masked_tbl ", masked_image_table.head())
 
         copy_vars.remove('_image_')
-        valid_res_tbl = random_name('Valid_Res')
+        valid_res_tbl = temp_table_name(self.conn, 'Valid_Res')
         dlscore_options = dict(model=self.model_table, initWeights=self.model_weights,
                                table=masked_image_table,
                                copyVars=copy_vars,
@@ -1238,34 +1522,7 @@ class Model(object):
 
         # brings to client but now down to a few images and we need to display
         temp_table = valid_res_tbl.to_frame()
-        # _parentId_ column is automatically added during dlscore based on _id_ column
-        image_id_list = temp_table['_parentId_'].unique().tolist()
-        n_masks = len(temp_table['_id_'].unique())
-
-        # setup heatmap image
-        prob_tensor = np.empty((output_width, output_height, n_masks))
-        prob_tensor[:] = np.nan
-        model_explain_table = dict()
-        count_for_subject = dict()
-
-        for name in image_id_list:
-            model_explain_table.update({'{}'.format(name): prob_tensor.copy()})
-            count_for_subject.update({'{}'.format(name): 0})
-
-        for row in temp_table.iterrows():
-            row = row[1]
-            name = str(row['_parentId_'])
-            x = int(row['x'])
-            y = int(row['y'])
-            x_step = int(row['width'])
-            y_step = int(row['height'])
-            true_class = row['_label_'].replace(' ', '_')
-            true_pred_prob_col = 'P__label_' + true_class
-            prob = row[true_pred_prob_col]
-            model_explain_table[name][y:min(y + y_step, output_height),
-            x:min(x + x_step, output_width),
-            count_for_subject[name]] = prob
-            count_for_subject[name] += 1
+        model_explain_table = heat_map_tensors(temp_table, output_width, output_height)
 
         original_image_table = data.fetchimages(fetchVars=data.columns.tolist(),
                                                 to=data.numrows().numrows).Images
@@ -1295,8 +1552,11 @@ class Model(object):
 
             output_table.append(temp_dict)
 
-        self._retrieve_('table.droptable', name=masked_image_table)
-        self._retrieve_('table.droptable', name=valid_res_tbl)
+        for name in [masked_image_table.to_table_params()['name'],
+                     valid_res_tbl.to_table_params()['name'], scored_tbl, sample_tbl]:
+            if name is not None:
+                self._retrieve_('table.droptable', name=name)
+                forget_temp_table(self.conn, name)
 
         output_table = pd.DataFrame(output_table)
         self.model_explain_table = output_table
@@ -1306,6 +1566,8 @@ class Model(object):
             if n_images > max_display:
                 print('NOTE: Only the results from the first {} images are displayed.'.format(max_display))
                 n_images = max_display
+            import matplotlib.pyplot as plt
+            import matplotlib.patches as patches
             fig, axs = plt.subplots(ncols=3, nrows=n_images, figsize=(12, 4 * n_images))
             if n_images == 1:
                 axs = [axs]
@@ -1396,6 +1658,7 @@ class Model(object):
 
         vmin = heat_map.min()
         vmax = heat_map.max()
+        import matplotlib.pyplot as plt
         fig, (ax0, ax2, ax1) = plt.subplots(ncols=3, figsize=(12, 4))
         ax0.imshow(img, extent=extent)
         ax0.axis('off')
@@ -1431,7 +1694,7 @@ class Model(object):
 
         '''
         if not self.conn.queryactionset('astore')['astore']:
-            self.conn.loadactionset('astore', _messagelevel='error')
+            self._retrieve_('builtins.loadactionset', actionSet='astore')
 
         CAS_tbl_name = self.model_name + '_astore'
 
@@ -1458,7 +1721,90 @@ class Model(object):
             file.write(model_astore['blob'])
         print('NOTE: Model astore file saved successfully.')
 
-    def save_to_table(self, path):
+    def to_onnx(self):
+        '''
+        Generate the ONNX graph of the model and its weights
+
+        Returns
+        -------
+        :class:`dlpy.model_conversion.write_onnx_model.OnnxModel`
+
+        '''
+        from .model_conversion.write_onnx_model import sas_to_onnx
+        weights = self.conn.CASTable(**self.model_weights.to_table_params()).to_frame()
+        return sas_to_onnx(self.layers, weights, self.model_name)
+
+    def save_to_onnx(self, path=None):
+        '''
+        Save the model to an ONNX file, for local CPU runtimes
+
+        The input of the ONNX model is a batch of images of shape
+        (N, channels, height, width), with the channels in BGR order as the
+        server decodes them.  The scaling and offsets of the input layer are
+        part of the graph.
+
+        Parameters
+        ----------
+        path: string, optional
+            Specifies the client-side directory to store the ONNX file.
+            Default : the current directory
+
+        Returns
+        -------
+        :class:`dlpy.model_conversion.write_onnx_model.OnnxModel`
+
+        '''
+        onnx_model = self.to_onnx()
+        if path is None:
+            path = os.getcwd()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        file_name = os.path.join(path, self.model_name + '.onnx')
+        onnx_model.save(file_name)
+        print('NOTE: Model ONNX file saved successfully.')
+        return onnx_model
+
+    def check_onnx_parity(self, images, onnx_model=None, rtol=1e-3, atol=1e-5):
+        '''
+        Compare the ONNX export of the model with the scores of the server
+
+        The images are scored with :meth:`predict` and with the ONNX model
+        (with onnxruntime when it is installed, with numpy otherwise).
+
+        Parameters
+        ----------
+        images : list of numpy arrays
+            Specifies RGB images of shape (height, width, channels), of the
+            size of the input layer.
+        onnx_model : :class:`dlpy.model_conversion.write_onnx_model.OnnxModel`, optional
+            Specifies the exported model.
+            Default : the result of :meth:`to_onnx`
+        rtol, atol : double, optional
+            Specifies the relative and absolute tolerances.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            Maximum absolute difference, and whether the outputs match, per image
+
+        '''
+        from .model_conversion.write_onnx_model import onnx_parity
+        if onnx_model is None:
+            onnx_model = self.to_onnx()
+        self.predict(list(images))
+        scores = self.valid_res_tbl.to_frame().sort_values('_id_')
+        probabilities = scores[[column for column in scores.columns
+                                if column.startswith('P__label_')]]
+        # the server decodes the images in BGR order
+        batch = np.stack([np.asarray(image) for image in images])[..., ::-1]
+        report = onnx_parity(onnx_model, batch.transpose(0, 3, 1, 2), probabilities.values,
+                             rtol=rtol, atol=atol)
+        print('NOTE: {} of {} images match the ONNX outputs (maximum difference: {:.3g}).'
+              .format(int(report['match'].sum()), len(report),
+                      report['max_abs_diff'].max()))
+        return report
+
+    def save_to_table(self, path, packed=False, dtype='float64'):
         '''
         Save the model as SAS dataset
 
@@ -1466,6 +1812,18 @@ class Model(object):
         ----------
         path : string
             Specifies the server-side path to store the model tables.
+        packed : bool, optional
+            Specifies whether to save the weights in the packed format
+            (<model name>_weights_packed.sashdat), see
+            :meth:`to_packed_weights`.  :meth:`load` reads both formats.
+            Default : False
+        dtype : string, optional
+            Specifies the precision of the saved weights, 'float16',
+            'float32' or 'float64'.  Lower precisions imply packed=True, and
+            the largest error of each layer is kept in the
+            weights_precision_report attribute.  The weights are upcast to
+            doubles when the model is loaded.
+            Default : 'float64'
 
         '''
         dir_name, file_name = os.path.split(path)
@@ -1489,11 +1847,19 @@ class Model(object):
                         table=self.model_table,
                         name=model_tbl_file,
                         replace=True, caslib=cas_lib_name)
-        self._retrieve_('table.save',
-                        table=self.model_weights,
-                        name=weight_tbl_file,
-                        replace=True, caslib=cas_lib_name)
-        CAS_tbl_name = random_name('Attr_Tbl')
+        if packed or np.dtype(dtype) != np.float64:
+            packed_tbl = self.to_packed_weights(dtype=dtype)
+            self._retrieve_('table.save',
+                            table=packed_tbl,
+                            name=_file_name_ + '_weights_packed' + _extension_,
+                            replace=True, caslib=cas_lib_name)
+            self._retrieve_('table.droptable', **packed_tbl.to_table_params())
+        else:
+            self._retrieve_('table.save',
+                            table=self.model_weights,
+                            name=weight_tbl_file,
+                            replace=True, caslib=cas_lib_name)
+        CAS_tbl_name = temp_table_name(self.conn, 'Attr_Tbl')
         self._retrieve_('table.attribute',
                         task='convert', attrtable=CAS_tbl_name,
                         **self.model_weights.to_table_params())
@@ -1501,6 +1867,8 @@ class Model(object):
                         table=CAS_tbl_name,
                         name=attr_tbl_file,
                         replace=True, caslib=cas_lib_name)
+        self._retrieve_('table.droptable', name=CAS_tbl_name)
+        forget_temp_table(self.conn, CAS_tbl_name)
         if not flag:
             self._retrieve_('table.dropcaslib', caslib=cas_lib_name)
         print('NOTE: Model table saved successfully.')
@@ -1512,23 +1880,27 @@ class Model(object):
         Parameters
         ----------
         path : string
-            Specifies the server-side path to store the model tables or astore
+            Specifies the server-side path to store the model tables or astore,
+            or the client-side path of the ONNX file
         output_format : string, optional
             Specifies the format of the deployed model
-            Supported format: astore or castable
+            Supported format: astore, castable or onnx
             Default : astore
 
         Notes
         -----
-        Currently, this function only supports sashdat and astore formats.
+        Currently, this function only supports sashdat, astore and onnx formats.
 
         '''
         if output_format.lower() == 'astore':
             self.save_to_astore(path=path, **kwargs)
         elif output_format.lower() in ('castable', 'table'):
             self.save_to_table(path=path)
+        elif output_format.lower() == 'onnx':
+            self.save_to_onnx(path=path)
         else:
-            raise ValueError('output_format must be "astore", "castable" or "table"')
+            raise ValueError('output_format must be "astore", "castable", "table" '
+                             'or "onnx"')
 
     def count_params(self):
         ''' Count the total number of parameters in the model '''
@@ -1636,6 +2008,7 @@ class FeatureMaps(object):
         n_col = min(n_images, 8)
         n_row = int(np.ceil(n_images / n_col))
 
+        import matplotlib.pyplot as plt
         fig = plt.figure(figsize=(16, 16 // n_col * n_row))
         title = 'Activation Maps for Layer_{}'.format(layer_id)
 
@@ -1643,9 +2016,8 @@ class FeatureMaps(object):
             image = []
             for i in range(3):
                 col_name = '_LayerAct_{}_IMG_{}_'.format(layer_id, i)
-                temp = self.conn.retrieve('image.fetchimages', _messagelevel='error',
-                                          table=self.tbl,
-                                          image=col_name).Images.Image[0]
+                temp = checked_call(self.conn, 'image.fetchimages', table=self.tbl,
+                                    image=col_name).Images.Image[0]
                 image.append(np.asarray(temp))
             image = np.dstack((image[2], image[1], image[0]))
             plt.imshow(image)
@@ -1654,9 +2026,8 @@ class FeatureMaps(object):
             for i in range(n_images):
                 filter_num = filter_id[i]
                 col_name = '_LayerAct_{}_IMG_{}_'.format(layer_id, filter_num)
-                image = self.conn.retrieve('image.fetchimages', _messagelevel='error',
-                                           table=self.tbl,
-                                           image=col_name).Images.Image[0]
+                image = checked_call(self.conn, 'image.fetchimages', table=self.tbl,
+                                     image=col_name).Images.Image[0]
                 image = np.asarray(image)
                 fig.add_subplot(n_row, n_col, i + 1)
                 plt.imshow(image, cmap='gray')
@@ -1665,6 +2036,60 @@ class FeatureMaps(object):
             plt.suptitle(title, fontsize=20)
 
 
+def heat_map_tensors(scores, output_width, output_height):
+    '''
+    Compute the heat map tensors from the scores of the masked images
+
+    Parameters
+    ----------
+    scores : pandas.DataFrame
+        Specifies the scored masked images, with the columns '_parentId_',
+        '_id_', '_label_', 'x', 'y', 'width', 'height' and the predicted
+        probabilities 'P__label_<class>'.
+    output_width : int
+        Specifies the width of the images.
+    output_height : int
+        Specifies the height of the images.
+
+    Returns
+    -------
+    dict
+        Maps the id of each image to the array of the probabilities of
+        the true class, one slice per mask.
+
+    '''
+    # _parentId_ column is automatically added during dlscore based on _id_ column
+    image_id_list = scores['_parentId_'].unique().tolist()
+    n_masks = len(scores['_id_'].unique())
+
+    # setup heatmap image
+    prob_tensor = np.empty((output_width, output_height, n_masks))
+    prob_tensor[:] = np.nan
+    model_explain_table = dict()
+    count_for_subject = dict()
+
+    for name in image_id_list:
+        model_explain_table.update({'{}'.format(name): prob_tensor.copy()})
+        count_for_subject.update({'{}'.format(name): 0})
+
+    for row in scores.iterrows():
+        row = row[1]
+        name = str(row['_parentId_'])
+        x = int(row['x'])
+        y = int(row['y'])
+        x_step = int(row['width'])
+        y_step = int(row['height'])
+        true_class = row['_label_'].replace(' ', '_')
+        true_pred_prob_col = 'P__label_' + true_class
+        prob = row[true_pred_prob_col]
+        model_explain_table[name][y:min(y + y_step, output_height),
+        x:min(x + x_step, output_width),
+        count_for_subject[name]] = prob
+        count_for_subject[name] += 1
+
+    return model_explain_table
+
+
 def get_num_configs(keys, layer_type_prefix, layer_table):
     '''
     Extract the numerical options from the model table
@@ -1999,6 +2424,56 @@ def extract_output_layer(layer_table):
     return layer
 
 
+def extract_layers(model_table):
+    '''
+    Extract the layers, and their connections, from a model table
+
+    Parameters
+    ----------
+    model_table : pandas.DataFrame
+        Specifies the content of the CAS table that defines the deep
+        learning model.
+
+    Returns
+    -------
+    list of :class:`Layer`
+
+    '''
+    layers = []
+    for layer_id in range(int(model_table['_DLLayerID_'].max()) + 1):
+        layer_table = model_table[model_table['_DLLayerID_'] == layer_id]
+        layertype = layer_table['_DLNumVal_'][layer_table['_DLKey1_'] ==
+                                              'layertype'].tolist()[0]
+        if layertype == 1:
+            layers.append(extract_input_layer(layer_table=layer_table))
+        elif layertype == 2:
+            layers.append(extract_conv_layer(layer_table=layer_table))
+        elif layertype == 3:
+            layers.append(extract_pooling_layer(layer_table=layer_table))
+        elif layertype == 4:
+            layers.append(extract_fc_layer(layer_table=layer_table))
+        elif layertype == 5:
+            layers.append(extract_output_layer(layer_table=layer_table))
+        elif layertype == 8:
+            layers.append(extract_batchnorm_layer(layer_table=layer_table))
+        elif layertype == 9:
+            layers.append(extract_residual_layer(layer_table=layer_table))
+    conn_mat = model_table[['_DLNumVal_', '_DLLayerID_']][
+        model_table['_DLKey1_'].str.contains('srclayers')].sort_values('_DLLayerID_')
+    layer_id_list = conn_mat['_DLLayerID_'].tolist()
+    src_layer_id_list = conn_mat['_DLNumVal_'].tolist()
+
+    for row_id in range(conn_mat.shape[0]):
+        layer_id = int(layer_id_list[row_id])
+        src_layer_id = int(src_layer_id_list[row_id])
+        if layers[layer_id].src_layers is None:
+            layers[layer_id].src_layers = [layers[src_layer_id]]
+        else:
+            layers[layer_id].src_layers.append(layers[src_layer_id])
+
+    return layers
+
+
 def layer_to_node(layer):
     '''
     Convert layer configuration to a node in the model graph
@@ -2029,7 +2504,7 @@ def layer_to_node(layer):
         if 'pool' in layer.config:
             content_dict['<Act>Pooling:'] = layer.activation
 
-    if layer.type_name is not 'Input':
+    if layer.type_name != 'Input':
         title_col = '<Output>Output Size:}|'
         value_col = '{}'.format(layer.output_size) + '}'
 
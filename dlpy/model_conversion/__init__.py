@@ -15,5 +15,29 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-from .sas_keras_parse import keras_to_sas
-# from .sas_caffe_parse import caffe_to_sas
+'''
+Conversion of Caffe and Keras models
+
+The converters are imported on first use, so that the Caffe conversion
+does not require Keras and the reverse.
+
+'''
+
+import importlib
+import sys
+
+_CONVERTERS = {'keras_to_sas': 'sas_keras_parse',
+               'keras_to_layers': 'sas_keras_parse',
+               'caffe_to_sas': 'sas_caffe_parse',
+               'caffe_to_layers': 'sas_caffe_parse'}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _CONVERTERS:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+        module = importlib.import_module('.' + _CONVERTERS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+else:
+    from .sas_keras_parse import keras_to_sas, keras_to_layers
@@ -0,0 +1,545 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Reading of Caffe network definitions and weights without Caffe
+
+The network definition (*.prototxt) is parsed from the protobuf text
+format and the weights (*.caffemodel) are read from the protobuf wire
+format, layer by layer, using the subset of caffe.proto needed by the
+conversion.  Neither pycaffe nor protobuf are required.
+
+'''
+
+import re
+import struct
+
+import numpy as np
+import six
+
+TRAIN = 0
+TEST = 1
+
+_ENUMS = {
+    'Phase': {'TRAIN': 0, 'TEST': 1},
+    'PoolMethod': {'MAX': 0, 'AVE': 1, 'STOCHASTIC': 2},
+    'EltwiseOp': {'PROD': 0, 'SUM': 1, 'MAX': 2},
+    'Engine': {'DEFAULT': 0, 'CAFFE': 1, 'CUDNN': 2},
+    'VarianceNorm': {'FAN_IN': 0, 'FAN_OUT': 1, 'AVERAGE': 2},
+}
+
+# subset of caffe.proto --> keep in sync with caffe.proto
+# field name: (field number, type, repeated, default)
+_SCHEMA = {
+    'NetParameter': {
+        'name': (1, 'string', False, ''),
+        'layers': (2, 'V1LayerParameter', True, None),
+        'input': (3, 'string', True, None),
+        'input_dim': (4, 'int32', True, None),
+        'input_shape': (8, 'BlobShape', True, None),
+        'layer': (100, 'LayerParameter', True, None),
+    },
+    'V1LayerParameter': {
+        'bottom': (2, 'string', True, None),
+        'top': (3, 'string', True, None),
+        'name': (4, 'string', False, ''),
+        'blobs': (6, 'BlobProto', True, None),
+    },
+    'BlobShape': {
+        'dim': (1, 'int64', True, None),
+    },
+    'BlobProto': {
+        'num': (1, 'int32', False, 0),
+        'channels': (2, 'int32', False, 0),
+        'height': (3, 'int32', False, 0),
+        'width': (4, 'int32', False, 0),
+        'data': (5, 'float', True, None),
+        'diff': (6, 'float', True, None),
+        'shape': (7, 'BlobShape', False, None),
+        'double_data': (8, 'double', True, None),
+        'double_diff': (9, 'double', True, None),
+    },
+    'NetStateRule': {
+        'phase': (1, 'Phase', False, TRAIN),
+        'min_level': (2, 'int32', False, 0),
+        'max_level': (3, 'int32', False, 0),
+        'stage': (4, 'string', True, None),
+        'not_stage': (5, 'string', True, None),
+    },
+    'LayerParameter': {
+        'name': (1, 'string', False, ''),
+        'type': (2, 'string', False, ''),
+        'bottom': (3, 'string', True, None),
+        'top': (4, 'string', True, None),
+        'loss_weight': (5, 'float', True, None),
+        'blobs': (7, 'BlobProto', True, None),
+        'include': (8, 'NetStateRule', True, None),
+        'exclude': (9, 'NetStateRule', True, None),
+        'phase': (10, 'Phase', False, TRAIN),
+        'transform_param': (100, 'TransformationParameter', False, None),
+        'convolution_param': (106, 'ConvolutionParameter', False, None),
+        'dropout_param': (108, 'DropoutParameter', False, None),
+        'eltwise_param': (110, 'EltwiseParameter', False, None),
+        'inner_product_param': (117, 'InnerProductParameter', False, None),
+        'memory_data_param': (119, 'MemoryDataParameter', False, None),
+        'pooling_param': (121, 'PoolingParameter', False, None),
+        'relu_param': (123, 'ReLUParameter', False, None),
+        'batch_norm_param': (139, 'BatchNormParameter', False, None),
+        'scale_param': (142, 'ScaleParameter', False, None),
+        'input_param': (143, 'InputParameter', False, None),
+    },
+    'TransformationParameter': {
+        'scale': (1, 'float', False, 1.0),
+        'mirror': (2, 'bool', False, False),
+        'crop_size': (3, 'uint32', False, 0),
+        'mean_file': (4, 'string', False, ''),
+        'mean_value': (5, 'float', True, None),
+        'force_color': (6, 'bool', False, False),
+        'force_gray': (7, 'bool', False, False),
+    },
+    'FillerParameter': {
+        'type': (1, 'string', False, 'constant'),
+        'value': (2, 'float', False, 0.0),
+        'min': (3, 'float', False, 0.0),
+        'max': (4, 'float', False, 1.0),
+        'mean': (5, 'float', False, 0.0),
+        'std': (6, 'float', False, 1.0),
+        'sparse': (7, 'int32', False, -1),
+        'variance_norm': (8, 'VarianceNorm', False, 0),
+    },
+    'ConvolutionParameter': {
+        'num_output': (1, 'uint32', False, 0),
+        'bias_term': (2, 'bool', False, True),
+        'pad': (3, 'uint32', True, None),
+        'kernel_size': (4, 'uint32', True, None),
+        'group': (5, 'uint32', False, 1),
+        'stride': (6, 'uint32', True, None),
+        'weight_filler': (7, 'FillerParameter', False, None),
+        'bias_filler': (8, 'FillerParameter', False, None),
+        'pad_h': (9, 'uint32', False, 0),
+        'pad_w': (10, 'uint32', False, 0),
+        'kernel_h': (11, 'uint32', False, 0),
+        'kernel_w': (12, 'uint32', False, 0),
+        'stride_h': (13, 'uint32', False, 0),
+        'stride_w': (14, 'uint32', False, 0),
+        'engine': (15, 'Engine', False, 0),
+        'axis': (16, 'int32', False, 1),
+        'force_nd_im2col': (17, 'bool', False, False),
+        'dilation': (18, 'uint32', True, None),
+    },
+    'PoolingParameter': {
+        'pool': (1, 'PoolMethod', False, 0),
+        'kernel_size': (2, 'uint32', False, 0),
+        'stride': (3, 'uint32', False, 1),
+        'pad': (4, 'uint32', False, 0),
+        'kernel_h': (5, 'uint32', False, 0),
+        'kernel_w': (6, 'uint32', False, 0),
+        'stride_h': (7, 'uint32', False, 0),
+        'stride_w': (8, 'uint32', False, 0),
+        'pad_h': (9, 'uint32', False, 0),
+        'pad_w': (10, 'uint32', False, 0),
+        'engine': (11, 'Engine', False, 0),
+        'global_pooling': (12, 'bool', False, False),
+    },
+    'InnerProductParameter': {
+        'num_output': (1, 'uint32', False, 0),
+        'bias_term': (2, 'bool', False, True),
+        'weight_filler': (3, 'FillerParameter', False, None),
+        'bias_filler': (4, 'FillerParameter', False, None),
+        'axis': (5, 'int32', False, 1),
+        'transpose': (6, 'bool', False, False),
+    },
+    'EltwiseParameter': {
+        'operation': (1, 'EltwiseOp', False, 1),
+        'coeff': (2, 'float', True, None),
+        'stable_product_grad': (3, 'bool', False, True),
+    },
+    'DropoutParameter': {
+        'dropout_ratio': (1, 'float', False, 0.5),
+    },
+    'MemoryDataParameter': {
+        'batch_size': (1, 'uint32', False, 0),
+        'channels': (2, 'uint32', False, 0),
+        'height': (3, 'uint32', False, 0),
+        'width': (4, 'uint32', False, 0),
+    },
+    'ReLUParameter': {
+        'negative_slope': (1, 'float', False, 0.0),
+        'engine': (2, 'Engine', False, 0),
+    },
+    'BatchNormParameter': {
+        'use_global_stats': (1, 'bool', False, False),
+        'moving_average_fraction': (2, 'float', False, 0.999),
+        'eps': (3, 'float', False, 1e-5),
+    },
+    'ScaleParameter': {
+        'axis': (1, 'int32', False, 1),
+        'num_axes': (2, 'int32', False, 1),
+        'filler': (3, 'FillerParameter', False, None),
+        'bias_term': (4, 'bool', False, False),
+        'bias_filler': (5, 'FillerParameter', False, None),
+    },
+    'InputParameter': {
+        'shape': (1, 'BlobShape', True, None),
+    },
+}
+
+
+class CaffeProtoError(ValueError):
+    '''
+    Used to indicate an error in reading a Caffe file
+
+    '''
+
+
+class Message(object):
+    '''
+    Caffe protobuf message
+
+    The fields behave as in the protobuf generated classes: unset fields
+    have their default value, unset message fields an empty message and
+    unset repeated fields an empty list.  Fields that are not part of
+    the supported subset of caffe.proto raise an AttributeError.
+
+    Parameters
+    ----------
+    message_type : string
+        Name of the message in caffe.proto, None for unknown messages.
+
+    '''
+
+    def __init__(self, message_type=None):
+        self.__dict__['_type'] = message_type
+        self.__dict__['_values'] = {}
+
+    def _field(self, name):
+        return _SCHEMA.get(self._type, {}).get(name)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        values = self.__dict__['_values']
+        if name in values:
+            return values[name]
+        field = self._field(name)
+        if field is None:
+            raise AttributeError('{} has no field "{}"'.format(self._type, name))
+        number, field_type, repeated, default = field
+        if repeated:
+            return []
+        if field_type in _SCHEMA:
+            return Message(field_type)
+        return default
+
+    def __setattr__(self, name, value):
+        self._values[name] = value
+
+    def HasField(self, name):
+        ''' Whether the field is set '''
+        return name in self._values
+
+    def __repr__(self):
+        return '{}({})'.format(self._type, ', '.join('{}={!r}'.format(key, value)
+                                                     for key, value in self._values.items()))
+
+
+_TOKEN = re.compile(r'''\s*(?:(\#[^\n]*)|("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')'''
+                    r'''|([{}<>:\[\],;])|([^\s{}<>:\[\],;"'\#]+))''')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise CaffeProtoError('Unexpected character at position {}: {!r}'
+                                  .format(pos, text[pos:pos + 20]))
+        pos = match.end()
+        if match.group(1) is None:
+            tokens.append(match.group(2) or match.group(3) or match.group(4))
+    return tokens
+
+
+def _scalar(token, field_type):
+    try:
+        if token[0] in '"\'':
+            return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)),
+                          token[1:-1])
+        if field_type in ('float', 'double'):
+            return float(token.rstrip('fF'))
+        if field_type == 'bool':
+            return token.lower() in ('true', 't', '1')
+        if field_type in _ENUMS:
+            if token in _ENUMS[field_type]:
+                return _ENUMS[field_type][token]
+            return int(token)
+        if field_type in ('int32', 'int64', 'uint32', 'uint64'):
+            return int(token, 0)
+    except ValueError:
+        raise CaffeProtoError('Invalid {} value: {}'.format(field_type, token))
+    return token
+
+
+class _TextParser(object):
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise CaffeProtoError('Unexpected end of the network definition')
+        self.pos += 1
+        return token
+
+    def message(self, msg, end=None):
+        while self.peek() != end:
+            name = self.next()
+            field = msg._field(name)
+            field_type = field[1] if field is not None else None
+            if self.peek() == ':':
+                self.next()
+            if self.peek() == '[':
+                self.next()
+                values = []
+                while self.peek() != ']':
+                    values.append(self.value(field_type))
+                    if self.peek() == ',':
+                        self.next()
+                self.next()
+            else:
+                values = [self.value(field_type)]
+            if self.peek() in (',', ';'):
+                self.next()
+            if field is None:
+                continue
+            if field[2]:
+                if not msg.HasField(name):
+                    setattr(msg, name, [])
+                getattr(msg, name).extend(values)
+            else:
+                setattr(msg, name, values[-1])
+        return msg
+
+    def value(self, field_type):
+        token = self.next()
+        if token in ('{', '<'):
+            sub = Message(field_type if field_type in _SCHEMA else None)
+            self.message(sub, end='}' if token == '{' else '>')
+            self.next()
+            return sub
+        return _scalar(token, field_type)
+
+
+def parse_prototxt(text, message_type='NetParameter'):
+    '''
+    Parse a message in protobuf text format
+
+    Parameters
+    ----------
+    text : string
+       Message in text format, e.g. the content of a *.prototxt file.
+    message_type : string, optional
+       Message name in caffe.proto.
+
+    Returns
+    -------
+    :class:`Message`
+
+    '''
+    return _TextParser(text).message(Message(message_type))
+
+
+def read_prototxt(file_name):
+    '''
+    Read a Caffe network definition file
+
+    Parameters
+    ----------
+    file_name : string
+       Fully qualified file name of network definition file (*.prototxt).
+
+    Returns
+    -------
+    :class:`Message`
+        The NetParameter message
+
+    '''
+    with open(file_name, 'r') as f:
+        return parse_prototxt(f.read())
+
+
+def _varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = six.indexbytes(buf, pos)
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf, start, end):
+    ''' (field number, wire type, value) of the fields of an encoded message '''
+    pos = start
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _varint(buf, pos)
+        elif wire_type == 1:
+            value = (pos, 8)
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _varint(buf, pos)
+            value = (pos, length)
+            pos += length
+        elif wire_type == 5:
+            value = (pos, 4)
+            pos += 4
+        else:
+            raise CaffeProtoError('Unsupported wire type {}'.format(wire_type))
+        yield number, wire_type, value
+
+
+def _packed(buf, wire_type, value, dtype):
+    start, length = value
+    return np.frombuffer(buf, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                         offset=start)
+
+
+def _blob(buf, start, end):
+    ''' Values of an encoded BlobProto message, with their shape '''
+    data = []
+    double_data = []
+    dims = []
+    legacy = [0, 0, 0, 0]
+    for number, wire_type, value in _fields(buf, start, end):
+        if number == 5:
+            data.append(_packed(buf, wire_type, value, '<f4'))
+        elif number == 8:
+            double_data.append(_packed(buf, wire_type, value, '<f8'))
+        elif number == 7:
+            for dim_number, dim_wire_type, dim in _fields(buf, value[0], value[0] + value[1]):
+                if dim_number != 1:
+                    continue
+                if dim_wire_type == 0:
+                    dims.append(dim)
+                else:
+                    pos = dim[0]
+                    while pos < dim[0] + dim[1]:
+                        item, pos = _varint(buf, pos)
+                        dims.append(item)
+        elif 1 <= number <= 4 and wire_type == 0:
+            legacy[number - 1] = value
+
+    parts = data or double_data
+    if not parts:
+        values = np.zeros(0, dtype='float32')
+    elif len(parts) == 1:
+        values = parts[0]
+    else:
+        values = np.concatenate(parts)
+
+    if not dims and any(legacy):
+        dims = legacy
+    if dims and int(np.prod(dims)) == values.size:
+        values = values.reshape(dims)
+    return values
+
+
+def iter_caffemodel_blobs(file_name, layer_names=None):
+    '''
+    Read the parameter blobs of a Caffe weights file, layer by layer
+
+    Only the layer being returned is held in memory.  Both the current
+    (layer) and the V1 (layers) formats are supported.
+
+    Parameters
+    ----------
+    file_name : string
+       Fully qualified file name of network parameter file (*.caffemodel).
+    layer_names : set of strings, optional
+       Names of the layers to return.  Default: all layers with parameters
+
+    Returns
+    -------
+    generator of (string, list of numpy arrays)
+        Layer name and parameter blobs, in file order
+
+    '''
+    with open(file_name, 'rb') as f:
+        while True:
+            key = _read_varint(f)
+            if key is None:
+                return
+            number, wire_type = key >> 3, key & 7
+            if wire_type == 0:
+                _read_varint(f)
+                continue
+            if wire_type in (1, 5):
+                f.seek(8 if wire_type == 1 else 4, 1)
+                continue
+            if wire_type != 2:
+                raise CaffeProtoError('Unsupported wire type {} in {}'
+                                      .format(wire_type, file_name))
+            length = _read_varint(f)
+            if number not in (2, 100):
+                f.seek(length, 1)
+                continue
+
+            buf = f.read(length)
+            if len(buf) != length:
+                raise CaffeProtoError('Truncated weights file ' + file_name)
+            name_number, blobs_number = (4, 6) if number == 2 else (1, 7)
+            name = None
+            blobs = []
+            for field, field_wire_type, value in _fields(buf, 0, length):
+                if field == name_number:
+                    name = buf[value[0]:value[0] + value[1]].decode('utf-8')
+                elif field == blobs_number and field_wire_type == 2:
+                    blobs.append(_blob(buf, value[0], value[0] + value[1]))
+            if blobs and (layer_names is None or name in layer_names):
+                yield name, blobs
+
+
+def _read_varint(f):
+    result = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            if shift:
+                raise CaffeProtoError('Truncated weights file')
+            return None
+        byte = struct.unpack('B', byte)[0]
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result
+        shift += 7
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Content-addressed cache of converted Caffe and Keras models '''
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# bump when the output of the converters changes
+CACHE_VERSION = 1
+
+# conversion options that do not change the result
+_IGNORED_OPTIONS = ('verbose',)
+
+
+def _entry_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class ConversionCache(object):
+    '''
+    Cache of converted models, keyed by the content of the model files
+
+    An entry holds the layer definitions of a converted model and, if the
+    weights were converted, the SAS-compatible weights file.  Entries are
+    stored in a directory per key, so that several processes can share the
+    cache.  When the total size of the entries exceeds max_size, the least
+    recently used entries are removed.
+
+    Parameters
+    ----------
+    path : string, optional
+        Specifies the directory of the cache.
+        Default : ~/.cache/dlpy/conversion
+    max_size : int, optional
+        Specifies the maximum size of the cache, in bytes.
+        Default : 4 GB
+
+    Returns
+    -------
+    :class:`ConversionCache`
+
+    '''
+
+    def __init__(self, path=None, max_size=4 << 30):
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'dlpy', 'conversion')
+        self.path = path
+        self.max_size = max_size
+        self._file_hashes = {}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def file_hash(self, file_name):
+        '''
+        Return the SHA-256 digest of the content of a file
+
+        Digests are remembered for the lifetime of the cache object, as long
+        as the size and modification time of the file do not change.
+
+        '''
+        stat = os.stat(file_name)
+        memo_key = (os.path.abspath(file_name), stat.st_size, stat.st_mtime)
+        if memo_key not in self._file_hashes:
+            digest = hashlib.sha256()
+            with open(file_name, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._file_hashes[memo_key] = digest.hexdigest()
+        return self._file_hashes[memo_key]
+
+    def key(self, kind, files, **options):
+        '''
+        Return the cache key of a conversion
+
+        Parameters
+        ----------
+        kind : string
+            Specifies the converter, e.g. 'caffe' or 'keras'.
+        files : list of strings
+            Specifies the model files, None entries are allowed.
+        **options : keyword arguments, optional
+            Specifies the conversion options.  The options that do not
+            change the result, such as verbose, are not part of the key.
+
+        Returns
+        -------
+        string
+
+        '''
+        options = dict((name, value) for name, value in options.items()
+                       if name not in _IGNORED_OPTIONS)
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_VERSION, kind, options], sort_keys=True,
+                                 default=str).encode('utf8'))
+        for file_name in files:
+            digest.update(b'\0' + (self.file_hash(file_name).encode('utf8')
+                                   if file_name is not None else b'-'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        '''
+        Return the layer definitions and weights file of a cached conversion
+
+        Returns
+        -------
+        (list of dicts, string or None), or None if the key is not cached
+
+        '''
+        entry = os.path.join(self.path, key)
+        try:
+            with open(os.path.join(entry, 'layers.json')) as f:
+                layers = json.load(f)
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError):
+            return None
+        weights_files = [name for name in os.listdir(entry) if name.endswith('.h5')]
+        weights_file = os.path.join(entry, weights_files[0]) if weights_files else None
+        return layers, weights_file
+
+    def put(self, key, layers, weights_file=None):
+        '''
+        Store the layer definitions and weights file of a conversion
+
+        Parameters
+        ----------
+        key : string
+            Specifies the cache key, see :meth:`key`.
+        layers : list of dicts
+            Specifies the layer definitions.
+        weights_file : string, optional
+            Specifies the SAS-compatible weights file, copied into the
+            cache under its base name.
+
+        Raises
+        ------
+        TypeError
+            If the layer definitions are not serializable
+
+        '''
+        tmp = tempfile.mkdtemp(dir=self.path, prefix='.tmp')
+        try:
+            if weights_file is not None:
+                shutil.copyfile(weights_file,
+                                os.path.join(tmp, os.path.basename(weights_file)))
+            self._store(key, tmp, layers)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _store(self, key, tmp, layers):
+        ''' Move a temporary directory holding the weights file into the cache '''
+        # raises TypeError if the layer definitions are not serializable
+        text = json.dumps(layers)
+        with open(os.path.join(tmp, 'layers.json'), 'w') as f:
+            f.write(text)
+        try:
+            os.rename(tmp, os.path.join(self.path, key))
+        except OSError:
+            # another process stored the same conversion first
+            pass
+        self.evict(keep=key)
+
+    def entries(self):
+        '''
+        Return the cached entries, least recently used first
+
+        Returns
+        -------
+        list of (string, int)
+            Keys and sizes in bytes
+
+        '''
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                entries.append((os.path.getmtime(entry), name, _entry_size(entry)))
+            except OSError:
+                continue
+        return [(name, size) for _, name, size in sorted(entries)]
+
+    def evict(self, keep=None):
+        ''' Remove the least recently used entries until the cache fits max_size '''
+        entries = self.entries()
+        total = sum(size for _, size in entries)
+        for name, size in entries:
+            if total <= self.max_size:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        ''' Remove all entries '''
+        for name, _ in self.entries():
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def convert(self, kind, files, convert, weights=False, **options):
+        '''
+        Return the layer definitions and weights file of a conversion
+
+        The conversion runs on a cache miss only.  The weights are written
+        into the cache directly, and the cached weights file is returned,
+        so that no copy of the weights is made.
+
+        Parameters
+        ----------
+        kind : string
+            Specifies the converter, e.g. 'caffe' or 'keras'.
+        files : list of strings
+            Specifies the model files the conversion reads.
+        convert : callable
+            Specifies the conversion.  It is called with the name of the
+            file the weights are written to (None when weights is False),
+            and returns the layer definitions.
+        weights : bool, optional
+            Specifies whether the conversion writes weights.
+            Default : False
+        **options : keyword arguments, optional
+            Specifies the conversion options.
+
+        Returns
+        -------
+        (list of dicts, string or None)
+            The layer definitions, and the cached weights file
+
+        '''
+        key = self.key(kind, files, **options)
+        cached = self.get(key)
+        if cached is not None and (cached[1] is not None or not weights):
+            return cached
+
+        tmp = tempfile.mkdtemp(dir=self.path, prefix='.tmp')
+        try:
+            # named after the converter, e.g. weights.caffemodel.h5, as
+            # Model.load_weights selects the format by the file name
+            layers = convert(os.path.join(tmp, 'weights.{}model.h5'.format(kind))
+                             if weights else None)
+            self._store(key, tmp, layers)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        cached = self.get(key)
+        if cached is None:
+            raise IOError('The conversion could not be stored in the cache "{}".'
+                          .format(self.path))
+        return cached
+
+
+def as_conversion_cache(cache):
+    '''
+    Return the conversion cache given to a converter
+
+    Parameters
+    ----------
+    cache : bool or :class:`ConversionCache`
+        True for a cache in the default directory, False or None for no
+        cache.
+
+    Returns
+    -------
+    :class:`ConversionCache` or None
+
+    '''
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ConversionCache()
+    return cache
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Reading of Keras HDF5 model files without Keras
+
+The model configuration (the model_config attribute written by
+Model.save) is turned into stand-ins of the Keras model and layer objects
+that provide what the conversion uses: the layer class names, get_config,
+the inbound and outbound nodes and the input shapes.  The weights are read
+with h5py, layer by layer.
+
+'''
+
+import json
+
+import h5py
+import numpy as np
+import six
+
+from .sas_keras_parse import KerasParseError
+
+_LAYER_CLASSES = {}
+
+
+def _text(value):
+    ''' Decode an HDF5 string attribute '''
+    if isinstance(value, bytes):
+        return value.decode('utf8')
+    return value
+
+
+def _pair(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return (value, value)
+
+
+class KerasNode(object):
+    ''' Stand-in of a Keras node, only its configuration is provided '''
+
+    def __init__(self, **config):
+        self.config = config
+
+    def get_config(self):
+        return self.config
+
+
+class KerasH5Layer(object):
+    '''
+    Stand-in of a Keras layer read from a model configuration
+
+    Instances are created through :func:`make_layer`, so that the class
+    name of each layer is that of the Keras layer it stands for.
+
+    '''
+
+    def __init__(self, config):
+        self.name = config['name']
+        self._config = config
+        self._inbound_nodes = []
+        self._outbound_nodes = []
+        self.input_shape = None
+        self.output_shape = None
+
+    def get_config(self):
+        return self._config
+
+
+def make_layer(class_name, config):
+    '''
+    Create the stand-in of a Keras layer
+
+    Parameters
+    ----------
+    class_name : string
+       Keras layer class, e.g. 'Conv2D'
+    config : dict
+       Layer configuration
+
+    Returns
+    -------
+    :class:`KerasH5Layer`
+
+    '''
+    if class_name not in _LAYER_CLASSES:
+        _LAYER_CLASSES[class_name] = type(str(class_name), (KerasH5Layer,), {})
+    config = dict(config)
+    if 'batch_shape' in config and 'batch_input_shape' not in config:
+        config['batch_input_shape'] = config['batch_shape']
+    return _LAYER_CLASSES[class_name](config)
+
+
+class KerasH5Model(object):
+    '''
+    Stand-in of a Keras model read from a Keras HDF5 model file
+
+    Attributes
+    ----------
+    name : string
+        Name of the Keras model
+    layers : list of :class:`KerasH5Layer`
+        Layers, in topological order
+    image_data_format : string
+        'channels_last' or 'channels_first'
+
+    '''
+
+    def __init__(self, name, layers, image_data_format='channels_last'):
+        self.name = name
+        self.layers = layers
+        self.image_data_format = image_data_format
+        self._layers = dict((layer.name, layer) for layer in layers)
+
+    def get_layer(self, name=None):
+        if name not in self._layers:
+            raise KerasParseError('No such layer: ' + str(name))
+        return self._layers[name]
+
+
+def _inbound_layer_names(node):
+    ''' Names of the layers of a serialized node (Keras 2 lists or Keras 3 dicts) '''
+    if isinstance(node, dict):
+        if 'keras_history' in node:
+            return [node['keras_history'][0]]
+        names = []
+        for value in node.values():
+            names.extend(_inbound_layer_names(value))
+        return names
+    if isinstance(node, (list, tuple)):
+        if node and isinstance(node[0], six.string_types):
+            return [node[0]]
+        names = []
+        for value in node:
+            names.extend(_inbound_layer_names(value))
+        return names
+    return []
+
+
+def _output_shape(layer, input_shapes, image_data_format):
+    ''' Output shape of a layer (without the batch dimension), None if unknown '''
+    class_name = layer.__class__.__name__.lower()
+    config = layer.get_config()
+    if class_name == 'inputlayer':
+        return tuple(config['batch_input_shape'][1:])
+    if not input_shapes or input_shapes[0] is None:
+        return None
+    shape = input_shapes[0]
+    if class_name in ['conv2d', 'maxpooling2d', 'averagepooling2d']:
+        data_format = config.get('data_format') or image_data_format
+        if data_format == 'channels_first':
+            channels, spatial = shape[0], shape[1:]
+        else:
+            channels, spatial = shape[2], shape[:2]
+        if class_name == 'conv2d':
+            size = _pair(config['kernel_size'])
+            strides = _pair(config.get('strides') or 1)
+            dilation = _pair(config.get('dilation_rate') or 1)
+            size = [(k - 1) * d + 1 for k, d in zip(size, dilation)]
+            channels = config['filters']
+        else:
+            size = _pair(config['pool_size'])
+            strides = _pair(config.get('strides') or size)
+        if config.get('padding', 'valid') == 'same':
+            spatial = [-(-dim // s) for dim, s in zip(spatial, strides)]
+        else:
+            spatial = [(dim - k) // s + 1 for dim, k, s in zip(spatial, size, strides)]
+        if data_format == 'channels_first':
+            return (channels,) + tuple(spatial)
+        return tuple(spatial) + (channels,)
+    if class_name == 'flatten':
+        return (int(np.prod(shape)),)
+    if class_name == 'dense':
+        return tuple(shape[:-1]) + (config['units'],)
+    if class_name in ['activation', 'dropout', 'batchnormalization', 'add']:
+        return shape
+    return None
+
+
+def read_keras_h5(file_name):
+    '''
+    Read the model configuration of a Keras HDF5 model file
+
+    Parameters
+    ----------
+    file_name : string
+       Fully qualified file name of a model saved by the Keras Model.save
+       method.
+
+    Returns
+    -------
+    :class:`KerasH5Model`
+
+    '''
+    with h5py.File(file_name, 'r') as f:
+        if 'model_config' not in f.attrs:
+            raise KerasParseError('File ' + file_name + ' does not contain a '
+                                  'model configuration (saved with save_weights?)')
+        model_config = json.loads(_text(f.attrs['model_config']))
+        keras_version = _text(f.attrs.get('keras_version', '1'))
+    if keras_version.startswith('1'):
+        raise KerasParseError('Keras 1 model files are not supported')
+
+    class_name = model_config['class_name']
+    config = model_config['config']
+    if isinstance(config, list):
+        config = dict(layers=config)
+    layer_configs = config['layers']
+    sequential = class_name == 'Sequential'
+
+    layers = []
+    inbound = {}
+    for ii, layer_config in enumerate(layer_configs):
+        layer = make_layer(layer_config['class_name'], layer_config['config'])
+        if sequential:
+            if ii == 0 and layer_config['class_name'] != 'InputLayer':
+                # Keras creates an input layer named after the first layer
+                input_layer = make_layer('InputLayer', dict(
+                    name=layer.name + '_input',
+                    batch_input_shape=layer.get_config()['batch_input_shape']))
+                layers.append(input_layer)
+                inbound[input_layer.name] = []
+            inbound[layer.name] = [layers[-1].name] if layers else []
+        else:
+            inbound[layer.name] = _inbound_layer_names(layer_config.get('inbound_nodes', []))
+        layers.append(layer)
+    model = KerasH5Model(config.get('name', 'model'), layers)
+
+    # the image data format is a global Keras setting, take the one of the layers
+    for layer in layers:
+        data_format = layer.get_config().get('data_format')
+        if data_format:
+            model.image_data_format = data_format
+            break
+
+    for layer in layers:
+        names = inbound[layer.name]
+        layer._inbound_nodes.append(KerasNode(inbound_layers=names,
+                                              outbound_layer=layer.name))
+        for name in names:
+            model.get_layer(name)._outbound_nodes.append(
+                KerasNode(inbound_layers=names, outbound_layer=layer.name))
+        input_shapes = [model.get_layer(name).output_shape for name in names]
+        if input_shapes:
+            layer.input_shape = (None,) + input_shapes[0] if input_shapes[0] else None
+        layer.output_shape = _output_shape(layer, input_shapes, model.image_data_format)
+    return model
+
+
+def iter_keras_h5_weights(file_name, model):
+    '''
+    Read the weights of a Keras HDF5 model file, layer by layer
+
+    Parameters
+    ----------
+    file_name : string
+       Fully qualified file name of a Keras HDF5 model or weights file
+    model : :class:`KerasH5Model`
+       Model the weights belong to
+
+    Returns
+    -------
+    generator of (:class:`KerasH5Layer`, list of numpy arrays)
+        Layers with weights and their weights, in file order
+
+    '''
+    with h5py.File(file_name, 'r') as f:
+        root = f['model_weights'] if 'model_weights' in f else f
+        for name in root.attrs['layer_names']:
+            name = _text(name)
+            group = root[name]
+            weight_names = [_text(n) for n in group.attrs['weight_names']]
+            if weight_names:
+                yield model.get_layer(name), [group[n][()] for n in weight_names]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Structured layer definitions of converted models
+
+The Caffe and Keras parsers describe a model as a list of layer
+definitions, each a dict with the parameters of the deepLearn.addLayer
+action::
+
+    dict(name='conv1', layer=dict(type='convolution', nfilters=64, ...),
+         srclayers=['data'])
+
+:func:`build_model_table` creates the model table from such a list in a
+single action call.
+
+'''
+
+import numpy as np
+import six
+
+from ..tracing import traced_call
+from ..utils import input_table_check
+
+IMAGENET_OFFSETS = [103.939, 116.779, 123.68]
+
+
+def layer_spec(name, layer, srclayers=None):
+    '''
+    Define one layer of a converted model
+
+    Parameters
+    ----------
+    name : string
+        Specifies the name of the layer.
+    layer : dict
+        Specifies the layer options of the deepLearn.addLayer action.
+    srclayers : list of strings, optional
+        Specifies the names of the source layers.
+
+    Returns
+    -------
+    dict
+
+    '''
+    spec = dict(name=name, layer=dict(layer))
+    if srclayers:
+        spec['srclayers'] = list(srclayers)
+    return spec
+
+
+def prepare_layers(layers, input_crop_type=None, input_channel_offset=None):
+    '''
+    Apply the input options to the input layer of a layer list
+
+    Parameters
+    ----------
+    layers : list of dicts
+        Specifies the layer definitions, see :func:`layer_spec`.
+    input_crop_type : string, optional
+        Specifies the random cropping of the input layer, 'NONE' or 'UNIQUE'.
+        Default : 'NONE'
+    input_channel_offset : list of doubles, optional
+        Specifies the offsets of the input channels.  The ImageNet means
+        are used for three channel images when not specified.
+
+    Returns
+    -------
+    list of dicts
+
+    '''
+    if input_crop_type is None:
+        input_crop_type = 'NONE'
+    elif input_crop_type.upper() not in ('NONE', 'UNIQUE'):
+        raise ValueError('input_crop_type can only be NONE or UNIQUE')
+
+    out = []
+    for spec in layers:
+        if spec['layer'].get('type') == 'input':
+            layer = dict(spec['layer'], randomcrop=input_crop_type)
+            offsets = input_channel_offset
+            if offsets is None and layer.get('nchannels') == 3:
+                print('NOTE: setting channel mean values to ImageNet means')
+                offsets = IMAGENET_OFFSETS
+            if offsets is not None:
+                layer['offsets'] = list(offsets)
+            spec = dict(spec, layer=layer)
+        out.append(spec)
+    return out
+
+
+def _casl_value(value):
+    ''' CASL literal of a parameter value '''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, six.integer_types):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, six.string_types):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, dict):
+        return '{' + ', '.join('{}={}'.format(key, _casl_value(item))
+                               for key, item in sorted(value.items())
+                               if item is not None) + '}'
+    if isinstance(value, (list, tuple)):
+        return '{' + ', '.join(_casl_value(item) for item in value) + '}'
+    raise TypeError('Unable to convert {!r} to a CASL value'.format(value))
+
+
+def layers_to_casl(model_table, layers, model_type='CNN'):
+    '''
+    Generate the CASL program building a model from its layer definitions
+
+    Parameters
+    ----------
+    model_table : string, dict or CAS table
+        Specifies the CAS table to store the deep learning model.
+    layers : list of dicts
+        Specifies the layer definitions, see :func:`layer_spec`.
+    model_type : string, optional
+        Specifies the model type.
+        Default : 'CNN'
+
+    Returns
+    -------
+    string
+
+    '''
+    model_table = input_table_check(model_table)
+    statements = ['deepLearn.buildModel / model={} type={};'.format(
+        _casl_value(dict(model_table, replace=True)), _casl_value(model_type))]
+    for spec in layers:
+        params = dict(spec)
+        params['model'] = model_table
+        statements.append('deepLearn.addLayer / ' +
+                          ' '.join('{}={}'.format(key, _casl_value(value))
+                                   for key, value in sorted(params.items())) + ';')
+    return '\n'.join(statements)
+
+
+def _load_runcasl(conn):
+    ''' Whether CASL programs can be run in the session '''
+    if conn.has_action('sccasl.runcasl'):
+        return True
+    res = conn.retrieve('builtins.loadactionset', actionset='sccasl', _messagelevel='none')
+    return res.severity <= 1 and conn.has_action('sccasl.runcasl')
+
+
+def build_model_table(conn, model_table, layers, model_type='CNN',
+                      input_crop_type=None, input_channel_offset=None):
+    '''
+    Create a model table from a list of layer definitions
+
+    The model and all of its layers are created by one CASL program, so
+    that the number of action calls does not depend on the number of
+    layers.  One action call per layer is made if the sccasl action set
+    is not available.
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    model_table : string, dict or CAS table
+        Specifies the CAS table to store the deep learning model.
+    layers : list of dicts
+        Specifies the layer definitions, see :func:`layer_spec`.
+    model_type : string, optional
+        Specifies the model type.
+        Default : 'CNN'
+    input_crop_type : string, optional
+        Specifies the random cropping of the input layer, 'NONE' or 'UNIQUE'.
+        Default : 'NONE'
+    input_channel_offset : list of doubles, optional
+        Specifies the offsets of the input channels.  The ImageNet means
+        are used for three channel images when not specified.
+
+    Returns
+    -------
+    :class:`CASTable`
+
+    '''
+    model_table = input_table_check(model_table)
+    layers = prepare_layers(layers, input_crop_type, input_channel_offset)
+
+    if not conn.queryactionset('deepLearn')['deepLearn']:
+        conn.loadactionset(actionSet='deeplearn', _messagelevel='error')
+
+    def retrieve(_name_, **kwargs):
+        return traced_call(_name_, kwargs,
+                           lambda: conn.retrieve(_name_, _messagelevel='error', **kwargs))
+
+    def fail(res):
+        # Do not leave a partial model table behind
+        conn.retrieve('table.droptable', _messagelevel='none', quiet=True, **model_table)
+        raise ValueError('Unable to build the model "{}":\n{}'
+                         .format(model_table['name'], '\n'.join(res.messages)))
+
+    if _load_runcasl(conn):
+        res = retrieve('sccasl.runcasl', code=layers_to_casl(model_table, layers, model_type))
+        if res.severity > 1:
+            fail(res)
+    else:
+        res = retrieve('deeplearn.buildmodel', model=dict(model_table, replace=True),
+                       type=model_type)
+        if res.severity > 1:
+            fail(res)
+        for spec in layers:
+            res = retrieve('deeplearn.addlayer', model=model_table, **spec)
+            if res.severity > 1:
+                fail(res)
+
+    return conn.CASTable(**model_table)
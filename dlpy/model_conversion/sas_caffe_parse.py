@@ -21,17 +21,10 @@
 import os
 import sys
 
-import caffe
-import caffe.draw
-from caffe.proto import caffe_pb2
-from caffe.pycaffe import *
-from google.protobuf import text_format
-
-from .write_caffe_model_parm import write_caffe_hdf5
-from .write_sas_code import (write_input_layer, write_convolution_layer,
-                             write_batch_norm_layer, write_pooling_layer,
-                             write_residual_layer, write_full_connect_layer,
-                             write_main_entry)
+from .caffe_proto import TEST, read_prototxt, iter_caffemodel_blobs
+from .model_spec import layer_spec
+from .write_caffe_model_parm import write_caffe_blobs
+from .write_sas_code import write_model_code
 
 caffe_activation_types = ['relu', 'prelu', 'elu', 'sigmoid', 'tanh',
                           'softmax', 'softmaxwithloss']
@@ -46,183 +39,122 @@ class CaffeParseError(ValueError):
     '''
 
 
-def caffe_to_sas(network_file, model_name, network_param=None,
-                 phase=caffe.TEST, verbose=False):
+def caffe_to_layers(network_file, model_name, network_param=None,
+                    phase=TEST, verbose=False, compression=None, weights_file=None):
     '''
-    Generate a SAS deep learning model from Caffe definition
+    Generate the layer definitions of a SAS deep learning model from Caffe definition
 
     Parameters
     ----------
     network_file : string
        Fully qualified file name of network definition file (*.prototxt).
-    sas_file : string
-       Fully qualified file name of SAS deep learning Python model definition.
     model_name : string
        Name for deep learning model.
     network_param : string, optional
        Fully qualified file name of network parameter file (*.caffemodel).
+       The weights are streamed, layer by layer, to weights_file.
     phase : int, optional
-       One of {caffe.TRAIN, caffe.TEST, None}.
+       One of {caffe_proto.TRAIN, caffe_proto.TEST, None}.
     verbose : bool, optional
-       To view all Caffe information messages, set to True.
-
-    '''
+       To print the progress of the conversion, set to True.
+    compression : string, optional
+       None or 'gzip', compression of the weights file.
+    weights_file : string, optional
+       Fully qualified name of the SAS-compatible weights file.
+       Default : <model_name>_weights.h5 in the current directory
 
-    # open output file
-
-    try:
-        output_code = ''
-        # initialize Caffe logging facility
-        caffe.init_log(0, verbose)
+    Returns
+    -------
+    list of dicts
+        Layer definitions, see :func:`dlpy.model_conversion.model_spec.layer_spec`
+
+    '''
+
+    # read network definition
+    net = read_prototxt(network_file)
+
+    # identify common Caffe/SAS computation layers and their related layers
+    layer_list = make_composite_layers(net.layer, phase)
+    if verbose:
+        print('NOTE: ' + str(len(layer_list)) + ' computation layers found in ' +
+              network_file)
+
+    # loop over included layers
+    layers = []
+    for clayer in layer_list:
+        layer_type = clayer.layer_parm.type.lower()
+        if (layer_type == 'pooling'):  # average/max pooling
+            spec = caffe_pooling_layer(clayer)
+        elif (layer_type == 'convolution'):  # 2D convolution
+            spec = caffe_convolution_layer(clayer)
+        elif (layer_type == 'batchnorm'):  # batch normalization
+            spec = caffe_batch_normalization_layer(clayer)
+        elif (layer_type in ['data', 'memorydata']):  # input layer
+            spec = caffe_input_layer(clayer)
+        elif (layer_type == 'eltwise'):  # residual
+            spec = caffe_residual_layer(clayer)
+        elif (layer_type == 'innerproduct'):  # fully connected
+            spec = caffe_full_connect_layer(clayer)
+        else:
+            raise CaffeParseError(layer_type +
+                                  ' is an unsupported layer type')
 
-        # instantiate a model and read network parameters
-        if (network_param is None):
-            model = caffe.Net(network_file, phase)
+        if spec:
+            layers.append(spec)
         else:
-            model = caffe.Net(network_file, phase, weights=network_param)
-        net = caffe_pb2.NetParameter()
-        text_format.Merge(open(network_file + '.tmp').read(), net)
-
-        # remove temporary file created
-        if os.path.isfile(network_file + '.tmp'):
-            os.remove(network_file + '.tmp')
-
-        # identify common Caffe/SAS computation layers
-        layer_list = []
-        for layer in net.layer:
-            include_layer = False
-            if (len(layer.include) == 0):
-                include_layer = True
-            else:
-                for layer_phase in layer.include:
-                    if (caffe.TEST == layer_phase.phase):
-                        include_layer = True
-
-            # exclude layers not implemented (or implemented in a different fashion)
-            if (layer.type.lower() not in common_layers):
-                include_layer = False
-
-            if include_layer:
-                layer_list.append(make_composite_layer(layer))
-
-        # associate activations with computation layers
-        for layer in net.layer:
-            layer_type = layer.type.lower()
-            if (layer_type in ['relu', 'prelu', 'elu', 'sigmoid', 'tanh']):
-                layer_index = None
-                for ii in range(len(layer_list)):
-                    if (layer.top[0] == layer_list[ii].layer_parm.top[0]):
-                        layer_index = ii
-
-                if layer_index is not None:
-                    layer_list[layer_index].related_layers.append(layer)
-                else:
-                    raise CaffeParseError(
-                        'Activation layer ' + layer.name +
-                        ' is not associated with any computation layer.')
+            raise CaffeParseError(
+                'Unable to generate SAS definition for layer ' +
+                clayer.layer_parm.name)
 
-        # associate dropout with computation layers
-        for layer in net.layer:
-            layer_type = layer.type.lower()
-            if (layer_type == 'dropout'):
-                layer_index = None
-                for ii in range(len(layer_list)):
-                    if (layer.top[0] == layer_list[ii].layer_parm.top[0]):
-                        layer_index = ii
+    # convert from BINARYPROTO to HDF5
+    if network_param is not None:
+        sas_hdf5 = weights_file or os.path.join(os.getcwd(),
+                                                '{}_weights.h5'.format(model_name))
+        layer_names = set(layer.name for layer in net.layer)
+        write_caffe_blobs(iter_caffemodel_blobs(network_param, layer_names), layer_list,
+                          sas_hdf5, compression=compression)
+        if verbose:
+            print('NOTE: the model weights have been written to ' + sas_hdf5)
 
-                if layer_index is not None:
-                    layer_list[layer_index].related_layers.append(layer)
-                else:
-                    raise CaffeParseError(
-                        'Dropout layer ' + layer.name +
-                        ' is not associated with any computation layer.')
-
-        # associate softmax with a fully-connected layer
-        for layer in net.layer:
-            layer_type = layer.type.lower()
-            if (layer_type in ['softmax', 'softmaxwithloss']):
-                layer_index = None
-                for ii in range(len(layer_list)):
-                    for jj in range(len(layer.bottom)):
-                        if (layer.bottom[jj] == layer_list[ii].layer_parm.top[0]):
-                            layer_index = ii
-
-                if layer_index is not None:
-                    layer_list[layer_index].related_layers.append(layer)
-                else:
-                    raise CaffeParseError(
-                        'Softmax layer ' + layer.name +
-                        ' is not associated with any fully-connected layer.')
-
-        # determine source layer(s) for computation layers
-        for ii in range(len(layer_list)):
-            for kk in range(len(layer_list[ii].layer_parm.bottom)):
-                name = None
-                for jj in range(ii):
-                    if (layer_list[ii].layer_parm.bottom[kk] ==
-                            layer_list[jj].layer_parm.top[0]):
-                        name = layer_list[jj].layer_parm.name
-
-                if name:
-                    layer_list[ii].source_layer.append(name)
-
-        # associate scale layer with batchnorm layer
-        for layer in net.layer:
-            if (layer.type.lower() == 'scale'):
-                bn_found = False
-                for ii in range(len(layer_list)):
-                    if ((layer_list[ii].layer_parm.type.lower() == 'batchnorm') and
-                            (layer_list[ii].layer_parm.top[0] == layer.top[0])):
-                        layer_list[ii].related_layers.append(layer)
-                        bn_found = True
-                        break
-
-                if not bn_found:
-                    raise CaffeParseError(
-                        'Scale layer ' + layer.name +
-                        ' is not associated with a batch normalization layer')
-
-        # loop over included layers
-        for clayer in layer_list:
-            layer_type = clayer.layer_parm.type.lower()
-            if (layer_type == 'pooling'):  # average/max pooling
-                sas_code = caffe_pooling_layer(clayer, model_name)
-            elif (layer_type == 'convolution'):  # 2D convolution
-                sas_code = caffe_convolution_layer(clayer, model_name)
-            elif (layer_type == 'batchnorm'):  # batch normalization
-                sas_code = caffe_batch_normalization_layer(clayer, model_name)
-            elif (layer_type in ['data', 'memorydata']):  # input layer
-                sas_code = caffe_input_layer(clayer, model_name)
-            elif (layer_type == 'eltwise'):  # residual
-                sas_code = caffe_residual_layer(clayer, model_name)
-            elif (layer_type == 'innerproduct'):  # fully connected
-                sas_code = caffe_full_connect_layer(clayer, model_name)
-            else:
-                raise CaffeParseError(layer_type +
-                                      ' is an unsupported layer type')
+    return layers
 
-            # write SAS code associated with Caffe layer
-            if sas_code:
-                output_code = output_code + sas_code + '\n\n'
 
-            else:
-                raise CaffeParseError(
-                    'Unable to generate SAS definition for layer ' +
-                    clayer.layer_parm.name)
+def caffe_to_sas(network_file, model_name, network_param=None,
+                 phase=TEST, verbose=False):
+    '''
+    Generate Python code defining a SAS deep learning model from Caffe definition
 
-            # convert from BINARYPROTO to HDF5
-            if network_param is not None:
-                sas_hdf5 = os.path.join(os.getcwd(), '{}_weights.h5'.format(model_name))
-                write_caffe_hdf5(model, layer_list, sas_hdf5)
+    Parameters
+    ----------
+    network_file : string
+       Fully qualified file name of network definition file (*.prototxt).
+    model_name : string
+       Name for deep learning model.
+    network_param : string, optional
+       Fully qualified file name of network parameter file (*.caffemodel).
+    phase : int, optional
+       One of {caffe_proto.TRAIN, caffe_proto.TEST, None}.
+    verbose : bool, optional
+       To print the progress of the conversion, set to True.
+
+    Returns
+    -------
+    string
+        Python code defining the function sas_model_gen, see
+        :func:`dlpy.model_conversion.write_sas_code.write_model_code`
 
-        return output_code
+    '''
+    try:
+        layers = caffe_to_layers(network_file, model_name, network_param=network_param,
+                                 phase=phase, verbose=verbose)
+        return write_model_code(model_name, layers)
 
     except CaffeParseError as err_msg:
         print(err_msg)
 
 
-# parse parameters for pooling layer and generate equivalent SAS code
-def caffe_pooling_layer(clayer, model_name):
+# parse parameters for pooling layer and generate the equivalent SAS layer definition
+def caffe_pooling_layer(clayer):
     '''
     Extract pooling layer parameters from LayerParameter object
 
@@ -230,12 +162,12 @@ def caffe_pooling_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning pooling layer definition
+    dict
+        SAS deep learning pooling layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
@@ -258,46 +190,38 @@ def caffe_pooling_layer(clayer, model_name):
     # read pooling parameters
     pooling_param = getattr(layer_parm, 'pooling_param', None)
     if (pooling_param is not None):
-        for ii in range(len(dstruct)):
-            if (dstruct[ii]['repeated']):
-                code_str = (dstruct[ii]['field'] + '=extract_repeated_attr' +
-                            '(pooling_param,\'' + dstruct[ii]['field'] + '\')')
-            else:
-                code_str = (dstruct[ii]['field'] + '=extract_attr' +
-                            '(pooling_param,\'' + dstruct[ii]['field'] + '\')')
-
-            exec(code_str)
+        params = extract_params(pooling_param, dstruct)
     else:
         raise CaffeParseError('No pooling parameters given')
 
     # define parameters needed by SAS pooling layer
 
     # pooling type
-    if (pool == 0):
+    if (params['pool'] == 0):
         pool_type = 'max'
-    elif (pool == 1):
+    elif (params['pool'] == 1):
         pool_type = 'mean'
     else:
         raise CaffeParseError('Invalid pooling type specified for layer = ' +
                               layer_parm.name)
 
     # stride (vertical)
-    if (stride_h is not None) and (stride_h > 0):
-        tmp_stride_h = stride_h
+    if (params['stride_h'] is not None) and (params['stride_h'] > 0):
+        tmp_stride_h = params['stride_h']
     else:
-        if (stride is None) or (stride == 0):
+        if (params['stride'] is None) or (params['stride'] == 0):
             tmp_stride_h = 1
         else:
-            tmp_stride_h = stride
+            tmp_stride_h = params['stride']
 
     # stride (horizontal)
-    if (stride_w is not None) and (stride_w > 0):
-        tmp_stride_w = stride_w
+    if (params['stride_w'] is not None) and (params['stride_w'] > 0):
+        tmp_stride_w = params['stride_w']
     else:
-        if (stride is None) or (stride == 0):
+        if (params['stride'] is None) or (params['stride'] == 0):
             tmp_stride_w = 1
         else:
-            tmp_stride_w = stride
+            tmp_stride_w = params['stride']
 
     # horizontal/vertical stride must agree
     if (tmp_stride_w != tmp_stride_h):
@@ -307,24 +231,24 @@ def caffe_pooling_layer(clayer, model_name):
         common_stride = tmp_stride_w
 
     # height of kernel
-    if (kernel_h is not None) and (kernel_h > 0):
-        height = kernel_h
+    if (params['kernel_h'] is not None) and (params['kernel_h'] > 0):
+        height = params['kernel_h']
     else:
-        if (kernel_size is None):
+        if (params['kernel_size'] is None):
             raise CaffeParseError('Unable to set kernel height for layer = ' +
                                   layer_parm.name)
         else:
-            height = kernel_size
+            height = params['kernel_size']
 
     # width of kernel
-    if (kernel_w is not None) and (kernel_w > 0):
-        width = kernel_w
+    if (params['kernel_w'] is not None) and (params['kernel_w'] > 0):
+        width = params['kernel_w']
     else:
-        if (kernel_size is None):
+        if (params['kernel_size'] is None):
             raise CaffeParseError('Unable to set kernel width for layer = ' +
                                   layer_parm.name)
         else:
-            width = kernel_size
+            width = params['kernel_size']
 
     # determine dropout
     dropout = extract_dropout(clayer)
@@ -337,14 +261,14 @@ def caffe_pooling_layer(clayer, model_name):
         raise CaffeParseError('Pooling layer requires one input layer, ' +
                               str(num_layers) + ' provided')
 
-    return write_pooling_layer(model_name=model_name, layer_name=clayer.layer_parm.name,
-                               width=str(width), height=str(height),
-                               stride=str(common_stride), type=pool_type,
-                               dropout=str(dropout), src_layer=source_layer)
+    return layer_spec(clayer.layer_parm.name,
+                      dict(type='pooling', width=width, height=height,
+                           stride=common_stride, pool=pool_type, dropout=dropout),
+                      source_layer)
 
 
-# parse parameters for convolution layer and generate equivalent SAS code
-def caffe_convolution_layer(clayer, model_name):
+# parse parameters for convolution layer and generate the equivalent SAS layer definition
+def caffe_convolution_layer(clayer):
     '''
     Extract convolution layer parameters from LayerParameter object
 
@@ -352,12 +276,12 @@ def caffe_convolution_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning convolution layer definition
+    dict
+        SAS deep learning convolution layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
@@ -386,50 +310,39 @@ def caffe_convolution_layer(clayer, model_name):
     # read convolution parameters
     convolution_param = getattr(layer_parm, 'convolution_param', None)
     if (convolution_param is not None):
-        for ii in range(len(dstruct)):
-            if (dstruct[ii]['repeated']):
-                code_str = (dstruct[ii]['field'] + '=extract_repeated_attr' +
-                            '(convolution_param,\'' + dstruct[ii]['field'] + '\')')
-            else:
-                code_str = (dstruct[ii]['field'] + '=extract_attr' +
-                            '(convolution_param,\'' + dstruct[ii]['field'] + '\')')
-
-            exec(code_str)
+        params = extract_params(convolution_param, dstruct)
     else:
         raise CaffeParseError('No convolution parameters given')
 
     # define parameters needed by SAS convolution layer
     # bias
-    if (bias_term is not None):
-        if bias_term:
-            nobias = 'False'
-        else:
-            nobias = 'True'
+    if (params['bias_term'] is not None):
+        nobias = not params['bias_term']
     else:
-        nobias = 'False'
+        nobias = False
 
     # number of output layers
-    if (num_output is None):
+    if (params['num_output'] is None):
         raise CaffeParseError('num_output not provided for layer = ' +
                               layer_parm.name)
 
     # stride (vertical)
-    if (stride_h is not None) and (stride_h > 0):
-        tmp_stride_h = stride_h
+    if (params['stride_h'] is not None) and (params['stride_h'] > 0):
+        tmp_stride_h = params['stride_h']
     else:
-        if (stride is None) or (stride == 0):
+        if (params['stride'] is None) or (params['stride'] == 0):
             tmp_stride_h = 1
         else:
-            tmp_stride_h = stride
+            tmp_stride_h = params['stride']
 
     # stride (horizontal)
-    if (stride_w is not None) and (stride_w > 0):
-        tmp_stride_w = stride_w
+    if (params['stride_w'] is not None) and (params['stride_w'] > 0):
+        tmp_stride_w = params['stride_w']
     else:
-        if (stride is None) or (stride == 0):
+        if (params['stride'] is None) or (params['stride'] == 0):
             tmp_stride_w = 1
         else:
-            tmp_stride_w = stride
+            tmp_stride_w = params['stride']
 
     # horizontal/vertical stride must agree
     if (tmp_stride_w != tmp_stride_h):
@@ -439,24 +352,24 @@ def caffe_convolution_layer(clayer, model_name):
         common_stride = tmp_stride_w
 
     # height of kernel
-    if (kernel_h is not None) and (kernel_h > 0):
-        height = kernel_h
+    if (params['kernel_h'] is not None) and (params['kernel_h'] > 0):
+        height = params['kernel_h']
     else:
-        if (kernel_size is None):
+        if (params['kernel_size'] is None):
             raise CaffeParseError('Unable to set kernel height for layer = ' +
                                   layer_parm.name)
         else:
-            height = kernel_size
+            height = params['kernel_size']
 
     # width of kernel
-    if (kernel_w is not None) and (kernel_w > 0):
-        width = kernel_w
+    if (params['kernel_w'] is not None) and (params['kernel_w'] > 0):
+        width = params['kernel_w']
     else:
-        if (kernel_size is None):
+        if (params['kernel_size'] is None):
             raise CaffeParseError('Unable to set kernel width for layer = ' +
                                   layer_parm.name)
         else:
-            width = kernel_size
+            width = params['kernel_size']
 
     # determine source layer(s)
     source_layer, num_layers = extract_source_layers(clayer)
@@ -472,16 +385,15 @@ def caffe_convolution_layer(clayer, model_name):
     if (dropout is None):
         dropout = 0
 
-    return write_convolution_layer(model_name=model_name,
-                                   layer_name=clayer.layer_parm.name,
-                                   nfilters=str(num_output), width=str(width),
-                                   height=str(height), stride=str(common_stride),
-                                   nobias=nobias, activation=act, dropout=str(dropout),
-                                   src_layer=source_layer)
+    return layer_spec(clayer.layer_parm.name,
+                      dict(type='convolution', nfilters=params['num_output'],
+                           width=width, height=height, stride=common_stride,
+                           nobias=nobias, act=act, dropout=dropout),
+                      source_layer)
 
 
-# parse parameters for batch normalization layer and generate equivalent SAS code
-def caffe_batch_normalization_layer(clayer, model_name):
+# parse parameters for batch normalization layer and generate the equivalent SAS layer definition
+def caffe_batch_normalization_layer(clayer):
     '''
     Extract batch normalization layer parameters from LayerParameter object
 
@@ -489,12 +401,12 @@ def caffe_batch_normalization_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning batch normalization layer definition
+    dict
+        SAS deep learning batch normalization layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
@@ -508,13 +420,12 @@ def caffe_batch_normalization_layer(clayer, model_name):
     # determine activation
     act = extract_activation(clayer, 'batchnorm')
 
-    return write_batch_norm_layer(model_name=model_name,
-                                  layer_name=clayer.layer_parm.name,
-                                  activation=act, src_layer=source_layer)
+    return layer_spec(clayer.layer_parm.name, dict(type='batchnorm', act=act),
+                      source_layer)
 
 
-# parse parameters for input layer and generate equivalent SAS code
-def caffe_input_layer(clayer, model_name):
+# parse parameters for input layer and generate the equivalent SAS layer definition
+def caffe_input_layer(clayer):
     '''
     Extract input layer parameters from LayerParameter object
 
@@ -522,18 +433,19 @@ def caffe_input_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning input layer definition
+    dict
+        SAS deep learning input layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
     layer_parm = clayer.layer_parm
 
     # read scaling parameter
+    scale = 1.0
     transform_param = getattr(layer_parm, 'transform_param', None)
     if (transform_param is not None):
         scale = getattr(transform_param, 'scale', 1.0)
@@ -550,13 +462,13 @@ def caffe_input_layer(clayer, model_name):
         width = -1
         print('WARNING: unable to provide parameters for image data format')
 
-    return write_input_layer(model_name=model_name, layer_name=layer_parm.name,
-                             channels=str(channels), width=str(width),
-                             height=str(height), scale=str(scale))
+    return layer_spec(layer_parm.name,
+                      dict(type='input', nchannels=channels, width=width,
+                           height=height, scale=scale))
 
 
-# parse parameters for residual layer and generate equivalent SAS code
-def caffe_residual_layer(clayer, model_name):
+# parse parameters for residual layer and generate the equivalent SAS layer definition
+def caffe_residual_layer(clayer):
     '''
     Extract residual layer parameters from LayerParameter object
 
@@ -564,12 +476,12 @@ def caffe_residual_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning residual layer definition
+    dict
+        SAS deep learning residual layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
@@ -583,20 +495,12 @@ def caffe_residual_layer(clayer, model_name):
     # read eltwise parameters
     eltwise_param = getattr(layer_parm, 'eltwise_param', None)
     if (eltwise_param is not None):
-        for ii in range(len(dstruct)):
-            if (dstruct[ii]['repeated']):
-                code_str = (dstruct[ii]['field'] + '=extract_repeated_attr' +
-                            '(eltwise_param,\'' + dstruct[ii]['field'] + '\')')
-            else:
-                code_str = (dstruct[ii]['field'] + '=extract_attr' +
-                            '(eltwise_param,\'' + dstruct[ii]['field'] + '\')')
-
-            exec(code_str)
+        params = extract_params(eltwise_param, dstruct)
     else:
         raise CaffeParseError('No eltwise parameters given')
 
     # determine whether operation specified is valid
-    if (operation != 1):
+    if (params['operation'] != 1):
         raise CaffeParseError('Element-wise operation not supported')
 
     # determine activation
@@ -609,12 +513,12 @@ def caffe_residual_layer(clayer, model_name):
             'Residual layer requires two or more input layers, ' +
             str(num_layers) + ' provided')
 
-    return write_residual_layer(model_name=model_name, layer_name=clayer.layer_parm.name,
-                                activation=act, src_layer=source_layer)
+    return layer_spec(clayer.layer_parm.name, dict(type='residual', act=act),
+                      source_layer)
 
 
-# parse parameters for fully connected layer and generate equivalent SAS code
-def caffe_full_connect_layer(clayer, model_name):
+# parse parameters for fully connected layer and generate the equivalent SAS layer definition
+def caffe_full_connect_layer(clayer):
     '''
     Extract fully-connected layer parameters from LayerParameter object
 
@@ -622,12 +526,12 @@ def caffe_full_connect_layer(clayer, model_name):
     ----------
     clayer : CompositeLayer
        Layer parameters.
-    model_name : string
-       Deep learning model name.
 
     Returns
     -------
-    String value with SAS deep learning fully-connected layer definition
+    dict
+        SAS deep learning fully-connected layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
 
@@ -644,43 +548,32 @@ def caffe_full_connect_layer(clayer, model_name):
     # read inner product parameters
     inner_product_param = getattr(layer_parm, 'inner_product_param', None)
     if (inner_product_param is not None):
-        for ii in range(len(dstruct)):
-            if (dstruct[ii]['repeated']):
-                code_str = (dstruct[ii]['field'] + '=extract_repeated_attr' +
-                            '(inner_product_param,\'' + dstruct[ii]['field'] + '\')')
-            else:
-                code_str = (dstruct[ii]['field'] + '=extract_attr' +
-                            '(inner_product_param,\'' + dstruct[ii]['field'] + '\')')
-
-            exec(code_str)
+        params = extract_params(inner_product_param, dstruct)
     else:
         raise CaffeParseError('No inner_product parameters given')
 
     # define parameters needed by SAS fully-connected layer
 
     # bias
-    if (bias_term is not None):
-        if bias_term:
-            nobias = 'False'
-        else:
-            nobias = 'True'
+    if (params['bias_term'] is not None):
+        nobias = not params['bias_term']
     else:
-        nobias = 'False'
+        nobias = False
 
     # number of output neurons
-    if (num_output is not None):
-        num_neurons = num_output
+    if (params['num_output'] is not None):
+        num_neurons = params['num_output']
     else:
         raise CaffeParseError('Number of output neurons not specified '
                               'for layer = , ' + layer_parm.name)
 
     # check axis setting
-    if (axis is not None) and (axis != 1):
-        raise CaffeParseError('axis = , ' + str(axis) + ' is not supported')
+    if (params['axis'] is not None) and (params['axis'] != 1):
+        raise CaffeParseError('axis = , ' + str(params['axis']) + ' is not supported')
 
     # check transpose setting
-    if (transpose is not None) and (transpose is not False):
-        raise CaffeParseError('transpose = , ' + str(transpose) +
+    if (params['transpose'] is not None) and (params['transpose'] is not False):
+        raise CaffeParseError('transpose = , ' + str(params['transpose']) +
                               ' is not supported')
 
     # determine activation
@@ -703,12 +596,10 @@ def caffe_full_connect_layer(clayer, model_name):
         raise CaffeParseError('Fully connected layer requires one input layer, ' +
                               str(num_layers) + ' provided')
 
-    return write_full_connect_layer(model_name=model_name,
-                                    layer_name=layer_parm.name,
-                                    nrof_neurons=str(num_neurons),
-                                    nobias=nobias, activation=act,
-                                    type=fc_type, dropout=str(dropout),
-                                    src_layer=source_layer)
+    layer = dict(type=fc_type, n=num_neurons, nobias=nobias, act=act)
+    if (fc_type == 'fullconnect'):
+        layer['dropout'] = dropout
+    return layer_spec(layer_parm.name, layer, source_layer)
 
 
 class CompositeLayer(object):
@@ -749,6 +640,104 @@ def make_composite_layer(layer_parm):
     return CompositeLayer(layer_parm)
 
 
+def make_composite_layers(net_layers, phase=TEST):
+    '''
+    Generate the CompositeLayer objects of a network definition
+
+    The computation layers are indexed by their top blob once, so that
+    associating the activation, dropout, softmax and scale layers and
+    resolving the source layers is linear in the number of layers.
+
+    Parameters
+    ----------
+    net_layers : list of LayerParameter objects
+        Layers of the NetParameter object (mirrors Google protobuf definition).
+    phase : int, optional
+        One of {caffe_proto.TRAIN, caffe_proto.TEST, None}.
+
+    Returns
+    -------
+    list of :class:`CompositeLayer`
+
+    '''
+    if phase is None:
+        phase = TEST
+
+    # layers of other phases are ignored altogether
+    net_layers = [layer for layer in net_layers
+                  if (len(layer.include) == 0 or
+                      any(phase == layer_phase.phase for layer_phase in layer.include))]
+
+    layer_list = []
+    for layer in net_layers:
+        # exclude layers not implemented (or implemented in a different fashion)
+        if (layer.type.lower() in common_layers):
+            layer_list.append(make_composite_layer(layer))
+
+    # computation layer producing each top blob (in-place layers re-use
+    # blob names, the last producer wins) and batch normalization layer
+    # of each top blob (the first one wins)
+    producer = {}
+    batchnorm = {}
+    for ii, clayer in enumerate(layer_list):
+        top = clayer.layer_parm.top[0]
+        producer[top] = ii
+        if (clayer.layer_parm.type.lower() == 'batchnorm'):
+            batchnorm.setdefault(top, ii)
+
+    # associate activations with computation layers
+    for layer in net_layers:
+        if (layer.type.lower() in ['relu', 'prelu', 'elu', 'sigmoid', 'tanh']):
+            if (layer.top[0] in producer):
+                layer_list[producer[layer.top[0]]].related_layers.append(layer)
+            else:
+                raise CaffeParseError(
+                    'Activation layer ' + layer.name +
+                    ' is not associated with any computation layer.')
+
+    # associate dropout with computation layers
+    for layer in net_layers:
+        if (layer.type.lower() == 'dropout'):
+            if (layer.top[0] in producer):
+                layer_list[producer[layer.top[0]]].related_layers.append(layer)
+            else:
+                raise CaffeParseError(
+                    'Dropout layer ' + layer.name +
+                    ' is not associated with any computation layer.')
+
+    # associate softmax with a fully-connected layer
+    for layer in net_layers:
+        if (layer.type.lower() in ['softmax', 'softmaxwithloss']):
+            indices = [producer[bottom] for bottom in layer.bottom if bottom in producer]
+            if indices:
+                layer_list[max(indices)].related_layers.append(layer)
+            else:
+                raise CaffeParseError(
+                    'Softmax layer ' + layer.name +
+                    ' is not associated with any fully-connected layer.')
+
+    # determine source layer(s) for computation layers: the last preceding
+    # computation layer producing each bottom blob
+    preceding = {}
+    for clayer in layer_list:
+        for bottom in clayer.layer_parm.bottom:
+            if (bottom in preceding):
+                clayer.source_layer.append(preceding[bottom])
+        preceding[clayer.layer_parm.top[0]] = clayer.layer_parm.name
+
+    # associate scale layer with batchnorm layer
+    for layer in net_layers:
+        if (layer.type.lower() == 'scale'):
+            if (layer.top[0] in batchnorm):
+                layer_list[batchnorm[layer.top[0]]].related_layers.append(layer)
+            else:
+                raise CaffeParseError(
+                    'Scale layer ' + layer.name +
+                    ' is not associated with a batch normalization layer')
+
+    return layer_list
+
+
 # map Caffe activation layer types to SAS activation types
 def map_caffe_activation(layer_name, layer_type, act_type):
     '''
@@ -865,7 +854,7 @@ def extract_dropout(clayer):
 # determine source layer(s) for a given computation layer
 def extract_source_layers(clayer):
     '''
-    Construct a string representation of the layer name(s) of all the source layers
+    Determine the layer name(s) of all the source layers
 
     Parameters
     ----------
@@ -874,15 +863,39 @@ def extract_source_layers(clayer):
 
     Returns
     -------
-    string
-        String representation of Python list
+    list of strings, int
+        Source layer names and their number
+
+    '''
+    source_layer = list(clayer.source_layer)
+    return source_layer, len(source_layer)
+
 
+# extract the fields of a parameter object
+def extract_params(param, dstruct):
     '''
-    source_layer = []
-    num_layers = len(clayer.source_layer)
-    for ii in range(num_layers):
-        source_layer.append(clayer.source_layer[ii])
-    return repr(source_layer), num_layers
+    Extract the fields of a parameter object
+
+    Parameters
+    ----------
+    param : parameter object
+       Various parameter objects defined by Google messages.
+    dstruct : list of dicts
+       Fields of the parameter object, with the keys 'field' and 'repeated'.
+
+    Returns
+    -------
+    dict
+        Field values, None for the fields that don't exist.
+
+    '''
+    params = {}
+    for item in dstruct:
+        if item['repeated']:
+            params[item['field']] = extract_repeated_attr(param, item['field'])
+        else:
+            params[item['field']] = extract_attr(param, item['field'])
+    return params
 
 
 # extract value from repeated container object (only first returned)
@@ -18,16 +18,9 @@
 
 ''' Convert keras model to sas models '''
 
-import os
-import sys
-
-from keras import backend as K
-
+from .model_spec import layer_spec
 from .write_keras_model_parm import write_keras_hdf5
-from .write_sas_code import (write_input_layer, write_convolution_layer,
-                             write_batch_norm_layer, write_pooling_layer,
-                             write_residual_layer, write_full_connect_layer,
-                             write_main_entry)
+from .write_sas_code import write_model_code
 
 computation_layer_classes = ['averagepooling2d', 'maxpooling2d', 'conv2d',
                              'dense', 'batchnormalization', 'add']
@@ -41,38 +34,60 @@ class KerasParseError(ValueError):
     '''
 
 
-def keras_to_sas(model, model_name=None):
-    output_code = ''
+def keras_to_layers(model, image_data_format=None):
+    '''
+    Generate the layer definitions of a SAS deep learning model from a Keras model
+
+    Parameters
+    ----------
+    model : Model object
+       Keras deep learning model, or a
+       :class:`dlpy.model_conversion.keras_h5.KerasH5Model` read from a
+       Keras HDF5 model file
+    image_data_format : string, optional
+       'channels_last' or 'channels_first'.  Default: the image data format
+       of the model, or else the Keras setting
+
+    Returns
+    -------
+    list of dicts
+        Layer definitions, see :func:`dlpy.model_conversion.model_spec.layer_spec`
+
+    '''
+    if image_data_format is None:
+        image_data_format = getattr(model, 'image_data_format', None)
+    if image_data_format is None:
+        from keras import backend as K
+        image_data_format = K.image_data_format()
+
+    graph = KerasLayerGraph(model)
+    layers = []
     layer_activation = {}
     src_layer = {}
     layer_dropout = {}
-    if model_name is None:
-        model_name = model.name
     for layer in model.layers:
         class_name = layer.__class__.__name__.lower()
         if (class_name in computation_layer_classes):
             comp_layer_name = find_previous_computation_layer(
-                model, layer.name, computation_layer_classes)
-            source_str = make_source_str(comp_layer_name)
-            src_layer.update({layer.name: source_str})
+                model, layer.name, computation_layer_classes, graph)
+            src_layer.update({layer.name: comp_layer_name})
         elif (class_name == 'activation'):
             tmp_name = find_previous_computation_layer(
-                model, layer.name, computation_layer_classes)
+                model, layer.name, computation_layer_classes, graph)
             tmp_act = extract_activation(layer)
             layer_activation.update({tmp_name[0]: tmp_act})
         elif (class_name == 'dropout'):
-            tmp = find_next_computation_layer(model, layer, dropout_layer_classes)
+            tmp = find_next_computation_layer(model, layer, dropout_layer_classes, graph)
             dconfig = layer.get_config()
             layer_dropout.update({tmp: dconfig['rate']})
 
     # if first layer is not an input layer, generate the correct
-    # input layer code for a SAS deep learning model
+    # input layer for a SAS deep learning model
     layer = model.layers[0]
     if (layer.__class__.__name__.lower() != 'inputlayer'):
-        sas_code = keras_input_layer(layer, model_name, False)
-        # write SAS code for input layer
-        if sas_code:
-            output_code = output_code + sas_code + '\n\n'
+        spec = keras_input_layer(layer, False, image_data_format)
+        if spec:
+            layers.append(spec)
         else:
             raise KerasParseError('Unable to generate an input layer')
 
@@ -80,7 +95,7 @@ def keras_to_sas(model, model_name=None):
     for layer in model.layers:
         class_name = layer.__class__.__name__.lower()
 
-        sas_code = None
+        spec = None
 
         # determine activation function
         if (class_name in ['conv2d', 'batchnormalization', 'add', 'dense']):
@@ -93,44 +108,61 @@ def keras_to_sas(model, model_name=None):
 
         # average/max pooling
         if (class_name in ['averagepooling2d', 'maxpooling2d']):
-            sas_code = keras_pooling_layer(layer, model_name, class_name,
-                                           src_layer, layer_dropout)
+            spec = keras_pooling_layer(layer, class_name, src_layer, layer_dropout)
         # 2D convolution
         elif (class_name == 'conv2d'):
-            sas_code = keras_convolution_layer(layer, model_name, act_func,
-                                               src_layer, layer_dropout)
+            spec = keras_convolution_layer(layer, act_func, src_layer, layer_dropout)
         # batch normalization
         elif (class_name == 'batchnormalization'):
-            sas_code = keras_batchnormalization_layer(layer, model_name,
-                                                      act_func, src_layer)
+            spec = keras_batchnormalization_layer(layer, act_func, src_layer)
         # input layer
         elif (class_name == 'inputlayer'):
-            sas_code = keras_input_layer(layer, model_name, True)
+            spec = keras_input_layer(layer, True, image_data_format)
         # add
         elif (class_name == 'add'):
-            sas_code = keras_residual_layer(layer, model_name,
-                                            act_func, src_layer)
+            spec = keras_residual_layer(layer, act_func, src_layer)
         elif (class_name in ['activation', 'flatten', 'dropout']):
             pass
         # fully connected
         elif (class_name == 'dense'):
-            sas_code = keras_full_connect_layer(layer, model_name, act_func,
-                                                src_layer, layer_dropout)
+            spec = keras_full_connect_layer(layer, act_func, src_layer, layer_dropout)
         else:
             print('WARNING: ' + class_name + ' is an unsupported layer '
                                              'type - your SAS model may be incomplete')
 
-        # write SAS code associated with Keras layer
-        if sas_code:
-            output_code = output_code + sas_code + '\n\n'
+        if spec:
+            layers.append(spec)
         elif (class_name not in ['activation', 'flatten', 'dropout']):
             print('WARNING: unable to generate SAS definition '
                   'for layer ' + class_name)
-    return output_code
+    return layers
+
+
+def keras_to_sas(model, model_name=None):
+    '''
+    Generate Python code defining a SAS deep learning model from a Keras model
+
+    Parameters
+    ----------
+    model : Model object
+       Keras deep learning model
+    model_name : string, optional
+       Name for deep learning model.  Default: the name of the Keras model
+
+    Returns
+    -------
+    string
+        Python code defining the function sas_model_gen, see
+        :func:`dlpy.model_conversion.write_sas_code.write_model_code`
+
+    '''
+    if model_name is None:
+        model_name = model.name
+    return write_model_code(model_name, keras_to_layers(model))
 
 
 # create SAS pooling layer
-def keras_pooling_layer(layer, model_name, class_name, src_layer, layer_dropout):
+def keras_pooling_layer(layer, class_name, src_layer, layer_dropout):
     '''
     Extract pooling layer parameters from layer definition object
 
@@ -138,20 +170,19 @@ def keras_pooling_layer(layer, model_name, class_name, src_layer, layer_dropout)
     ----------
     layer : Layer object
        Pooling layer
-    model_name : string
-       Deep learning model name
     class_name : string
        Layer class
-    src_layer : list-of-Layer objects
-       Layer objects corresponding to source layer(s) for
+    src_layer : dict
+       Layer names (keys) and the names of their source layer(s) (values) for
        pooling layer
     layer_dropout : dict
        Dictionary containing dropout layer names (keys) and dropout rates (values)
 
     Returns
     -------
-    string
-        String value with SAS deep learning pooling layer definition
+    dict
+        SAS deep learning pooling layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
@@ -179,7 +210,7 @@ def keras_pooling_layer(layer, model_name, class_name, src_layer, layer_dropout)
 
     # extract source layer(s)
     if (layer.name in src_layer.keys()):
-        source_str = src_layer[layer.name]
+        source_layer = src_layer[layer.name]
     else:
         raise KerasParseError('Unable to determine source layer for '
                               'pooling layer = ' + layer.name)
@@ -190,13 +221,14 @@ def keras_pooling_layer(layer, model_name, class_name, src_layer, layer_dropout)
     else:
         dropout = 0.0
 
-    return write_pooling_layer(model_name=model_name, layer_name=layer.name,
-                               width=str(width), height=str(height), stride=str(step),
-                               type=type, dropout=str(dropout), src_layer=source_str)
+    return layer_spec(layer.name,
+                      dict(type='pooling', width=width, height=height, stride=step,
+                           pool=type, dropout=dropout),
+                      source_layer)
 
 
 # create SAS 2D convolution layer
-def keras_convolution_layer(layer, model_name, act_func, src_layer, layer_dropout):
+def keras_convolution_layer(layer, act_func, src_layer, layer_dropout):
     '''
     Extract convolution layer parameters from layer definition object
 
@@ -204,20 +236,19 @@ def keras_convolution_layer(layer, model_name, act_func, src_layer, layer_dropou
     ----------
     layer : Layer object
        Convolution layer
-    model_name : string
-       Deep learning model name
     act_func : string
        Keras activation function
-    src_layer : list-of-Layer objects
-       Layer objects corresponding to source layer(s) for
+    src_layer : dict
+       Layer names (keys) and the names of their source layer(s) (values) for
        convolution layer
     layer_dropout : dict
        Dictionary containing dropout layer names (keys) and dropout rates (values)
 
     Returns
     -------
-    string
-        String value with SAS deep learning convolution layer definition
+    dict
+        SAS deep learning convolution layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
@@ -244,17 +275,14 @@ def keras_convolution_layer(layer, model_name, act_func, src_layer, layer_dropou
                               'directions for convolution layer')
 
     # bias term
-    if (config['use_bias']):
-        bias_str = 'False'
-    else:
-        bias_str = 'True'
+    nobias = not config['use_bias']
 
     # number of filters
     nrof_filters = config['filters']
 
     # extract source layer(s)
     if (layer.name in src_layer.keys()):
-        source_str = src_layer[layer.name]
+        source_layer = src_layer[layer.name]
     else:
         raise KerasParseError('Unable to determine source layer for '
                               'convolution layer = ' + layer.name)
@@ -265,15 +293,15 @@ def keras_convolution_layer(layer, model_name, act_func, src_layer, layer_dropou
     else:
         dropout = 0.0
 
-    return write_convolution_layer(model_name=model_name, layer_name=layer.name,
-                                   nfilters=str(nrof_filters), width=str(width),
-                                   height=str(height), stride=str(step),
-                                   nobias=bias_str, activation=layer_act_func,
-                                   dropout=str(dropout), src_layer=source_str)
+    return layer_spec(layer.name,
+                      dict(type='convolution', nfilters=nrof_filters, width=width,
+                           height=height, stride=step, nobias=nobias,
+                           act=layer_act_func, dropout=dropout),
+                      source_layer)
 
 
 # create SAS batch normalization layer
-def keras_batchnormalization_layer(layer, model_name, act_func, src_layer):
+def keras_batchnormalization_layer(layer, act_func, src_layer):
     '''
     Extract batch normalization layer parameters from layer definition object
 
@@ -281,25 +309,24 @@ def keras_batchnormalization_layer(layer, model_name, act_func, src_layer):
     ----------
     layer : Layer object
        Batch nornalization layer
-    model_name : string
-       Deep learning model name
     act_func : string
        Keras activation function
-    src_layer : list-of-Layer objects
-       Layer objects corresponding to source layer(s) for
+    src_layer : dict
+       Layer names (keys) and the names of their source layer(s) (values) for
        batch normalization layer
 
     Returns
     -------
-    string
-        String value with SAS deep learning batch normalization layer definition
+    dict
+        SAS deep learning batch normalization layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
 
     # extract source layer(s)
     if (layer.name in src_layer.keys()):
-        source_str = src_layer[layer.name]
+        source_layer = src_layer[layer.name]
     else:
         raise KerasParseError('Unable to determine source layer for '
                               'batch normalization layer = ' + layer.name)
@@ -312,12 +339,12 @@ def keras_batchnormalization_layer(layer, model_name, act_func, src_layer):
     else:
         layer_act_func = 'identity'
 
-    return write_batch_norm_layer(model_name=model_name, layer_name=layer.name,
-                                  activation=layer_act_func, src_layer=source_str)
+    return layer_spec(layer.name, dict(type='batchnorm', act=layer_act_func),
+                      source_layer)
 
 
 # create SAS input layer
-def keras_input_layer(layer, model_name, input_layer):
+def keras_input_layer(layer, input_layer, image_data_format='channels_last'):
     '''
     Extract input layer parameters from layer definition object
 
@@ -325,20 +352,21 @@ def keras_input_layer(layer, model_name, input_layer):
     ----------
     layer : Layer object
        Input layer
-    model_name : string
-       Deep learning model name
     input_layer : boolean
        Indicate whether layer name given (True) or not (False)
+    image_data_format : string, optional
+       'channels_last' or 'channels_first'
 
     Returns
     -------
-    string
-        String value with SAS deep learning input layer definition
+    dict
+        SAS deep learning input layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
 
-    if (K.image_data_format() == 'channels_first'):
+    if (image_data_format == 'channels_first'):
         dummy, C, H, W = config['batch_input_shape']
     else:
         dummy, H, W, C = config['batch_input_shape']
@@ -352,13 +380,12 @@ def keras_input_layer(layer, model_name, input_layer):
     # TBD: fix scale, now default value for scale
     scale = 1.0
 
-    return write_input_layer(model_name=model_name, layer_name=input_name,
-                             channels=str(C), width=str(W),
-                             height=str(H), scale=str(scale))
+    return layer_spec(input_name,
+                      dict(type='input', nchannels=C, width=W, height=H, scale=scale))
 
 
 # create SAS residual layer
-def keras_residual_layer(layer, model_name, act_func, src_layer):
+def keras_residual_layer(layer, act_func, src_layer):
     '''
     Extract residual layer parameters from layer definition object
 
@@ -366,25 +393,24 @@ def keras_residual_layer(layer, model_name, act_func, src_layer):
     ----------
     layer : Layer object
        Add layer
-    model_name : string
-       Deep learning model name
     act_func : string
        Keras activation function
-    src_layer : list-of-Layer objects
-       Layer objects corresponding to source layer(s) for
+    src_layer : dict
+       Layer names (keys) and the names of their source layer(s) (values) for
        residual layer
 
     Returns
     -------
-    string
-        String value with SAS deep learning residual layer definition
+    dict
+        SAS deep learning residual layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
 
     # extract source layer(s)
     if (layer.name in src_layer.keys()):
-        source_str = src_layer[layer.name]
+        source_layer = src_layer[layer.name]
     else:
         raise KerasParseError('Unable to determine source layers for '
                               'residual layer = ' + layer.name)
@@ -397,12 +423,12 @@ def keras_residual_layer(layer, model_name, act_func, src_layer):
     else:
         layer_act_func = 'identity'
 
-    return write_residual_layer(model_name=model_name, layer_name=layer.name,
-                                activation=layer_act_func, src_layer=source_str)
+    return layer_spec(layer.name, dict(type='residual', act=layer_act_func),
+                      source_layer)
 
 
 # create SAS fully connected layer
-def keras_full_connect_layer(layer, model_name, act_func, src_layer, layer_dropout):
+def keras_full_connect_layer(layer, act_func, src_layer, layer_dropout):
     '''
     Extract fully connected layer parameters from layer definition object
 
@@ -410,20 +436,19 @@ def keras_full_connect_layer(layer, model_name, act_func, src_layer, layer_dropo
     ----------
     layer : Layer object
        Fully connected layer
-    model_name : string
-       Deep learning model name
     act_func : string
        Keras activation function
-    src_layer : list-of-Layer objects
-       Layer objects corresponding to source layer(s) for
+    src_layer : dict
+       Layer names (keys) and the names of their source layer(s) (values) for
        fully connected layer
     layer_dropout : dict
        Dictionary containing dropout layer names (keys) and dropout rates (values)
 
     Returns
     -------
-    string
-        String value with SAS deep learning fully connected layer definition
+    dict
+        SAS deep learning fully connected layer definition, see
+        :func:`dlpy.model_conversion.model_spec.layer_spec`
 
     '''
     config = layer.get_config()
@@ -446,12 +471,9 @@ def keras_full_connect_layer(layer, model_name, act_func, src_layer, layer_dropo
     nrof_neurons = config['units']
 
     # bias term
-    if (config['use_bias']):
-        bias_str = 'False'
-    else:
-        bias_str = 'True'
+    nobias = not config['use_bias']
 
-        # set dropout
+    # set dropout
     if (layer.name in layer_dropout.keys()):
         dropout = layer_dropout[layer.name]
     else:
@@ -459,15 +481,16 @@ def keras_full_connect_layer(layer, model_name, act_func, src_layer, layer_dropo
 
     # extract source layer(s)
     if (layer.name in src_layer.keys()):
-        source_str = src_layer[layer.name]
+        source_layer = src_layer[layer.name]
     else:
         raise KerasParseError('Unable to determine source layer for '
                               'fully connected layer = ' + layer.name)
 
-    return write_full_connect_layer(model_name=model_name, layer_name=layer.name,
-                                    nrof_neurons=str(nrof_neurons), nobias=bias_str,
-                                    activation=layer_act_func, type=layer_type,
-                                    dropout=str(dropout), src_layer=source_str)
+    layer_def = dict(type=layer_type, n=nrof_neurons, nobias=nobias,
+                     act=layer_act_func)
+    if (layer_type == 'fullconnect'):
+        layer_def['dropout'] = dropout
+    return layer_spec(layer.name, layer_def, source_layer)
 
 
 def map_keras_activation(layer, act_func):
@@ -539,7 +562,105 @@ def extract_activation(layer):
     return config['activation']
 
 
-def find_next_computation_layer(model, layer, computation_layer_list):
+class KerasLayerGraph(object):
+    '''
+    Adjacency index of the layers of a Keras model
+
+    The inbound and outbound layers of each layer are read once, and the
+    computation layers preceding or following each layer are resolved
+    once per list of computation layers, so that resolving the source
+    layers of a whole model is linear in the number of layers.
+
+    Parameters
+    ----------
+    model : Model object
+       Keras deep learning model
+
+    '''
+
+    def __init__(self, model):
+        self.layers = {}
+        self.n_inbound_nodes = {}
+        self.inbound = {}
+        self.outbound = {}
+        for layer in model.layers:
+            self.layers[layer.name] = layer
+            self.n_inbound_nodes[layer.name] = len(layer._inbound_nodes)
+            if layer._inbound_nodes:
+                self.inbound[layer.name] = list(
+                    layer._inbound_nodes[0].get_config()['inbound_layers'])
+            else:
+                self.inbound[layer.name] = []
+            self.outbound[layer.name] = [node.get_config()['outbound_layer']
+                                         for node in layer._outbound_nodes]
+        self._previous = {}
+        self._next = {}
+
+    def _is_computation(self, name, computation_layer_list):
+        layer = self.layers.get(name)
+        return (layer is not None and
+                layer.__class__.__name__.lower() in computation_layer_list)
+
+    def previous_computation_layer(self, name, computation_layer_list):
+        '''
+        Resolve a layer to the computation layer it is computed from
+
+        Returns the layer itself if it is a computation layer, None if the
+        computation layer is ambiguous.  Chains of non-computation layers
+        starting at the root layer resolve to the first layer of the chain.
+
+        '''
+        key = tuple(computation_layer_list)
+        memo = self._previous.setdefault(key, {})
+        path = []
+        while name not in memo:
+            if self._is_computation(name, computation_layer_list):
+                memo[name] = name
+                break
+            inbound = self.inbound.get(name, [])
+            if len(inbound) > 1:
+                memo[name] = None
+            elif len(inbound) == 0:
+                memo[name] = name
+            elif (not self._is_computation(inbound[0], computation_layer_list) and
+                  len(self.inbound.get(inbound[0], [])) == 0):
+                memo[name] = name
+            else:
+                path.append(name)
+                name = inbound[0]
+                continue
+            break
+        result = memo[name]
+        for name in path:
+            memo[name] = result
+        return result
+
+    def next_computation_layer(self, name, computation_layer_list):
+        '''
+        Resolve a layer to the computation layer it feeds
+
+        Returns the layer itself if it is a computation layer, None if the
+        computation layer is ambiguous or does not exist.
+
+        '''
+        key = tuple(computation_layer_list)
+        memo = self._next.setdefault(key, {})
+        path = []
+        while name not in memo:
+            if self._is_computation(name, computation_layer_list):
+                memo[name] = name
+            elif len(self.outbound.get(name, [])) != 1:
+                memo[name] = None
+            else:
+                path.append(name)
+                name = self.outbound[name][0]
+        result = memo[name]
+        for name in path:
+            memo[name] = result
+        return result
+
+
+def find_next_computation_layer(model, layer, computation_layer_list, graph=None):
     '''
     Extract the name of the computation layer following the current layer
 
@@ -551,6 +672,8 @@ def find_next_computation_layer(model, layer, computation_layer_list):
        Current layer object
     computation_layer_list : list
        List of computation layers supported by SAS
+    graph : :class:`KerasLayerGraph`, optional
+       Adjacency index of the model.  Default: a new index of the model
 
     Returns
     -------
@@ -558,28 +681,21 @@ def find_next_computation_layer(model, layer, computation_layer_list):
         String value with name of next computation layer
 
     '''
-
-    if (len(layer._outbound_nodes) > 1):
+    if graph is None:
+        graph = KerasLayerGraph(model)
+
+    outbound = graph.outbound.get(layer.name, [])
+    layer_name = None
+    if (len(outbound) == 1):
+        layer_name = graph.next_computation_layer(outbound[0], computation_layer_list)
+    if layer_name is None:
         raise KerasParseError('Unable to determine next computation layer '
                               'for layer = ' + layer.name)
-    else:
-        node_config = layer._outbound_nodes[0].get_config()
-        layer_name = node_config['outbound_layer']
-        tmp_layer = model.get_layer(name=layer_name)
-        while (tmp_layer.__class__.__name__.lower() not in computation_layer_list):
-            if (len(tmp_layer._outbound_nodes) > 1):
-                raise KerasParseError('Unable to determine next computation layer '
-                                      'for layer = ' + layer.name)
-                break
-            else:
-                node_config = tmp_layer._outbound_nodes[0].get_config()
-                layer_name = node_config['outbound_layer']
-                tmp_layer = model.get_layer(name=layer_name)
-
     return layer_name
 
 
-def find_previous_computation_layer(model, layer_name, computation_layer_list):
+def find_previous_computation_layer(model, layer_name, computation_layer_list,
+                                    graph=None):
     '''
     Extract the name of the computation layer prior to the current layer
 
@@ -591,61 +707,28 @@ def find_previous_computation_layer(model, layer_name, computation_layer_list):
        Current layer name
     computation_layer_list : list
        List of computation layers supported by SAS
+    graph : :class:`KerasLayerGraph`, optional
+       Adjacency index of the model.  Default: a new index of the model
 
     Returns
     -------
-    string
-        String value with name of previous computation layer
+    list of strings
+        Names of previous computation layers
 
     '''
+    if graph is None:
+        graph = KerasLayerGraph(model)
 
-    layer = model.get_layer(name=layer_name)
-    if (len(layer._inbound_nodes) > 1):
+    if (graph.n_inbound_nodes.get(layer_name, 0) > 1):
         raise KerasParseError('Unable to determine previous computation '
                               'layer(s) for layer = ' + layer_name)
-        return None
-    else:
-        src_layer_name = []
-        node_config = layer._inbound_nodes[0].get_config()
-        for lname in node_config['inbound_layers']:
-            tmp_layer = model.get_layer(name=lname)
-            prev_layer = tmp_layer
-            while (tmp_layer.__class__.__name__.lower() not in computation_layer_list):
-                # check for root node
-                node_config = tmp_layer._inbound_nodes[0].get_config()
-                if (len(node_config['inbound_layers']) > 1):
-                    raise KerasParseError('Unable to determine previous computation '
-                                          'layer(s) for layer = ' + layer_name)
-                    return None
-                elif (len(node_config['inbound_layers']) == 1):
-                    tmp_name = node_config['inbound_layers'][0]
-                    prev_layer = tmp_layer
-                    tmp_layer = model.get_layer(name=tmp_name)
-                else:
-                    tmp_layer = prev_layer
-                    break
-
-            src_layer_name.append(tmp_layer.name)
-
-        return src_layer_name
-
-
-def make_source_str(layer_name):
-    '''
-    Create a string value representing a Python list of source layers
 
-    Parameters
-    ----------
-    layer_name : string
-       List of Python layer names
+    src_layer_name = []
+    for lname in graph.inbound.get(layer_name, []):
+        src_name = graph.previous_computation_layer(lname, computation_layer_list)
+        if src_name is None:
+            raise KerasParseError('Unable to determine previous computation '
+                                  'layer(s) for layer = ' + layer_name)
+        src_layer_name.append(src_name)
 
-    Returns
-    -------
-    string
-        String representation of list of Python layer names
-
-    '''
-    source_str = []
-    for ii in range(len(layer_name)):
-        source_str.append(layer_name[ii])
-    return repr(source_str)
+    return src_layer_name
@@ -18,8 +18,19 @@
 
 ''' Supporting functions for caffe model conversion '''
 
+import multiprocessing
 import sys
+import zlib
+from multiprocessing.pool import ThreadPool
+
 import h5py
+import numpy as np
+
+# target size, in bytes, of the HDF5 chunks
+CHUNK_SIZE = 1 << 20
+
+# compressed blobs larger than this are compressed by the worker threads
+PARALLEL_BLOB_SIZE = 1 << 22
 
 
 class HDF5WriteError(IOError):
@@ -29,8 +40,76 @@ class HDF5WriteError(IOError):
     '''
 
 
+def _chunk_shape(blob):
+    ''' Chunks of whole rows of about CHUNK_SIZE bytes '''
+    row_size = max(1, blob.nbytes // blob.shape[0])
+    rows = max(1, min(blob.shape[0], CHUNK_SIZE // row_size))
+    return (rows,) + blob.shape[1:]
+
+
+def write_blob(group, name, blob, compression=None, compression_level=4, pool=None):
+    '''
+    Write a parameter blob as a chunked, optionally compressed, dataset
+
+    Large blobs are compressed chunk by chunk by the threads of `pool`
+    while the compressed chunks are written, so that compression is not
+    limited to one core.
+
+    Parameters
+    ----------
+    group : h5py.Group
+       Group of the layer
+    name : string
+       Data set name
+    blob : numpy array
+       Parameter values
+    compression : string, optional
+       None or 'gzip'
+    compression_level : int, optional
+       gzip compression level (1-9)
+    pool : ThreadPool, optional
+       Worker threads compressing large blobs
+
+    Returns
+    -------
+    h5py.Dataset
+
+    '''
+    blob = np.ascontiguousarray(blob)
+    if blob.ndim == 0 or blob.size == 0:
+        return group.create_dataset(name, data=blob)
+    chunks = _chunk_shape(blob)
+    if compression is None:
+        return group.create_dataset(name, data=blob, chunks=chunks)
+    if compression != 'gzip':
+        raise ValueError('Unsupported compression ' + repr(compression) +
+                         ', the SAS deep learning actions read gzip compressed files')
+    if pool is None or blob.nbytes < PARALLEL_BLOB_SIZE:
+        return group.create_dataset(name, data=blob, chunks=chunks, compression='gzip',
+                                    compression_opts=compression_level)
+
+    dset = group.create_dataset(name, shape=blob.shape, dtype=blob.dtype, chunks=chunks,
+                                compression='gzip', compression_opts=compression_level)
+    rows = chunks[0]
+    starts = range(0, blob.shape[0], rows)
+
+    def compress(start):
+        chunk = blob[start:start + rows]
+        if chunk.shape[0] < rows:
+            # edge chunks are stored full size
+            chunk = np.concatenate([chunk, np.zeros((rows - chunk.shape[0],) + blob.shape[1:],
+                                                    dtype=blob.dtype)])
+        return zlib.compress(chunk.tobytes(), compression_level)
+
+    offset = (0,) * (blob.ndim - 1)
+    for start, data in zip(starts, pool.imap(compress, starts)):
+        dset.id.write_direct_chunk((start,) + offset, data)
+    return dset
+
+
 # write Caffe model parameters in HDF5 format
-def write_caffe_hdf5(net, layer_list, file_name):
+def write_caffe_hdf5(net, layer_list, file_name, compression=None, compression_level=4,
+                     n_threads=None):
     '''
     Generate a SAS deep learning model from Caffe definition
 
@@ -42,6 +121,41 @@ def write_caffe_hdf5(net, layer_list, file_name):
        List of layers.  Parameter for these layers must be written in HDF5 format
     file_name : string
        Fully qualified file name of SAS-compatible HDF5 file (*.caffemodel.h5)
+    compression : string, optional
+       None or 'gzip'
+    compression_level : int, optional
+       gzip compression level (1-9)
+    n_threads : int, optional
+       Number of threads compressing large blobs.  Default: number of CPUs
+
+    '''
+    blobs = ((name, [blob.data for blob in params]) for name, params in net.params.items())
+    write_caffe_blobs(blobs, layer_list, file_name, compression, compression_level, n_threads)
+
+
+def write_caffe_blobs(blobs, layer_list, file_name, compression=None, compression_level=4,
+                      n_threads=None):
+    '''
+    Write Caffe parameter blobs in the SAS deep learning HDF5 format
+
+    The blobs are written as they are produced, so that only the blobs of
+    one layer need to be held in memory.
+
+    Parameters
+    ----------
+    blobs : iterable of (string, list of numpy arrays)
+       Layer names and their parameter blobs, e.g. from
+       :func:`dlpy.model_conversion.caffe_proto.iter_caffemodel_blobs`
+    layer_list : list-of-CompositeLayer
+       List of layers.  Parameter for these layers must be written in HDF5 format
+    file_name : string
+       Fully qualified file name of SAS-compatible HDF5 file (*.caffemodel.h5)
+    compression : string, optional
+       None or 'gzip'
+    compression_level : int, optional
+       gzip compression level (1-9)
+    n_threads : int, optional
+       Number of threads compressing large blobs.  Default: number of CPUs
 
     '''
 
@@ -54,50 +168,49 @@ def write_caffe_hdf5(net, layer_list, file_name):
     # create base group
     g = fout.create_group('data')
 
+    if n_threads is None:
+        n_threads = multiprocessing.cpu_count()
+    pool = None
+    if compression is not None and n_threads > 1:
+        pool = ThreadPool(n_threads)
+
     try:
 
+        # associate scale layers with batchnorm layers
+        scale_names = {}
+        for clayer in layer_list:
+            for related in clayer.related_layers:
+                if (related.type.lower() == 'scale'):
+                    scale_names.setdefault(related.name, clayer.layer_parm.name + '_scale')
+
         # write output file
-        params = net.params
-        for name in params.keys():
-
-            # associate scale layers with batchnorm layers
-            match = False
-            prop_name = name
-            for clayer in layer_list:
-                # search for scale layer
-                for ii in range(len(clayer.related_layers)):
-                    if ((clayer.related_layers[ii].type.lower() == 'scale') and
-                            (name == clayer.related_layers[ii].name) and
-                            (not match)):
-                        prop_name = clayer.layer_parm.name + '_scale'
-                        match = True
-
-                if match:
-                    break
-
-            if not match:
-                prop_name = name
+        param_names = set()
+        for name, values in blobs:
+            if name in param_names:
+                continue
+            param_names.add(name)
 
             # open/create group
-            cur_group = g.create_group(prop_name)
+            cur_group = g.create_group(scale_names.get(name, name))
 
             # data set indexed by blob number
-            for ii in range(len(params[name])):
-                blob = params[name][ii].data
-
+            for ii, blob in enumerate(values):
                 # save parameters in HDF5 format
-                dset = cur_group.create_dataset(str(ii), data=blob)
+                write_blob(cur_group, str(ii), blob, compression, compression_level, pool)
 
         # every layer in layer_list must have a corresponding group in the parameter
         # file.  Add dummy group(s) for layers that don't have parameters
         for layer in layer_list:
-            if (layer.layer_parm.name not in params.keys()):
+            if (layer.layer_parm.name not in param_names):
                 cur_group = g.create_group(layer.layer_parm.name)
 
     except HDF5WriteError as err_str:
         print(err_str)
 
     finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
         # close file
         fout.close()
 
@@ -21,19 +21,121 @@
 import sys
 import h5py
 import numpy as np
-from keras import backend as K
-try:
-    from keras.engine.topology import preprocess_weights_for_loading
-except ImportError:
-    from keras.engine.saving import preprocess_weights_for_loading
+
+
+def flatten_permutation(height, width, channels, image_data_format='channels_last'):
+    '''
+    Generate the row permutation of the first Dense layer after a flattening layer
+
+    Keras flattens "channels last" feature maps in (H, W, C) order, SAS deep
+    learning in (C, H, W) order.  Row i of the converted weights is row
+    perm_index[i] of the Keras weights.
+
+    Parameters
+    ----------
+    height : int
+       Height of the flattened feature maps
+    width : int
+       Width of the flattened feature maps
+    channels : int
+       Number of channels of the flattened feature maps
+    image_data_format : string, optional
+       Keras image data format, 'channels_last' or 'channels_first'
+
+    Returns
+    -------
+    numpy array of int, or None if no permutation is needed
+
+    '''
+    if image_data_format != 'channels_last':
+        return None
+    index = np.arange(height * width * channels).reshape(height, width, channels)
+    return index.transpose(2, 0, 1).ravel()
+
+
+def _flatten_info(model, image_data_format):
+    ''' Name of the Dense layer following the flattening layer and its permutation '''
+    for index, layer in enumerate(model.layers):
+        if layer.__class__.__name__.lower() == 'flatten':
+            permute_layer_name = model.layers[index + 1].name
+            if image_data_format == 'channels_first':
+                C, H, W = (layer.input_shape)[1:]
+            else:
+                H, W, C = (layer.input_shape)[1:]
+            return permute_layer_name, flatten_permutation(H, W, C, image_data_format)
+    return None, None
+
+
+def convert_keras_tensor(layer, tensor_in, image_data_format='channels_last',
+                         permute_layer_name=None, perm_index=None):
+    '''
+    Permute the axes of a Keras weight tensor to the SAS deep learning format
+
+    Parameters
+    ----------
+    layer : Keras layer
+       Layer the weights belong to (only its class name and name are used)
+    tensor_in : numpy array
+       Keras weights
+    image_data_format : string, optional
+       Keras image data format, 'channels_last' or 'channels_first'
+    permute_layer_name : string, optional
+       Name of the Dense layer following the flattening layer
+    perm_index : numpy array of int, optional
+       Row permutation of that layer, see :func:`flatten_permutation`
+
+    Returns
+    -------
+    numpy array
+
+    '''
+    class_name = layer.__class__.__name__
+    if image_data_format == 'channels_first' or perm_index is None:
+        # format: (C,fdim1, fdim2, fdim3) ==> (C,fdim3,fdim1,fdim2)
+        if len(tensor_in.shape) == 4:
+            return np.transpose(tensor_in, (0, 3, 1, 2))
+        return tensor_in
+    # "channels last" format
+    # this is a vector - nothing to permute
+    if len(tensor_in.shape) == 1:
+        return tensor_in
+    # permute Conv2D tensor to "channels_first" format
+    if class_name == 'Conv2D':
+        return np.transpose(tensor_in, (3, 2, 0, 1))
+    # have to account for neuron ordering in first dense
+    # layer following flattening operation
+    if class_name == 'Dense':
+        if layer.name == permute_layer_name:
+            tensor_in = tensor_in[perm_index, :]
+        # mimic Caffe layout
+        return np.transpose(tensor_in, (1, 0))
+    return tensor_in
+
+
+def _check_compression(compression):
+    ''' The SAS deep learning actions read uncompressed or gzip compressed files '''
+    if compression not in (None, 'gzip'):
+        raise ValueError('Unsupported compression ' + repr(compression) +
+                         ', the SAS deep learning actions read gzip compressed files')
+
+
+def _write_dataset(group, name, tensor, compression=None):
+    ''' Write a weight tensor as a chunked, optionally compressed, dataset '''
+    tensor = np.ascontiguousarray(tensor)
+    if tensor.ndim == 0 or tensor.size == 0:
+        return group.create_dataset(name, data=tensor)
+    return group.create_dataset(name, data=tensor, chunks=True, compression=compression)
 
 
 # let Keras read parameters and then transform to format needed for SAS deep learning
 # NOTE: modified version of Keras function load_weights_from_hdf5_group()
-def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out):
+def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out, compression=None):
     '''
     Generate an HDF5 file with trained model parameters given a Keras definition
 
+    The layers are converted one at a time, so that only the weights of
+    one layer are held in memory.
+
     Parameters
     ----------
     model : Keras model
@@ -42,8 +144,17 @@ def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out):
        Fully qualified file name of Keras HDF5 file
     hdf5_out : string
        Fully qualified file name of SAS-compatible HDF5 file
+    compression : string, optional
+       None or 'gzip', compression of the datasets
 
     '''
+    _check_compression(compression)
+    from keras import backend as K
+    try:
+        from keras.engine.topology import preprocess_weights_for_loading
+    except ImportError:
+        from keras.engine.saving import preprocess_weights_for_loading
+
     # open input/output files
     try:
         f_in = h5py.File(hdf5_in, 'r')
@@ -91,37 +202,9 @@ def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out):
                              str(len(filtered_layers)) + ' layers.')
 
         # determine permutation vector associated with flattening layer (if it exists)
-        flatten_layer_index = -1
-        index = 0
-        for layer in model.layers:
-            if (layer.__class__.__name__.lower() == 'flatten'):
-                flatten_layer_index = index
-                break
-            index = index + 1
-
-        if (flatten_layer_index != -1):
-            layer = model.layers[flatten_layer_index]
-            permute_layer_name = model.layers[flatten_layer_index + 1].name
-            if (image_data_format == 'channels_first'):
-                C, H, W = (layer.input_shape)[1:]
-            else:
-                H, W, C = (layer.input_shape)[1:]
-            N = (layer.output_shape)[1]
-            perm_index = [0] * N
-            if (image_data_format == 'channels_last'):
-                ii = 0
-                for cc in range(C):
-                    for hh in range(H):
-                        for ww in range(W):
-                            perm_index[ii] = hh * W * C + ww * C + cc
-                            ii = ii + 1
-            else:
-                for nn in range(N):
-                    perm_index[nn] = nn
-        else:
-            perm_index = []
+        permute_layer_name, perm_index = _flatten_info(model, image_data_format)
 
-            # let Keras read weights, reformat, and write to SAS-compatible file
+        # let Keras read weights, reformat, and write to SAS-compatible file
         for k, name in enumerate(layer_names):
             g_in = f_in[name]
             g_out = f_out.create_group(name)
@@ -149,44 +232,14 @@ def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out):
 
             # read/write weights
             for ii in range(len(weight_names)):
-                tensor_in = np.zeros(weight_values[ii].shape,
-                                     dtype=weight_values[ii].dtype)
-                weight_values[ii].read_direct(tensor_in)
-
-                # permute axes as needed to conform to SAS deep
-                # learning "channels first" format
-                if ((image_data_format == 'channels_first') or (not perm_index)):
-                    # format: (C,fdim1, fdim2, fdim3) ==> (C,fdim3,fdim1,fdim2)
-                    if (len(tensor_in.shape) == 4):
-                        tensor_out = np.transpose(tensor_in, (0, 3, 1, 2))
-                    else:
-                        tensor_out = tensor_in.copy()
-                else:
-                    # "channels last" format
-                    # this is a vector - nothing to permute
-                    if (len(tensor_in.shape) == 1):
-                        tensor_out = tensor_in.copy()
-                    else:
-                        # permute Conv2D tensor to "channels_first" format
-                        if (layer.__class__.__name__ == 'Conv2D'):
-                            tensor_out = np.transpose(tensor_in, (3, 2, 0, 1))
-                        # have to account for neuron ordering in first dense
-                        # layer following flattening operation
-                        elif (layer.__class__.__name__ == 'Dense'):
-                            if (layer.name == permute_layer_name):
-                                tensor_out = np.zeros(tensor_in.shape)
-                                for jj in range(tensor_out.shape[0]):
-                                    tensor_out[jj, :] = tensor_in[perm_index[jj], :]
-                            else:  # not following flattening, just copy
-                                tensor_out = tensor_in.copy()
-
-                            # mimic Caffe layout
-                            tensor_out = np.transpose(tensor_out, (1, 0))
-
-                            # save weight in format amenable to SAS
+                tensor_out = convert_keras_tensor(layer, np.asarray(weight_values[ii]),
+                                                  image_data_format,
+                                                  permute_layer_name, perm_index)
+
+                # save weight in format amenable to SAS
                 dset_name = generate_dataset_name(layer, ii)
                 new_weight_names.append(dset_name)
-                g_out.create_dataset(dset_name, data=tensor_out)
+                _write_dataset(g_out, dset_name, tensor_out, compression)
 
             # update weight names
             g_out.attrs['weight_names'] = new_weight_names
@@ -199,21 +252,31 @@ def write_keras_hdf5_from_file(model, hdf5_in, hdf5_out):
         f_out.close()
         f_in.close()
 
-    # generate dataset name with template layerName/layerName/weightName:0
 
-
-def write_keras_hdf5(model, hdf5_out):
+def write_keras_weights(weights, hdf5_out, image_data_format='channels_last',
+                        permute_layer_name=None, perm_index=None, compression=None):
     '''
-    Generate an HDF5 file with trained model parameters given a Keras definition
+    Generate an HDF5 file with trained model parameters, layer by layer
 
     Parameters
     ----------
-    model : Keras model
-       Keras deep learning model
+    weights : iterable of (Layer, list of numpy arrays)
+       Layers with weights and their Keras weights.  Only the layer being
+       written is held in memory when a generator is given.
     hdf5_out : string
        Fully qualified file name of SAS-compatible HDF5 file
+    image_data_format : string, optional
+       Keras image data format, 'channels_last' or 'channels_first'
+    permute_layer_name : string, optional
+       Name of the Dense layer following the flattening layer
+    perm_index : numpy array of int, optional
+       Row permutation of that layer, see :func:`flatten_permutation`
+    compression : string, optional
+       None or 'gzip', compression of the datasets
 
     '''
+    _check_compression(compression)
+
     # open output file
     try:
         f_out = h5py.File(hdf5_out, 'w')
@@ -221,113 +284,20 @@ def write_keras_hdf5(model, hdf5_out):
         sys.exit('File ' + hdf5_out + ' could not be created')
 
     try:
-        image_data_format = K.image_data_format()
-
-        # determine layers with weights
-        filtered_layers = []
-        for layer in model.layers:
-            weights = layer.weights
-            if weights:
-                filtered_layers.append(layer)
-
-        # determine permutation vector associated with flattening layer (if it exists)
-        flatten_layer_index = -1
-        index = 0
-        for layer in model.layers:
-            if (layer.__class__.__name__.lower() == 'flatten'):
-                flatten_layer_index = index
-                break
-            index = index + 1
-
-        if (flatten_layer_index != -1):
-            layer = model.layers[flatten_layer_index]
-            permute_layer_name = model.layers[flatten_layer_index + 1].name
-            if (image_data_format == 'channels_first'):
-                C, H, W = (layer.input_shape)[1:]
-            else:
-                H, W, C = (layer.input_shape)[1:]
-            N = (layer.output_shape)[1]
-            perm_index = [0] * N
-            if (image_data_format == 'channels_last'):
-                ii = 0
-                for cc in range(C):
-                    for hh in range(H):
-                        for ww in range(W):
-                            perm_index[ii] = hh * W * C + ww * C + cc
-                            ii = ii + 1
-            else:
-                for nn in range(N):
-                    perm_index[nn] = nn
-        else:
-            perm_index = []
-
-            # let Keras read weights, reformat, and write to SAS-compatible file
-        for k, layer in enumerate(filtered_layers):
-            # g_in = f_in[name]
+        for layer, weight_values in weights:
             g_out = f_out.create_group(layer.name)
-            symbolic_weights = layer.weights
-            weight_values = K.batch_get_value(symbolic_weights)
-            weight_names = []
-            for i, (w, val) in enumerate(zip(symbolic_weights, weight_values)):
-                if hasattr(w, 'name') and w.name:
-                    name = str(w.name)
-                else:
-                    name = 'param_' + str(i)
-                weight_names.append(name.encode('utf8'))
-
-            # layer modification from here:
             new_weight_names = []
 
-            if len(weight_values) != len(symbolic_weights):
-                raise ValueError('Layer #' + str(k) +
-                                 ' (named "' + layer.name +
-                                 '" in the current model) was found to '
-                                 'correspond to layer ' + name +
-                                 ' in the saved file. '
-                                 'However the new layer ' + layer.name +
-                                 ' expects ' + str(len(symbolic_weights)) +
-                                 ' weights, but the saved weights have ' +
-                                 str(len(weight_values)) +
-                                 ' elements.')
             # read/write weights
-            for ii in range(len(weight_names)):
-                tensor_in = weight_values[ii]
-
-                # permute axes as needed to conform to SAS deep
-                # learning "channels first" format
-                if ((image_data_format == 'channels_first') or (not perm_index)):
-                    # format: (C,fdim1, fdim2, fdim3) ==> (C,fdim3,fdim1,fdim2)
-                    if (len(tensor_in.shape) == 4):
-                        tensor_out = np.transpose(tensor_in, (0, 3, 1, 2))
-                    else:
-                        tensor_out = tensor_in.copy()
-                else:
-                    # "channels last" format
-                    # this is a vector - nothing to permute
-                    if (len(tensor_in.shape) == 1):
-                        tensor_out = tensor_in.copy()
-                    else:
-                        # permute Conv2D tensor to "channels_first" format
-                        if (layer.__class__.__name__ == 'Conv2D'):
-                            tensor_out = np.transpose(tensor_in, (3, 2, 0, 1))
-                        # have to account for neuron ordering in first dense
-                        # layer following flattening operation
-                        elif (layer.__class__.__name__ == 'Dense'):
-                            if (layer.name == permute_layer_name):
-                                tensor_out = np.zeros(tensor_in.shape)
-                                for jj in range(tensor_out.shape[0]):
-                                    tensor_out[jj, :] = tensor_in[perm_index[jj], :]
-                            else:  # not following flattening, just copy
-                                tensor_out = tensor_in.copy()
-
-                            # mimic Caffe layout
-                            tensor_out = np.transpose(tensor_out, (1, 0))
-
-                            # save weight in format amenable to SAS
+            for ii in range(len(weight_values)):
+                tensor_out = convert_keras_tensor(layer, weight_values[ii],
+                                                  image_data_format,
+                                                  permute_layer_name, perm_index)
+
+                # save weight in format amenable to SAS
                 dset_name = generate_dataset_name(layer, ii)
                 new_weight_names.append(dset_name)
-
-                g_out.create_dataset(dset_name, data=tensor_out)
+                _write_dataset(g_out, dset_name, tensor_out, compression)
 
             # update weight names
             g_out.attrs['weight_names'] = new_weight_names
@@ -337,7 +307,61 @@ def write_keras_hdf5(model, hdf5_out):
     finally:
         # close files
         f_out.close()
-    # generate dataset name with template layerName/layerName/weightName:0
+
+
+def write_keras_hdf5(model, hdf5_out, compression=None):
+    '''
+    Generate an HDF5 file with trained model parameters given a Keras definition
+
+    Parameters
+    ----------
+    model : Keras model
+       Keras deep learning model
+    hdf5_out : string
+       Fully qualified file name of SAS-compatible HDF5 file
+    compression : string, optional
+       None or 'gzip', compression of the datasets
+
+    '''
+    from keras import backend as K
+
+    image_data_format = K.image_data_format()
+
+    # determine permutation vector associated with flattening layer (if it exists)
+    permute_layer_name, perm_index = _flatten_info(model, image_data_format)
+
+    # let Keras read weights, reformat, and write to SAS-compatible file
+    weights = ((layer, K.batch_get_value(layer.weights))
+               for layer in model.layers if layer.weights)
+    write_keras_weights(weights, hdf5_out, image_data_format, permute_layer_name,
+                        perm_index, compression)
+
+
+def write_keras_hdf5_from_h5(model, hdf5_in, hdf5_out, compression=None):
+    '''
+    Generate an HDF5 file with trained model parameters from a Keras HDF5 file
+
+    Keras is not required, the weights are read with h5py one layer at
+    a time.
+
+    Parameters
+    ----------
+    model : :class:`dlpy.model_conversion.keras_h5.KerasH5Model`
+       Model read from the Keras HDF5 model file
+    hdf5_in : string
+       Fully qualified file name of Keras HDF5 file
+    hdf5_out : string
+       Fully qualified file name of SAS-compatible HDF5 file
+    compression : string, optional
+       None or 'gzip', compression of the datasets
+
+    '''
+    from .keras_h5 import iter_keras_h5_weights
+
+    permute_layer_name, perm_index = _flatten_info(model, model.image_data_format)
+    write_keras_weights(iter_keras_h5_weights(hdf5_in, model), hdf5_out,
+                        model.image_data_format, permute_layer_name, perm_index,
+                        compression)
 
 
 def generate_dataset_name(layer, index):
@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Export of SAS deep learning models to ONNX
+
+The layers and the weights table of a model are mapped to an ONNX graph
+(opset 9) in NCHW layout, which is encoded in the protobuf wire format
+directly, so that the onnx package is not required.  The graph input is
+the image as decoded by the server (channels in BGR order), before the
+scaling and the offsets of the input layer, which are part of the graph.
+The layout of the weights table is described in :mod:`dlpy.weights_arrays`.
+
+'''
+
+import struct
+
+import numpy as np
+import pandas as pd
+import six
+
+from ..weights_arrays import _split, output_shape, weight_shapes
+
+OPSET_VERSION = 9
+IR_VERSION = 4
+BN_EPSILON = 1e-5
+
+# SAS activations --> ONNX operators (None: no operator)
+_ACTIVATIONS = {'identity': None, 'relu': 'Relu', 'sigmoid': 'Sigmoid', 'tanh': 'Tanh',
+                'softmax': 'Softmax', 'elu': 'Elu', 'leaky': 'LeakyRelu',
+                'softplus': 'Softplus'}
+
+# activation selected by act='auto'
+_AUTO_ACTIVATIONS = {'convo': 'relu', 'fc': 'relu', 'output': 'softmax'}
+
+_LAYER_TYPES = {'input': 'input', 'convo': 'convo', 'convolution': 'convo',
+                'pool': 'pool', 'pooling': 'pool', 'batchnorm': 'batchnorm',
+                'residual': 'residual', 'concat': 'concat', 'fc': 'fc',
+                'fullconnect': 'fc', 'output': 'output'}
+
+
+class OnnxExportError(ValueError):
+    '''
+    Used to indicate a layer or a weights table that can not be exported to ONNX
+
+    '''
+
+
+# protobuf wire format
+
+def _varint(value):
+    out = bytearray()
+    value &= (1 << 64) - 1
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _int_field(number, value):
+    return _varint(number << 3) + _varint(int(value))
+
+
+def _bytes_field(number, payload):
+    if isinstance(payload, six.text_type):
+        payload = payload.encode('utf8')
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _float_field(number, value):
+    return _varint(number << 3 | 5) + struct.pack('<f', value)
+
+
+def _attribute(name, value):
+    ''' Encode an AttributeProto (FLOAT=1, INT=2, STRING=3, INTS=7) '''
+    out = _bytes_field(1, name)
+    if isinstance(value, float):
+        out += _float_field(2, value) + _int_field(20, 1)
+    elif isinstance(value, six.integer_types):
+        out += _int_field(3, value) + _int_field(20, 2)
+    elif isinstance(value, six.string_types):
+        out += _bytes_field(4, value) + _int_field(20, 3)
+    else:
+        out += b''.join(_int_field(8, item) for item in value) + _int_field(20, 7)
+    return out
+
+
+def _value_info(name, shape):
+    ''' Encode a ValueInfoProto of a float tensor, None dimensions are symbolic '''
+    dims = b''
+    for dim in shape:
+        if dim is None:
+            dims += _bytes_field(1, _bytes_field(2, 'N'))
+        else:
+            dims += _bytes_field(1, _int_field(1, dim))
+    tensor_type = _int_field(1, 1) + _bytes_field(2, dims)
+    return _bytes_field(1, name) + _bytes_field(2, _bytes_field(1, tensor_type))
+
+
+class OnnxNode(object):
+    '''
+    Node of an ONNX graph
+
+    Parameters
+    ----------
+    op_type : string
+        ONNX operator
+    inputs : list of strings
+        Names of the input tensors
+    outputs : list of strings
+        Names of the output tensors
+    name : string
+        Name of the node
+    **attrs : keyword arguments
+        Attributes of the operator
+
+    '''
+
+    def __init__(self, op_type, inputs, outputs, name, **attrs):
+        self.op_type = op_type
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.name = name
+        self.attrs = attrs
+
+    def to_bytes(self):
+        out = b''.join(_bytes_field(1, item) for item in self.inputs)
+        out += b''.join(_bytes_field(2, item) for item in self.outputs)
+        out += _bytes_field(3, self.name) + _bytes_field(4, self.op_type)
+        for key in sorted(self.attrs):
+            out += _bytes_field(5, _attribute(key, self.attrs[key]))
+        return out
+
+
+class OnnxModel(object):
+    '''
+    ONNX graph of a SAS deep learning model
+
+    Attributes
+    ----------
+    name : string
+        Name of the graph
+    nodes : list of :class:`OnnxNode`
+        Nodes, in topological order
+    initializers : dict
+        Names and values (float32 numpy arrays) of the weights
+    input_name, output_name : string
+        Names of the graph input (N x C x H x W) and output (N x n) tensors
+    input_shape, output_shape : tuple
+        Shapes of the input and output tensors, without the batch dimension
+
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.nodes = []
+        self.initializers = {}
+        self.input_name = None
+        self.input_shape = None
+        self.output_name = None
+        self.output_shape = None
+
+    def add_node(self, op_type, inputs, name, **attrs):
+        ''' Add a node and return the name of its output tensor '''
+        self.nodes.append(OnnxNode(op_type, inputs, [name], name, **attrs))
+        return name
+
+    def add_initializer(self, name, value):
+        self.initializers[name] = np.ascontiguousarray(value, dtype=np.float32)
+        return name
+
+    def to_bytes(self):
+        '''
+        Encode the model as an ONNX ModelProto
+
+        Returns
+        -------
+        bytes
+
+        '''
+        graph = b''.join(_bytes_field(1, node.to_bytes()) for node in self.nodes)
+        graph += _bytes_field(2, self.name)
+        for name in sorted(self.initializers):
+            value = self.initializers[name]
+            tensor = b''.join(_int_field(1, dim) for dim in value.shape)
+            tensor += _int_field(2, 1) + _bytes_field(8, name)
+            tensor += _bytes_field(9, value.astype('<f4').tobytes())
+            graph += _bytes_field(5, tensor)
+        graph += _bytes_field(11, _value_info(self.input_name, (None,) + self.input_shape))
+        graph += _bytes_field(12, _value_info(self.output_name,
+                                              (None,) + self.output_shape))
+        opset = _bytes_field(1, '') + _int_field(2, OPSET_VERSION)
+        return (_int_field(1, IR_VERSION) + _bytes_field(2, 'dlpy') +
+                _bytes_field(7, graph) + _bytes_field(8, opset))
+
+    def save(self, file_name):
+        ''' Write the model to an ONNX file '''
+        with open(file_name, 'wb') as f:
+            f.write(self.to_bytes())
+
+    def run(self, images):
+        '''
+        Evaluate the model on a batch of images
+
+        onnxruntime is used if it is installed, otherwise the graph is
+        evaluated with numpy.
+
+        Parameters
+        ----------
+        images : numpy array
+            Images of shape (N, C, H, W), channels in BGR order
+
+        Returns
+        -------
+        numpy array of shape (N, n)
+
+        '''
+        images = np.asarray(images, dtype=np.float32)
+        try:
+            import onnxruntime
+        except ImportError:
+            onnxruntime = None
+        if onnxruntime is not None:
+            session = onnxruntime.InferenceSession(self.to_bytes())
+            return session.run([self.output_name], {self.input_name: images})[0]
+
+        tensors = dict(self.initializers)
+        tensors[self.input_name] = images
+        for node in self.nodes:
+            args = [tensors[name] for name in node.inputs]
+            tensors[node.outputs[0]] = _OPERATORS[node.op_type](*args, **node.attrs)
+        return tensors[self.output_name]
+
+
+# numpy evaluation of the operators used by the export
+
+def _windows(x, kernel_shape, strides, pads, value=0.):
+    ''' (N, C, H_out, W_out, kh, kw) view of the sliding windows of x '''
+    x = np.pad(x, ((0, 0), (0, 0), (pads[0], pads[2]), (pads[1], pads[3])),
+               mode='constant', constant_values=value)
+    n, c, h, w = x.shape
+    kh, kw = kernel_shape
+    sh, sw = strides
+    shape = (n, c, (h - kh) // sh + 1, (w - kw) // sw + 1, kh, kw)
+    s = x.strides
+    return np.lib.stride_tricks.as_strided(
+        x, shape, (s[0], s[1], s[2] * sh, s[3] * sw, s[2], s[3]), writeable=False)
+
+
+def _conv(x, w, b=None, kernel_shape=None, strides=(1, 1), pads=(0, 0, 0, 0)):
+    windows = _windows(x, w.shape[2:], strides, pads)
+    out = np.tensordot(windows, w, axes=([1, 4, 5], [1, 2, 3])).transpose(0, 3, 1, 2)
+    if b is not None:
+        out = out + b.reshape(1, -1, 1, 1)
+    return out
+
+
+def _max_pool(x, kernel_shape=None, strides=None, pads=(0, 0, 0, 0)):
+    return _windows(x, kernel_shape, strides, pads, -np.inf).max(axis=(4, 5))
+
+
+def _average_pool(x, kernel_shape=None, strides=None, pads=(0, 0, 0, 0),
+                  count_include_pad=0):
+    total = _windows(x, kernel_shape, strides, pads).sum(axis=(4, 5))
+    count = _windows(np.ones_like(x[:1, :1]), kernel_shape, strides, pads).sum(axis=(4, 5))
+    return total / count
+
+
+def _batch_norm(x, scale, bias, mean, var, epsilon=BN_EPSILON):
+    shape = (1, -1, 1, 1)
+    return ((x - mean.reshape(shape)) / np.sqrt(var.reshape(shape) + epsilon) *
+            scale.reshape(shape) + bias.reshape(shape))
+
+
+def _softmax(x, axis=1):
+    e = np.exp(x - x.max(axis=axis, keepdims=True))
+    return e / e.sum(axis=axis, keepdims=True)
+
+
+def _gemm(a, b, c=None, transB=0):
+    out = a.dot(b.T if transB else b)
+    return out if c is None else out + c
+
+
+_OPERATORS = {
+    'Conv': _conv,
+    'MaxPool': _max_pool,
+    'AveragePool': _average_pool,
+    'BatchNormalization': _batch_norm,
+    'Relu': lambda x: np.maximum(x, 0),
+    'Sigmoid': lambda x: 1. / (1. + np.exp(-x)),
+    'Tanh': np.tanh,
+    'Softmax': _softmax,
+    'Elu': lambda x, alpha=1.: np.where(x > 0, x, alpha * (np.exp(x) - 1.)),
+    'LeakyRelu': lambda x, alpha=0.01: np.where(x > 0, x, alpha * x),
+    'Softplus': lambda x: np.log1p(np.exp(x)),
+    'Sum': lambda *args: sum(args[1:], args[0]),
+    'Concat': lambda *args, **kwargs: np.concatenate(args, axis=kwargs['axis']),
+    'Flatten': lambda x, axis=1: x.reshape(x.shape[0], -1),
+    'Gemm': _gemm,
+    'Mul': np.multiply,
+    'Sub': np.subtract,
+}
+
+
+# SAS layers --> ONNX nodes
+
+def _layer_arrays(layers, weights):
+    ''' Weight arrays of each layer, from a weights table '''
+    if weights is None:
+        weights = pd.DataFrame(columns=['_LayerID_', '_WeightID_', '_Weight_'])
+    weights = weights.sort_values(['_LayerID_', '_WeightID_'])
+    values = dict((int(layer_id), group['_Weight_'].values.astype(np.float32))
+                  for layer_id, group in weights.groupby('_LayerID_'))
+    try:
+        shapes = weight_shapes(layers, dict((layer_id, item.size)
+                                            for layer_id, item in values.items()))
+    except ValueError as err:
+        raise OnnxExportError(str(err))
+
+    arrays = {}
+    for name, (layer_id, items) in shapes.items():
+        layer_values = values.pop(layer_id, np.zeros(0, dtype=np.float32))
+        count = sum(int(np.prod(shape)) for shape in items)
+        if layer_values.size != count:
+            raise OnnxExportError('Layer "{}" has {} weights, {} expected'
+                                  .format(name, layer_values.size, count))
+        arrays[name] = _split(layer_values, items)
+    if values:
+        raise OnnxExportError('The weights table has weights for layer(s) without '
+                              'weights: ' + ', '.join(layers[layer_id].name
+                                                      for layer_id in sorted(values)))
+    return arrays
+
+
+def _activation(layer, layer_type):
+    act = str(layer.config.get('act', 'auto')).lower()
+    if act == 'auto':
+        act = _AUTO_ACTIVATIONS.get(layer_type, 'identity')
+    if act not in _ACTIVATIONS:
+        raise OnnxExportError('Activation "{}" of layer "{}" can not be exported '
+                              'to ONNX'.format(act, layer.name))
+    return act
+
+
+def _same_pads(size, kernel, stride):
+    ''' Padding of one dimension, so that the output size is size // stride '''
+    total = max(0, (size // stride - 1) * stride + kernel - size)
+    begin = min((kernel - 1) // 2, total)
+    return begin, total - begin
+
+
+def sas_to_onnx(layers, weights, model_name='dlpy_model'):
+    '''
+    Generate the ONNX graph of a SAS deep learning model
+
+    Parameters
+    ----------
+    layers : list of :class:`dlpy.layers.Layer`
+        Layers of the model, in the order of the model table.
+    weights : pandas.DataFrame
+        Content of the weights table (_LayerID_, _WeightID_ and _Weight_
+        columns).
+    model_name : string, optional
+        Name of the graph.
+
+    Returns
+    -------
+    :class:`OnnxModel`
+
+    '''
+    for layer in layers:
+        if str(layer.config['type']).lower() not in _LAYER_TYPES:
+            raise OnnxExportError('Layer "{}" of type "{}" can not be exported to ONNX'
+                                  .format(layer.name, layer.config['type']))
+    arrays = _layer_arrays(layers, weights)
+
+    model = OnnxModel(model_name)
+    outputs = {}
+    for layer in layers:
+        layer_type = _LAYER_TYPES[str(layer.config['type']).lower()]
+        name = layer.name
+        if layer_type != 'input':
+            srcs = [outputs[src.name] for src in layer.src_layers]
+            src_shapes = [output_shape(src) for src in layer.src_layers]
+
+        if layer_type == 'input':
+            model.input_name, model.input_shape = name, output_shape(layer)
+            out = name
+            scale = float(layer.config.get('scale', 1.))
+            if scale != 1.:
+                scale_name = model.add_initializer(name + '_scale', np.array([scale]))
+                out = model.add_node('Mul', [out, scale_name], name + '_scaled')
+            offsets = layer.config.get('offsets') or []
+            if any(offsets):
+                offsets = np.asarray(offsets, dtype=np.float32).reshape(1, -1, 1, 1)
+                offsets_name = model.add_initializer(name + '_offsets', offsets)
+                out = model.add_node('Sub', [out, offsets_name], name + '_centered')
+
+        elif layer_type == 'convo':
+            _, height, width = src_shapes[0]
+            kh, kw = arrays[name][0].shape[2:]
+            stride = int(layer.config.get('stride', 1))
+            inputs = [srcs[0]] + [model.add_initializer(name + suffix, value)
+                                  for suffix, value in zip(['_W', '_B'], arrays[name])]
+            pad_h, pad_w = _same_pads(height, kh, stride), _same_pads(width, kw, stride)
+            out = model.add_node('Conv', inputs, name, kernel_shape=[kh, kw],
+                                 strides=[stride, stride],
+                                 pads=[pad_h[0], pad_w[0], pad_h[1], pad_w[1]])
+
+        elif layer_type == 'pool':
+            _, height, width = src_shapes[0]
+            kh, kw = int(layer.config['height']), int(layer.config['width'])
+            stride = int(layer.config.get('stride', kw))
+            pad_h, pad_w = _same_pads(height, kh, stride), _same_pads(width, kw, stride)
+            attrs = dict(kernel_shape=[kh, kw], strides=[stride, stride],
+                         pads=[pad_h[0], pad_w[0], pad_h[1], pad_w[1]])
+            if str(layer.config.get('pool', 'max')).lower() == 'max':
+                out = model.add_node('MaxPool', srcs, name, **attrs)
+            else:
+                out = model.add_node('AveragePool', srcs, name, count_include_pad=0, **attrs)
+
+        elif layer_type == 'batchnorm':
+            mean, var, scale, bias = arrays[name]
+            inputs = [srcs[0]] + [model.add_initializer(name + suffix, value)
+                                  for suffix, value in [('_scale', scale), ('_bias', bias),
+                                                        ('_mean', mean), ('_var', var)]]
+            out = model.add_node('BatchNormalization', inputs, name, epsilon=BN_EPSILON)
+
+        elif layer_type == 'residual':
+            out = model.add_node('Sum', srcs, name)
+
+        elif layer_type == 'concat':
+            out = model.add_node('Concat', srcs, name, axis=1)
+
+        else:  # fully connected and output layers
+            src = srcs[0]
+            if len(src_shapes[0]) > 1:
+                src = model.add_node('Flatten', [src], name + '_flatten', axis=1)
+            inputs = [src] + [model.add_initializer(name + suffix, value)
+                              for suffix, value in zip(['_W', '_B'], arrays[name])]
+            out = model.add_node('Gemm', inputs, name, transB=1)
+
+        if layer_type != 'input':
+            act = _ACTIVATIONS[_activation(layer, layer_type)]
+            if act == 'Softmax':
+                out = model.add_node(act, [out], name + '_act', axis=1)
+            elif act == 'LeakyRelu':
+                out = model.add_node(act, [out], name + '_act', alpha=0.1)
+            elif act == 'Elu':
+                out = model.add_node(act, [out], name + '_act', alpha=1.)
+            elif act is not None:
+                out = model.add_node(act, [out], name + '_act')
+
+        outputs[name] = out
+        if layer_type == 'output':
+            model.output_name, model.output_shape = out, arrays[name][0].shape[:1]
+
+    if model.output_name is None:
+        raise OnnxExportError('The model has no output layer')
+    return model
+
+
+def onnx_parity(onnx_model, images, probabilities, rtol=1e-3, atol=1e-5):
+    '''
+    Compare the outputs of an ONNX model with the scores of the server
+
+    Parameters
+    ----------
+    onnx_model : :class:`OnnxModel`
+        Exported model
+    images : numpy array
+        Images of shape (N, C, H, W), channels in BGR order
+    probabilities : numpy array or pandas.DataFrame
+        Probabilities predicted by the server, of shape (N, n), in the
+        order of the output neurons
+    rtol, atol : float, optional
+        Relative and absolute tolerances
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        Maximum absolute difference, and whether the outputs match, per image
+
+    '''
+    expected = np.asarray(probabilities, dtype=np.float64)
+    actual = np.asarray(onnx_model.run(images), dtype=np.float64)
+    if actual.shape != expected.shape:
+        raise OnnxExportError('The ONNX outputs have the shape {}, the scores {}'
+                              .format(actual.shape, expected.shape))
+    return pd.DataFrame(dict(
+        max_abs_diff=np.abs(actual - expected).max(axis=1),
+        match=np.isclose(actual, expected, rtol=rtol, atol=atol).all(axis=1)))
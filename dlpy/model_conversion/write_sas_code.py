@@ -16,7 +16,13 @@
 #  limitations under the License.
 #
 
-''' Write python codes for create sas model '''
+'''
+Write python codes for create sas model
+
+The generated code is an export format only; models are built from the
+layer definitions with :func:`dlpy.model_conversion.model_spec.build_model_table`.
+
+'''
 
 import sys
 
@@ -290,6 +296,73 @@ def write_full_connect_layer(model_name='sas', layer_name='fullconnect',
     return '\n'.join(out)
 
 
+# complete model definition
+def write_model_code(model_name, layers):
+    '''
+    Generate Python code defining a SAS deep learning model
+
+    The code defines the function sas_model_gen(s, ...), which creates
+    the model with one action call per layer.
+
+    Parameters
+    ----------
+    model_name : string
+       Name for deep learning model
+    layers : list of dicts
+       Layer definitions, see :func:`dlpy.model_conversion.model_spec.layer_spec`
+
+    Returns
+    -------
+    string
+
+    '''
+    out = []
+    for spec in layers:
+        name = spec['name']
+        layer = spec['layer']
+        layer_type = layer['type']
+        src_layer = repr(list(spec.get('srclayers', [])))
+        if layer_type == 'input':
+            code = write_input_layer(model_name=model_name, layer_name=name,
+                                     channels=str(layer['nchannels']),
+                                     width=str(layer['width']),
+                                     height=str(layer['height']),
+                                     scale=str(layer.get('scale', 1.0)))
+        elif layer_type == 'convolution':
+            code = write_convolution_layer(model_name=model_name, layer_name=name,
+                                           nfilters=str(layer['nfilters']),
+                                           width=str(layer['width']),
+                                           height=str(layer['height']),
+                                           stride=str(layer['stride']),
+                                           nobias=str(layer['nobias']),
+                                           activation=layer['act'],
+                                           dropout=str(layer['dropout']),
+                                           src_layer=src_layer)
+        elif layer_type == 'batchnorm':
+            code = write_batch_norm_layer(model_name=model_name, layer_name=name,
+                                          activation=layer['act'], src_layer=src_layer)
+        elif layer_type == 'pooling':
+            code = write_pooling_layer(model_name=model_name, layer_name=name,
+                                       width=str(layer['width']),
+                                       height=str(layer['height']),
+                                       stride=str(layer['stride']), type=layer['pool'],
+                                       dropout=str(layer['dropout']), src_layer=src_layer)
+        elif layer_type == 'residual':
+            code = write_residual_layer(model_name=model_name, layer_name=name,
+                                        activation=layer['act'], src_layer=src_layer)
+        elif layer_type in ('fullconnect', 'output'):
+            code = write_full_connect_layer(model_name=model_name, layer_name=name,
+                                            nrof_neurons=str(layer['n']),
+                                            nobias=str(layer['nobias']),
+                                            activation=layer['act'], type=layer_type,
+                                            dropout=str(layer.get('dropout', 0)),
+                                            src_layer=src_layer)
+        else:
+            raise ValueError('Unable to generate code for layer type ' + layer_type)
+        out.append(code + '\n\n')
+    return ''.join(out)
+
+
 # Python __main__ function
 def write_main_entry(model_name):
     '''
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Session-shared, versioned model tables '''
+
+import re
+import time
+
+import pandas as pd
+
+from .model import Model
+from .temp_tables import temp_table_name, forget_temp_table
+from .tracing import traced_call
+
+
+class ModelRegistry(object):
+    '''
+    Registry of deep learning models promoted to global scope
+
+    A published version consists of three global tables in the caslib of
+    the registry: the model table ``<name>_v<version>``, the weights table
+    (with the weights attributes) ``<name>_v<version>_weights``, and a
+    one-row information table ``<name>_v<version>_info`` holding the
+    reference count and the status of the version.  Any CAS session that
+    can access the caslib can attach to a published version without loading
+    the model again.
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    caslib : string, optional
+        Specifies the caslib that holds the global tables.
+        Default : None, meaning the active caslib of the session.
+
+    Returns
+    -------
+    :class:`ModelRegistry`
+
+    '''
+
+    def __init__(self, conn, caslib=None):
+        self.conn = conn
+        self.caslib = caslib
+
+    def _retrieve_(self, _name_, message_level='error', **kwargs):
+        return traced_call(_name_, kwargs,
+                           lambda: self.conn.retrieve(_name_, _messagelevel=message_level,
+                                                      **kwargs))
+
+    def _table(self, name, **kwargs):
+        table = dict(name=name, **kwargs)
+        if self.caslib is not None:
+            table['caslib'] = self.caslib
+        return table
+
+    @staticmethod
+    def _version_name(name, version):
+        return '{}_v{}'.format(name, int(version))
+
+    def versions(self, name):
+        '''
+        List the published versions of a model
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name the model was published under.
+
+        Returns
+        -------
+        list of int
+
+        '''
+        kwargs = {} if self.caslib is None else dict(caslib=self.caslib)
+        res = self._retrieve_('table.tableinfo', **kwargs)
+        if 'TableInfo' not in res:
+            return []
+        pattern = re.compile(r'^{}_V(\d+)_INFO$'.format(re.escape(name.upper())))
+        versions = []
+        for table_name, is_global in zip(res['TableInfo']['Name'],
+                                         res['TableInfo']['Global']):
+            match = pattern.match(table_name.upper())
+            if match and is_global:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def publish(self, model, name=None, version=None):
+        '''
+        Promote the tables of a model to global scope under a versioned name
+
+        Parameters
+        ----------
+        model : Model
+            Specifies the model, with attached weights, to be published.
+        name : string, optional
+            Specifies the name to publish the model under.
+            Default : the name of the model
+        version : int, optional
+            Specifies the version to publish.
+            Default : one more than the latest published version
+
+        Returns
+        -------
+        int
+            The published version
+
+        '''
+        if name is None:
+            name = model.model_name
+        existing = self.versions(name)
+        if version is None:
+            version = existing[-1] + 1 if existing else 1
+        elif int(version) in existing:
+            raise ValueError('Version {} of model "{}" is already published.'
+                             .format(version, name))
+
+        base = self._version_name(name, version)
+        weights_name = base + '_weights'
+
+        self._retrieve_('table.partition', table=model.model_table,
+                        casout=self._table(base, promote=True))
+        self._retrieve_('table.partition', table=model.model_weights,
+                        casout=self._table(weights_name, promote=True))
+
+        attr_tbl = temp_table_name(self.conn, 'Attr_Tbl')
+        self._retrieve_('table.attribute', task='convert', attrtable=attr_tbl,
+                        **model.model_weights.to_table_params())
+        self._retrieve_('table.attribute', task='add', attrtable=attr_tbl,
+                        **self._table(weights_name))
+        self._retrieve_('table.droptable', name=attr_tbl, quiet=True)
+        forget_temp_table(self.conn, attr_tbl)
+
+        info = pd.DataFrame(dict(model_name=[model.model_name],
+                                 refcount=[0.],
+                                 status=['active'],
+                                 published=[time.time()]))
+        self.conn.upload_frame(info, casout=self._table(base + '_info', promote=True))
+
+        print('NOTE: Model "{}" is published as version {}.'.format(name, version))
+        return int(version)
+
+    def attach(self, name, version=None):
+        '''
+        Attach to a published version of a model
+
+        The returned model shares the global tables and is read-only:
+        it can be used for scoring, but not for training until new weights
+        are assigned with :meth:`Model.set_weights`.
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name the model was published under.
+        version : int, optional
+            Specifies the version to attach to.
+            Default : the latest active version
+
+        Returns
+        -------
+        :class:`Model`
+
+        '''
+        if version is None:
+            info = self.info(name)
+            info = info[info['status'] == 'active']
+            if info.shape[0] == 0:
+                raise ValueError('There is no active version of model "{}".'.format(name))
+            version = int(info['version'].max())
+        else:
+            status = self._fetch_info(name, version)['status'][0]
+            if status != 'active':
+                raise ValueError('Version {} of model "{}" is {}.'
+                                 .format(version, name, status))
+
+        base = self._version_name(name, version)
+        model = Model.from_table(self.conn.CASTable(**self._table(base)),
+                                 display_note=False)
+        model.model_weights = self.conn.CASTable(**self._table(base + '_weights'))
+        model.read_only = True
+        model.shared_version = (name, int(version))
+
+        self._add_refcount(base, 1)
+        print('NOTE: Attached to version {} of model "{}".'.format(version, name))
+        return model
+
+    def release(self, model):
+        '''
+        Release a model returned by :meth:`attach`
+
+        If the version was retired and this was its last reference,
+        the global tables are dropped.
+
+        Parameters
+        ----------
+        model : Model
+            Specifies the attached model.
+
+        '''
+        shared_version = getattr(model, 'shared_version', None)
+        if shared_version is None:
+            raise ValueError('The model is not attached to a published version.')
+        name, version = shared_version
+        base = self._version_name(name, version)
+
+        self._add_refcount(base, -1)
+        model.shared_version = None
+
+        info = self._fetch_info(name, version)
+        if info['status'][0] == 'retired' and info['refcount'][0] <= 0:
+            self._drop(base)
+
+    def retire(self, name, version, force=False):
+        '''
+        Retire a published version
+
+        The version cannot be attached to anymore.  Its global tables are
+        dropped as soon as no session references them.
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name the model was published under.
+        version : int
+            Specifies the version to retire.
+        force : bool, optional
+            Specifies whether to drop the tables even if sessions still
+            reference them.
+            Default : False
+
+        '''
+        base = self._version_name(name, version)
+        info = self._fetch_info(name, version)
+        self._retrieve_('table.update', table=self._table(base + '_info'),
+                        set=[dict(var='status', value="'retired'")])
+        if force or info['refcount'][0] <= 0:
+            self._drop(base)
+        else:
+            print('NOTE: Version {} of model "{}" is retired, the tables are dropped '
+                  'when the last {} reference(s) are released.'
+                  .format(version, name, int(info['refcount'][0])))
+
+    def info(self, name):
+        '''
+        Summarize the published versions of a model
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name the model was published under.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        rows = []
+        for version in self.versions(name):
+            info = self._fetch_info(name, version)
+            rows.append(dict(version=version,
+                             refcount=int(info['refcount'][0]),
+                             status=info['status'][0],
+                             published=pd.to_datetime(info['published'][0], unit='s')))
+        return pd.DataFrame(rows, columns=['version', 'refcount', 'status', 'published'])
+
+    def _fetch_info(self, name, version):
+        base = self._version_name(name, version)
+        res = self._retrieve_('table.fetch', table=self._table(base + '_info'))
+        if 'Fetch' not in res:
+            raise ValueError('Version {} of model "{}" is not published.'
+                             .format(version, name))
+        return res['Fetch']
+
+    def _add_refcount(self, base, increment):
+        self._retrieve_('table.update', table=self._table(base + '_info'),
+                        set=[dict(var='refcount',
+                                  value='refcount + ({})'.format(increment))])
+
+    def _drop(self, base):
+        for suffix in ('', '_weights', '_info'):
+            self._retrieve_('table.droptable', quiet=True, **self._table(base + suffix))
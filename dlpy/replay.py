@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Record and replay of the CAS actions issued by a workload '''
+
+import gzip
+import pickle
+
+import pandas as pd
+from swat.cas.results import CASResults
+from swat.cas.table import CASTable
+
+from .fake_cas import _StubConnection, _Performance, _short_name
+from .tracing import params_digest, _result_size
+
+LOG_FORMAT = 'dlpy-action-log'
+LOG_VERSION = 1
+
+
+class _TableRef(object):
+    ''' Picklable reference to a CASTable of the results '''
+
+    def __init__(self, params):
+        self.params = params
+
+
+def _encode_results(res):
+    items = []
+    for key, value in res.items():
+        if isinstance(value, CASTable):
+            value = _TableRef(dict(value.params))
+        items.append((key, value))
+    performance = getattr(res, 'performance', None)
+    return dict(items=items,
+                severity=getattr(res, 'severity', 0),
+                status=getattr(res, 'status', None),
+                messages=list(getattr(res, 'messages', None) or []),
+                elapsed_time=getattr(performance, 'elapsed_time', None))
+
+
+def _decode_results(results, conn):
+    out = CASResults()
+    for key, value in results['items']:
+        if isinstance(value, _TableRef):
+            value = conn.CASTable(**value.params)
+        out[key] = value
+    out.severity = results['severity']
+    out.status = results['status']
+    out.messages = results['messages']
+    out.performance = _Performance(results['elapsed_time'] or 0.)
+    return out
+
+
+def read_log(path):
+    '''
+    Read an action log written by :class:`RecordingCAS`
+
+    Only read logs from trusted sources: the results are stored with pickle.
+
+    Parameters
+    ----------
+    path : string
+        Specifies the log file.
+
+    Returns
+    -------
+    list of dict
+        The action calls, in order, with the keys 'action', 'digest',
+        'rows', 'bytes' and 'results'.
+
+    '''
+    records = []
+    with gzip.open(path, 'rb') as f:
+        header = pickle.load(f)
+        if not isinstance(header, dict) or header.get('format') != LOG_FORMAT:
+            raise ValueError('"{}" is not a DLPy action log.'.format(path))
+        if header.get('version') != LOG_VERSION:
+            raise ValueError('Version {} of the action log is not supported.'
+                             .format(header.get('version')))
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except EOFError:
+                break
+    return records
+
+
+class RecordingCAS(_StubConnection):
+    '''
+    Record the action calls issued on a CAS connection
+
+    Every action call is forwarded to the connection and written, with its
+    results, to a compressed log that :class:`ReplayCAS` replays without a
+    server.  The tables returned in the results are bound to the recorder,
+    so the actions issued on them are recorded too.
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    path : string
+        Specifies the log file to write.
+
+    Examples
+    --------
+    >>> with RecordingCAS(swat.CAS(host, port), 'workload.log.gz') as conn:
+    ...     model = Model.from_table(conn.CASTable('my_model'))
+    ...     model.predict(conn.CASTable('test'))
+
+    Returns
+    -------
+    :class:`RecordingCAS`
+
+    '''
+
+    def __init__(self, conn, path):
+        _StubConnection.__init__(self)
+        self.conn = conn
+        self.path = path
+        self._file = gzip.open(path, 'wb')
+        pickle.dump(dict(format=LOG_FORMAT, version=LOG_VERSION), self._file, protocol=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def has_action(self, name):
+        return self.conn.has_action(name)
+
+    def has_actionset(self, name):
+        return self.conn.has_actionset(name)
+
+    def _invoke(self, name, kwargs):
+        if _short_name(name) == 'upload' and isinstance(kwargs.get('data'), pd.DataFrame):
+            kwargs = dict(kwargs)
+            res = CASResults()
+            res['casTable'] = self.conn.upload_frame(kwargs.pop('data'), **kwargs)
+        else:
+            res = self.conn.retrieve(name, **kwargs)
+
+        params = dict((key, value) for key, value in kwargs.items()
+                      if not key.startswith('_'))
+        rows, nbytes = _result_size(res)
+        record = dict(action=name, digest=params_digest(params), rows=rows, bytes=nbytes,
+                      results=_encode_results(res))
+        if self._file is None:
+            raise ValueError('The recording is closed.')
+        pickle.dump(record, self._file, protocol=2)
+
+        for key, value in list(res.items()):
+            if isinstance(value, CASTable):
+                res[key] = self.CASTable(**value.params)
+        return res
+
+    def close(self):
+        ''' Finish writing the log (the connection is left open) '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ReplayCAS(_StubConnection):
+    '''
+    Replay an action log in place of a CAS connection
+
+    Each action call returns the recorded results of the next logged call.
+    A ValueError is raised as soon as the workload issues a different
+    action than the one recorded, so changes to the sequence of actions
+    issued by DLPy are detected without a server.
+
+    Parameters
+    ----------
+    path : string
+        Specifies the log file written by :class:`RecordingCAS`.
+    latency : double, optional
+        Specifies the time, in seconds, added to every action call.
+        Default : 0
+    check_params : bool, optional
+        Specifies whether the parameters of the actions must match the
+        recorded ones.  Generated table names usually differ between runs.
+        Default : False
+
+    Returns
+    -------
+    :class:`ReplayCAS`
+
+    '''
+
+    def __init__(self, path, latency=0., check_params=False):
+        _StubConnection.__init__(self, latency=latency)
+        self.path = path
+        self.check_params = check_params
+        self.records = read_log(path)
+        self.position = 0
+        self._actions = set(_short_name(record['action']) for record in self.records)
+
+    def has_action(self, name):
+        return _short_name(name) in self._actions
+
+    def _invoke(self, name, kwargs):
+        if self.position >= len(self.records):
+            raise ValueError('Action "{}" was issued after the end of the log '
+                             '({} actions).'.format(name, len(self.records)))
+        record = self.records[self.position]
+        if _short_name(record['action']) != _short_name(name):
+            raise ValueError('Action "{}" was issued at position {}, but "{}" was recorded.'
+                             .format(name, self.position, record['action']))
+        if self.check_params:
+            params = dict((key, value) for key, value in kwargs.items()
+                          if not key.startswith('_'))
+            if params_digest(params) != record['digest']:
+                raise ValueError('The parameters of action "{}" at position {} differ '
+                                 'from the recorded ones.'.format(name, self.position))
+        self.position += 1
+        return _decode_results(record['results'], self)
+
+    def assert_complete(self):
+        ''' Raise a ValueError if some of the recorded actions were not replayed '''
+        if self.position < len(self.records):
+            raise ValueError('{} of the {} recorded actions were not replayed, the next '
+                             'one is "{}".'.format(len(self.records) - self.position,
+                                                   len(self.records),
+                                                   self.records[self.position]['action']))
+
+
+def log_summary(path):
+    '''
+    Summarize the round trips and the data transferred in an action log
+
+    Parameters
+    ----------
+    path : string
+        Specifies the log file.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        The number of calls, and the rows and bytes returned, by action
+
+    '''
+    records = pd.DataFrame([dict(action=_short_name(record['action']), calls=1,
+                                 rows=record['rows'], bytes=record['bytes'])
+                            for record in read_log(path)],
+                           columns=['action', 'calls', 'rows', 'bytes'])
+    return records.groupby('action')[['calls', 'rows', 'bytes']].sum()
+
+
+def compare_summaries(baseline, current):
+    '''
+    Compare the round trips and data transferred of two runs of a workload
+
+    Parameters
+    ----------
+    baseline : pandas.DataFrame
+        Specifies the summary, as returned by :func:`log_summary`, of the
+        reference run.
+    current : pandas.DataFrame
+        Specifies the summary of the run to be checked.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        The calls and bytes of both runs by action, their differences and
+        a 'Total' row, sorted by decreasing difference of calls.
+
+    '''
+    columns = ['calls', 'bytes']
+    out = baseline[columns].join(current[columns], how='outer', lsuffix='_baseline')
+    out = out.fillna(0).astype('int64')
+    out.loc['Total'] = out.sum()
+    out['calls_diff'] = out['calls'] - out['calls_baseline']
+    out['bytes_diff'] = out['bytes'] - out['bytes_baseline']
+    return out[['calls_baseline', 'calls', 'calls_diff',
+                'bytes_baseline', 'bytes', 'bytes_diff']] \
+        .sort_values('calls_diff', ascending=False)
@@ -0,0 +1,594 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Low-latency scoring components for deployed deep learning models '''
+
+import collections
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from six.moves import queue
+
+from .images import encode_image, is_in_memory_image
+from .tracing import traced_call
+from .utils import (random_name, upload_dataframe, unify_keys, upload_astore,
+                    input_table_check, checked_call)
+
+
+class ScoreRequest(object):
+    '''
+    Handle of a single scoring request submitted to a :class:`BatchScorer`
+
+    Attributes
+    ----------
+    data : dict
+        The row submitted for scoring.
+    submitted : double
+        Time (in seconds) when the request was submitted.
+    latency : double
+        Time (in seconds) between the submission and the completion
+        of the request.  None until the request is completed.
+
+    '''
+
+    def __init__(self, data):
+        self.data = data
+        self.submitted = time.time()
+        self.latency = None
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def done(self):
+        ''' Return True if the request has been scored or has failed '''
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        '''
+        Wait for the request to be scored and return the scored row
+
+        Parameters
+        ----------
+        timeout : double, optional
+            Specifies the maximum number of seconds to wait.
+            Default : None, wait until the request is completed.
+
+        Returns
+        -------
+        :class:`pandas.Series`
+
+        '''
+        if not self._done.wait(timeout):
+            raise RuntimeError('The scoring request did not complete '
+                               'within {} seconds.'.format(timeout))
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _set_result(self, result=None, error=None):
+        self._result = result
+        self._error = error
+        self.latency = time.time() - self.submitted
+        self._done.set()
+
+
+class BatchScorer(object):
+    '''
+    Dynamic request batching for low-latency scoring
+
+    Requests submitted from any number of threads are coalesced into
+    micro-batches.  Each micro-batch is uploaded to the server as one table
+    and scored with a single dlScore action call, and the scored rows are
+    routed back to the individual requests.
+
+    Parameters
+    ----------
+    model : Model
+        Specifies the model (with attached weights) used for scoring.
+    max_batch_size : int, optional
+        Specifies the maximum number of requests in a micro-batch.
+        Default : 32
+    max_wait : double, optional
+        Specifies the maximum time, in seconds, that the first request of
+        a micro-batch waits for more requests to arrive.
+        Default : 0.01
+    inputs : string, optional
+        Specifies the column holding the input of the model.
+        Default : '_image_'
+    binary_columns : list of str, optional
+        Specifies the columns that contain raw bytes, such as encoded images.
+        Default : [inputs]
+    **kwargs : keyword arguments, optional
+        Specifies the optional arguments for the dlScore action.
+
+    Notes
+    -----
+    The CAS connection of the model is only used by the scoring thread
+    of the BatchScorer while it is running.
+
+    Returns
+    -------
+    :class:`BatchScorer`
+
+    '''
+
+    request_id_col = '_request_id_'
+
+    def __init__(self, model, max_batch_size=32, max_wait=0.01, inputs='_image_',
+                 binary_columns=None, **kwargs):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be a positive integer.')
+        if max_wait < 0:
+            raise ValueError('max_wait must be non-negative.')
+
+        self.model = model
+        self.conn = model.conn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max_wait
+        self.inputs = inputs
+        if binary_columns is None:
+            binary_columns = [inputs]
+        self.binary_columns = list(binary_columns)
+        self.score_options = unify_keys(dict(kwargs))
+
+        self.batch_table = random_name('Score_Batch')
+        self.output_table = random_name('Score_Out')
+
+        self.latencies = collections.deque(maxlen=100000)
+        self.batch_sizes = collections.deque(maxlen=100000)
+        self.n_batches = 0
+        self.n_requests = 0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        ''' Start the scoring thread '''
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        ''' Start the scoring thread, with the lock held '''
+        if self._stopping:
+            raise RuntimeError('The scorer is stopping.')
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name='dlpy-batch-scorer')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self, timeout=None):
+        '''
+        Stop the scoring thread and drop the server-side batch tables
+
+        Pending requests are scored before the thread exits.  The tables
+        are left on the server if the thread does not stop in time.
+
+        Parameters
+        ----------
+        timeout : double, optional
+            Specifies the maximum number of seconds to wait for the scoring
+            thread to finish.
+
+        '''
+        with self._lock:
+            worker = self._worker
+            if worker is None:
+                return
+            # No request is queued after the end of the queue is marked
+            self._stopping = True
+            self._stop_event.set()
+            self._queue.put(None)
+        worker.join(timeout)
+        if worker.is_alive():
+            # The scoring thread still uses the connection and the tables;
+            # submit keeps failing until stop is called again
+            warnings.warn('The scoring thread did not stop within {} seconds, the tables '
+                          '"{}" and "{}" are not dropped.'
+                          .format(timeout, self.batch_table, self.output_table))
+            return
+        try:
+            for name in (self.batch_table, self.output_table):
+                checked_call(self.conn, 'table.droptable', name=name, quiet=True)
+        finally:
+            with self._lock:
+                self._worker = None
+                self._stopping = False
+
+    def submit(self, data):
+        '''
+        Submit a single image or row for scoring
+
+        Parameters
+        ----------
+        data : bytes, numpy.ndarray, PIL.Image.Image or dict
+            Specifies an image (the content of an image file, or an image
+            array, see :func:`dlpy.images.encode_image`), or a dictionary
+            mapping column names to values for one row.
+
+        Returns
+        -------
+        :class:`ScoreRequest`
+
+        '''
+        if isinstance(data, dict):
+            data = dict(data)
+        elif is_in_memory_image(data) and not isinstance(data, (list, tuple)):
+            data = {self.inputs: encode_image(data)}
+        else:
+            raise TypeError('data must be an image (bytes of an encoded image, '
+                            'numpy array or PIL image) or a dictionary of column values.')
+        if self.request_id_col in data:
+            raise ValueError('Column name "{}" is reserved.'.format(self.request_id_col))
+
+        request = ScoreRequest(data)
+        with self._lock:
+            self._start()
+            self._queue.put(request)
+        return request
+
+    def score(self, data, timeout=None):
+        '''
+        Score a single image or row and wait for the result
+
+        Parameters
+        ----------
+        data : bytes, numpy.ndarray, PIL.Image.Image or dict
+            Specifies an image, or a dictionary of column values.
+        timeout : double, optional
+            Specifies the maximum number of seconds to wait.
+
+        Returns
+        -------
+        :class:`pandas.Series`
+
+        '''
+        return self.submit(data).result(timeout)
+
+    def latency_percentiles(self, percentiles=(50, 90, 95, 99)):
+        '''
+        Percentiles of the request latencies, in milliseconds
+
+        Parameters
+        ----------
+        percentiles : iter-of-doubles, optional
+            Specifies the percentiles to compute.
+            Default : (50, 90, 95, 99)
+
+        Returns
+        -------
+        :class:`pandas.Series`
+
+        '''
+        percentiles = list(percentiles)
+        with self._lock:
+            latencies = list(self.latencies)
+        latencies = np.asarray(latencies, dtype=float) * 1000.
+        if latencies.size == 0:
+            values = [np.nan] * len(percentiles)
+        else:
+            values = np.percentile(latencies, percentiles)
+        return pd.Series(values, index=['p{}'.format(p) for p in percentiles],
+                         name='latency_ms')
+
+    def _collect_batch(self):
+        ''' Block for the first request, then gather requests until the batch is full '''
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                if self._stop_event.is_set():
+                    break
+                continue
+            self._score_batch(batch)
+
+    def _score_batch(self, batch):
+        try:
+            rows = []
+            for request_id, request in enumerate(batch):
+                row = dict(request.data)
+                row[self.request_id_col] = request_id
+                rows.append(row)
+            data = pd.DataFrame(rows)
+            binary_columns = [col for col in self.binary_columns if col in data.columns]
+
+            upload_dataframe(self.conn, data, casout=self.batch_table,
+                             binary_columns=binary_columns, nrecs=len(rows))
+            if self.inputs in binary_columns:
+                checked_call(self.conn, 'table.altertable', name=self.batch_table,
+                             columns=[dict(name=self.inputs, binaryType='image')])
+
+            dlscore_options = dict(model=self.model.model_table,
+                                   initweights=self.model.model_weights,
+                                   table=dict(name=self.batch_table),
+                                   copyvars=[self.request_id_col],
+                                   randomflip='none',
+                                   randomcrop='none',
+                                   casout=dict(replace=True, name=self.output_table),
+                                   encodename=True)
+            dlscore_options.update(self.score_options)
+            checked_call(self.conn, 'deeplearn.dlscore', **dlscore_options)
+
+            scored = checked_call(self.conn, 'table.fetch', table=self.output_table,
+                                  maxrows=len(rows), to=len(rows), index=False)['Fetch']
+            scored = scored.set_index(self.request_id_col)
+        except Exception as err:
+            for request in batch:
+                request._set_result(error=err)
+        else:
+            for request_id, request in enumerate(batch):
+                if request_id in scored.index:
+                    request._set_result(result=scored.loc[request_id])
+                else:
+                    request._set_result(error=RuntimeError(
+                        'No scoring result was returned for the request.'))
+
+        with self._lock:
+            self.n_batches += 1
+            self.n_requests += len(batch)
+            self.batch_sizes.append(len(batch))
+            self.latencies.extend(request.latency for request in batch)
+
+
+class AstoreScorer(object):
+    '''
+    Persistent astore-based scoring session
+
+    The analytic store is uploaded once and kept resident in the session,
+    so that new tables can be scored through the astore.score action without
+    the model table and the weights table of the training session.
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    path : string, optional
+        Specifies the client-side path of the astore file, e.g. the file
+        written by :meth:`Model.save_to_astore`.
+    astore_table : string or dict, optional
+        Specifies an existing table on server that contains the astore.
+        Either path or astore_table has to be specified.
+    model_name : string, optional
+        Specifies the name of the scored model.
+
+    Attributes
+    ----------
+    valid_res : pandas.DataFrame
+        Results after running AstoreScorer.predict() on client (limited to 1000)
+    valid_res_tbl : CASTable
+        Results after running AstoreScorer.predict() on server
+    valid_conf_mat : CASResults
+        Confusion matrix of results
+    valid_score : pandas.DataFrame
+        Shows number of Observations and Misclassification Error
+
+    Returns
+    -------
+    :class:`AstoreScorer`
+
+    '''
+
+    def __init__(self, conn, path=None, astore_table=None, model_name=None):
+        if (path is None) == (astore_table is None):
+            raise ValueError('Exactly one of path and astore_table has to be specified.')
+
+        if not conn.queryactionset('astore')['astore']:
+            conn.loadactionset('astore', _messagelevel='error')
+
+        self.conn = conn
+        if path is not None:
+            self.astore_table = dict(name=upload_astore(conn, path,
+                                                        table_name=random_name('ASTORE')))
+            self._owns_table = True
+        else:
+            self.astore_table = input_table_check(astore_table)
+            self._owns_table = False
+        self.model_name = model_name
+
+        self.valid_res = None
+        self.valid_res_tbl = None
+        self.valid_conf_mat = None
+        self.valid_score = None
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        '''
+        Export a model to an astore that stays resident on the server
+
+        Parameters
+        ----------
+        model : Model
+            Specifies the model (with attached weights) to be exported.
+        **kwargs : keyword arguments, optional
+            Specifies the optional arguments for the dlExportModel action.
+
+        Notes
+        -----
+        The astore is created directly in the session, it is not
+        downloaded to the client.
+
+        Returns
+        -------
+        :class:`AstoreScorer`
+
+        '''
+        astore_table = random_name(model.model_name + '_astore')
+        model._retrieve_('deeplearn.dlexportmodel',
+                         casout=dict(replace=True, name=astore_table),
+                         initWeights=model.model_weights,
+                         modelTable=model.model_table,
+                         randomCrop='none',
+                         randomFlip='none',
+                         **kwargs)
+        out = cls(model.conn, astore_table=astore_table, model_name=model.model_name)
+        out._owns_table = True
+        return out
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _retrieve_(self, _name_, message_level='error', **kwargs):
+        return traced_call(_name_, kwargs,
+                           lambda: self.conn.retrieve(_name_, _messagelevel=message_level,
+                                                      **kwargs))
+
+    def describe(self):
+        '''
+        Describe the inputs and outputs of the astore
+
+        Returns
+        -------
+        :class:`CASResults`
+
+        '''
+        return self._retrieve_('astore.describe', rstore=self.astore_table)
+
+    def predict(self, data, target='_label_', copy_vars=None, n_fetch=1000, **kwargs):
+        '''
+        Score a table with the astore
+
+        Parameters
+        ----------
+        data : ImageTable or CASTable or string or dict
+            Specifies the table to be scored.
+        target : string, optional
+            Specifies the variable name of the response in the data.  The
+            confusion matrix and the misclassification error are only
+            computed when the column exists.
+            Default : '_label_'
+        copy_vars : list of str, optional
+            Specifies the columns copied to the output table.
+            Default : None, meaning the columns '_id_', '_filename_0' and
+            target, among those that exist in data.  The image column is
+            never copied unless specified.
+        n_fetch : int, optional
+            Specifies the number of scored rows brought to the client in
+            the valid_res attribute.
+            Default : 1000
+        **kwargs : keyword arguments, optional
+            Specifies the optional arguments for the astore.score action.
+
+        Returns
+        -------
+        :class:`CASResults`
+
+        '''
+        input_tbl_opts = input_table_check(data)
+        input_table = self.conn.CASTable(**input_tbl_opts)
+        columns = input_table.columninfo().ColumnInfo.Column.tolist()
+
+        if copy_vars is None:
+            copy_vars = [item for item in ['_id_', '_filename_0', target] if item in columns]
+
+        valid_res_tbl = random_name('Valid_Res')
+        res = self._retrieve_('astore.score', table=input_tbl_opts,
+                              rstore=self.astore_table,
+                              out=dict(replace=True, name=valid_res_tbl),
+                              copyvars=copy_vars, **kwargs)
+
+        if self.valid_res_tbl is not None:
+            self._retrieve_('table.droptable', quiet=True,
+                            **self.valid_res_tbl.to_table_params())
+        self.valid_res_tbl = self.conn.CASTable(valid_res_tbl)
+
+        if target in copy_vars:
+            self.valid_conf_mat = self._retrieve_('simple.crosstab', table=valid_res_tbl,
+                                                  row=target, col='I_' + target)
+            self.valid_score = self._score_info(valid_res_tbl, target)
+            res['ScoreInfo'] = self.valid_score
+        else:
+            self.valid_conf_mat = None
+            self.valid_score = None
+
+        self.valid_res = self._retrieve_('table.fetch', table=valid_res_tbl,
+                                         to=n_fetch, maxrows=n_fetch)['Fetch']
+        return res
+
+    def _score_info(self, table_name, target):
+        ''' Compute the misclassification error of the scored table on server '''
+        info = self._retrieve_('table.columninfo', table=table_name)['ColumnInfo']
+        types = dict(zip(info['Column'].str.upper(), info['Type'].str.lower()))
+        target_num, predicted_num = [
+            types.get(name.upper()) not in ('char', 'varchar', 'binary', 'varbinary')
+            for name in (target, 'I_' + target)]
+        if target_num and predicted_num:
+            compare = '{0} ne I_{0}'
+        elif target_num:
+            # the predicted levels of a numeric target are formatted values
+            compare = '{0} ne input(I_{0}, best32.)'
+        elif predicted_num:
+            compare = 'strip({0}) ne strip(put(I_{0}, best32.))'
+        else:
+            compare = 'strip({0}) ne strip(I_{0})'
+        code = '_dlpy_miss_ = ({}) * 100;'.format(compare.format(target))
+        summary = self._retrieve_('simple.summary', inputs=['_dlpy_miss_'],
+                                  table=dict(name=table_name,
+                                             computedvars=['_dlpy_miss_'],
+                                             computedvarsprogram=code))['Summary']
+        n_obs = int(summary['N'][0])
+        return pd.DataFrame(dict(Descr=['Number of Observations Read',
+                                        'Number of Observations Used',
+                                        'Misclassification Error (%)'],
+                                 Value=[n_obs, n_obs, summary['Mean'][0]]))
+
+    def close(self):
+        ''' Drop the astore, and the scored table, from the session '''
+        if self.valid_res_tbl is not None:
+            self._retrieve_('table.droptable', quiet=True,
+                            **self.valid_res_tbl.to_table_params())
+            self.valid_res_tbl = None
+        if self._owns_table and self.astore_table is not None:
+            self._retrieve_('table.droptable', quiet=True, **self.astore_table)
+        self.astore_table = None
@@ -21,6 +21,7 @@
 from swat.cas.table import CASTable
 
 from .images import ImageTable
+from .temp_tables import temp_table_name, forget_temp_table
 from .utils import random_name
 
 
@@ -46,9 +47,10 @@ def two_way_split(tbl, test_rate=20, stratify_by='_label_',
     ( training CASTable, testing CASTable )
 
     '''
+    conn = tbl.get_connection()
     train_tbl_name = random_name()
     test_tbl_name = random_name()
-    temp_tbl_name = random_name('Temp')
+    temp_tbl_name = temp_table_name(conn, 'Temp')
 
     tbl._retrieve('loadactionset', actionset='sampling')
 
@@ -74,9 +76,16 @@ def two_way_split(tbl, test_rate=20, stratify_by='_label_',
 
     tbl._retrieve('table.dropTable',
                   name=temp_tbl_name)
+    forget_temp_table(conn, temp_tbl_name)
 
-    return (ImageTable.from_table(train, label_col=stratify_by, image_col=image_col),
-            ImageTable.from_table(test, label_col=stratify_by, image_col=image_col))
+    out = (ImageTable.from_table(train, label_col=stratify_by, image_col=image_col),
+           ImageTable.from_table(test, label_col=stratify_by, image_col=image_col))
+
+    # The ImageTables are copies of the partitions
+    for name in (train_tbl_name, test_tbl_name):
+        tbl._retrieve('table.dropTable', name=name)
+
+    return out
 
 
 def three_way_split(tbl, valid_rate=20, test_rate=20, stratify_by='_label_', **kwargs):
@@ -104,10 +113,11 @@ def three_way_split(tbl, valid_rate=20, test_rate=20, stratify_by='_label_', **k
     ( train CASTable, valid CASTable, test CASTable )
 
     '''
+    conn = tbl.get_connection()
     train_tbl_name = random_name()
     valid_tbl_name = random_name()
     test_tbl_name = random_name()
-    temp_tbl_name = random_name('Temp')
+    temp_tbl_name = temp_table_name(conn, 'Temp')
 
     tbl._retrieve('loadactionset', actionset='sampling')
 
@@ -137,7 +147,14 @@ def three_way_split(tbl, valid_rate=20, test_rate=20, stratify_by='_label_', **k
 
     tbl._retrieve('table.dropTable',
                   name=temp_tbl_name)
+    forget_temp_table(conn, temp_tbl_name)
+
+    out = (ImageTable.from_table(train),
+           ImageTable.from_table(valid),
+           ImageTable.from_table(test))
+
+    # The ImageTables are copies of the partitions
+    for name in (train_tbl_name, valid_tbl_name, test_tbl_name):
+        tbl._retrieve('table.dropTable', name=name)
 
-    return (ImageTable.from_table(train),
-            ImageTable.from_table(valid),
-            ImageTable.from_table(test))
+    return out
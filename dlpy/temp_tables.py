@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Lifecycle management of the temporary tables created by DLPy '''
+
+import collections
+import threading
+import weakref
+
+import pandas as pd
+
+from .utils import random_name
+
+
+_lock = threading.RLock()
+_session_tables = weakref.WeakKeyDictionary()
+_scoped_tables = weakref.WeakKeyDictionary()
+
+
+class TempTables(object):
+    '''
+    Registry of the tables created by DLPy in a CAS session
+
+    Used as a context manager, the registry is scoped: every table DLPy
+    creates on the connection inside the ``with`` block is registered, and
+    all of them are dropped on exit.  Outside of any scope, tables are
+    registered in the session-level registry returned by
+    :func:`session_temp_tables`.
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    max_bytes : int, optional
+        Specifies the memory budget of the registered tables.  When a new
+        table is registered and the budget is exceeded, the oldest tables
+        are dropped until the footprint fits in the budget.  The size of
+        each table is measured once, at the first check after it was
+        created.
+        Default : None, no budget
+
+    Examples
+    --------
+    >>> with TempTables(conn):
+    ...     model.predict(test)
+    ...     model.heat_map_analysis()
+    >>> # every table created in the block has been dropped
+
+    Returns
+    -------
+    :class:`TempTables`
+
+    '''
+
+    def __init__(self, conn, max_bytes=None):
+        # The registries are keyed by weak references to the connection
+        self._conn = weakref.ref(conn)
+        self.max_bytes = max_bytes
+        self.tables = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        return self._conn()
+
+    def __enter__(self):
+        with _lock:
+            _scoped_tables.setdefault(self.conn, []).append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with _lock:
+            stack = _scoped_tables.get(self.conn, [])
+            if self in stack:
+                stack.remove(self)
+        self.drop()
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __contains__(self, name):
+        return name.upper() in self.tables
+
+    def new_name(self, name='ImageData', length=6):
+        '''
+        Generate a table name and register the table
+
+        Parameters
+        ----------
+        name : string, optional
+            Prefix of the generated name
+        length : int, optional
+            Length of the random characters in the name
+
+        Returns
+        -------
+        string
+
+        '''
+        self.enforce_budget()
+        table_name = random_name(name, length)
+        self.register(table_name)
+        return table_name
+
+    def register(self, name, caslib=None, nbytes=None):
+        '''
+        Register a table
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name of the table.
+        caslib : string, optional
+            Specifies the caslib of the table.
+        nbytes : int, optional
+            Specifies the size of the table, if known.  Otherwise it is
+            measured at the next check of the budget.
+
+        '''
+        with self._lock:
+            self.tables[name.upper()] = dict(name=name, caslib=caslib, bytes=nbytes,
+                                             misses=0)
+        if nbytes is not None:
+            self.enforce_budget()
+
+    def keep(self, name):
+        '''
+        Stop tracking a table, so that it is not dropped by the registry
+
+        Parameters
+        ----------
+        name : string
+            Specifies the name of the table.
+
+        '''
+        with self._lock:
+            self.tables.pop(name.upper(), None)
+
+    def footprint(self):
+        '''
+        Report the number of rows and the memory used by the registered tables
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        with self._lock:
+            tables = list(self.tables.values())
+        rows = []
+        for table in tables:
+            details = self._details(table)
+            if details is None:
+                # The table was dropped by other means
+                self.keep(table['name'])
+                continue
+            rows.append(dict(Name=table['name'], Rows=int(details['Rows'].sum()),
+                             Bytes=table['bytes']))
+        return pd.DataFrame(rows, columns=['Name', 'Rows', 'Bytes'])
+
+    def _details(self, table):
+        ''' Table details of a registered table, recording its size '''
+        res = self.conn.retrieve('table.tabledetails', _messagelevel='error',
+                                 level='sum', **self._table_params(table))
+        if 'TableDetails' not in res:
+            return None
+        details = res['TableDetails']
+        table['bytes'] = int(sum(float(details[col].sum())
+                                 for col in ('DataSize', 'VardataSize')
+                                 if col in details.columns))
+        return details
+
+    def _measure(self):
+        ''' Record the size of the registered tables that were not measured yet '''
+        with self._lock:
+            tables = [table for table in self.tables.values() if table['bytes'] is None]
+        for table in tables:
+            if self._details(table) is None:
+                # Not created yet, or dropped by other means if still
+                # missing at the next check
+                table['misses'] += 1
+                if table['misses'] > 1:
+                    self.keep(table['name'])
+
+    def drop(self, names=None):
+        '''
+        Drop registered tables from the server
+
+        Parameters
+        ----------
+        names : list of str, optional
+            Specifies the tables to drop.
+            Default : None, meaning all the registered tables
+
+        '''
+        with self._lock:
+            if names is None:
+                names = list(self.tables.keys())
+            tables = [self.tables.pop(name.upper()) for name in names
+                      if name.upper() in self.tables]
+        for table in tables:
+            self.conn.retrieve('table.droptable', _messagelevel='error',
+                               quiet=True, **self._table_params(table))
+
+    def enforce_budget(self):
+        ''' Drop the oldest registered tables until the footprint fits in max_bytes '''
+        if self.max_bytes is None or not self.tables:
+            return
+        self._measure()
+        with self._lock:
+            sizes = [(table['name'], table['bytes']) for table in self.tables.values()
+                     if table['bytes'] is not None]
+        total = sum(size for _, size in sizes)
+        evict = []
+        for name, size in sizes:
+            if total <= self.max_bytes:
+                break
+            evict.append(name)
+            total -= size
+        if evict:
+            print('NOTE: Dropping {} temporary table(s) to stay within the memory '
+                  'budget of {} bytes.'.format(len(evict), self.max_bytes))
+            self.drop(evict)
+
+    @staticmethod
+    def _table_params(table):
+        if table['caslib'] is None:
+            return dict(name=table['name'])
+        return dict(name=table['name'], caslib=table['caslib'])
+
+
+def session_temp_tables(conn, max_bytes=None):
+    '''
+    Return the session-level registry of the tables created by DLPy
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    max_bytes : int, optional
+        Specifies the memory budget of the registry.  The budget is left
+        unchanged if not specified.
+
+    Returns
+    -------
+    :class:`TempTables`
+
+    '''
+    with _lock:
+        tables = _session_tables.get(conn)
+        if tables is None:
+            tables = TempTables(conn)
+            _session_tables[conn] = tables
+    if max_bytes is not None:
+        tables.max_bytes = max_bytes
+    return tables
+
+
+def active_temp_tables(conn):
+    '''
+    Return the innermost scoped registry of the connection, or the session registry
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+
+    Returns
+    -------
+    :class:`TempTables`
+
+    '''
+    with _lock:
+        stack = _scoped_tables.get(conn)
+        if stack:
+            return stack[-1]
+    return session_temp_tables(conn)
+
+
+def temp_table_name(conn, name='ImageData', length=6):
+    '''
+    Generate a table name registered in the active registry of the connection
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    name : string, optional
+        Prefix of the generated name
+    length : int, optional
+        Length of the random characters in the name
+
+    Returns
+    -------
+    string
+
+    '''
+    return active_temp_tables(conn).new_name(name, length)
+
+
+def forget_temp_table(conn, name):
+    '''
+    Stop tracking a table dropped by DLPy, in every registry of the connection
+
+    Parameters
+    ----------
+    conn : CAS
+        Specifies the CAS connection object.
+    name : string
+        Specifies the name of the table.
+
+    '''
+    with _lock:
+        registries = list(_scoped_tables.get(conn, [])) + \
+            [tables for tables in [_session_tables.get(conn)] if tables is not None]
+    for tables in registries:
+        tables.keep(name)
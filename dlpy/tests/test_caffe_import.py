@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.model import Model
+from dlpy.model_conversion.conversion_cache import ConversionCache
+from dlpy.model_conversion.caffe_proto import (parse_prototxt, iter_caffemodel_blobs,
+                                               TEST)
+from dlpy.model_conversion.sas_caffe_parse import caffe_to_layers
+
+PROTOTXT = '''
+name: "tiny_resnet"
+layer {
+  name: "data"  type: "MemoryData"  top: "data"  top: "label"
+  memory_data_param { batch_size: 1 channels: 3 height: 32 width: 32 }
+  transform_param { scale: 0.5 }
+}
+layer {
+  name: "conv1"  type: "Convolution"  bottom: "data"  top: "conv1"
+  convolution_param { num_output: 4 kernel_size: 3 stride: 1 bias_term: false }
+}
+layer { name: "bn1" type: "BatchNorm" bottom: "conv1" top: "conv1" }
+layer { name: "scale1" type: "Scale" bottom: "conv1" top: "conv1"
+        scale_param { bias_term: true } }
+layer { name: "relu1" type: "ReLU" bottom: "conv1" top: "conv1" }
+layer {
+  name: "conv2"  type: "Convolution"  bottom: "conv1"  top: "conv2"
+  convolution_param { num_output: 4 kernel_size: 3 pad: 1 }
+}
+layer {
+  name: "res1"  type: "Eltwise"  bottom: "conv1"  bottom: "conv2"  top: "res1"
+  eltwise_param { operation: SUM }
+}
+layer { name: "res1_relu" type: "ReLU" bottom: "res1" top: "res1" }
+layer {
+  name: "pool1"  type: "Pooling"  bottom: "res1"  top: "pool1"
+  pooling_param { pool: AVE kernel_size: 2 stride: 2 }
+}
+layer {
+  name: "fc1"  type: "InnerProduct"  bottom: "pool1"  top: "fc1"
+  inner_product_param { num_output: 10 }
+}
+layer { name: "drop1" type: "Dropout" bottom: "fc1" top: "fc1"
+        dropout_param { dropout_ratio: 0.25 } }
+layer { name: "fc2" type: "InnerProduct" bottom: "fc1" top: "fc2"
+        inner_product_param { num_output: 2 } }
+layer { name: "prob" type: "Softmax" bottom: "fc2" top: "prob" }
+layer { name: "loss" type: "SoftmaxWithLoss" bottom: "fc2" bottom: "label"
+        include { phase: TRAIN } }
+'''
+
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def field(number, payload):
+    return varint(number << 3 | 2) + varint(len(payload)) + payload
+
+
+def caffemodel(params):
+    out = b''
+    for name, blobs in params:
+        layer = field(1, name.encode('utf-8'))
+        for blob in blobs:
+            shape = field(1, b''.join(varint(dim) for dim in blob.shape))
+            layer += field(7, field(7, shape) +
+                           field(5, blob.astype('<f4').tobytes()))
+        out += field(100, layer)
+    return out
+
+
+class TestCaffeImport(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+        with open('tiny.prototxt', 'w') as f:
+            f.write(PROTOTXT)
+        rng = np.random.RandomState(0)
+        self.params = [('conv1', [rng.rand(4, 3, 3, 3)]),
+                       ('bn1', [rng.rand(4), rng.rand(4), rng.rand(1)]),
+                       ('scale1', [rng.rand(4), rng.rand(4)]),
+                       ('conv2', [rng.rand(4, 4, 3, 3), rng.rand(4)]),
+                       ('fc1', [rng.rand(10, 1024), rng.rand(10)]),
+                       ('fc2', [rng.rand(2, 10), rng.rand(2)]),
+                       ('fc_train_only', [rng.rand(3)])]
+        with open('tiny.caffemodel', 'wb') as f:
+            f.write(caffemodel(self.params))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_prototxt(self):
+        net = parse_prototxt(PROTOTXT)
+        self.assertEqual(net.name, 'tiny_resnet')
+        self.assertEqual(len(net.layer), 14)
+        self.assertEqual(net.layer[0].top, ['data', 'label'])
+        self.assertEqual(net.layer[8].pooling_param.pool, 1)
+        self.assertEqual(net.layer[1].convolution_param.kernel_size, [3])
+        self.assertEqual(net.layer[1].convolution_param.group, 1)
+        self.assertEqual(net.layer[2].pooling_param.stride, 1)
+        self.assertEqual(net.layer[13].include[0].phase, 0)
+        with self.assertRaises(AttributeError):
+            net.layer[0].no_such_field
+
+    def test_blobs(self):
+        blobs = list(iter_caffemodel_blobs('tiny.caffemodel', set(['conv1', 'fc1'])))
+        self.assertEqual([name for name, _ in blobs], ['conv1', 'fc1'])
+        self.assertEqual(blobs[1][1][0].shape, (10, 1024))
+        self.assertTrue(np.allclose(blobs[1][1][0], self.params[4][1][0]))
+
+    def test_caffe_to_layers(self):
+        layers = caffe_to_layers('tiny.prototxt', 'tiny', network_param='tiny.caffemodel',
+                                 phase=TEST)
+        self.assertEqual([spec['name'] for spec in layers],
+                         ['data', 'conv1', 'bn1', 'conv2', 'res1', 'pool1', 'fc1', 'fc2'])
+        specs = dict((spec['name'], spec) for spec in layers)
+        self.assertEqual(specs['data']['layer']['scale'], 0.5)
+        self.assertEqual(specs['conv1']['layer']['nobias'], True)
+        self.assertEqual(specs['bn1']['layer']['act'], 'relu')
+        self.assertEqual(specs['res1']['srclayers'], ['bn1', 'conv2'])
+        self.assertEqual(specs['pool1']['layer']['pool'], 'mean')
+        self.assertEqual(specs['fc1']['layer']['dropout'], 0.25)
+        self.assertEqual(specs['fc2']['layer']['type'], 'output')
+
+        with h5py.File('tiny_weights.h5', 'r') as f:
+            self.assertEqual(sorted(f['data'].keys()),
+                             ['bn1', 'bn1_scale', 'conv1', 'conv2', 'data', 'fc1',
+                              'fc2', 'pool1', 'res1'])
+            self.assertEqual(f['data/conv2/0'].shape, (4, 4, 3, 3))
+
+    def test_from_caffe_model(self):
+        model = Model.from_caffe_model(FakeCAS(), 'tiny.prototxt',
+                                       output_model_table='tiny')
+        self.assertEqual([layer.config['type'] for layer in model.layers],
+                         ['input', 'convo', 'batchnorm', 'convo', 'residual', 'pool',
+                          'fc', 'output'])
+
+    def test_cache(self):
+        cache = ConversionCache('cache')
+        for _ in range(2):
+            model = Model.from_caffe_model(FakeCAS(), 'tiny.prototxt', output_model_table='tiny',
+                                           model_weights_file='tiny.caffemodel', cache=cache,
+                                           verbose=False)
+        self.assertEqual(len(model.layers), 8)
+        self.assertEqual(len(cache.entries()), 1)
+        # the weights are written to the cache only
+        self.assertFalse(os.path.exists('tiny_weights.h5'))
+        weights_file = cache.get(cache.entries()[0][0])[1]
+        with h5py.File(weights_file, 'r') as f:
+            self.assertEqual(f['data/conv2/0'].shape, (4, 4, 3, 3))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import collections
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.model_conversion import write_caffe_model_parm
+from dlpy.model_conversion.write_caffe_model_parm import write_caffe_hdf5
+
+
+class Namespace(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestCaffeWeights(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.params = collections.OrderedDict([
+            ('conv1', [rng.rand(16, 3, 3, 3).astype('float32'),
+                       rng.rand(16).astype('float32')]),
+            ('bn1', [rng.rand(16).astype('float32') for _ in range(3)]),
+            ('scale1', [rng.rand(16).astype('float32') for _ in range(2)]),
+            ('fc1', [rng.rand(1000, 300).astype('float32')])])
+        self.net = Namespace(params=collections.OrderedDict(
+            (name, [Namespace(data=blob) for blob in blobs])
+            for name, blobs in self.params.items()))
+        self.layer_list = [
+            Namespace(layer_parm=Namespace(name='data'), related_layers=[]),
+            Namespace(layer_parm=Namespace(name='conv1'), related_layers=[]),
+            Namespace(layer_parm=Namespace(name='bn1'),
+                      related_layers=[Namespace(type='Scale', name='scale1')]),
+            Namespace(layer_parm=Namespace(name='fc1'), related_layers=[])]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, file_name):
+        with h5py.File(file_name, 'r') as f:
+            self.assertEqual(sorted(f['data'].keys()),
+                             ['bn1', 'bn1_scale', 'conv1', 'data', 'fc1'])
+            self.assertEqual(len(f['data/data']), 0)
+            for name, group in [('conv1', 'conv1'), ('scale1', 'bn1_scale'), ('fc1', 'fc1')]:
+                for ii, blob in enumerate(self.params[name]):
+                    self.assertTrue((f['data'][group][str(ii)][()] == blob).all())
+
+    def test_write(self):
+        file_name = os.path.join(self.dir, 'model.caffemodel.h5')
+        write_caffe_hdf5(self.net, self.layer_list, file_name)
+        self.check(file_name)
+
+    def test_parallel_compression(self):
+        parallel_size = write_caffe_model_parm.PARALLEL_BLOB_SIZE
+        chunk_size = write_caffe_model_parm.CHUNK_SIZE
+        write_caffe_model_parm.PARALLEL_BLOB_SIZE = 1 << 10
+        write_caffe_model_parm.CHUNK_SIZE = 1 << 14
+        try:
+            file_name = os.path.join(self.dir, 'model.caffemodel.h5')
+            write_caffe_hdf5(self.net, self.layer_list, file_name, compression='gzip',
+                             n_threads=4)
+            self.check(file_name)
+            with h5py.File(file_name, 'r') as f:
+                self.assertEqual(f['data/fc1/0'].compression, 'gzip')
+                self.assertEqual(f['data/fc1/0'].chunks, (13, 300))
+        finally:
+            write_caffe_model_parm.PARALLEL_BLOB_SIZE = parallel_size
+            write_caffe_model_parm.CHUNK_SIZE = chunk_size
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import time
+
+import swat.utils.testing as tm
+from dlpy.model_conversion.conversion_cache import ConversionCache
+
+
+class TestConversionCache(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ConversionCache(os.path.join(self.dir, 'cache'), max_size=2500)
+        self.model_file = os.path.join(self.dir, 'model.prototxt')
+        self.weights_file = os.path.join(self.dir, 'weights.h5')
+        with open(self.model_file, 'w') as f:
+            f.write('name: "model"')
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def convert(self, weights_file=None):
+        self.calls += 1
+        with open(weights_file or self.weights_file, 'wb') as f:
+            f.write(b'\0' * 1000)
+        return [dict(name='data', layer=dict(type='input', nchannels=3))]
+
+    def test_hit(self):
+        layers, weights_file = self.cache.convert('caffe', [self.model_file, None],
+                                                  self.convert, True, phase=1)
+        self.assertEqual(os.path.dirname(os.path.dirname(weights_file)), self.cache.path)
+        self.assertEqual(os.path.basename(weights_file), 'weights.caffemodel.h5')
+        self.assertFalse(os.path.exists(self.weights_file))
+        # verbose does not change the result
+        cached = self.cache.convert('caffe', [self.model_file, None], self.convert, True,
+                                    phase=1, verbose=True)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cached, (layers, weights_file))
+        self.assertEqual(os.path.getsize(weights_file), 1000)
+
+        self.cache.convert('caffe', [self.model_file, None], self.convert, True, phase=0)
+        self.assertEqual(self.calls, 2)
+        with open(self.model_file, 'a') as f:
+            f.write(' ')
+        self.cache.convert('caffe', [self.model_file, None], self.convert, True, phase=1)
+        self.assertEqual(self.calls, 3)
+
+    def test_not_serializable(self):
+        with self.assertRaises(TypeError):
+            self.cache.convert('caffe', [self.model_file, None],
+                               lambda weights_file: [dict(name=object())])
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_evict(self):
+        keys = []
+        for phase in range(3):
+            keys.append(self.cache.key('caffe', [self.model_file], phase=phase))
+            self.cache.put(keys[-1], self.convert(), self.weights_file)
+            time.sleep(0.01)
+            if phase == 1:
+                self.cache.get(keys[0])
+        # the least recently used entry is removed
+        self.assertEqual(sorted(name for name, _ in self.cache.entries()),
+                         sorted([keys[0], keys[2]]))
+        self.cache.clear()
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == '__main__':
+    tm.runtests()
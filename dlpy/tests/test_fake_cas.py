@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import time
+
+import pandas as pd
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.images import ImageTable
+from dlpy.layers import InputLayer, Conv2d, Pooling, Dense, OutputLayer
+from dlpy.model import Model
+from dlpy.Sequential import Sequential
+from dlpy.splitting import two_way_split
+
+
+class TestFakeCAS(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        data = pd.DataFrame(dict(_image_=[b'image'] * 20,
+                                 _label_=['cat', 'dog'] * 10,
+                                 _filename_0=['{}.jpg'.format(i) for i in range(20)]))
+        self.s.upload_frame(data, casout=dict(name='images'))
+
+    def simple_model(self):
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 32, 32))
+        model.add(Conv2d(8, 7))
+        model.add(Pooling(2))
+        model.add(Dense(16))
+        model.add(OutputLayer(n=2))
+        return model
+
+    def test_model_table(self):
+        model = self.simple_model()
+        info = model.get_model_info()['ModelInfo']
+        self.assertEqual(info['Value'][2], '5')
+        self.assertEqual(info['Value'][5], '1')
+
+        model1 = Model.from_table(self.s.CASTable('simple'))
+        self.assertEqual([layer.config['type'] for layer in model1.layers],
+                         ['input', 'convo', 'pool', 'fc', 'output'])
+        self.assertEqual(model1.layers[1].config['nfilters'], 8)
+        self.assertEqual(model1.layers[2].config['pool'], 'max')
+
+    def test_fit_predict(self):
+        model = self.simple_model()
+        res = model.fit(data='images', inputs='_image_', target='_label_', max_epochs=3)
+        self.assertEqual(res['OptIterHistory'].shape[0], 3)
+        self.assertTrue(model.model_weights is not None)
+
+        self.s.reset_stats()
+        res = model.predict(data='images')
+        self.assertTrue('ScoreInfo' in res)
+        self.assertEqual(self.s.action_counts['dlscore'], 1)
+
+        scored = model.valid_res_tbl.to_frame()
+        self.assertEqual(scored.shape[0], 20)
+        self.assertTrue(set(scored['I__label_']) <= set(['cat', 'dog']))
+
+    def test_where_and_fetch(self):
+        tbl = self.s.CASTable('images', where='_label_ = "cat"')
+        self.assertEqual(tbl.numrows()['numrows'], 10)
+        fetched = self.s.retrieve('table.fetch', table='images', to=5,
+                                  sortby=[dict(name='_filename_0', order='DESCENDING')])
+        self.assertEqual(fetched['Fetch'].shape[0], 5)
+        self.assertEqual(fetched['Fetch']['_filename_0'][0], '9.jpg')
+
+    def test_split(self):
+        tbl = ImageTable.from_table(self.s.CASTable('images'))
+        train, test = two_way_split(tbl, test_rate=20)
+        self.assertEqual(train.numrows()['numrows'], 16)
+        self.assertEqual(test.numrows()['numrows'], 4)
+
+    def test_unknown_table(self):
+        res = self.s.retrieve('table.fetch', table='missing')
+        self.assertEqual(res.severity, 2)
+
+    def test_latency(self):
+        s = FakeCAS(latency=0.01)
+        start = time.time()
+        for _ in range(5):
+            s.retrieve('table.tableinfo')
+        self.assertTrue(time.time() - start >= 0.05)
+        self.assertEqual(s.round_trips, 5)
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pandas as pd
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.feature_cache import feature_table_name
+from dlpy.layers import InputLayer, Conv2d, Pooling, Dense, OutputLayer
+from dlpy.Sequential import Sequential
+
+
+class TestFeatureCache(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        self.s.upload_frame(pd.DataFrame(dict(_image_=[b'x'] * 4, _id_=[1, 2, 3, 4],
+                                              _label_=['a', 'b', 'c', 'a'])),
+                            casout=dict(name='train'))
+        backbone = Sequential(self.s, model_table='backbone')
+        backbone.add(InputLayer(3, 8, 8))
+        backbone.add(Conv2d(4, 3))
+        backbone.add(Pooling(2))
+        backbone.add(Dense(6, name='features'))
+        backbone.add(OutputLayer(n=2))
+        self.backbone = backbone
+        self.set_weights(0)
+
+    def set_weights(self, seed):
+        rng = np.random.RandomState(seed)
+        rows = [(layer_id, ii, rng.normal())
+                for layer_id, n in [(1, 112), (3, 390), (4, 14)] for ii in range(n)]
+        self.s.upload_frame(pd.DataFrame(rows, columns=['_LayerID_', '_WeightID_',
+                                                        '_Weight_']),
+                            casout=dict(name='backbone_weights', replace=True))
+        self.backbone.set_weights('backbone_weights')
+
+    def head(self, name, n_features=6):
+        head = Sequential(self.s, model_table=name)
+        head.add(InputLayer(n_features, 1, 1))
+        head.add(Dense(5))
+        head.add(OutputLayer(n=3))
+        return head
+
+    def test_shared_features(self):
+        for name in ['head_0', 'head_1']:
+            self.backbone.fit_head(self.head(name), 'train', 'features', max_epochs=1)
+        self.assertEqual(self.s.action_counts['dlscore'], 1)
+        self.assertEqual(self.s.action_counts['dltrain'], 2)
+
+        name = feature_table_name(self.backbone, 'train', 'features')
+        features = self.s.CASTable(name).to_frame()
+        self.assertEqual(list(features.columns[:2]), ['_id_', '_label_'])
+        self.assertEqual(features.shape, (4, 8))
+
+    def test_new_weights(self):
+        name = feature_table_name(self.backbone, 'train', 'features')
+        self.assertEqual(feature_table_name(self.backbone, 'train', 'features'), name)
+        self.set_weights(1)
+        self.assertNotEqual(feature_table_name(self.backbone, 'train', 'features'), name)
+
+    def test_new_data(self):
+        name = feature_table_name(self.backbone, 'train', 'features')
+        self.s.upload_frame(pd.DataFrame(dict(_image_=[b'y'] * 4, _id_=[1, 2, 3, 4],
+                                              _label_=['c', 'b', 'a', 'a'])),
+                            casout=dict(name='train', replace=True))
+        self.assertNotEqual(feature_table_name(self.backbone, 'train', 'features'), name)
+
+    def test_input_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.backbone.fit_head(self.head('head_0', n_features=5), 'train', 'features')
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import io
+
+import numpy as np
+import swat.utils.testing as tm
+from PIL import Image
+from dlpy.fake_cas import FakeCAS
+from dlpy.images import ImageTable, _array_to_bmp, encode_image, is_in_memory_image
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+
+
+class TestImageEncoding(tm.TestCase):
+
+    def setUp(self):
+        # the width of 3 pixels needs padding of the BMP rows
+        self.array = np.random.RandomState(0).randint(0, 256, size=(5, 3, 3)).astype('uint8')
+
+    def test_array_to_bmp(self):
+        self.assertTrue(np.array_equal(decode(_array_to_bmp(self.array)), self.array))
+
+        gray = self.array[:, :, 0]
+        self.assertTrue(np.array_equal(decode(_array_to_bmp(gray)),
+                                       np.stack([gray] * 3, axis=-1)))
+        clipped = decode(_array_to_bmp(np.full((2, 2, 3), 300.)))
+        self.assertTrue((clipped == 255).all())
+        with self.assertRaises(ValueError):
+            _array_to_bmp(np.zeros((2, 2, 2)))
+
+    def test_encode_image(self):
+        png = encode_image(Image.fromarray(self.array))
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertTrue(np.array_equal(decode(png), self.array))
+        self.assertEqual(encode_image(png), png)
+        with self.assertRaises(TypeError):
+            encode_image([1, 2, 3])
+
+    def test_is_in_memory_image(self):
+        png = encode_image(Image.fromarray(self.array))
+        self.assertTrue(is_in_memory_image(png))
+        self.assertTrue(is_in_memory_image(_array_to_bmp(self.array)))
+        self.assertTrue(is_in_memory_image([self.array, Image.fromarray(self.array)]))
+        self.assertFalse(is_in_memory_image(b'BMW_images'))
+        self.assertFalse(is_in_memory_image('test_table'))
+        self.assertFalse(is_in_memory_image([]))
+
+    def test_from_images(self):
+        s = FakeCAS()
+        casout = dict(replace=True)
+        tbl = ImageTable.from_images(s, [self.array] * 2, labels=['a', 'b'], casout=casout)
+        self.assertEqual(casout, dict(replace=True))
+        frame = s.CASTable(tbl.to_table_params()['name']).to_frame()
+        self.assertEqual(list(frame['_label_']), ['a', 'b'])
+        self.assertTrue(np.array_equal(decode(frame['_image_'][0]), self.array))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -24,6 +24,7 @@
 
 import os
 
+import numpy as np
 import swat
 import swat.utils.testing as tm
 from dlpy.images import ImageTable
@@ -135,6 +136,16 @@ class TestImageTable(tm.TestCase):
         for i, k in zip(column_list, value_list):
             self.assertEqual(int(out[i]), k)
 
+    def test_from_images(self):
+        images = [np.full((20, 30, 3), 255, dtype=np.uint8),
+                  np.zeros((40, 10), dtype=np.uint8)]
+        out = ImageTable.from_images(self.s, images, labels=['white', 'black'])
+        self.assertTrue(isinstance(out, ImageTable))
+        summary = out.image_summary
+        self.assertEqual(int(summary['minWidth']), 10)
+        self.assertEqual(int(summary['maxHeight']), 40)
+        self.assertEqual(out.label_freq.shape[0], 2)
+
 
 if __name__ == '__main__':
     tm.runtests()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import subprocess
+import sys
+
+import swat.utils.testing as tm
+
+
+def imported_modules(code):
+    code += '\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))'
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+class TestImports(tm.TestCase):
+
+    def test_lazy_plotting(self):
+        modules = imported_modules('import dlpy, dlpy.applications')
+        self.assertFalse([name for name in modules if name.startswith('matplotlib')])
+        self.assertFalse('graphviz' in modules)
+        self.assertFalse('dlpy.caffe_models.model_resnet152' in modules)
+
+    def test_caffe_models(self):
+        modules = imported_modules('from dlpy.caffe_models import VGG16_Model')
+        self.assertTrue('dlpy.caffe_models.model_vgg16' in modules)
+        self.assertFalse('dlpy.caffe_models.model_vgg19' in modules)
+
+
+if __name__ == '__main__':
+    tm.runtests()
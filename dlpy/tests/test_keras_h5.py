@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.model import Model
+from dlpy.model_conversion.keras_h5 import read_keras_h5
+from dlpy.model_conversion.sas_keras_parse import (keras_to_layers, KerasLayerGraph,
+                                                   find_previous_computation_layer,
+                                                   computation_layer_classes)
+from dlpy.model_conversion.write_keras_model_parm import (flatten_permutation,
+                                                          write_keras_hdf5_from_h5)
+
+
+def layer(class_name, name, inbound=None, **config):
+    config['name'] = name
+    inbound_nodes = [[[src, 0, 0, {}] for src in inbound]] if inbound else []
+    return dict(class_name=class_name, name=name, config=config,
+                inbound_nodes=inbound_nodes)
+
+
+MODEL_CONFIG = dict(class_name='Model', config=dict(name='tiny', layers=[
+    layer('InputLayer', 'input_1', batch_input_shape=[None, 8, 8, 3]),
+    layer('Conv2D', 'conv1', ['input_1'], filters=4, kernel_size=[3, 3], strides=[1, 1],
+          padding='same', data_format='channels_last', use_bias=True, activation='linear'),
+    layer('BatchNormalization', 'bn1', ['conv1']),
+    layer('Activation', 'relu1', ['bn1'], activation='relu'),
+    layer('MaxPooling2D', 'pool1', ['relu1'], pool_size=[2, 2], strides=[2, 2],
+          padding='valid', data_format='channels_last'),
+    layer('Flatten', 'flatten_1', ['pool1']),
+    layer('Dense', 'fc1', ['flatten_1'], units=5, use_bias=True, activation='relu'),
+    layer('Dropout', 'drop1', ['fc1'], rate=0.5),
+    layer('Dense', 'fc2', ['drop1'], units=2, use_bias=True, activation='softmax')]))
+
+
+class TestKerasH5(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+        rng = np.random.RandomState(0)
+        self.weights = [('conv1', [rng.rand(3, 3, 3, 4), rng.rand(4)]),
+                        ('bn1', [rng.rand(4) for _ in range(4)]),
+                        ('fc1', [rng.rand(64, 5), rng.rand(5)]),
+                        ('fc2', [rng.rand(5, 2), rng.rand(2)])]
+        with h5py.File('tiny.h5', 'w') as f:
+            f.attrs['keras_version'] = b'2.2.4'
+            f.attrs['model_config'] = json.dumps(MODEL_CONFIG).encode('utf8')
+            root = f.create_group('model_weights')
+            names = [item['name'] for item in MODEL_CONFIG['config']['layers']]
+            root.attrs['layer_names'] = [name.encode('utf8') for name in names]
+            weights = dict(self.weights)
+            for name in names:
+                group = root.create_group(name)
+                weight_names = []
+                for ii, value in enumerate(weights.get(name, [])):
+                    weight_name = '{}/w{}:0'.format(name, ii)
+                    group[weight_name] = value.astype('float32')
+                    weight_names.append(weight_name.encode('utf8'))
+                group.attrs['weight_names'] = weight_names
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        model = read_keras_h5('tiny.h5')
+        self.assertEqual(model.image_data_format, 'channels_last')
+        self.assertEqual(model.get_layer('flatten_1').input_shape, (None, 4, 4, 4))
+        self.assertEqual(model.get_layer('fc1').output_shape, (5,))
+
+        layers = keras_to_layers(model)
+        self.assertEqual([spec['name'] for spec in layers],
+                         ['input_1', 'conv1', 'bn1', 'pool1', 'fc1', 'fc2'])
+        specs = dict((spec['name'], spec) for spec in layers)
+        self.assertEqual(specs['input_1']['layer']['nchannels'], 3)
+        self.assertEqual(specs['bn1']['layer']['act'], 'relu')
+        self.assertEqual(specs['fc1']['srclayers'], ['pool1'])
+        self.assertEqual(specs['fc2']['layer']['type'], 'output')
+
+    def test_layer_graph(self):
+        with h5py.File('tiny.h5', 'a') as f:
+            config = json.loads(f.attrs['model_config'])
+            config['config']['layers'][5:5] = [
+                layer('Conv2D', 'conv2', ['pool1'], filters=4, kernel_size=[1, 1]),
+                layer('Activation', 'relu2', ['conv2'], activation='relu'),
+                layer('Add', 'res1', ['pool1', 'relu2'])]
+            config['config']['layers'][8]['inbound_nodes'] = [[['res1', 0, 0, {}]]]
+            f.attrs['model_config'] = json.dumps(config).encode('utf8')
+        model = read_keras_h5('tiny.h5')
+        graph = KerasLayerGraph(model)
+        self.assertEqual(graph.inbound['res1'], ['pool1', 'relu2'])
+        self.assertEqual(graph.outbound['pool1'], ['conv2', 'res1'])
+        self.assertEqual(find_previous_computation_layer(model, 'res1',
+                                                         computation_layer_classes, graph),
+                         ['pool1', 'conv2'])
+        self.assertEqual(find_previous_computation_layer(model, 'conv1',
+                                                         computation_layer_classes, graph),
+                         ['input_1'])
+        self.assertEqual(graph.previous_computation_layer('relu1', computation_layer_classes),
+                         'bn1')
+
+    def test_weights(self):
+        model = read_keras_h5('tiny.h5')
+        write_keras_hdf5_from_h5(model, 'tiny.h5', 'sas.h5')
+        weights = dict(self.weights)
+        with h5py.File('sas.h5', 'r') as f:
+            self.assertEqual(sorted(f.keys()), ['bn1', 'conv1', 'fc1', 'fc2'])
+            self.assertEqual(f['conv1/conv1/kernel:0'].shape, (4, 3, 3, 3))
+            self.assertEqual(len(f['bn1/bn1']), 4)
+            fc1 = f['fc1/fc1/kernel:0'][()]
+            expected = weights['fc1'][0][flatten_permutation(4, 4, 4)].T
+            self.assertTrue(np.allclose(fc1, expected))
+
+    def test_from_keras_model(self):
+        model = Model.from_keras_model(FakeCAS(), 'tiny.h5', output_model_table='tiny',
+                                       include_weights=True)
+        self.assertEqual([layer.config['type'] for layer in model.layers],
+                         ['input', 'convo', 'batchnorm', 'pool', 'fc', 'output'])
+        self.assertTrue(os.path.isfile('tiny_weights.kerasmodel.h5'))
+
+
+if __name__ == '__main__':
+    tm.runtests()
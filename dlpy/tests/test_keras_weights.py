@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.model_conversion.write_keras_model_parm import (flatten_permutation,
+                                                          convert_keras_tensor,
+                                                          write_keras_weights)
+
+
+class Dense(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Conv2D(Dense):
+    pass
+
+
+class TestKerasWeights(tm.TestCase):
+
+    def test_flatten_permutation(self):
+        H, W, C = 3, 4, 5
+        expected = []
+        for cc in range(C):
+            for hh in range(H):
+                for ww in range(W):
+                    expected.append(hh * W * C + ww * C + cc)
+        self.assertEqual(flatten_permutation(H, W, C).tolist(), expected)
+        self.assertTrue(flatten_permutation(H, W, C, 'channels_first') is None)
+
+    def test_convert(self):
+        perm_index = flatten_permutation(2, 2, 3)
+        kernel = np.arange(12 * 4, dtype='float32').reshape(12, 4)
+        out = convert_keras_tensor(Dense('fc1'), kernel, 'channels_last', 'fc1', perm_index)
+        self.assertEqual(out.shape, (4, 12))
+        self.assertEqual(out.dtype, np.float32)
+        self.assertTrue((out.T == kernel[perm_index]).all())
+
+        out = convert_keras_tensor(Dense('fc2'), kernel, 'channels_last', 'fc1', perm_index)
+        self.assertTrue((out == kernel.T).all())
+
+        conv = np.zeros((3, 3, 2, 8))
+        out = convert_keras_tensor(Conv2D('conv1'), conv, 'channels_last', 'fc1', perm_index)
+        self.assertEqual(out.shape, (8, 2, 3, 3))
+
+    def test_compression(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(tmp_dir, 'weights.kerasmodel.h5')
+            weights = [(Dense('fc1'), [np.ones((6, 4)), np.zeros(4)])]
+            write_keras_weights(weights, file_name, compression='gzip')
+            with h5py.File(file_name, 'r') as f:
+                self.assertEqual(f['fc1/fc1/kernel:0'].compression, 'gzip')
+            with self.assertRaises(ValueError):
+                write_keras_weights(weights, file_name, compression='lzf')
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    tm.runtests()
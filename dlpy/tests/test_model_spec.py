@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.model import Model
+from dlpy.model_conversion.model_spec import (layer_spec, layers_to_casl,
+                                              build_model_table, IMAGENET_OFFSETS)
+from dlpy.model_conversion.write_sas_code import write_model_code
+
+
+def resnet_block():
+    return [layer_spec('data', dict(type='input', nchannels=3, width=32, height=32,
+                                    scale=1.0)),
+            layer_spec('conv1', dict(type='convolution', nfilters=8, width=3, height=3,
+                                     stride=1, nobias=True, act='identity', dropout=0),
+                       ['data']),
+            layer_spec('bn1', dict(type='batchnorm', act='relu'), ['conv1']),
+            layer_spec('res1', dict(type='residual', act='relu'), ['bn1', 'data']),
+            layer_spec('pool1', dict(type='pooling', width=2, height=2, stride=2,
+                                     pool='max', dropout=0), ['res1']),
+            layer_spec('fc1', dict(type='fullconnect', n=16, nobias=False, act='relu',
+                                   dropout=0.5), ['pool1']),
+            layer_spec('prob', dict(type='output', n=10, nobias=False, act='softmax'),
+                       ['fc1'])]
+
+
+class CASLSession(FakeCAS):
+    ''' FakeCAS with a CASL action that only records the programs '''
+
+    def __init__(self):
+        FakeCAS.__init__(self)
+        self.programs = []
+
+    def _action_runcasl(self, code=None, **kwargs):
+        self.programs.append(code)
+        return {}
+
+
+class TestModelSpec(tm.TestCase):
+
+    def test_build_model_table(self):
+        s = FakeCAS()
+        tbl = build_model_table(s, 'resnet', resnet_block())
+        model = Model.from_table(tbl, display_note=False)
+        self.assertEqual([layer.name for layer in model.layers],
+                         ['data', 'conv1', 'bn1', 'res1', 'pool1', 'fc1', 'prob'])
+        self.assertEqual(s.action_counts['buildmodel'], 1)
+        self.assertEqual(s.action_counts['addlayer'], 7)
+
+    def test_failed_layer(self):
+        s = FakeCAS()
+        layers = resnet_block()
+        layers[3]['srclayers'] = ['bn1', 'missing']
+        with self.assertRaises(ValueError):
+            build_model_table(s, 'resnet', layers)
+        self.assertEqual(s.action_counts['addlayer'], 4)
+        self.assertNotIn('RESNET', s.tables)
+
+    def test_single_call(self):
+        s = CASLSession()
+        build_model_table(s, dict(name='resnet', caslib='casuser'), resnet_block())
+        self.assertEqual(s.action_counts.get('addlayer', 0), 0)
+        self.assertEqual(s.action_counts['runcasl'], 1)
+
+        statements = s.programs[0].split('\n')
+        self.assertEqual(len(statements), 8)
+        self.assertTrue(statements[0].startswith(
+            'deepLearn.buildModel / model={caslib="casuser", name="resnet", replace=true}'))
+        self.assertTrue('srclayers={"bn1", "data"}' in statements[4])
+        self.assertTrue('nobias=true' in statements[2])
+        self.assertTrue('offsets={{{}}}'.format(', '.join(repr(x) for x in IMAGENET_OFFSETS))
+                        in statements[1])
+
+    def test_casl_quoting(self):
+        code = layers_to_casl('m', [layer_spec('a"b', dict(type='input', nchannels=1,
+                                                           width=8, height=8))])
+        self.assertTrue('name="a""b"' in code)
+
+    def test_export(self):
+        code = write_model_code('resnet', resnet_block())
+        compile(code, 'resnet.py', 'exec')
+        self.assertEqual(code.count('s.addLayer('), 9)
+
+
+if __name__ == '__main__':
+    tm.runtests()
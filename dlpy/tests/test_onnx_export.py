@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import io
+
+import numpy as np
+import pandas as pd
+import swat.utils.testing as tm
+from PIL import Image
+from dlpy.fake_cas import FakeCAS
+from dlpy.layers import InputLayer, Conv2d, BN, Pooling, Dense, OutputLayer
+from dlpy.model_conversion.caffe_proto import _fields
+from dlpy.model_conversion.write_onnx_model import BN_EPSILON, OnnxExportError
+from dlpy.Sequential import Sequential
+
+
+def reference_forward(x, w):
+    ''' Direct computation of the test model '''
+    x = x * 0.5 - np.array([1., 2., 3.]).reshape(1, 3, 1, 1)
+    n = x.shape[0]
+    padded = np.pad(x, ((0, 0), (0, 0), (1, 1), (1, 1)), mode='constant')
+    conv = np.zeros((n, 4, 8, 8))
+    for f in range(4):
+        for i in range(8):
+            for j in range(8):
+                conv[:, f, i, j] = (padded[:, :, i:i + 3, j:j + 3] *
+                                    w['conv_W'][f]).sum(axis=(1, 2, 3)) + w['conv_B'][f]
+    conv = np.maximum(conv, 0)
+    mean, var, scale, bias = [w['bn'][k * 4:(k + 1) * 4].reshape(1, 4, 1, 1)
+                              for k in range(4)]
+    bn = np.maximum((conv - mean) / np.sqrt(var + BN_EPSILON) * scale + bias, 0)
+    pool = bn.reshape(n, 4, 4, 2, 4, 2).max(axis=(3, 5))
+    fc = np.maximum(pool.reshape(n, -1).dot(w['fc_W'].T) + w['fc_B'], 0)
+    out = fc.dot(w['out_W'].T) + w['out_B']
+    out = np.exp(out - out.max(axis=1, keepdims=True))
+    return out / out.sum(axis=1, keepdims=True)
+
+
+class TestOnnxExport(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8, scale=0.5, offsets=[1, 2, 3]))
+        model.add(Conv2d(4, 3))
+        model.add(BN(act='relu'))
+        model.add(Pooling(2))
+        model.add(Dense(5))
+        model.add(OutputLayer(n=2))
+        self.model = model
+
+        rng = np.random.RandomState(0)
+        self.weights = dict(conv_W=rng.normal(size=(4, 3, 3, 3)), conv_B=rng.normal(size=4),
+                            bn=np.concatenate([rng.normal(size=4), rng.uniform(1, 2, 4),
+                                               rng.normal(size=8)]),
+                            fc_W=rng.normal(size=(5, 64)), fc_B=rng.normal(size=5),
+                            out_W=rng.normal(size=(2, 5)), out_B=rng.normal(size=2))
+        layer_weights = {1: ['conv_W', 'conv_B'], 2: ['bn'], 4: ['fc_W', 'fc_B'],
+                         5: ['out_W', 'out_B']}
+        rows = []
+        for layer_id, names in layer_weights.items():
+            values = np.concatenate([self.weights[name].ravel() for name in names])
+            rows.extend((layer_id, ii, value) for ii, value in enumerate(values))
+        self.s.upload_frame(pd.DataFrame(rows, columns=['_LayerID_', '_WeightID_',
+                                                        '_Weight_']),
+                            casout=dict(name='simple_weights'))
+
+    def test_export(self):
+        onnx_model = self.model.to_onnx()
+        self.assertEqual([node.op_type for node in onnx_model.nodes],
+                         ['Mul', 'Sub', 'Conv', 'Relu', 'BatchNormalization', 'Relu',
+                          'MaxPool', 'Flatten', 'Gemm', 'Relu', 'Gemm', 'Softmax'])
+        self.assertEqual(onnx_model.input_shape, (3, 8, 8))
+        self.assertEqual(onnx_model.output_shape, (2,))
+
+        x = np.random.RandomState(1).uniform(0, 255, size=(3, 3, 8, 8))
+        self.assertTrue(np.allclose(onnx_model.run(x), reference_forward(x, self.weights),
+                                    rtol=1e-4, atol=1e-6))
+
+    def test_encoding(self):
+        buf = self.model.to_onnx().to_bytes()
+        model_fields = dict((number, value) for number, _, value in _fields(buf, 0, len(buf)))
+        self.assertEqual(model_fields[1], 4)
+        start, length = model_fields[7]
+        graph = list(_fields(buf, start, start + length))
+        self.assertEqual(sum(1 for number, _, _ in graph if number == 1), 12)
+        self.assertEqual(sum(1 for number, _, _ in graph if number == 5), 12)
+
+    def test_missing_weights(self):
+        self.s.upload_frame(pd.DataFrame(dict(_LayerID_=[1], _WeightID_=[0], _Weight_=[1.])),
+                            casout=dict(name='simple_weights', replace=True))
+        with self.assertRaises(OnnxExportError):
+            self.model.to_onnx()
+
+    def server_scores(self, frame, levels):
+        # the scores of the server, computed from the uploaded images in BGR order
+        images = np.stack([np.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+                           for data in frame['_image_']])
+        return reference_forward(images[..., ::-1].transpose(0, 3, 1, 2).astype(float),
+                                 self.weights)
+
+    def test_parity(self):
+        images = [np.random.RandomState(i).randint(0, 255, size=(8, 8, 3)).astype('uint8')
+                  for i in range(3)]
+        self.s.score_function = self.server_scores
+        report = self.model.check_onnx_parity(images)
+        self.assertEqual(list(report.columns), ['max_abs_diff', 'match'])
+        self.assertEqual(report['match'].tolist(), [True, True, True])
+
+        def mismatch(frame, levels):
+            scores = self.server_scores(frame, levels)
+            scores[1] = scores[1, ::-1]
+            return scores
+
+        self.s.score_function = mismatch
+        report = self.model.check_onnx_parity(images)
+        self.assertEqual(report['match'].tolist(), [True, False, True])
+        self.assertTrue(report['max_abs_diff'][1] > 1e-3)
+
+
+if __name__ == '__main__':
+    tm.runtests()
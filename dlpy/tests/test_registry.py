@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.layers import InputLayer, Dense, OutputLayer
+from dlpy.registry import ModelRegistry
+from dlpy.Sequential import Sequential
+
+
+class TestModelRegistry(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8))
+        model.add(Dense(4))
+        model.add(OutputLayer(n=2))
+        self.s.retrieve('deeplearn.dlimportmodelweights', model='simple',
+                        modelweights=dict(name='simple_weights'))
+        model.set_weights('simple_weights')
+        self.model = model
+        self.registry = ModelRegistry(self.s)
+
+    def global_tables(self):
+        return sorted(name for name, entry in self.s.tables.items() if entry['promoted'])
+
+    def test_publish(self):
+        self.assertEqual(self.registry.publish(self.model), 1)
+        self.assertEqual(self.registry.publish(self.model), 2)
+        self.assertEqual(self.registry.versions('simple'), [1, 2])
+        self.assertEqual(self.global_tables(),
+                         ['SIMPLE_V1', 'SIMPLE_V1_INFO', 'SIMPLE_V1_WEIGHTS',
+                          'SIMPLE_V2', 'SIMPLE_V2_INFO', 'SIMPLE_V2_WEIGHTS'])
+        self.assertFalse([name for name in self.s.tables if name.startswith('ATTR_TBL')])
+        with self.assertRaises(ValueError):
+            self.registry.publish(self.model, version=2)
+
+    def test_attach_release(self):
+        self.registry.publish(self.model)
+        self.registry.publish(self.model)
+        first = self.registry.attach('simple')
+        second = self.registry.attach('simple', version=2)
+        self.assertTrue(first.read_only)
+        self.assertEqual(first.shared_version, ('simple', 2))
+        self.assertEqual(first.model_weights.params['name'], 'simple_v2_weights')
+        self.assertEqual(list(self.registry.info('simple')['refcount']), [0, 2])
+
+        self.registry.release(first)
+        self.assertIsNone(first.shared_version)
+        self.assertEqual(list(self.registry.info('simple')['refcount']), [0, 1])
+        with self.assertRaises(ValueError):
+            self.registry.release(first)
+        self.registry.release(second)
+        self.assertEqual(list(self.registry.info('simple')['refcount']), [0, 0])
+
+    def test_retire(self):
+        self.registry.publish(self.model)
+        attached = self.registry.attach('simple', version=1)
+        self.registry.retire('simple', 1)
+        self.assertEqual(len(self.global_tables()), 3)
+        with self.assertRaises(ValueError):
+            self.registry.attach('simple', version=1)
+        with self.assertRaises(ValueError):
+            self.registry.attach('simple')
+
+        self.registry.release(attached)
+        self.assertEqual(self.global_tables(), [])
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.layers import InputLayer, Conv2d, OutputLayer
+from dlpy.model import Model
+from dlpy.replay import RecordingCAS, ReplayCAS, log_summary, compare_summaries
+from dlpy.Sequential import Sequential
+
+
+def workload(conn):
+    model = Sequential(conn, model_table='simple')
+    model.add(InputLayer(3, 32, 32))
+    model.add(Conv2d(8, 7))
+    model.add(OutputLayer(n=2))
+    return Model.from_table(conn.CASTable('simple'))
+
+
+class TestReplay(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'workload.log.gz')
+        with RecordingCAS(FakeCAS(), self.path) as conn:
+            self.model = workload(conn)
+            self.n_actions = conn.round_trips
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_replay(self):
+        conn = ReplayCAS(self.path)
+        model = workload(conn)
+        conn.assert_complete()
+        self.assertEqual(conn.round_trips, self.n_actions)
+        self.assertEqual([layer.name for layer in model.layers],
+                         [layer.name for layer in self.model.layers])
+
+    def test_mismatch(self):
+        conn = ReplayCAS(self.path)
+        conn.queryactionset('deepLearn')
+        with self.assertRaises(ValueError):
+            conn.retrieve('table.fetch', table='simple')
+
+    def test_incomplete(self):
+        conn = ReplayCAS(self.path)
+        conn.queryactionset('deepLearn')
+        with self.assertRaises(ValueError):
+            conn.assert_complete()
+
+    def test_summary(self):
+        summary = log_summary(self.path)
+        self.assertEqual(summary.loc['addlayer', 'calls'], 3)
+        self.assertEqual(summary['calls'].sum(), self.n_actions)
+
+        current = summary.copy()
+        current.loc['addlayer', 'calls'] += 2
+        report = compare_summaries(summary, current)
+        self.assertEqual(report.loc['Total', 'calls_diff'], 2)
+        self.assertEqual(report.index[0], 'addlayer')
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.layers import InputLayer, Dense, OutputLayer
+from dlpy.scoring import AstoreScorer, BatchScorer
+from dlpy.Sequential import Sequential
+from dlpy.utils import ActionError
+
+
+class TestBatchScorer(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8))
+        model.add(Dense(4))
+        model.add(OutputLayer(n=2))
+        self.s.retrieve('deeplearn.dlimportmodelweights', model='simple',
+                        modelweights=dict(name='simple_weights'))
+        model.set_weights('simple_weights')
+        self.model = model
+
+    def scorer(self, max_wait=1.):
+        # the key column is copied to the output, to check the routing of the rows
+        return BatchScorer(self.model, max_batch_size=4, max_wait=max_wait,
+                           copyvars=[BatchScorer.request_id_col, 'key'])
+
+    def test_batching(self):
+        with self.scorer() as scorer:
+            requests = [scorer.submit(dict(_image_=b'image', key=i)) for i in range(8)]
+            results = [request.result(10) for request in requests]
+        self.assertEqual(self.s.action_counts['dlscore'], 2)
+        self.assertEqual(list(scorer.batch_sizes), [4, 4])
+        self.assertEqual([int(result['key']) for result in results], list(range(8)))
+        self.assertNotIn(scorer.batch_table.upper(), self.s.tables)
+        self.assertNotIn(scorer.output_table.upper(), self.s.tables)
+
+    def test_error(self):
+        self.model.model_weights = self.s.CASTable('missing_weights')
+        with self.scorer() as scorer:
+            request = scorer.submit(dict(_image_=b'image', key=0))
+            with self.assertRaises(ActionError):
+                request.result(10)
+
+    def test_submit_while_stopping(self):
+        # the scoring thread is still busy when the scorer is stopped
+        self.s.latency = 0.1
+        scorer = self.scorer(max_wait=0.)
+        request = scorer.submit(dict(_image_=b'image', key=0))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            scorer.stop(timeout=0.)
+        self.assertEqual(len(caught), 1)
+        with self.assertRaises(RuntimeError):
+            scorer.submit(dict(_image_=b'image', key=1))
+
+        scorer.stop()
+        self.assertEqual(int(request.result(0)['key']), 0)
+        self.assertNotIn(scorer.batch_table.upper(), self.s.tables)
+        self.s.latency = 0.
+        with scorer:
+            self.assertEqual(int(scorer.score(dict(_image_=b'image', key=2), 10)['key']), 2)
+
+    def test_latency_percentiles(self):
+        scorer = self.scorer(max_wait=0.)
+        self.assertTrue(scorer.latency_percentiles().isnull().all())
+        with scorer:
+            for i in range(3):
+                scorer.score(dict(_image_=b'image', key=i), timeout=10)
+        percentiles = scorer.latency_percentiles((50, 99))
+        self.assertEqual(list(percentiles.index), ['p50', 'p99'])
+        self.assertTrue(np.all(np.diff(percentiles.values) >= 0))
+        self.assertTrue((percentiles > 0).all())
+
+
+class TestAstoreScorer(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8))
+        model.add(OutputLayer(n=2))
+        self.s.retrieve('deeplearn.dlimportmodelweights', model='simple',
+                        modelweights=dict(name='simple_weights'))
+        model.set_weights('simple_weights')
+        self.model = model
+        # every row is predicted as the first level
+        self.s.score_function = lambda frame, levels: \
+            np.tile(np.eye(len(levels))[0], (frame.shape[0], 1))
+
+    def predict(self, labels):
+        self.s.upload_frame(pd.DataFrame(dict(_image_=[b'image'] * len(labels),
+                                              _label_=labels)),
+                            casout=dict(name='test', replace=True))
+        with AstoreScorer.from_model(self.model) as scorer:
+            res = scorer.predict('test')
+            self.assertEqual(scorer.valid_res.shape[0], len(labels))
+        return res['ScoreInfo'].set_index('Descr')['Value']
+
+    def test_character_target(self):
+        score_info = self.predict(['a', 'b', 'a', 'a'])
+        self.assertEqual(score_info['Number of Observations Read'], 4)
+        self.assertAlmostEqual(score_info['Misclassification Error (%)'], 25.)
+
+    def test_numeric_target(self):
+        score_info = self.predict([0, 1, 1, 1])
+        self.assertAlmostEqual(score_info['Misclassification Error (%)'], 75.)
+        self.assertFalse([name for name in self.s.tables if 'ASTORE' in name])
+
+
+if __name__ == '__main__':
+    tm.runtests()
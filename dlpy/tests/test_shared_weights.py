@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pandas as pd
+import swat.utils.testing as tm
+from dlpy.applications import VGG16
+from dlpy.fake_cas import FakeCAS, FakeCASError
+
+
+class TestSharedWeights(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        self.s.upload_frame(pd.DataFrame(dict(_image_=[b'x'] * 4,
+                                              _label_=['a', 'b', 'c', 'a'])),
+                            casout=dict(name='train'))
+
+    def head(self, name):
+        return VGG16(self.s, model_table=name, n_classes=3, pre_train_weight=True,
+                     pre_train_weight_file='/models/VGG_ILSVRC_16_layers.caffemodel.h5')
+
+    def test_shared_backbone(self):
+        heads = [self.head('head_{}'.format(i)) for i in range(3)]
+        self.assertEqual(self.s.action_counts['dlimportmodelweights'], 1)
+        backbone = heads[0].model_weights.params['name']
+        self.assertEqual(set(head.model_weights.params['name'] for head in heads),
+                         set([backbone]))
+        self.assertTrue(all(head.copy_on_write for head in heads))
+
+        shared = self.s.CASTable(backbone).to_frame()
+        self.assertTrue((shared['_LayerID_'] < 19).all())
+        self.assertEqual([name for name in self.s.tables if name.endswith('_WEIGHTS')], [])
+
+        heads[0].fit(data='train', max_epochs=1)
+        self.assertEqual(heads[0].model_weights.params['name'], 'head_0_weights')
+        self.assertFalse(heads[0].copy_on_write)
+        self.assertEqual(heads[1].model_weights.params['name'], backbone)
+        self.assertTrue(self.s.CASTable(backbone).to_frame().equals(shared))
+
+    def test_failed_training(self):
+        head = self.head('head_0')
+        backbone = head.model_weights.params['name']
+
+        def fail(**kwargs):
+            raise FakeCASError('Out of memory.')
+
+        self.s._action_dltrain = fail
+        head.fit(data='train', max_epochs=1)
+        self.assertEqual(head.model_weights.params['name'], backbone)
+        self.assertTrue(head.copy_on_write)
+        self.assertTrue(head.read_only)
+
+
+if __name__ == '__main__':
+    tm.runtests()
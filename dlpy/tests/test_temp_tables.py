@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+# NOTE: This test requires a running CAS server.  You must use an ~/.authinfo
+#       file to specify your username and password.  The CAS host and port must
+#       be specified using the CASHOST and CASPORT environment variables.
+#       A specific protocol ('cas', 'http', 'https', or 'auto') can be set using
+#       the CASPROTOCOL environment variable.
+
+import numpy as np
+import pandas as pd
+import swat
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.images import ImageTable
+from dlpy.splitting import two_way_split
+from dlpy.temp_tables import TempTables, session_temp_tables
+
+USER, PASSWD = tm.get_user_pass()
+HOST, PORT, PROTOCOL = tm.get_host_port_proto()
+
+
+class TestTempTables(tm.TestCase):
+
+    def setUp(self):
+        swat.reset_option()
+        swat.options.cas.print_messages = False
+        swat.options.interactive_mode = False
+
+        self.s = swat.CAS(HOST, PORT, USER, PASSWD, protocol=PROTOCOL)
+        self.images = [np.zeros((20, 20, 3), dtype=np.uint8)] * 4
+
+    def tearDown(self):
+        # tear down tests
+        try:
+            self.s.endsession()
+        except swat.SWATError:
+            pass
+        del self.s
+        swat.reset_option()
+
+    def table_names(self):
+        return self.s.tableinfo().TableInfo.Name.str.upper().tolist()
+
+    def test_scoped_drop(self):
+        with TempTables(self.s) as tables:
+            kept = ImageTable.from_images(self.s, self.images).to_table_params()['name']
+            name = tables.new_name('Images')
+            ImageTable.from_images(self.s, self.images, casout=dict(name=name))
+            self.assertTrue(name in tables)
+            self.assertFalse(kept in tables)
+            self.assertEqual(tables.footprint().shape[0], 1)
+        names = self.table_names()
+        self.assertFalse(name.upper() in names)
+        self.assertTrue(kept.upper() in names)
+
+    def test_session_budget(self):
+        tables = session_temp_tables(self.s, max_bytes=1)
+        first = tables.new_name('Images')
+        ImageTable.from_images(self.s, self.images, casout=dict(name=first))
+        second = tables.new_name('Images')
+        ImageTable.from_images(self.s, self.images, casout=dict(name=second))
+        names = self.table_names()
+        self.assertFalse(first.upper() in names)
+        self.assertTrue(second.upper() in names)
+        tables.drop()
+        self.assertFalse(second.upper() in self.table_names())
+
+
+class TestTempTablesOffline(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        self.frame = pd.DataFrame(dict(x=np.arange(100.)))
+
+    def create(self, tables, prefix='Temp'):
+        name = tables.new_name(prefix)
+        self.s.upload_frame(self.frame, casout=dict(name=name))
+        return name
+
+    def test_returned_tables_not_registered(self):
+        with TempTables(self.s) as tables:
+            image_tbl = ImageTable.from_images(self.s, [np.zeros((4, 4, 3))])
+            name = self.create(tables)
+            self.assertEqual(list(tables.tables), [name.upper()])
+        self.assertNotIn(name.upper(), self.s.tables)
+        self.assertIn(image_tbl.to_table_params()['name'].upper(), self.s.tables)
+
+    def test_budget_measures_once(self):
+        tables = TempTables(self.s, max_bytes=10 ** 9)
+        for _ in range(5):
+            self.create(tables)
+        # the first four tables are measured once, by the next allocation
+        self.assertEqual(self.s.action_counts['tabledetails'], 4)
+
+        names = list(tables.tables)
+        tables.max_bytes = 3 * tables.tables[names[0]]['bytes']
+        # the two oldest tables are dropped before the new one is allocated
+        last = self.create(tables)
+        self.assertEqual(list(tables.tables), names[2:] + [last.upper()])
+        self.assertEqual(sorted(name for name in self.s.tables if name.startswith('TEMP')),
+                         sorted(tables.tables))
+
+    def test_forget_dropped(self):
+        tables = TempTables(self.s, max_bytes=10 ** 9)
+        name = tables.new_name('Temp')
+        tables.new_name('Temp')
+        self.assertIn(name.upper(), tables.tables)
+        tables.new_name('Temp')
+        self.assertNotIn(name.upper(), tables.tables)
+
+    def test_forget_intermediates(self):
+        self.s.upload_frame(pd.DataFrame(dict(_image_=[b'image'] * 10,
+                                              _label_=['cat', 'dog'] * 5)),
+                            casout=dict(name='images'))
+        tables = session_temp_tables(self.s)
+        for _ in range(3):
+            two_way_split(ImageTable.from_table(self.s.CASTable('images')), test_rate=20)
+        # the intermediate tables dropped by DLPy are no longer tracked
+        self.assertFalse([name for name in tables.tables if name.startswith('TEMP')])
+
+
+if __name__ == '__main__':
+    tm.runtests()
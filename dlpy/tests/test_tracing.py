@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.images import ImageTable
+from dlpy.tracing import Tracer, traced_call, params_digest, install_hook, remove_hook
+
+
+class TestTracing(tm.TestCase):
+
+    def call(self):
+        return traced_call('table.fetch', dict(table='t'),
+                           lambda: dict(Fetch=pd.DataFrame(dict(a=[1, 2, 3]))))
+
+    def test_inactive(self):
+        tracer = Tracer()
+        self.call()
+        self.assertEqual(len(tracer.events), 0)
+
+    def test_events(self):
+        with Tracer() as tracer:
+            self.call()
+            self.call()
+        self.call()
+        events = tracer.to_frame()
+        self.assertEqual(events.shape[0], 2)
+        self.assertEqual(events['rows'].tolist(), [3, 3])
+        self.assertEqual(events['caller'][0], 'TestTracing.call')
+        self.assertEqual(events['digest'][0], params_digest(dict(table='t')))
+
+        summary = tracer.summary()
+        self.assertEqual(int(summary['calls'].iloc[0]), 2)
+
+        trace = tracer.to_chrome_trace()
+        self.assertEqual(len(trace['traceEvents']), 2)
+        self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+
+    def test_failing_hook(self):
+        def hook(event):
+            raise RuntimeError('hook')
+
+        def fail():
+            raise KeyError('action')
+
+        install_hook(hook)
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(self.call()['Fetch'].shape[0], 3)
+                with self.assertRaises(KeyError):
+                    traced_call('table.fetch', {}, fail)
+            self.assertEqual(len(caught), 2)
+        finally:
+            remove_hook(hook)
+
+    def test_image_table(self):
+        s = FakeCAS()
+        with Tracer() as tracer:
+            ImageTable.from_images(s, [np.zeros((4, 4, 3))])
+        events = tracer.to_frame()
+        self.assertEqual(set(events['caller']), set(['ImageTable.from_images']))
+        self.assertEqual(events['action'].tolist()[-2:],
+                         ['table.addtable', 'table.altertable'])
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS
+from dlpy.layers import InputLayer, Conv2d, BN, Pooling, Dense, OutputLayer
+from dlpy.model import Model
+from dlpy.Sequential import Sequential
+from dlpy.utils import ActionError
+from dlpy.weights_arrays import (fetch_rows, pack_weights, precision_report, unpack_weights,
+                                 weight_shapes, weights_frame)
+
+
+class TestWeightsArrays(tm.TestCase):
+
+    def setUp(self):
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8))
+        model.add(Conv2d(4, 3))
+        model.add(BN(act='relu'))
+        model.add(Pooling(2))
+        model.add(Dense(5))
+        model.add(OutputLayer(n=2))
+        self.model = model
+        names = [layer.name for layer in model.layers]
+
+        rng = np.random.RandomState(0)
+        self.arrays = {names[1]: [rng.normal(size=(4, 3, 3, 3)), rng.normal(size=4)],
+                       names[2]: [rng.normal(size=4) for _ in range(4)],
+                       names[4]: [rng.normal(size=(5, 64)), rng.normal(size=5)],
+                       names[5]: [rng.normal(size=(2, 5)), rng.normal(size=2)]}
+
+    def test_round_trip(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        self.assertEqual(self.s.action_counts['addtable'], 1)
+        table = self.s.CASTable('simple_weights').to_frame()
+        self.assertEqual(table.shape[0], 465)
+
+        self.s.reset_stats()
+        weights = self.model.get_weights(chunk_size=100)
+        self.assertEqual(list(weights), [layer.name for layer in self.model.layers
+                                         if layer.name in self.arrays])
+        for name, arrays in self.arrays.items():
+            self.assertEqual(len(weights[name]), len(arrays))
+            for fetched, expected in zip(weights[name], arrays):
+                self.assertEqual(fetched.shape, expected.shape)
+                self.assertTrue(np.allclose(fetched, expected))
+        # chunks of 100 weights: 2 + 1 + 4 + 1
+        self.assertEqual(self.s.action_counts['fetch'], 8)
+
+    def test_missing_table(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        self.s.retrieve('table.droptable', name='simple_weights')
+        with self.assertRaises(ActionError):
+            self.model.get_weights()
+
+    def test_weight_shapes(self):
+        model = Sequential(self.s, model_table='no_bias')
+        model.add(InputLayer(1, 6, 4))
+        model.add(Conv2d(2, 3, stride=2, includeBias=False))
+        model.add(OutputLayer())
+        shapes = weight_shapes(model.layers, counts={2: 39})
+        self.assertEqual(list(shapes.values()), [(1, [(2, 1, 3, 3)]),
+                                                 (2, [(3, 12), (3,)])])
+        # the shapes agree with the numbers of weights of the model summary
+        for name, (layer_id, items) in weight_shapes(self.model.layers).items():
+            layer = self.model.layers[layer_id]
+            if layer.config['type'] != 'batchnorm':
+                self.assertEqual(sum(int(np.prod(item)) for item in items),
+                                 layer.num_weights + layer.num_bias)
+
+    def test_shape_mismatch(self):
+        name = self.model.layers[4].name
+        self.arrays[name][0] = self.arrays[name][0].T
+        with self.assertRaises(ValueError):
+            self.model.set_weights_from_arrays(self.arrays)
+        del self.arrays[name]
+        with self.assertRaises(ValueError):
+            self.model.set_weights_from_arrays(self.arrays)
+
+    def test_packed(self):
+        frame = weights_frame(self.model.layers, self.arrays)
+        shuffled = frame.sample(frac=1, random_state=0)
+        packed = pack_weights(shuffled, chunk_size=100)
+        self.assertEqual(list(packed['_Count_']), [100, 12, 16, 100, 100, 100, 25, 12])
+        self.assertEqual(packed['_Blob_'].map(len).sum(), 465 * 8)
+        unpacked = unpack_weights(packed)
+        self.assertTrue((unpacked.values == frame.values).all())
+
+        with self.assertRaises(ValueError):
+            pack_weights(frame.iloc[1:])
+
+    def test_packed_table(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        packed_tbl = self.model.to_packed_weights(chunk_size=100)
+        self.assertEqual(packed_tbl.to_table_params()['name'], 'simple_weights_packed')
+        self.assertEqual(self.s.CASTable('simple_weights_packed').to_frame().shape[0], 8)
+
+        self.s.retrieve('table.droptable', name='simple_weights')
+        self.model.set_weights_from_packed(packed_tbl)
+        weights = self.model.get_weights()
+        for name, arrays in self.arrays.items():
+            for fetched, expected in zip(weights[name], arrays):
+                self.assertTrue(np.allclose(fetched, expected))
+
+    def test_fetch_rows(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        self.s.reset_stats()
+        frame = fetch_rows(self.s, self.s.CASTable('simple_weights'), chunk_size=200)
+        self.assertEqual(self.s.action_counts['fetch'], 3)
+        self.assertEqual(frame.shape[0], 465)
+        expected = weights_frame(self.model.layers, self.arrays)
+        self.assertTrue(np.array_equal(pack_weights(frame)['_Blob_'],
+                                       pack_weights(expected)['_Blob_']))
+
+    def test_save_packed(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        self.s.retrieve('table.addcaslib', name='models', path='/models')
+        self.model.save_to_table('/models', packed=True)
+        self.assertEqual(sorted(name for _, name in self.s.saved_tables),
+                         ['simple.sashdat', 'simple_weights_attr.sashdat',
+                          'simple_weights_packed.sashdat'])
+
+        model = Model(self.s, model_table='simple')
+        model.load('/models/simple.sashdat')
+        weights = model.get_weights()
+        for name, arrays in self.arrays.items():
+            for fetched, expected in zip(weights[name], arrays):
+                self.assertTrue(np.allclose(fetched, expected))
+
+    def test_half_precision(self):
+        frame = weights_frame(self.model.layers, self.arrays)
+        packed = pack_weights(frame, dtype='float16')
+        self.assertEqual(packed['_Blob_'].map(len).sum(), 465 * 2)
+        unpacked = unpack_weights(packed)
+        self.assertEqual(unpacked['_Weight_'].dtype, np.float64)
+        errors = np.abs(unpacked['_Weight_'].values - frame['_Weight_'].values)
+
+        report = precision_report(frame, 'float16')
+        self.assertEqual(list(report['_LayerID_']), [1, 2, 4, 5])
+        self.assertEqual(list(report['n_weights']), [112, 16, 325, 12])
+        self.assertAlmostEqual(report['max_abs_error'].max(), errors.max())
+        self.assertTrue((report['max_rel_error'] < 1e-3).all())
+
+        frame.loc[0, '_Weight_'] = 1e6
+        with self.assertRaises(ValueError):
+            pack_weights(frame, dtype='float16')
+
+    def test_packed_half_precision(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        packed_tbl = self.model.to_packed_weights(dtype='float16')
+        self.assertEqual(list(self.model.weights_precision_report['layer']),
+                         [self.model.layers[i].name for i in [1, 2, 4, 5]])
+
+        self.s.retrieve('table.droptable', name='simple_weights')
+        self.model.set_weights_from_packed(packed_tbl)
+        weights = self.model.get_weights()
+        for name, arrays in self.arrays.items():
+            for fetched, expected in zip(weights[name], arrays):
+                self.assertTrue(np.allclose(fetched, expected, rtol=1e-3, atol=1e-3))
+
+    def test_save_half_precision(self):
+        self.model.set_weights_from_arrays(self.arrays)
+        self.s.retrieve('table.addcaslib', name='models', path='/models')
+        self.model.save_to_table('/models', dtype='float16')
+        self.assertEqual(list(self.model.weights_precision_report['layer']),
+                         [self.model.layers[i].name for i in [1, 2, 4, 5]])
+        blobs = [frame['_Blob_'] for (_, name), frame in self.s.saved_tables.items()
+                 if name == 'simple_weights_packed.sashdat'][0]
+        self.assertEqual(sum(len(blob) for blob in blobs), 2 * 465)
+
+        model = Model(self.s, model_table='simple')
+        model.load('/models/simple.sashdat')
+        weights = model.get_weights()
+        for name, arrays in self.arrays.items():
+            for fetched, expected in zip(weights[name], arrays):
+                self.assertTrue(np.allclose(fetched, expected, rtol=1e-3, atol=1e-3))
+
+
+if __name__ == '__main__':
+    tm.runtests()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import swat.utils.testing as tm
+from dlpy.fake_cas import FakeCAS, FakeCASError
+from dlpy.layers import InputLayer, Conv2d, BN, Pooling, Dense, OutputLayer
+from dlpy.Sequential import Sequential
+from dlpy.utils import ActionError
+from dlpy.weights_upload import staging_table_name, WeightsUploadError
+
+
+class TestWeightsUpload(tm.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.s = FakeCAS()
+        model = Sequential(self.s, model_table='simple')
+        model.add(InputLayer(3, 8, 8))
+        model.add(Conv2d(4, 3))
+        model.add(BN(act='relu'))
+        model.add(Pooling(2))
+        model.add(Dense(5))
+        model.add(OutputLayer(n=2))
+        self.model = model
+        self.names = [layer.name for layer in model.layers]
+
+        rng = np.random.RandomState(0)
+        self.weights = dict(conv=[rng.normal(size=(4, 3, 3, 3)), rng.normal(size=4)],
+                            bn=[rng.normal(size=4) for _ in range(4)],
+                            fc=[rng.normal(size=(5, 64)), rng.normal(size=5)],
+                            out=[rng.normal(size=(2, 5)), rng.normal(size=2)])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_keras(self):
+        file_name = os.path.join(self.dir, 'simple.kerasmodel.h5')
+        with h5py.File(file_name, 'w') as f:
+            for index, key, weight_names in [
+                    (1, 'conv', ['kernel', 'bias']),
+                    (2, 'bn', ['gamma', 'beta', 'moving_mean', 'moving_variance']),
+                    (4, 'fc', ['kernel', 'bias']), (5, 'out', ['kernel', 'bias'])]:
+                name = self.names[index]
+                group = f.create_group(name)
+                names = []
+                for weight_name, value in zip(weight_names, self.weights[key]):
+                    names.append('{}/{}:0'.format(name, weight_name).encode('utf8'))
+                    group[names[-1]] = value
+                group.attrs['weight_names'] = names
+        return file_name
+
+    def expected(self):
+        gamma, beta, mean, var = self.weights['bn']
+        values = {1: self.weights['conv'], 2: [mean, var, gamma, beta],
+                  4: self.weights['fc'], 5: self.weights['out']}
+        return dict((layer_id, np.concatenate([np.ravel(item) for item in items]))
+                    for layer_id, items in values.items())
+
+    def check_table(self, expected):
+        table = self.s.CASTable(**self.model.model_weights.to_table_params()).to_frame()
+        self.assertEqual(sorted(set(table['_LayerID_'])), sorted(expected))
+        for layer_id, values in expected.items():
+            rows = table[table['_LayerID_'] == layer_id].sort_values('_WeightID_')
+            self.assertEqual(list(rows['_WeightID_']), list(range(values.size)))
+            self.assertTrue(np.allclose(rows['_Weight_'].values, values))
+
+    def test_keras_file(self):
+        file_name = self.write_keras()
+        self.model.load_weights(file_name, upload=True, chunk_size=50)
+        self.check_table(self.expected())
+        self.assertEqual(self.s.action_counts['addtable'], 10)
+        self.assertFalse(self.s.tables.get(
+            staging_table_name('simple', file_name).upper()))
+
+    def test_resume(self):
+        file_name = self.write_keras()
+        staging = staging_table_name('simple', file_name)
+        calls = []
+
+        def fail(done, total):
+            calls.append(done)
+            raise RuntimeError('connection lost')
+
+        with self.assertRaises(RuntimeError):
+            self.model.load_weights(file_name, upload=True, chunk_size=100, progress=fail)
+        self.assertEqual(self.s.tables[staging.upper()]['frame'].shape[0], 100)
+
+        self.model.load_weights(file_name, upload=True, chunk_size=100,
+                                progress=lambda done, total: calls.append(done))
+        self.assertEqual(calls, [100, 100, 200, 300, 400, 465])
+        self.check_table(self.expected())
+
+    def test_failed_chunk(self):
+        file_name = self.write_keras()
+        staging = staging_table_name('simple', file_name)
+        addtable = self.s._action_addtable
+
+        def fail_second(**kwargs):
+            if self.s.action_counts['addtable'] == 2:
+                raise FakeCASError('Out of memory.')
+            return addtable(**kwargs)
+
+        self.s._action_addtable = fail_second
+        with self.assertRaises(ActionError):
+            self.model.load_weights(file_name, upload=True, chunk_size=100)
+        self.assertEqual(self.s.tables[staging.upper()]['frame'].shape[0], 100)
+
+        del self.s._action_addtable
+        self.model.load_weights(file_name, upload=True, chunk_size=100)
+        self.check_table(self.expected())
+
+    def test_keras_dense_orientation(self):
+        # Dense kernels kept in the Keras (inputs, n) orientation
+        self.weights['fc'][0] = self.weights['fc'][0].T
+        self.weights['out'][0] = self.weights['out'][0].T
+        file_name = self.write_keras()
+        self.model.load_weights(file_name, upload=True)
+        expected = self.expected()
+        expected[4] = np.concatenate([self.weights['fc'][0].T.ravel(), self.weights['fc'][1]])
+        expected[5] = np.concatenate([self.weights['out'][0].T.ravel(),
+                                      self.weights['out'][1]])
+        self.check_table(expected)
+
+    def test_shape_mismatch(self):
+        self.weights['conv'][0] = self.weights['conv'][0].transpose(2, 3, 1, 0)
+        file_name = self.write_keras()
+        with self.assertRaises(WeightsUploadError):
+            self.model.load_weights(file_name, upload=True)
+        self.assertEqual(self.s.action_counts['addtable'], 0)
+
+    def test_caffe_file(self):
+        file_name = os.path.join(self.dir, 'simple.caffemodel.h5')
+        gamma, beta, mean, var = self.weights['bn']
+        with h5py.File(file_name, 'w') as f:
+            data = f.create_group('data')
+            for index, key in [(1, 'conv'), (4, 'fc'), (5, 'out')]:
+                group = data.create_group(self.names[index])
+                for ii, value in enumerate(self.weights[key]):
+                    group[str(ii)] = value
+            bn = data.create_group(self.names[2])
+            for ii, value in enumerate([mean * 2, var * 2, np.array([2.])]):
+                bn[str(ii)] = value
+            scale = data.create_group(self.names[2] + '_scale')
+            scale['0'], scale['1'] = gamma, beta
+        self.model.load_weights(file_name, upload=True)
+        self.check_table(self.expected())
+
+    def test_missing_layer(self):
+        file_name = os.path.join(self.dir, 'empty.kerasmodel.h5')
+        h5py.File(file_name, 'w').close()
+        with self.assertRaises(WeightsUploadError):
+            self.model.load_weights(file_name, upload=True)
+
+
+if __name__ == '__main__':
+    tm.runtests()
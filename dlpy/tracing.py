@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+''' Instrumentation of the CAS action calls made by DLPy '''
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+
+import pandas as pd
+
+_hooks = []
+_hooks_lock = threading.Lock()
+
+_RETRIEVE_FRAMES = ('_retrieve_', '_retrieve', 'traced_call', 'checked_call', '<lambda>')
+
+
+def install_hook(hook):
+    '''
+    Install a function called after every CAS action issued by DLPy
+
+    Parameters
+    ----------
+    hook : callable
+        Specifies the function.  It is called with a single argument,
+        the dictionary describing the action call, see :class:`Tracer`.
+
+    '''
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def remove_hook(hook):
+    '''
+    Remove a function installed with :func:`install_hook`
+
+    Parameters
+    ----------
+    hook : callable
+        Specifies the function.
+
+    '''
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def params_digest(params):
+    '''
+    Digest of the parameters of an action call
+
+    Parameters
+    ----------
+    params : dict
+        Specifies the parameters.
+
+    Returns
+    -------
+    string
+
+    '''
+    text = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _caller():
+    ''' Qualified name of the innermost DLPy function issuing the action '''
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('dlpy.') and module != __name__ and \
+                code.co_name not in _RETRIEVE_FRAMES:
+            obj = frame.f_locals.get('self', frame.f_locals.get('cls'))
+            if obj is not None:
+                owner = obj if isinstance(obj, type) else type(obj)
+                return '{}.{}'.format(owner.__name__, code.co_name)
+            return '{}.{}'.format(module.split('.')[-1], code.co_name)
+        frame = frame.f_back
+    return None
+
+
+def _result_size(res):
+    ''' Number of rows and bytes of the tables returned to the client '''
+    rows = 0
+    nbytes = 0
+    try:
+        values = list(res.values())
+    except AttributeError:
+        return rows, nbytes
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            rows += value.shape[0]
+            nbytes += int(value.memory_usage(index=True, deep=True).sum())
+    return rows, nbytes
+
+
+def traced_call(name, params, call):
+    '''
+    Issue an action call, reporting it to the installed hooks
+
+    Parameters
+    ----------
+    name : string
+        Specifies the name of the action.
+    params : dict
+        Specifies the parameters of the action.
+    call : callable
+        Specifies the function, without arguments, issuing the action.
+
+    Returns
+    -------
+    The result of `call`
+
+    '''
+    if not _hooks:
+        return call()
+
+    caller = _caller()
+    start = time.time()
+    error = None
+    res = None
+    try:
+        res = call()
+        return res
+    except Exception as err:
+        error = err
+        raise
+    finally:
+        end = time.time()
+        performance = getattr(res, 'performance', None)
+        rows, nbytes = _result_size(res)
+        event = dict(action=name,
+                     digest=params_digest(params),
+                     caller=caller,
+                     start=start,
+                     wall_time=end - start,
+                     elapsed_time=getattr(performance, 'elapsed_time', None),
+                     cpu_user_time=getattr(performance, 'cpu_user_time', None),
+                     cpu_system_time=getattr(performance, 'cpu_system_time', None),
+                     rows=rows,
+                     bytes=nbytes,
+                     severity=getattr(res, 'severity', None),
+                     error=None if error is None else repr(error),
+                     thread=threading.current_thread().ident)
+        with _hooks_lock:
+            hooks = list(_hooks)
+        for hook in hooks:
+            # A failing hook must not hide the result, or the error, of the action
+            try:
+                hook(event)
+            except Exception as err:
+                warnings.warn('The tracing hook {!r} failed: {!r}'.format(hook, err))
+
+
+class Tracer(object):
+    '''
+    Record the CAS action calls issued by DLPy
+
+    Every action issued through :meth:`Model._retrieve_`,
+    :meth:`ImageTable._retrieve` and the other DLPy entry points is
+    recorded while the tracer is active.  Each event holds the action name,
+    a digest of its parameters, the calling DLPy method, the client wall
+    time, the server elapsed and CPU times, and the rows and bytes of the
+    tables returned to the client.
+
+    Examples
+    --------
+    >>> with Tracer() as tracer:
+    ...     model.fit(train, max_epochs=1)
+    ...     model.predict(test)
+    >>> tracer.summary()
+    >>> tracer.to_chrome_trace('trace.json')
+
+    Returns
+    -------
+    :class:`Tracer`
+
+    '''
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        ''' Start recording '''
+        install_hook(self)
+
+    def stop(self):
+        ''' Stop recording '''
+        remove_hook(self)
+
+    def clear(self):
+        ''' Remove the recorded events '''
+        with self._lock:
+            self.events = []
+
+    def to_frame(self):
+        '''
+        The recorded events
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+
+        '''
+        columns = ['action', 'caller', 'digest', 'start', 'wall_time', 'elapsed_time',
+                   'cpu_user_time', 'cpu_system_time', 'rows', 'bytes', 'severity',
+                   'error', 'thread']
+        with self._lock:
+            events = list(self.events)
+        return pd.DataFrame(events, columns=columns)
+
+    def summary(self, by=('caller', 'action')):
+        '''
+        Summarize the recorded events
+
+        Parameters
+        ----------
+        by : iter-of-strings, optional
+            Specifies the columns to group the events by.
+            Default : ('caller', 'action')
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            The number of calls, and the total time and data, sorted by
+            decreasing wall time.
+
+        '''
+        by = list(by)
+        events = self.to_frame()
+        events[by] = events[by].fillna('')
+        groups = events.groupby(by)
+        out = groups[['wall_time', 'elapsed_time', 'cpu_user_time', 'cpu_system_time',
+                      'rows', 'bytes']].sum()
+        out.insert(0, 'calls', groups.size())
+        total = out['wall_time'].sum()
+        out['wall_time_pct'] = 100. * out['wall_time'] / total if total else 0.
+        return out.sort_values('wall_time', ascending=False)
+
+    def to_chrome_trace(self, path=None):
+        '''
+        Export the recorded events in the Chrome trace event format
+
+        The file can be opened with chrome://tracing or Perfetto.
+
+        Parameters
+        ----------
+        path : string, optional
+            Specifies the file to write.
+
+        Returns
+        -------
+        dict
+            The trace, if path is not specified
+
+        '''
+        pid = os.getpid()
+        trace_events = []
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            args = dict((key, event[key]) for key in
+                        ('digest', 'elapsed_time', 'cpu_user_time', 'cpu_system_time',
+                         'rows', 'bytes', 'error') if event[key] is not None)
+            trace_events.append(dict(name=event['action'],
+                                     cat=event['caller'] or 'dlpy',
+                                     ph='X',
+                                     ts=int(event['start'] * 1e6),
+                                     dur=int(event['wall_time'] * 1e6),
+                                     pid=pid,
+                                     tid=event['thread'],
+                                     args=args))
+        trace = dict(traceEvents=trace_events, displayTimeUnit='ms')
+        if path is None:
+            return trace
+        with open(path, 'w') as f:
+            json.dump(trace, f)
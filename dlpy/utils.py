@@ -18,22 +18,36 @@
 
 ''' Utility functions for the DLPy package '''
 
+import collections
 import os
 import random
 import re
 import string
+import threading
 
-import matplotlib.pyplot as plt
 import numpy as np
 import six
 import swat as sw
 from swat.cas.table import CASTable
 
+from .tracing import traced_call
+
+
+_name_random = random.SystemRandom()
+_name_lock = threading.Lock()
+# The most recent names, bounded so that long-running processes do not grow it
+_issued_names = collections.OrderedDict()
+_MAX_ISSUED_NAMES = 100000
+
 
 def random_name(name='ImageData', length=6):
     '''
     Generate random name
 
+    The random characters come from the system random source, and a name
+    is never repeated among the last 100000 names of the process.  Safe
+    to generate from several threads.
+
     Parameters
     ----------
     name : string, optional
@@ -46,8 +60,20 @@ def random_name(name='ImageData', length=6):
     string
 
     '''
-    return name + '_' + ''.join(random.sample(
-        string.ascii_uppercase + string.ascii_lowercase + string.digits, length))
+    chars = string.ascii_uppercase + string.ascii_lowercase + string.digits
+    with _name_lock:
+        attempts = 0
+        while True:
+            out = name + '_' + ''.join(_name_random.choice(chars) for _ in range(length))
+            # CAS table names are case-insensitive
+            if out.upper() not in _issued_names:
+                _issued_names[out.upper()] = None
+                if len(_issued_names) > _MAX_ISSUED_NAMES:
+                    _issued_names.popitem(last=False)
+                return out
+            attempts += 1
+            if attempts % 100 == 0:
+                length += 1
 
 
 def input_table_check(input_table):
@@ -199,6 +225,7 @@ def plot_predict_res(image, label, labels, values):
     :class:`matplotlib.axes.Axes`
 
     '''
+    import matplotlib.pyplot as plt
     fig = plt.figure(figsize=(12, 5))
     ax1 = fig.add_subplot(1, 2, 1)
     ax1.set_title('{}'.format(label))
@@ -257,17 +284,111 @@ def upload_astore(conn, path, table_name=None):
     table_name : string, or casout options
         Specifies the name of the cas table on server to put the astore object
 
+    Returns
+    -------
+    string or dict
+        The table holding the astore object on server
+
     '''
-    conn.loadactionset('astore')
+    conn.loadactionset('astore', _messagelevel='error')
 
-    with open(path, 'br') as f:
+    with open(path, 'rb') as f:
         astore_byte = f.read()
 
     store_ = sw.blob(astore_byte)
 
     if table_name is None:
         table_name = random_name('ASTORE')
-    conn.astore.upload(rstore=table_name, store=store_)
+    conn.retrieve('astore.upload', _messagelevel='error',
+                  rstore=table_name, store=store_)
+    return table_name
+
+
+class ActionError(ValueError):
+    '''
+    Used to indicate a CAS action call that failed
+
+    '''
+
+
+def checked_call(conn, _name_, message_level='error', **kwargs):
+    '''
+    Issue a traced action call, and raise if the action failed
+
+    Parameters
+    ----------
+    conn : CAS
+        The CAS connection object
+    _name_ : string
+        Specifies the name of the action.
+    message_level : string, optional
+        Specifies the level of the messages displayed.
+        Default : 'error'
+    **kwargs : keyword arguments, optional
+        Specifies the parameters of the action.
+
+    Raises
+    ------
+    :class:`ActionError`
+        If the severity of the results is greater than 1
+
+    Returns
+    -------
+    :class:`CASResults`
+
+    '''
+    res = traced_call(_name_, kwargs,
+                      lambda: conn.retrieve(_name_, _messagelevel=message_level, **kwargs))
+    if getattr(res, 'severity', 0) > 1:
+        raise ActionError('The {} action failed:\n{}'
+                          .format(_name_, '\n'.join(getattr(res, 'messages', None) or [])))
+    return res
+
+
+def upload_dataframe(conn, data, casout, binary_columns=None, nrecs=1000):
+    '''
+    Upload a pandas DataFrame to the server through the table.addtable action
+
+    Parameters
+    ----------
+    conn : CAS
+        The CAS connection object
+    data : pandas.DataFrame
+        Specifies the data to be uploaded.
+    casout : string or dict
+        Specifies the name, or the casout options, of the table on server.
+    binary_columns : list of str, optional
+        Specifies the columns containing raw bytes (e.g. encoded images)
+        that are uploaded as VARBINARY.
+    nrecs : int, optional
+        Specifies the number of rows sent to the server in each data message.
+
+    Notes
+    -----
+    Unlike the CSV based upload, binary columns are transferred as they are,
+    and the rows are sent in buffers of `nrecs` rows.
+
+    Returns
+    -------
+    :class:`CASTable`
+
+    '''
+    from swat.cas.datamsghandlers import PandasDataFrame
+
+    if isinstance(casout, six.string_types):
+        casout = dict(name=casout)
+    casout = dict(casout)
+    name = casout.pop('name')
+    casout.setdefault('replace', True)
+
+    dtype = None
+    if binary_columns:
+        dtype = dict((col, 'varbinary') for col in binary_columns)
+
+    handler = PandasDataFrame(data, nrecs=max(1, min(nrecs, len(data))), dtype=dtype)
+    res = checked_call(conn, 'table.addtable', table=name,
+                       **dict(casout, **handler.args.addtable))
+    return res['casTable']
 
 
 def unify_keys(dic):
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Conversion between weights tables and per-layer NumPy arrays
+
+A weights table holds one row per scalar weight (_LayerID_, _WeightID_,
+_Weight_).  The arrays of a layer are, in _WeightID_ order:
+
+    convolution      kernel (nfilters, channels, height, width), bias (nfilters,)
+    fully connected  kernel (n, inputs), bias (n,)
+    batchnorm        mean, variance, scale and bias, (channels,) each
+
+The inputs of a fully connected layer are in channel, row, column order.
+
+The packed format of a weights table holds the weights of each layer in
+varbinary blobs of little-endian floats, one row per chunk of weights
+(_LayerID_, _Offset_, _Count_, _Blob_).  The blobs hold doubles, or floats
+of half or single precision to reduce the size of exported weights; the
+precision of a blob follows from its length and _Count_.  The deep learning
+actions read the row format, so the packed format is converted at the
+boundaries, when a model is saved or loaded: the rows are fetched and packed
+by the client, and the blobs are unpacked (and upcast to doubles) by the
+client before the rows are uploaded.
+
+'''
+
+import collections
+
+import numpy as np
+import pandas as pd
+
+from .utils import checked_call
+
+PACKED_CHUNK_SIZE = 1 << 16
+
+# blob item size --> dtype
+_PACKED_DTYPES = {2: '<f2', 4: '<f4', 8: '<f8'}
+
+
+def _layer_type(layer):
+    return str(layer.config['type']).lower()
+
+
+def _has_bias(layer):
+    config = dict((key.lower(), value) for key, value in layer.config.items())
+    return not (config.get('nobias', False) or config.get('includebias', True) is False)
+
+
+def output_shape(layer):
+    '''
+    Return the shape of the output of a layer, in channel, row, column order
+
+    The output size of the layer must have been computed by
+    :attr:`dlpy.layers.Layer.summary_str`, e.g. by :func:`weight_shapes`.
+
+    '''
+    size = layer.output_size
+    if isinstance(size, int):
+        return (size,)
+    width, height, channels = size
+    return (int(channels), int(height), int(width))
+
+
+def weight_shapes(layers, counts=None):
+    '''
+    Return the shapes of the weight arrays of each layer
+
+    The shapes follow from the output sizes and the numbers of weights and
+    biases computed by :attr:`dlpy.layers.Layer.summary_str`.
+
+    Parameters
+    ----------
+    layers : list of :class:`dlpy.layers.Layer`
+        Specifies the layers of the model, in the order of the model table.
+    counts : dict, optional
+        Specifies the number of weights of each layer ID, used for the
+        layers whose number of neurons is not set (e.g. an output layer
+        sized by the target).
+
+    Returns
+    -------
+    OrderedDict
+        Layer names --> (layer ID, list of shapes), for the layers with
+        weights, in the order of the model table
+
+    '''
+    counts = counts or {}
+    out = collections.OrderedDict()
+    for layer_id, layer in enumerate(layers):
+        # computes the output size and the numbers of weights of the layer
+        layer.summary_str
+        layer_type = _layer_type(layer)
+        if layer_type in ['convo', 'convolution']:
+            width, height = layer.kernel_size
+            items = [(output_shape(layer)[0], output_shape(layer.src_layers[0])[0],
+                      height, width)]
+            if layer.num_bias:
+                items.append((layer.num_bias,))
+        elif layer_type == 'batchnorm':
+            # the moving mean and variance are stored with the scale and bias
+            items = [(output_shape(layer)[0],)] * 4
+        elif layer_type in ['fc', 'fullconnect', 'output']:
+            n_inputs = int(np.prod(output_shape(layer.src_layers[0])))
+            bias = 1 if _has_bias(layer) else 0
+            if layer.num_weights is None:
+                if layer_id not in counts:
+                    raise ValueError('The number of neurons of layer "{}" is unknown.'
+                                     .format(layer.name))
+                n = counts[layer_id] // (n_inputs + bias)
+            else:
+                n = layer.num_weights // n_inputs
+            items = [(n, n_inputs)] + ([(n,)] if bias else [])
+        else:
+            continue
+        out[layer.name] = (layer_id, items)
+    return out
+
+
+def _split(values, shapes):
+    ''' Arrays of the given shapes, from the weights of a layer in _WeightID_ order '''
+    arrays = []
+    start = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        arrays.append(values[start:start + size].reshape(shape))
+        start += size
+    return arrays
+
+
+def fetch_weights(conn, table, layers, chunk_size=1 << 20):
+    '''
+    Fetch the weights of a model as per-layer arrays
+
+    The weights of each layer are fetched in chunks of rows selected by
+    ranges of _WeightID_, and placed by their _WeightID_, so that the rows
+    can come back in any order.
+
+    Parameters
+    ----------
+    conn : CAS
+        The CAS connection object
+    table : CASTable
+        Specifies the weights table.
+    layers : list of :class:`dlpy.layers.Layer`
+        Specifies the layers of the model, in the order of the model table.
+    chunk_size : int, optional
+        Specifies the number of rows fetched by each table.fetch action.
+        Default : 1048576
+
+    Returns
+    -------
+    OrderedDict
+        Layer names --> list of numpy arrays
+
+    '''
+    table_params = table.to_table_params()
+    counts = {}
+    for layer_id, layer in enumerate(layers):
+        if _layer_type(layer) in ['fc', 'output'] and layer.config.get('n') is None:
+            res = checked_call(conn, 'table.numrows',
+                               table=dict(table_params, where='_LayerID_ = {}'
+                                          .format(layer_id)))
+            counts[layer_id] = int(res['numrows'])
+
+    out = collections.OrderedDict()
+    for name, (layer_id, shapes) in weight_shapes(layers, counts).items():
+        size = sum(int(np.prod(shape)) for shape in shapes)
+        values = np.zeros(size)
+        for start in range(0, size, chunk_size):
+            where = '_LayerID_ = {} and _WeightID_ >= {} and _WeightID_ < {}'.format(
+                layer_id, start, start + chunk_size)
+            res = checked_call(conn, 'table.fetch', table=dict(table_params, where=where),
+                               fetchvars=['_WeightID_', '_Weight_'], to=chunk_size,
+                               maxrows=chunk_size)
+            fetched = res['Fetch']
+            values[fetched['_WeightID_'].values.astype(np.int64)] = \
+                fetched['_Weight_'].values
+        out[name] = _split(values, shapes)
+    return out
+
+
+def fetch_rows(conn, table, chunk_size=1 << 20):
+    '''
+    Fetch the rows of a weights table
+
+    Unlike :func:`fetch_weights`, the rows are fetched as they are stored,
+    without the layers of the model, in ranges of row numbers.
+
+    Parameters
+    ----------
+    conn : CAS
+        The CAS connection object
+    table : CASTable
+        Specifies the weights table.
+    chunk_size : int, optional
+        Specifies the number of rows fetched by each table.fetch action.
+        Default : 1048576
+
+    Returns
+    -------
+    pandas.DataFrame
+
+    '''
+    table_params = table.to_table_params()
+    nrows = int(checked_call(conn, 'table.numrows', table=table_params)['numrows'])
+    frames = [pd.DataFrame(collections.OrderedDict(
+        [('_LayerID_', np.zeros(0, dtype=np.int64)),
+         ('_WeightID_', np.zeros(0, dtype=np.int64)), ('_Weight_', np.zeros(0))]))]
+    for start in range(0, nrows, chunk_size):
+        res = checked_call(conn, 'table.fetch', table=table_params,
+                           fetchvars=['_LayerID_', '_WeightID_', '_Weight_'],
+                           to=min(start + chunk_size, nrows), maxrows=chunk_size,
+                           **{'from': start + 1})
+        frames.append(pd.DataFrame(res['Fetch']))
+    return pd.concat(frames, ignore_index=True)
+
+
+def weights_frame(layers, arrays):
+    '''
+    Return the rows of a weights table holding per-layer arrays
+
+    Parameters
+    ----------
+    layers : list of :class:`dlpy.layers.Layer`
+        Specifies the layers of the model, in the order of the model table.
+    arrays : dict
+        Specifies the arrays of each layer with weights, as returned by
+        :func:`fetch_weights`.
+
+    Returns
+    -------
+    pandas.DataFrame
+
+    '''
+    layer_ids = dict((layer.name, layer_id) for layer_id, layer in enumerate(layers))
+    counts = dict((layer_ids[name], sum(np.size(item) for item in items))
+                  for name, items in arrays.items() if name in layer_ids)
+    shapes = weight_shapes(layers, counts)
+    unknown = [name for name in arrays if name not in shapes]
+    missing = [name for name in shapes if name not in arrays]
+    if unknown or missing:
+        raise ValueError('The arrays do not match the layers with weights '
+                         '(missing: {}, unknown: {}).'.format(missing or None, unknown or None))
+
+    columns = []
+    for name, (layer_id, layer_shapes) in shapes.items():
+        items = arrays[name]
+        if [tuple(np.shape(item)) for item in items] != [tuple(s) for s in layer_shapes]:
+            raise ValueError('The arrays of layer "{}" have shapes {}, expected {}.'.format(
+                name, [tuple(np.shape(item)) for item in items], layer_shapes))
+        values = np.concatenate([np.ravel(item) for item in items]).astype(np.float64)
+        columns.append((np.full(values.size, layer_id, dtype=np.int64),
+                        np.arange(values.size, dtype=np.int64), values))
+    return pd.DataFrame(collections.OrderedDict([
+        ('_LayerID_', np.concatenate([item[0] for item in columns])),
+        ('_WeightID_', np.concatenate([item[1] for item in columns])),
+        ('_Weight_', np.concatenate([item[2] for item in columns]))]))
+
+
+def _packed_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f' or dtype.itemsize not in _PACKED_DTYPES:
+        raise ValueError('The weights can be packed as float16, float32 or float64, '
+                         'not {}.'.format(dtype))
+    return np.dtype(_PACKED_DTYPES[dtype.itemsize])
+
+
+def _in_range(values, dtype):
+    ''' Mask of the values that can be cast to dtype without overflow '''
+    return ~np.isfinite(values) | (np.abs(values) <= np.finfo(dtype).max)
+
+
+def precision_report(frame, dtype='float16'):
+    '''
+    Return the error of storing the weights of each layer with less precision
+
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+        Specifies the rows of the weights table.
+    dtype : string, optional
+        Specifies the storage precision, 'float16' or 'float32'.
+        Default : 'float16'
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per layer ID, with the number of weights, the largest
+        absolute error and the largest error relative to the largest
+        absolute weight of the layer
+
+    '''
+    dtype = _packed_dtype(dtype)
+    values = frame['_Weight_'].values.astype(np.float64)
+    # out of range weights are not cast, as floating point traps may be enabled
+    in_range = _in_range(values, dtype)
+    errors = np.full(values.size, np.inf)
+    errors[in_range] = np.abs(values[in_range].astype(dtype).astype(np.float64) -
+                              values[in_range])
+    report = pd.DataFrame(dict(_LayerID_=frame['_LayerID_'].values.astype(np.int64),
+                               error=errors, weight=np.abs(values)))
+    groups = report.groupby('_LayerID_')
+    max_error, max_weight = groups['error'].max(), groups['weight'].max()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_error = np.where(max_weight > 0, max_error / max_weight, 0.)
+    return pd.DataFrame(collections.OrderedDict([
+        ('_LayerID_', max_error.index.values), ('n_weights', groups.size().values),
+        ('max_abs_error', max_error.values), ('max_rel_error', rel_error)]))
+
+
+def pack_weights(frame, chunk_size=PACKED_CHUNK_SIZE, dtype='float64'):
+    '''
+    Return the packed format of the rows of a weights table
+
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+        Specifies the rows of the weights table (_LayerID_, _WeightID_ and
+        _Weight_ columns), in any order.
+    chunk_size : int, optional
+        Specifies the number of weights in each blob.
+        Default : 65536
+    dtype : string, optional
+        Specifies the precision of the weights in the blobs, 'float16',
+        'float32' or 'float64'.  See :func:`precision_report` for the error
+        of the lower precisions.
+        Default : 'float64'
+
+    Returns
+    -------
+    pandas.DataFrame
+
+    '''
+    dtype = _packed_dtype(dtype)
+    layer_ids = frame['_LayerID_'].values.astype(np.int64)
+    weight_ids = frame['_WeightID_'].values.astype(np.int64)
+    order = np.lexsort((weight_ids, layer_ids))
+    layer_ids, weight_ids = layer_ids[order], weight_ids[order]
+    values = frame['_Weight_'].values.astype(np.float64)[order]
+    if not _in_range(values, dtype).all():
+        raise ValueError('Some weights are out of the range of {}.'.format(dtype.name))
+    values = values.astype(dtype)
+
+    rows = []
+    bounds = np.flatnonzero(np.diff(layer_ids)) + 1
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, layer_ids.size]):
+        if not np.array_equal(weight_ids[start:stop], np.arange(stop - start)):
+            raise ValueError('The weight IDs of layer {} are not contiguous.'
+                             .format(layer_ids[start]))
+        for offset in range(0, stop - start, chunk_size):
+            chunk = values[start + offset:min(start + offset + chunk_size, stop)]
+            rows.append((layer_ids[start], offset, chunk.size, chunk.tobytes()))
+    return pd.DataFrame(rows, columns=['_LayerID_', '_Offset_', '_Count_', '_Blob_'])
+
+
+def unpack_weights(packed):
+    '''
+    Return the rows of a weights table from its packed format
+
+    Parameters
+    ----------
+    packed : pandas.DataFrame
+        Specifies the packed weights (_LayerID_, _Offset_, _Count_ and _Blob_
+        columns), see :func:`pack_weights`.
+
+    Returns
+    -------
+    pandas.DataFrame
+
+    '''
+    columns = [[], [], []]
+    for layer_id, offset, count, blob in packed[['_LayerID_', '_Offset_', '_Count_',
+                                                 '_Blob_']].itertuples(index=False):
+        dtype = _PACKED_DTYPES.get(len(blob) // count if count else 8)
+        if dtype is None or len(blob) % max(count, 1):
+            raise ValueError('The blob of layer {} at offset {} has {} bytes for {} '
+                             'weights.'.format(layer_id, offset, len(blob), count))
+        values = np.frombuffer(blob, dtype=dtype)
+        columns[0].append(np.full(values.size, layer_id, dtype=np.int64))
+        columns[1].append(np.arange(offset, offset + values.size, dtype=np.int64))
+        columns[2].append(values.astype(np.float64))
+    if not columns[0]:
+        columns = [[np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)],
+                   [np.zeros(0)]]
+    return pd.DataFrame(collections.OrderedDict(
+        (name, np.concatenate(items))
+        for name, items in zip(['_LayerID_', '_WeightID_', '_Weight_'], columns)))
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright SAS Institute
+#
+#  Licensed under the Apache License, Version 2.0 (the License);
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Upload of client-side HDF5 weight files into a weights table
+
+The SAS-compatible HDF5 files written by the Keras and Caffe converters
+(*.kerasmodel.h5 and *.caffemodel.h5) are read by the client, one layer at
+a time, and the weights are streamed to the server in chunks of rows, so
+that the file never has to be copied to a server-side path.  The rows are
+appended to a staging table named after the file; an interrupted upload
+resumes after the rows the staging table already holds.
+
+The weights of each layer are sent in the layout of the weights table
+described in :mod:`dlpy.weights_arrays`.
+
+'''
+
+import hashlib
+import os
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .utils import upload_dataframe
+from .weights_arrays import weight_shapes
+
+
+class WeightsUploadError(ValueError):
+    '''
+    Used to indicate a weights file that does not match the model
+
+    '''
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf8')
+    return value
+
+
+def _layer_type(layer):
+    return str(layer.config['type']).lower()
+
+
+def _keras_datasets(group):
+    ''' Datasets of a Keras layer group, by weight name (kernel, bias, gamma, ...) '''
+    names = [_text(name) for name in group.attrs.get('weight_names', [])]
+    return dict((name.split('/')[-1].split(':')[0], group[name]) for name in names)
+
+
+def _weights_plan(f, layers):
+    '''
+    Datasets making up the weights of each layer, in weights-table order
+
+    Returns
+    -------
+    list of (int, list of (h5py.Dataset, float, bool))
+        Layer IDs and their datasets, with the divisor applied to the
+        values of each dataset and whether the dataset is transposed
+
+    '''
+    caffe = 'data' in f and isinstance(f['data'], h5py.Group)
+    root = f['data'] if caffe else f
+    plan = []
+    for layer_id, layer in enumerate(layers):
+        layer_type = _layer_type(layer)
+        if layer_type not in ['convo', 'fc', 'output', 'batchnorm']:
+            continue
+        if layer.name not in root:
+            raise WeightsUploadError('The weights file has no weights for layer "{}".'
+                                     .format(layer.name))
+        group = root[layer.name]
+        if caffe:
+            datasets = [group[key] for key in sorted(group.keys(), key=int)]
+            if layer_type == 'batchnorm':
+                # Caffe stores the mean and variance multiplied by a moving
+                # average factor, and the scale and bias in a Scale layer
+                factor = float(np.ravel(datasets[2][()])[0]) if len(datasets) > 2 else 1.
+                factor = factor or 1.
+                scale = root.get(layer.name + '_scale')
+                if scale is None:
+                    raise WeightsUploadError('The weights file has no scale and bias for '
+                                             'batchnorm layer "{}".'.format(layer.name))
+                items = [(datasets[0], factor), (datasets[1], factor),
+                         (scale['0'], 1.), (scale['1'], 1.)]
+            else:
+                items = [(dataset, 1.) for dataset in datasets]
+        else:
+            datasets = _keras_datasets(group)
+            required = ['moving_mean', 'moving_variance'] if layer_type == 'batchnorm' \
+                else ['kernel']
+            missing = [name for name in required if name not in datasets]
+            if missing:
+                raise WeightsUploadError('The weights file has no {} for layer "{}".'
+                                         .format(' or '.join(missing), layer.name))
+            if layer_type == 'batchnorm':
+                # without scale (or center), Keras stores no gamma (or beta)
+                channels = datasets['moving_mean'].shape[0]
+                items = [(datasets['moving_mean'], 1.), (datasets['moving_variance'], 1.),
+                         (datasets.get('gamma', np.ones(channels)), 1.),
+                         (datasets.get('beta', np.zeros(channels)), 1.)]
+            else:
+                items = [(datasets[name], 1.) for name in ['kernel', 'bias']
+                         if name in datasets]
+        plan.append((layer_id, items))
+    return _check_shapes(plan, layers)
+
+
+def _check_shapes(plan, layers):
+    '''
+    Check the shapes of the datasets against the layers of the model
+
+    A fully connected kernel stored as (inputs, n), as Keras does, is
+    transposed to (n, inputs).
+
+    '''
+    counts = dict((layer_id, sum(int(np.prod(np.shape(dataset))) for dataset, _ in items))
+                  for layer_id, items in plan)
+    try:
+        shapes = weight_shapes(layers, counts)
+    except ValueError as err:
+        raise WeightsUploadError(str(err))
+
+    checked = []
+    for layer_id, items in plan:
+        name = layers[layer_id].name
+        expected = shapes[name][1]
+        found = [tuple(np.shape(dataset)) for dataset, _ in items]
+        out = []
+        for (dataset, divisor), shape, expected_shape in zip(items, found, expected):
+            squeezed = tuple(size for size in shape if size != 1)
+            if squeezed == tuple(size for size in expected_shape if size != 1):
+                out.append((dataset, divisor, False))
+            elif len(shape) == 2 and shape[::-1] == tuple(expected_shape):
+                out.append((dataset, divisor, True))
+            else:
+                break
+        if len(out) != len(expected) or len(items) != len(expected):
+            raise WeightsUploadError('The weights of layer "{}" have shapes {}, expected {}.'
+                                     .format(name, found, [tuple(s) for s in expected]))
+        checked.append((layer_id, out))
+    return checked
+
+
+def _layer_sizes(plan):
+    return [sum(int(np.prod(np.shape(dataset))) for dataset, _, _ in items)
+            for _, items in plan]
+
+
+def _iter_chunks(plan, start=0, chunk_size=1 << 20):
+    ''' Rows of the weights table from row start, in DataFrames of chunk_size rows '''
+    blocks, n_rows = [], 0
+    for (layer_id, items), size in zip(plan, _layer_sizes(plan)):
+        if start >= size:
+            start -= size
+            continue
+        values = np.concatenate([np.ravel(np.asarray(dataset[()]).T if transposed
+                                          else dataset[()]).astype(np.float64) / divisor
+                                 for dataset, divisor, transposed in items])
+        blocks.append((np.full(size - start, layer_id, dtype=np.int64),
+                       np.arange(start, size, dtype=np.int64), values[start:]))
+        n_rows += size - start
+        start = 0
+        while n_rows >= chunk_size:
+            chunk, blocks = _split_blocks(blocks, chunk_size)
+            n_rows -= chunk_size
+            yield chunk
+    if n_rows:
+        yield _split_blocks(blocks, n_rows)[0]
+
+
+def _split_blocks(blocks, n_rows):
+    ''' DataFrame of the first n_rows rows of the column blocks, and the other blocks '''
+    taken, rest = [], []
+    for block in blocks:
+        size = block[0].size
+        if n_rows >= size:
+            taken.append(block)
+        elif n_rows:
+            taken.append(tuple(column[:n_rows] for column in block))
+            rest.append(tuple(column[n_rows:] for column in block))
+        else:
+            rest.append(block)
+        n_rows = max(0, n_rows - size)
+    columns = [np.concatenate(items) for items in zip(*taken)]
+    chunk = pd.DataFrame(dict(zip(['_LayerID_', '_WeightID_', '_Weight_'], columns)),
+                         columns=['_LayerID_', '_WeightID_', '_Weight_'])
+    return chunk, rest
+
+
+def staging_table_name(model_name, file_name):
+    '''
+    Return the name of the table a weights file is uploaded into
+
+    The name depends on the path, size and modification time of the file,
+    so that an interrupted upload of the same file can be resumed.
+
+    '''
+    stat = os.stat(file_name)
+    key = '{}:{}:{}'.format(os.path.abspath(file_name), stat.st_size, stat.st_mtime)
+    return '{}_upload_{}'.format(model_name, hashlib.sha1(key.encode('utf8')).hexdigest()[:8])
+
+
+def _table_rows(conn, name):
+    res = conn.retrieve('table.tableexists', _messagelevel='error', name=name)
+    if not res.get('exists'):
+        return 0
+    res = conn.retrieve('table.tableinfo', _messagelevel='error', name=name)
+    return int(res['TableInfo']['Rows'].iloc[0])
+
+
+def upload_weights(conn, layers, file_name, table, chunk_size=1 << 20, nrecs=10000,
+                   resume=True, progress=None):
+    '''
+    Upload the weights of a client-side HDF5 file into a weights table
+
+    Parameters
+    ----------
+    conn : CAS
+        The CAS connection object
+    layers : list of :class:`dlpy.layers.Layer`
+        Specifies the layers of the model, in the order of the model table.
+    file_name : string
+        Specifies the client-side SAS-compatible HDF5 file
+        (*.kerasmodel.h5 or *.caffemodel.h5).
+    table : string
+        Specifies the name of the table the rows are appended to.
+    chunk_size : int, optional
+        Specifies the number of rows sent by each table.addtable action.
+        A failed upload is resumed from the last chunk received.
+        Default : 1048576
+    nrecs : int, optional
+        Specifies the number of rows in each data message.
+        Default : 10000
+    resume : bool, optional
+        Specifies whether to keep the rows already in the table.  When
+        False, the table is replaced.
+        Default : True
+    progress : callable, optional
+        Specifies a function called with the number of rows uploaded and
+        the total number of rows, after each chunk.
+
+    Returns
+    -------
+    int
+        The number of rows of the table
+
+    '''
+    with h5py.File(file_name, 'r') as f:
+        plan = _weights_plan(f, layers)
+        total = sum(_layer_sizes(plan))
+
+        done = _table_rows(conn, table) if resume else 0
+        if done > total:
+            raise WeightsUploadError('Table "{}" has more rows than the weights file.'
+                                     .format(table))
+        if progress is not None and done:
+            progress(done, total)
+
+        for chunk in _iter_chunks(plan, done, chunk_size):
+            upload_dataframe(conn, chunk, dict(name=table, replace=not done,
+                                               append=bool(done)), nrecs=nrecs)
+            done += chunk.shape[0]
+            if progress is not None:
+                progress(done, total)
+    return total
+
+
+def load_uploaded_weights(model, file_name, chunk_size=1 << 20, resume=True, progress=None):
+    '''
+    Upload a client-side HDF5 weights file and attach it to a model
+
+    Parameters
+    ----------
+    model : :class:`dlpy.model.Model`
+        Specifies the model the weights belong to.
+    file_name : string
+        Specifies the client-side SAS-compatible HDF5 file.
+    chunk_size : int, optional
+        Specifies the number of rows sent by each table.addtable action.
+    resume : bool, optional
+        Specifies whether to resume an interrupted upload of the same file.
+    progress : callable, optional
+        Specifies a function called with the number of rows uploaded and
+        the total number of rows, after each chunk.
+
+    '''
+    staging = staging_table_name(model.model_name, file_name)
+    upload_weights(model.conn, model.layers, file_name, staging, chunk_size=chunk_size,
+                   resume=resume, progress=progress)
+    model.set_weights(staging)
+    model.conn.retrieve('table.droptable', _messagelevel='error', name=staging,
+                        quiet=True)